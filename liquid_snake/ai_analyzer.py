@@ -22,6 +22,13 @@ from typing import Dict, Any, Optional, List
 from datetime import datetime, timedelta
 from icecream import ic
 
+from downsample import DEFAULT_DOWNSAMPLE_METHOD, TIMELINE_MAX_POINTS, downsample_timeline_charts
+from insights import build_server_insights
+from plans import plan_cache, plan_index_usage
+from query_groups import QueryGroupEngine
+from snapshot import snapshot_store
+from timeline import TimelineBuckets
+
 # Try to import OpenAI SDK
 try:
     from openai import OpenAI, OpenAIError
@@ -357,14 +364,25 @@ class SessionCache:
         if expired_keys:
             ic(f"🗑️ Cleaned up {len(expired_keys)} expired sessions", expired_keys)
     
-    def set(self, session_id: str, data: Dict[str, Any]) -> None:
-        """Store data in cache"""
+    def set(self, session_id: str, data: Dict[str, Any], size_bytes: Optional[int] = None) -> None:
+        """
+        Store data in cache
+        
+        Args:
+            session_id: Session identifier
+            data: Data to cache
+            size_bytes: Known size of the data; avoids stringifying large datasets
+        """
+        if size_bytes is None:
+            size_bytes = len(str(data))
+        
         with self._lock:
             self._cache[session_id] = {
                 'data': data,
-                'timestamp': time.time()
+                'timestamp': time.time(),
+                'size_bytes': size_bytes
             }
-        ic(f"💾 Cached session {session_id}", f"size={len(str(data))} bytes")
+        ic(f"💾 Cached session {session_id}", f"size={size_bytes} bytes")
     
     def get(self, session_id: str) -> Optional[Dict[str, Any]]:
         """Retrieve data from cache"""
@@ -397,7 +415,7 @@ class SessionCache:
         """Get cache statistics"""
         with self._lock:
             total_sessions = len(self._cache)
-            total_size = sum(len(str(s['data'])) for s in self._cache.values())
+            total_size = sum(s['size_bytes'] for s in self._cache.values())
             
             return {
                 'total_sessions': total_sessions,
@@ -630,6 +648,9 @@ class DataObfuscator:
 # AI Payload Builder
 # ============================================================================
 
+# Cached next to a multi-file dataset by /api/ingest (parallel_ingest.py)
+PRECOMPUTED_AGGREGATES = ('query_group_engine', 'service_pressure', 'timeline_buckets')
+
 class AIPayloadBuilder:
     """
     Build AI analysis payload from cached query data
@@ -658,6 +679,7 @@ class AIPayloadBuilder:
             Complete payload dict
         """
         ic(f"🔨 Building payload from raw data")
+        raw_data = self._scope_to_time_window(raw_data, options)
         
         # Initialize payload with context
         full_prompt = user_prompt
@@ -772,7 +794,7 @@ CRITICAL: Do NOT skip analysis of the stake timestamp. The user specifically wan
             'metadata': {
                 'timestamp': datetime.utcnow().isoformat() + 'Z',
                 'analyzer_version': raw_data.get('version', 'unknown'),
-                'total_queries_in_dataset': len(raw_data.get('everyQueryData', []))
+                'total_queries_in_dataset': get_total_queries(raw_data)
             }
         }
         
@@ -817,7 +839,11 @@ CRITICAL: Do NOT skip analysis of the stake timestamp. The user specifically wan
             }
             
         if selections.get('timeline_charts', False):
-            timeline = self._build_timeline_charts(raw_data)
+            timeline = self._build_timeline_charts(
+                raw_data,
+                max_points=options.get('timeline_max_points', TIMELINE_MAX_POINTS),
+                method=options.get('timeline_downsample', DEFAULT_DOWNSAMPLE_METHOD)
+            )
             payload['data']['timeline_charts'] = {
                 '_description': 'Time-series data from Timeline Charts showing traffic spikes, latency trends, memory usage, and throughput over time',
                 **timeline
@@ -965,6 +991,7 @@ CRITICAL: Do NOT skip analysis of the stake timestamp. The user specifically wan
         if not cached_data:
             ic("❌ Session not found in cache")
             return None
+        cached_data = self._scope_to_time_window(cached_data, options)
         
         # Initialize payload
         payload = {
@@ -996,7 +1023,11 @@ CRITICAL: Do NOT skip analysis of the stake timestamp. The user specifically wan
             payload['data']['index_query_flow'] = self._build_flow_diagram(cached_data)
             
         if selections.get('timeline_charts', False):
-            payload['data']['timeline_charts'] = self._build_timeline_charts(cached_data)
+            payload['data']['timeline_charts'] = self._build_timeline_charts(
+                cached_data,
+                max_points=options.get('timeline_max_points', TIMELINE_MAX_POINTS),
+                method=options.get('timeline_downsample', DEFAULT_DOWNSAMPLE_METHOD)
+            )
         
         # Apply obfuscation if requested
         if options.get('obfuscated', False):
@@ -1007,9 +1038,37 @@ CRITICAL: Do NOT skip analysis of the stake timestamp. The user specifically wan
         ic(f"✅ Payload built, size={len(str(payload))} bytes")
         return payload
     
+    def _scope_to_time_window(self, data: Dict[str, Any], options: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Restrict a server-side dataset to options['time_window'] = {'start', 'end'}
+        
+        Uses the dataset's sorted requestTime index (two binary searches); the
+        cached data itself is left untouched.
+        """
+        window = options.get('time_window') or {}
+        dataset = data.get('dataset')
+        if dataset is None or not (window.get('start') or window.get('end')):
+            return data
+        
+        scoped = dataset.time_window(window.get('start'), window.get('end'))
+        ic(f"🕒 Scoped dataset to time window: {len(scoped)} of {len(dataset)} requests")
+        # Aggregates precomputed at ingest cover the whole capture
+        return {
+            **{key: value for key, value in data.items() if key not in PRECOMPUTED_AGGREGATES},
+            'dataset': scoped
+        }
+    
     def _build_dashboard_metrics(self, data: Dict[str, Any]) -> Dict[str, Any]:
         """Extract dashboard metrics - aggregated stats from charts"""
         dashboard_stats = data.get('dashboardStats', {})
+        dataset = data.get('dataset')
+        
+        if dataset is not None and (not dashboard_stats or not dashboard_stats.get('charts')):
+            # Server-side dataset from /api/ingest: aggregate over columns
+            return {
+                'source': 'server_dataset',
+                **dataset.summary()
+            }
         
         if not dashboard_stats or not dashboard_stats.get('charts'):
             return {
@@ -1022,12 +1081,21 @@ CRITICAL: Do NOT skip analysis of the stake timestamp. The user specifically wan
     def _build_insights(self, data: Dict[str, Any]) -> Dict[str, Any]:
         """Extract insights data from frontend"""
         insights = data.get('insightsData', {})
+        dataset = data.get('dataset')
+        
+        if dataset is not None and (not insights or not insights.get('items')):
+            # Server-side dataset from /api/ingest: evaluate the insight rules over columns
+            insights = {
+                'source': 'server_dataset',
+                **build_server_insights(dataset, conflicts=data.get('service_pressure'))
+            }
         
         if not insights or not insights.get('items'):
             return {'note': 'No insights data available - insights tab may not be loaded'}
         
         # Return all items with their counts and samples
         return {
+            **({'source': insights['source']} if 'source' in insights else {}),
             'total_insights': len(insights.get('items', [])),
             'insights': insights.get('items', [])
         }
@@ -1036,6 +1104,10 @@ CRITICAL: Do NOT skip analysis of the stake timestamp. The user specifically wan
         """Extract query groups (normalized patterns) from analysisData"""
         analysis = data.get('analysisData', [])
         
+        if not analysis and (data.get('dataset') is not None or data.get('everyQueryData')):
+            # Browser did not send the Analysis tab: group the requests server-side
+            return self._build_server_query_groups(data, limit=limit)
+        
         if not analysis:
             return {'note': 'No query group data available'}
         
@@ -1067,18 +1139,56 @@ CRITICAL: Do NOT skip analysis of the stake timestamp. The user specifically wan
             'note': f'Showing top {len(sample_patterns)} of {len(analysis)} query patterns by duration. Statements truncated to 200 chars.'
         }
     
+    def _build_server_query_groups(self, data: Dict[str, Any], limit: int = 10) -> Dict[str, Any]:
+        """Group the server-side dataset (or everyQueryData) by normalized statement"""
+        # Multi-file ingests cache an engine merged from the per-file partials
+        engine = data.get('query_group_engine')
+        dataset = data.get('dataset')
+        if engine is None:
+            engine = QueryGroupEngine()
+            if dataset is not None:
+                engine.add_dataset(dataset)
+            else:
+                engine.extend(data.get('everyQueryData', []))
+        
+        groups = engine.results()
+        sample_patterns = []
+        for pattern in groups[:limit]:
+            statement = pattern['normalized_statement']
+            if len(statement) > 200:
+                pattern['normalized_statement'] = statement[:200] + '... (truncated)'
+            sample_patterns.append(pattern)
+        
+        return {
+            'source': 'server_dataset' if dataset is not None else 'server_requests',
+            'total_patterns': len(groups),
+            'sample_size': len(sample_patterns),
+            'patterns': sample_patterns,
+            'note': f'Showing top {len(sample_patterns)} of {len(groups)} query patterns by total serviceTime. '
+                    f'Percentiles are DDSketch estimates within 1%. Statements truncated to 200 chars.'
+        }
+    
     def _build_indexes(self, data: Dict[str, Any]) -> Dict[str, Any]:
-        """Extract index data from system:indexes upload"""
+        """Extract index data from system:indexes upload, plus index usage from request plans"""
         index_data = data.get('indexData', [])
+        plan_usage = plan_index_usage(data.get('dataset'))
         
         if not index_data or len(index_data) == 0:
+            if plan_usage:
+                return {
+                    'plan_index_usage': plan_usage,
+                    'note': 'No system:indexes upload; index usage is taken from the completed_requests plans'
+                }
             return {'note': 'No index data available - user did not upload system:indexes JSON'}
         
-        return {
+        result = {
             'total_indexes': len(index_data),
             'indexes': index_data,
             'note': f'Index catalog with {len(index_data)} indexes from system:indexes query'
         }
+        if plan_usage:
+            result['plan_index_usage'] = plan_usage
+        return result
     
     def _build_flow_diagram(self, data: Dict[str, Any]) -> Dict[str, Any]:
         """Extract flow diagram data with Mermaid visualization"""
@@ -1103,10 +1213,17 @@ CRITICAL: Do NOT skip analysis of the stake timestamp. The user specifically wan
             'note': 'Mermaid graph showing which indexes are used by which queries'
         }
         
-    def _build_timeline_charts(self, data: Dict[str, Any]) -> Dict[str, Any]:
-        """Extract timeline charts data"""
+    def _build_timeline_charts(self, data: Dict[str, Any],
+                               max_points: int = TIMELINE_MAX_POINTS,
+                               method: str = DEFAULT_DOWNSAMPLE_METHOD) -> Dict[str, Any]:
+        """Extract timeline charts data, downsampled to max_points per chart"""
         timeline_data = data.get('timelineChartsData', {})
         
+        if not timeline_data and data.get('dataset') is not None:
+            # Server-side dataset from /api/ingest: per-minute request count and latency
+            buckets = data.get('timeline_buckets') or TimelineBuckets.from_dataset(data['dataset'])
+            timeline_data = buckets.to_charts()
+        
         if not timeline_data:
             return {'note': 'No timeline chart data available - charts may not be loaded'}
             
@@ -1132,8 +1249,8 @@ CRITICAL: Do NOT skip analysis of the stake timestamp. The user specifically wan
         
         return {
             'total_charts': len(valid_charts),
-            'charts': valid_charts,
-            'note': 'Sampled time-series data from interactive charts'
+            'charts': downsample_timeline_charts(valid_charts, max_points=max_points, method=method),
+            'note': f'Sampled time-series data from interactive charts (spike-preserving {method} downsampling, max {max_points} points per chart)'
         }
 
 # Global payload builder instance
@@ -1339,20 +1456,50 @@ def generate_session_id() -> str:
     """Generate unique session ID"""
     return secrets.token_urlsafe(16)
 
-def cache_analyzer_data(data: Dict[str, Any]) -> str:
+def cache_analyzer_data(data: Dict[str, Any], size_bytes: Optional[int] = None) -> str:
     """
     Cache analyzer data and return session ID
     
     Args:
         data: Complete analyzer data from frontend
+        size_bytes: Known size of the data (e.g. bytes read by /api/ingest)
         
     Returns:
         session_id for retrieving cached data
     """
     session_id = generate_session_id()
-    session_cache.set(session_id, data)
+    session_cache.set(session_id, data, size_bytes=size_bytes)
     return session_id
 
+def open_dataset_snapshot(content_hash: str, version: str = 'unknown') -> Optional[str]:
+    """
+    Reopen a dataset snapshot (see snapshot.py) into a new session
+    
+    Args:
+        content_hash: SHA-256 of the originally uploaded bytes
+        version: Analyzer version to record with the dataset
+        
+    Returns:
+        session_id, or None if there is no snapshot for the hash
+    """
+    dataset = snapshot_store.load(content_hash)
+    if dataset is None:
+        return None
+    cached = {
+        'dataset': dataset,
+        'version': version,
+        'source': 'snapshot',
+        'content_hash': content_hash
+    }
+    return cache_analyzer_data(cached, size_bytes=dataset.nbytes)
+
+def get_total_queries(data: Dict[str, Any]) -> int:
+    """Number of requests in analyzer data (server-side dataset or everyQueryData)"""
+    dataset = data.get('dataset')
+    if dataset is not None:
+        return len(dataset)
+    return len(data.get('everyQueryData', []))
+
 def get_cached_data(session_id: str) -> Optional[Dict[str, Any]]:
     """Retrieve cached data by session ID"""
     return session_cache.get(session_id)
@@ -1375,9 +1522,33 @@ def build_ai_payload(session_id: str,
     """
     return payload_builder.build_payload(session_id, prompt, selections, options)
 
+# Payload metadata that differs between two builds of the same data
+PAYLOAD_VOLATILE_METADATA = ('timestamp', 'session_id')
+
+def split_volatile_metadata(payload: Dict[str, Any]) -> tuple:
+    """
+    Separate per-build metadata from a payload (the input is not modified)
+    
+    Returns:
+        (stable_payload, volatile_metadata): the stable part is identical for
+        identical data, so it can be stored as a shared content-addressed blob
+    """
+    metadata = payload.get('metadata')
+    if not isinstance(metadata, dict):
+        return payload, {}
+    volatile = {k: metadata[k] for k in PAYLOAD_VOLATILE_METADATA if k in metadata}
+    stable_metadata = {k: v for k, v in metadata.items() if k not in volatile}
+    return {**payload, 'metadata': stable_metadata}, volatile
+
+def restore_volatile_metadata(payload: Dict[str, Any], volatile: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+    """Inverse of split_volatile_metadata"""
+    if not volatile:
+        return payload
+    return {**payload, 'metadata': {**payload.get('metadata', {}), **volatile}}
+
 def get_cache_stats() -> Dict[str, Any]:
     """Get cache statistics"""
-    return session_cache.stats()
+    return {**session_cache.stats(), 'plan_cache': plan_cache.stats()}
 
 # ============================================================================
 # Example Usage (for testing)
@@ -0,0 +1,99 @@
+#!/usr/bin/env python3
+"""
+Analysis Status Module
+Sub-document, CAS-guarded status transitions for AI analysis documents
+
+Architecture:
+- An analysis document carries the whole payload and aiResponse, so status
+  changes never read or rewrite it: the current status is read with a
+  one-path lookup_in, and only the changed paths (status, timestamps,
+  metadata.*, error, aiResponse on completion) are written with mutate_in
+- The mutate_in carries the CAS from that lookup, so a transition only
+  applies if nothing changed in between; on a CAS mismatch the status is
+  read again and the transition re-checked. A cancel that lands while the
+  background task completes is therefore either seen by the task (which
+  then does not complete) or fails because the document is completed -
+  never both
+- Transitions are only allowed out of ACTIVE_STATUSES; terminal statuses
+  are never overwritten
+- The sub-document spec module and mutate options are injected (like the
+  connect function in cb_pool), so this module has no SDK dependency
+"""
+
+from typing import Any, Callable, Dict, Iterable, Optional, Tuple
+from icecream import ic
+
+# Statuses an analysis can move out of
+ACTIVE_STATUSES = ('pending', 'submitted', 'processing')
+
+# Attempts before giving up when the document keeps changing underneath
+CAS_RETRIES = 5
+
+
+class StatusUpdater:
+    """
+    Applies status transitions to analysis documents with lookup_in/mutate_in
+    """
+
+    def __init__(self,
+                 sd: Any,
+                 mutate_options: Callable[[int], Any],
+                 cas_mismatch: Tuple[type, ...] = (),
+                 path_not_found: Tuple[type, ...] = ()):
+        """
+        Args:
+            sd: Sub-document spec module (couchbase.subdocument: get, upsert)
+            mutate_options: Builds mutate_in options guarded by a CAS
+            cas_mismatch: Exception types raised when the CAS no longer matches
+            path_not_found: Exception types raised when the status path is missing
+        """
+        self.sd = sd
+        self.mutate_options = mutate_options
+        self.cas_mismatch = cas_mismatch
+        self.path_not_found = path_not_found
+
+    def current_status(self, collection: Any, doc_id: str) -> Tuple[Optional[str], int]:
+        """(status, cas) without reading the rest of the document"""
+        result = collection.lookup_in(doc_id, [self.sd.get('status')])
+        try:
+            status = result.content_as[str](0)
+        except self.path_not_found:
+            status = None
+        return status, result.cas
+
+    def transition(self,
+                   collection: Any,
+                   doc_id: str,
+                   status: str,
+                   fields: Optional[Dict[str, Any]] = None,
+                   allowed_from: Iterable[Optional[str]] = ACTIVE_STATUSES) -> Dict[str, Any]:
+        """
+        Set status (and other paths) if the current status allows it
+
+        Args:
+            collection: Analyzer collection
+            doc_id: Analysis document id
+            status: New status
+            fields: Other paths to set, dotted for nested fields ('metadata.elapsed_ms')
+            allowed_from: Statuses the document may currently have
+
+        Returns:
+            {'applied': bool, 'status': status after the call, 'cas': ...}
+        """
+        allowed = set(allowed_from)
+        specs = [self.sd.upsert('status', status)]
+        for path, value in (fields or {}).items():
+            specs.append(self.sd.upsert(path, value, create_parents=True))
+
+        for attempt in range(CAS_RETRIES):
+            current, cas = self.current_status(collection, doc_id)
+            if current not in allowed:
+                ic(f"⏭️ {doc_id}: not moving {current} -> {status}")
+                return {'applied': False, 'status': current, 'cas': cas}
+            try:
+                result = collection.mutate_in(doc_id, specs, self.mutate_options(cas))
+                return {'applied': True, 'status': status, 'cas': result.cas}
+            except self.cas_mismatch:
+                ic(f"🔁 {doc_id} changed during {current} -> {status}, retrying", attempt + 1)
+
+        raise RuntimeError(f"Document {doc_id} kept changing; status not set to {status}")
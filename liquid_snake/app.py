@@ -5,32 +5,60 @@ Runs on http://localhost:5555
 
 Includes Couchbase REST API endpoints for Issue #231:
 - POST /api/couchbase/test - Test connection
-- POST /api/couchbase/query - Execute N1QL query
+- POST /api/couchbase/query - Execute N1QL query (optionally streamed as NDJSON / incremental JSON)
+- GET /api/couchbase/pool-stats - Pooled cluster connections and their health
 - POST /api/couchbase/save-analyzer - Save analyzer data
 - GET /api/couchbase/load-analyzer/<requestId> - Load analyzer data
+- POST /api/couchbase/save-analyzer-bulk|load-analyzer-bulk|delete-analyzer-bulk - Many analyzer
+  documents per request (concurrent multi-document KV, one result per item)
 - POST /api/couchbase/save-preferences - Save user preferences
 - GET /api/couchbase/load-preferences/<userId> - Load user preferences
+- POST /api/couchbase/collect - Pull system:completed_requests from the cluster into a server-side dataset
+- POST /api/capture/start|stop|load, GET /api/capture/status - Scheduled incremental capture
+  of system:completed_requests into a rolling capture in the analyzer collection
+- POST /api/ingest - Stream-parse a completed_requests export into a server-side dataset
+  (several files, e.g. one per query node, are parsed in a process pool)
+  and snapshot it to disk so the same capture reopens by content hash without re-parsing
 """
 
-from flask import Flask, request, jsonify, send_from_directory
+from flask import Flask, Response, request, jsonify, send_from_directory, stream_with_context
 from flask_cors import CORS
 import os
+import shutil
+import tempfile
+import threading
 import time
 from icecream import ic
 from couchbase.cluster import Cluster
-from couchbase.options import ClusterOptions, QueryOptions
+from couchbase.options import ClusterOptions, MutateInOptions, QueryOptions, ReplaceOptions
 import couchbase.subdocument as SD
 from couchbase.auth import PasswordAuthenticator
+from couchbase.diagnostics import ClusterState
 from couchbase.exceptions import (
+    CasMismatchException,
     DocumentExistsException,
     DocumentNotFoundException,
     TimeoutException, 
     CouchbaseException,
-    PathNotFoundException
+    PathNotFoundException,
+    ServiceUnavailableException
 )
+from datetime import timedelta
 
 # Import AI Analyzer module
 import ai_analyzer
+import analysis_status
+import bulk_kv
+from blob_storage import BLOB_SWEEP_GRACE_SECONDS, blob_storage
+import capture
+import cb_pool
+import collector
+import history
+import result_cache
+import ingest
+import parallel_ingest
+import snapshot
+import streaming
 import sys
 ic(sys.executable)
 
@@ -59,52 +87,68 @@ DIRECTORY = os.path.dirname(os.path.abspath(__file__))
 app = Flask(__name__, static_folder=DIRECTORY, static_url_path='')
 CORS(app)  # Enable CORS for all routes
 
-# Couchbase connection cache
-_cluster = None
-_config = None
+def _connect_cluster(config):
+    """Open a Couchbase cluster and wait until it is ready (raises if auth fails)"""
+    # Couchbase SDK uses its own ports, so only the hostname/IP is kept
+    connection_string = f"couchbase://{cb_pool.normalize_host(config['url'])}"
+    ic(f"🔌 Connecting to Couchbase: {connection_string}", config['username'])
+    
+    cluster = Cluster(
+        connection_string,
+        ClusterOptions(PasswordAuthenticator(config['username'], config['password']))
+    )
+    cluster.wait_until_ready(timedelta(seconds=10))
+    return cluster
+
+def _probe_cluster(cluster):
+    """Raise if the SDK has no live connection (diagnostics sends no requests)"""
+    if cluster.diagnostics().state == ClusterState.Offline:
+        raise ConnectionError("Cluster diagnostics report offline")
+
+# Couchbase connection pool (one connection per cluster config)
+cluster_pool = cb_pool.ClusterPool(_connect_cluster, probe=_probe_cluster)
+
+# Bucket/collection handles per pooled connection, pre-opened on connect
+collection_resolver = cb_pool.CollectionResolver()
+cluster_pool.on_connect.append(collection_resolver.warm)
+cluster_pool.on_close.append(collection_resolver.forget)
+
+# Sub-document status transitions for AI analysis documents (CAS-guarded)
+status_updater = analysis_status.StatusUpdater(
+    SD,
+    lambda cas: MutateInOptions(cas=cas),
+    cas_mismatch=(CasMismatchException,),
+    path_not_found=(PathNotFoundException,)
+)
 
 def get_couchbase_connection(config):
     """Get or create Couchbase cluster connection"""
-    global _cluster, _config
-    
     # Validate credentials before attempting connection
     if not config.get('username') or not config.get('password'):
         ic("⚠️ Missing credentials - username or password is empty")
         return None
     
-    # If config changed or no connection, create new one
-    if _config != config or _cluster is None:
-        if _cluster:
-            try:
-                _cluster.close()
-            except:
-                pass
-        
-        try:
-            # Parse URL to extract hostname/IP (strip protocol and port since Couchbase SDK uses its own ports)
-            url_cleaned = config['url'].replace('http://', '').replace('https://', '')
-            hostname = url_cleaned.split(':')[0]  # Get hostname/IP only
-            connection_string = f"couchbase://{hostname}"
-            
-            ic(f"🔌 Connecting to Couchbase: {connection_string}", config['username'])
-            
-            _cluster = Cluster(
-                connection_string,
-                ClusterOptions(PasswordAuthenticator(config['username'], config['password']))
-            )
-            
-            # Wait for cluster to be ready (this will raise exception if auth fails)
-            from datetime import timedelta
-            _cluster.wait_until_ready(timedelta(seconds=10))
-            
-            _config = config
-            ic("✅ Cluster connection established successfully")
-            return _cluster
-        except Exception as e:
-            ic("❌ Failed to connect to Couchbase", connection_string, e)
-            return None
-    
-    return _cluster
+    return cluster_pool.get(config)
+
+def get_collection(cluster, bucket_config, kind='analyzer'):
+    """Cached collection handle for a request's bucketConfig ('analyzer' or 'preferences')"""
+    return collection_resolver.collection(cluster, bucket_config, kind)
+
+def invalidate_results(cluster_config, bucket_config, kind='analyzer'):
+    """Drop cached reads of a keyspace after this server wrote to it"""
+    result_cache.result_cache.invalidate(cluster_config, result_cache.keyspace_tag(bucket_config, kind))
+
+def report_couchbase_error(config, error):
+    """
+    Drop a pooled connection after a connection-level failure so it reconnects
+
+    A timeout may just be a slow query or KV op, so the connection is only
+    dropped if the diagnostics probe also fails.
+    """
+    if isinstance(error, ServiceUnavailableException):
+        cluster_pool.mark_unhealthy(config, error)
+    elif isinstance(error, TimeoutException):
+        cluster_pool.probe(config, error)
 
 # Static file serving
 @app.route('/')
@@ -119,6 +163,7 @@ def serve_static(path):
 @app.route('/api/couchbase/test', methods=['POST'])
 def test_connection():
     """Test Couchbase connection"""
+    cluster_config = {}
     try:
         data = request.json
         ic(data)  # Log input
@@ -128,7 +173,7 @@ def test_connection():
         if cluster:
             # Try to ping the cluster
             bucket_name = data.get('bucketConfig', {}).get('bucket', 'cb_tools')
-            bucket = cluster.bucket(bucket_name)
+            bucket = collection_resolver.bucket(cluster, bucket_name)
             bucket.ping()
             
             response = {
@@ -143,20 +188,64 @@ def test_connection():
                 'error': 'Failed to connect'
             }), 500
     except Exception as e:
+        report_couchbase_error(cluster_config, e)
         return jsonify({
             'success': False,
             'error': str(e)
         }), 500
 
+@app.route('/api/couchbase/pool-stats', methods=['GET'])
+def get_pool_stats():
+    """
+    Pooled cluster connections (no credentials)
+    
+    Response:
+    {
+        "success": true,
+        "stats": {
+            "clusters": [{"cluster": "admin@10.0.0.5", "healthy": true, "idle_seconds": 3.2, ...}],
+            "connected": 1,
+            "max_clusters": 8,
+            "idle_seconds": 1800,
+            "handles": {"buckets": 1, "collections": 2, "hits": 120, "misses": 2},
+            "result_cache": {"entries": 12, "hits": 340, "misses": 25, "invalidations": 4, ...}
+        }
+    }
+    """
+    return jsonify({
+        'success': True,
+        'stats': {
+            **cluster_pool.stats(),
+            'handles': collection_resolver.stats(),
+            'result_cache': result_cache.result_cache.stats()
+        }
+    })
+
 @app.route('/api/couchbase/query', methods=['POST'])
 def execute_query():
-    """Execute N1QL query"""
+    """
+    Execute N1QL query
+    
+    Set "stream" (body field or ?stream=) to "ndjson" for one row per line, or
+    to "json" for the usual {"results": [...], "success": ...} document written
+    incrementally. Rows are encoded as the SDK yields them, so large results
+    (e.g. system:completed_requests) keep memory flat. Errors after the
+    response has started are reported in-band.
+    """
+    cluster_config = {}
     try:
         data = request.json
         ic(data)  # Log input
         cluster_config = data.get('config', {})
         query = data.get('query', '')
         params = data.get('params', {})
+        stream_format = data.get('stream') or request.args.get('stream')
+        
+        if stream_format and stream_format not in streaming.STREAM_FORMATS:
+            return jsonify({
+                'success': False,
+                'error': f'Unknown stream format: {stream_format} (use one of {", ".join(streaming.STREAM_FORMATS)})'
+            }), 400
         
         cluster = get_couchbase_connection(cluster_config)
         if not cluster:
@@ -164,6 +253,18 @@ def execute_query():
         
         # Execute query
         result = cluster.query(query, **params)
+        
+        if stream_format:
+            ic(f"🌊 Streaming query results as {stream_format}")
+            chunks = streaming.stream_rows(
+                result, stream_format, on_error=lambda e: report_couchbase_error(cluster_config, e)
+            )
+            return Response(
+                stream_with_context(chunks),
+                mimetype=streaming.MIMETYPES[stream_format],
+                headers={'X-Accel-Buffering': 'no'}
+            )
+        
         rows = [row for row in result]
         
         response = {
@@ -173,6 +274,7 @@ def execute_query():
         ic(response)  # Log output
         return jsonify(response)
     except Exception as e:
+        report_couchbase_error(cluster_config, e)
         return jsonify({
             'success': False,
             'error': str(e)
@@ -192,11 +294,11 @@ def save_analyzer_data():
         if not cluster:
             return jsonify({'success': False, 'error': 'Not connected'}), 500
         
-        bucket = cluster.bucket(bucket_config['bucket'])
-        collection = bucket.scope(bucket_config['analyzerScope']).collection(bucket_config['analyzerCollection'])
+        collection = get_collection(cluster, bucket_config, 'analyzer')
         
         # Upsert document
         result = collection.upsert(request_id, analyzer_data)
+        invalidate_results(cluster_config, bucket_config)
         
         return jsonify({
             'success': True,
@@ -220,8 +322,7 @@ def load_analyzer_data(request_id):
         if not cluster:
             return jsonify({'success': False, 'error': 'Not connected'}), 500
         
-        bucket = cluster.bucket(bucket_config['bucket'])
-        collection = bucket.scope(bucket_config['analyzerScope']).collection(bucket_config['analyzerCollection'])
+        collection = get_collection(cluster, bucket_config, 'analyzer')
         
         # Get document
         result = collection.get(request_id)
@@ -249,11 +350,11 @@ def delete_analyzer_data():
         if not cluster:
             return jsonify({'success': False, 'error': 'Not connected'}), 500
         
-        bucket = cluster.bucket(bucket_config['bucket'])
-        collection = bucket.scope(bucket_config['analyzerScope']).collection(bucket_config['analyzerCollection'])
+        collection = get_collection(cluster, bucket_config, 'analyzer')
         
         # Delete document
         collection.remove(request_id)
+        invalidate_results(cluster_config, bucket_config)
         
         return jsonify({
             'success': True
@@ -269,6 +370,74 @@ def delete_analyzer_data():
             'error': str(e)
         }), 500
 
+def _bulk_analyzer_request(operation, writes=True):
+    """Shared handling for the bulk analyzer endpoints; operation(collection, data) builds the response"""
+    cluster_config = {}
+    try:
+        data = request.json or {}
+        cluster_config = data.get('config', {})
+        
+        cluster = get_couchbase_connection(cluster_config)
+        if not cluster:
+            return jsonify({'success': False, 'error': 'Not connected'}), 500
+        
+        collection = get_collection(cluster, data.get('bucketConfig', {}), 'analyzer')
+        response = operation(collection, data)
+        if writes:
+            invalidate_results(cluster_config, data.get('bucketConfig', {}))
+        return jsonify(response)
+    except ValueError as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 400
+    except Exception as e:
+        report_couchbase_error(cluster_config, e)
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
+@app.route('/api/couchbase/save-analyzer-bulk', methods=['POST'])
+def save_analyzer_data_bulk():
+    """
+    Save many analyzer documents in one request
+    
+    Request: {"config": {...}, "bucketConfig": {...}, "documents": [{"requestId": "...", "data": {...}}, ...]}
+    Response: {"success": true, "results": [{"requestId": "...", "success": true, "cas": ...}, ...],
+               "succeeded": n, "failed": m}
+    """
+    return _bulk_analyzer_request(lambda collection, data: bulk_kv.bulk_upsert(
+        collection, bulk_kv.validate_documents(data.get('documents'))
+    ))
+
+@app.route('/api/couchbase/load-analyzer-bulk', methods=['POST'])
+def load_analyzer_data_bulk():
+    """
+    Load many analyzer documents in one request
+    
+    Request: {"config": {...}, "bucketConfig": {...}, "requestIds": ["...", ...]}
+    Response: {"success": true, "results": [{"requestId": "...", "success": true, "data": {...}}, ...],
+               "succeeded": n, "failed": m}
+    Missing documents are reported per item with "status": "not_found".
+    """
+    return _bulk_analyzer_request(lambda collection, data: bulk_kv.bulk_get(
+        collection, bulk_kv.validate_ids(data.get('requestIds')), not_found=(DocumentNotFoundException,)
+    ), writes=False)
+
+@app.route('/api/couchbase/delete-analyzer-bulk', methods=['POST'])
+def delete_analyzer_data_bulk():
+    """
+    Delete many analyzer documents in one request
+    
+    Request: {"config": {...}, "bucketConfig": {...}, "requestIds": ["...", ...]}
+    Response: {"success": true, "results": [{"requestId": "...", "success": true}, ...],
+               "succeeded": n, "failed": m}
+    """
+    return _bulk_analyzer_request(lambda collection, data: bulk_kv.bulk_remove(
+        collection, bulk_kv.validate_ids(data.get('requestIds')), not_found=(DocumentNotFoundException,)
+    ))
+
 @app.route('/api/couchbase/save-preferences', methods=['POST'])
 def save_user_preferences():
     """Save user preferences using K/V upsert with automatic backup"""
@@ -289,11 +458,11 @@ def save_user_preferences():
         if not cluster:
             return jsonify({'success': False, 'error': 'Not connected'}), 500
         
-        bucket = cluster.bucket(bucket_config['bucket'])
-        collection = bucket.scope(bucket_config['preferencesScope']).collection(bucket_config['preferencesCollection'])
+        collection = get_collection(cluster, bucket_config, 'preferences')
         
         # K/V UPSERT main document
         result = collection.upsert(user_id, preferences)
+        invalidate_results(cluster_config, bucket_config, 'preferences')
         
         # Create backup with MD5 hash and 7-day TTL
         try:
@@ -346,35 +515,41 @@ def load_user_preferences(user_id):
         cluster_config = data.get('config', {})
         bucket_config = data.get('bucketConfig', {})
         
-        cluster = get_couchbase_connection(cluster_config)
-        if not cluster:
-            return jsonify({'success': False, 'error': 'Not connected'}), 500
-        
-        bucket = cluster.bucket(bucket_config['bucket'])
-        collection = bucket.scope(bucket_config['preferencesScope']).collection(bucket_config['preferencesCollection'])
-        
-        # K/V GET operation (no query needed!)
-        result = collection.get(user_id)
-        content = result.content_as[dict]
+        def load():
+            cluster = get_couchbase_connection(cluster_config)
+            if not cluster:
+                raise ConnectionError('Not connected')
+            
+            collection = get_collection(cluster, bucket_config, 'preferences')
+            
+            # K/V GET operation (no query needed!)
+            try:
+                result = collection.get(user_id)
+            except DocumentNotFoundException:
+                response = {
+                    'success': True,
+                    'data': {
+                        'docType': 'config'
+                    },
+                    'cas': None,
+                    'firstTime': True
+                }
+                ic(user_id, "NOT_FOUND", response)  # Log output (first time user)
+                return response
+            
+            response = {
+                'success': True,
+                'data': result.content_as[dict],
+                'cas': result.cas
+            }
+            ic(user_id, result.cas, response)  # Log output
+            return response
         
-        response = {
-            'success': True,
-            'data': content,
-            'cas': result.cas
-        }
-        ic(user_id, result.cas, response)  # Log output
-        return jsonify(response)
-    except DocumentNotFoundException:
-        response = {
-            'success': True,
-            'data': {
-                'docType': 'config'
-            },
-            'cas': None,
-            'firstTime': True
-        }
-        ic(user_id, "NOT_FOUND", response)  # Log output (first time user)
-        return jsonify(response)
+        # Re-renders within the TTL reuse the last read; save-preferences invalidates it
+        cache_key = result_cache.ResultCache.key(
+            cluster_config, result_cache.keyspace_tag(bucket_config, 'preferences'), 'get', user_id
+        )
+        return jsonify(result_cache.result_cache.cached(cache_key, load, refresh=bool(data.get('refresh'))))
     except Exception as e:
         ic("❌ Error loading preferences", e)
         return jsonify({
@@ -436,6 +611,371 @@ def cache_analyzer_data_endpoint():
             'error': str(e)
         }), 500
 
+@app.route('/api/couchbase/collect', methods=['POST'])
+def collect_completed_requests_endpoint():
+    """
+    Pull system:completed_requests (with meta().plan) from the cluster into a
+    server-side dataset, instead of exporting and uploading it by hand
+    
+    The pull is split per query node and requestTime window; slices run
+    concurrently and rows are parsed as they arrive (see collector.py).
+    
+    Request:
+    {
+        "config": {...cluster config...},
+        "maxWorkers": 4,        (optional)
+        "windowsPerNode": 4,    (optional)
+        "version": "..."        (optional)
+    }
+    
+    Response:
+    {
+        "success": true,
+        "dataset_id": "abc123...",
+        "record_count": 48211,
+        "node_count": 3,
+        "slice_count": 12,
+        "failed_slices": [],
+        "elapsed_ms": 5120
+    }
+    """
+    cluster_config = {}
+    try:
+        data = request.json or {}
+        cluster_config = data.get('config', {})
+        cluster = get_couchbase_connection(cluster_config)
+        if not cluster:
+            return jsonify({'success': False, 'error': 'Not connected'}), 500
+        
+        def run_query(statement, params):
+            return cluster.query(statement, QueryOptions(named_parameters=params)) if params else cluster.query(statement)
+        
+        result = collector.collect_completed_requests(
+            run_query,
+            max_workers=data.get('maxWorkers') or collector.COLLECT_MAX_WORKERS,
+            windows_per_node=data.get('windowsPerNode') or collector.COLLECT_WINDOWS_PER_NODE
+        )
+        stats = result['stats']
+        
+        if stats['record_count'] == 0:
+            return jsonify({
+                'success': False,
+                'error': 'No completed requests found on the cluster',
+                **stats
+            }), 404
+        
+        cached = {
+            'dataset': result['dataset'],
+            'version': data.get('version', 'unknown'),
+            'source': 'collector'
+        }
+        dataset_id = ai_analyzer.cache_analyzer_data(cached, size_bytes=stats['dataset_bytes'])
+        ic(f"✅ Collected dataset {dataset_id} ready", stats['record_count'], stats['elapsed_ms'])
+        
+        return jsonify({
+            'success': True,
+            'dataset_id': dataset_id,
+            **stats
+        })
+    except Exception as e:
+        report_couchbase_error(cluster_config, e)
+        ic("💥 Error collecting completed requests", str(e))
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
+def _capture_connection(config):
+    """Pooled connection for a capture poll; raises so the poll is reported as failed"""
+    cluster = get_couchbase_connection(config)
+    if not cluster:
+        raise ConnectionError('Not connected')
+    return cluster
+
+def _capture_store(cluster_config, bucket_config):
+    return capture.CaptureStore(
+        lambda: get_collection(_capture_connection(cluster_config), bucket_config, 'analyzer'),
+        not_found=(DocumentNotFoundException,),
+        replace_options=lambda cas: ReplaceOptions(cas=cas),
+        cas_mismatch=(CasMismatchException,),
+        exists=(DocumentExistsException,)
+    )
+
+@app.route('/api/capture/start', methods=['POST'])
+def start_capture():
+    """
+    Start (or restart) polling a cluster's system:completed_requests
+    
+    Each poll pulls only rows past the per-node watermark and appends them to
+    a rolling capture (capture::<capture_id>) in the analyzer collection.
+    
+    Request:
+    {
+        "config": {...cluster config...},
+        "bucketConfig": {...},
+        "intervalSeconds": 30,    (optional)
+        "maxRecords": 500000      (optional)
+    }
+    """
+    try:
+        data = request.json or {}
+        cluster_config = data.get('config', {})
+        bucket_config = data.get('bucketConfig', {})
+        if not get_couchbase_connection(cluster_config):
+            return jsonify({'success': False, 'error': 'Not connected'}), 500
+        
+        def run_query(statement, params):
+            cluster = _capture_connection(cluster_config)
+            return cluster.query(statement, QueryOptions(named_parameters=params)) if params else cluster.query(statement)
+        
+        job = capture.CaptureJob(
+            capture.capture_id_for(cluster_config),
+            f"{cluster_config.get('username')}@{cb_pool.normalize_host(cluster_config.get('url', ''))}",
+            run_query,
+            _capture_store(cluster_config, bucket_config),
+            interval_seconds=float(data.get('intervalSeconds') or capture.CAPTURE_INTERVAL_SECONDS),
+            max_records=int(data.get('maxRecords') or capture.CAPTURE_MAX_RECORDS),
+            on_error=lambda e: report_couchbase_error(cluster_config, e)
+        )
+        capture.capture_scheduler.start(job)
+        
+        return jsonify({
+            'success': True,
+            **job.status()
+        })
+    except Exception as e:
+        ic("💥 Error starting capture", str(e))
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
+@app.route('/api/capture/stop', methods=['POST'])
+def stop_capture():
+    """Stop polling a cluster (the rolling capture is kept)"""
+    data = request.json or {}
+    capture_id = data.get('captureId') or capture.capture_id_for(data.get('config', {}))
+    if not capture.capture_scheduler.stop(capture_id):
+        return jsonify({'success': False, 'error': 'No capture running'}), 404
+    return jsonify({'success': True, 'capture_id': capture_id})
+
+@app.route('/api/capture/status', methods=['GET'])
+def get_capture_status():
+    """Running captures with their poll counts, record counts and last error"""
+    return jsonify({
+        'success': True,
+        'captures': capture.capture_scheduler.status()
+    })
+
+@app.route('/api/capture/load', methods=['POST'])
+def load_capture():
+    """
+    Load a rolling capture into a server-side dataset
+    
+    Request: {"config": {...}, "bucketConfig": {...}, "captureId": "..." (optional), "version": "..."}
+    Response: {"success": true, "dataset_id": "...", "record_count": n}
+    """
+    cluster_config = {}
+    try:
+        data = request.json or {}
+        cluster_config = data.get('config', {})
+        capture_id = data.get('captureId') or capture.capture_id_for(cluster_config)
+        
+        dataset = _capture_store(cluster_config, data.get('bucketConfig', {})).load_dataset(capture_id)
+        if dataset is None or len(dataset) == 0:
+            return jsonify({'success': False, 'error': 'Capture is empty or does not exist'}), 404
+        
+        cached = {
+            'dataset': dataset,
+            'version': data.get('version', 'unknown'),
+            'source': 'capture'
+        }
+        dataset_id = ai_analyzer.cache_analyzer_data(cached, size_bytes=dataset.nbytes)
+        
+        return jsonify({
+            'success': True,
+            'dataset_id': dataset_id,
+            'capture_id': capture_id,
+            'record_count': len(dataset)
+        })
+    except Exception as e:
+        report_couchbase_error(cluster_config, e)
+        ic("💥 Error loading capture", str(e))
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
+@app.route('/api/ingest', methods=['POST'])
+def ingest_completed_requests_endpoint():
+    """
+    Stream-parse a system:completed_requests export into a server-side dataset
+    
+    The body is read incrementally, so the raw text and the decoded records are
+    never held in memory together. Accepts either the raw export as the request
+    body (JSON array, {"results": [...]} or NDJSON) or a multipart upload with
+    the file in the "file" field.
+    
+    A multipart upload with several files (one completed_requests export per
+    query node) is spooled to temp files and parsed in a process pool; query
+    groups, Service Pressure insights and timeline buckets are pre-aggregated
+    per file and cached with the merged dataset. A single upload of at least
+    parallel_ingest.MIN_PARALLEL_BYTES on a multi-core server is spooled too,
+    and split into newline-aligned shards when it is NDJSON.
+    
+    Every parsed capture is written to an on-disk snapshot keyed by the
+    SHA-256 of the uploaded bytes (in a background thread). Passing that
+    hash back as `content_hash` reopens the snapshot with memory-mapped
+    columns instead of reading and parsing the body again.
+    
+    Query string:
+        version: Analyzer version to record with the dataset (optional)
+        content_hash: Reopen this snapshot if it exists (optional)
+    
+    Response:
+    {
+        "success": true,
+        "dataset_id": "abc123...",
+        "content_hash": "9f86d08...",
+        "record_count": 262,
+        "bytes_read": 616911,
+        "elapsed_ms": 12
+    }
+    """
+    spool_dir = None
+    try:
+        version = request.args.get('version', 'unknown')
+        content_hash = request.args.get('content_hash')
+        if content_hash:
+            start_time = time.time()
+            dataset_id = ai_analyzer.open_dataset_snapshot(content_hash, version=version)
+            if dataset_id:
+                dataset = ai_analyzer.get_cached_data(dataset_id)['dataset']
+                return jsonify({
+                    'success': True,
+                    'dataset_id': dataset_id,
+                    'content_hash': content_hash,
+                    'record_count': len(dataset),
+                    'dataset_bytes': dataset.nbytes,
+                    'elapsed_ms': int((time.time() - start_time) * 1000),
+                    'from_snapshot': True
+                })
+            ic(f"📭 No snapshot for {content_hash}, parsing upload")
+        
+        uploads = ingest.request_uploads(request)
+        
+        ic("📥 Ingest request received", request.content_type, request.content_length, len(uploads))
+        
+        if len(uploads) > 1:
+            spool_dir = tempfile.mkdtemp(prefix='cb_ingest_')
+            paths = []
+            for index, upload in enumerate(uploads):
+                path = os.path.join(spool_dir, f'{index}.json')
+                upload.save(path)
+                paths.append(path)
+            result = parallel_ingest.ingest_parallel(paths)
+            content_hash = snapshot.hash_files(paths)
+        elif (request.content_length or 0) >= parallel_ingest.MIN_PARALLEL_BYTES and (os.cpu_count() or 1) > 1:
+            spool_dir = tempfile.mkdtemp(prefix='cb_ingest_')
+            path = os.path.join(spool_dir, '0.json')
+            stream = snapshot.HashingReader(uploads[0].stream if uploads else request.stream)
+            with open(path, 'wb') as spool:
+                shutil.copyfileobj(stream, spool, ingest.DEFAULT_CHUNK_SIZE)
+            content_hash = stream.hexdigest()
+            if parallel_ingest.should_shard(path):
+                result = parallel_ingest.ingest_parallel([path])
+            else:
+                with open(path, 'rb') as spooled:
+                    result = ingest.ingest_to_dataset(spooled)
+        else:
+            stream = snapshot.HashingReader(uploads[0].stream if uploads else request.stream)
+            result = ingest.ingest_to_dataset(stream)
+            content_hash = stream.hexdigest()
+        stats = result['stats']
+        
+        if stats['record_count'] == 0:
+            return jsonify({
+                'success': False,
+                'error': 'No completed requests found in upload'
+            }), 400
+        
+        cached = {
+            'dataset': result['dataset'],
+            'version': version,
+            'source': 'ingest',
+            'content_hash': content_hash
+        }
+        for key in ai_analyzer.PRECOMPUTED_AGGREGATES:
+            if key in result:
+                cached[key] = result[key]
+        dataset_id = ai_analyzer.cache_analyzer_data(cached, size_bytes=stats['dataset_bytes'])
+        
+        ic(f"✅ Dataset {dataset_id} ready", stats)
+        
+        threading.Thread(
+            target=_write_snapshot, args=(content_hash, result['dataset']), daemon=True
+        ).start()
+        
+        return jsonify({
+            'success': True,
+            'dataset_id': dataset_id,
+            'content_hash': content_hash,
+            **stats
+        })
+        
+    except ValueError as e:
+        ic("❌ Invalid completed_requests upload", str(e))
+        return jsonify({
+            'success': False,
+            'error': f'Invalid JSON: {str(e)}'
+        }), 400
+    except Exception as e:
+        ic("💥 Error ingesting upload", str(e))
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+    finally:
+        if spool_dir:
+            shutil.rmtree(spool_dir, ignore_errors=True)
+
+def _write_snapshot(content_hash, dataset):
+    """Persist an ingested dataset (runs in a background thread)"""
+    try:
+        snapshot.snapshot_store.save(content_hash, dataset)
+    except Exception as e:
+        ic(f"⚠️ Snapshot {content_hash} not written", str(e))
+
+def _resolve_raw_data(request_data):
+    """
+    Return the analyzer data for a request, pulling records from a server-side
+    dataset when the client passes `dataset_id` instead of re-posting them.
+    
+    If the session has expired and the client also passes the dataset's
+    `content_hash`, the dataset is reopened from its snapshot.
+    
+    Returns:
+        Raw data dict, or None if the referenced dataset has expired
+    """
+    raw_data = request_data.get('data') or {}
+    dataset_id = request_data.get('dataset_id')
+    
+    if not dataset_id:
+        return raw_data
+    
+    dataset = ai_analyzer.get_cached_data(dataset_id)
+    if dataset is None and request_data.get('content_hash'):
+        reopened_id = ai_analyzer.open_dataset_snapshot(request_data['content_hash'])
+        dataset = ai_analyzer.get_cached_data(reopened_id) if reopened_id else None
+    if dataset is None:
+        return None
+    
+    # The server-side dataset replaces the records; everything else comes from the browser
+    return {
+        **dataset,
+        **{key: value for key, value in raw_data.items() if key not in ('everyQueryData', 'dataset')}
+    }
+
 @app.route('/api/ai/preview', methods=['POST'])
 def preview_ai_payload():
     """
@@ -478,7 +1018,12 @@ def preview_ai_payload():
         ic("👁️ Preview AI payload request received")
         
         # Extract request parameters
-        raw_data = request_data.get('data', {})
+        raw_data = _resolve_raw_data(request_data)
+        if raw_data is None:
+            return jsonify({
+                'success': False,
+                'error': 'Dataset not found or expired'
+            }), 404
         prompt = request_data.get('prompt', 'Analyze query performance')
         extra_instructions = request_data.get('extra_instructions', '')
         selections = request_data.get('selections', {})
@@ -491,7 +1036,7 @@ def preview_ai_payload():
                 'error': 'No data provided'
             }), 400
         
-        ic(f"📊 Data size: {len(str(raw_data))} bytes")
+        ic(f"📊 Records: {ai_analyzer.get_total_queries(raw_data)}", request_data.get('dataset_id'))
         ic(f"🎯 Selections: {selections}")
         ic(f"📝 Format: {output_format}")
         ic(f"📦 TOON Available: {TOON_AVAILABLE}")
@@ -668,10 +1213,7 @@ def background_ai_task(doc_id, provider, model, api_key, api_url, endpoint, prom
             ic(f"❌ Failed to connect to Couchbase for background update of {doc_id}")
             return
 
-        bucket = cluster.bucket(cb_config['bucketConfig']['bucket'])
-        collection = bucket.scope(cb_config['bucketConfig']['analyzerScope']).collection(
-            cb_config['bucketConfig']['analyzerCollection']
-        )
+        collection = get_collection(cluster, cb_config['bucketConfig'], 'analyzer')
         
         if result['success']:
             analysis_data = result['data']
@@ -728,30 +1270,22 @@ def background_ai_task(doc_id, provider, model, api_key, api_url, endpoint, prom
                 
                 ic(f"✅ De-obfuscation complete, restored {len(obfuscation_mapping)} tokens")
             
-            # Update Couchbase doc with success results
+            # Update Couchbase doc with success results (only the changed paths;
+            # a concurrent cancel wins and the result is dropped)
             try:
                 response_size = len(json.dumps(analysis_data).encode('utf-8'))
                 
-                # Get current doc to preserve fields
-                current_doc = collection.get(doc_id).content_as[dict]
-                
-                # Check if cancelled
-                if current_doc.get('status') == 'cancelled':
-                    ic(f"🛑 Task was cancelled, aborting update for {doc_id}")
-                    return
-                
-                current_doc.update({
+                update = status_updater.transition(collection, doc_id, 'completed', {
                     'completedAt': datetime.utcnow().isoformat() + 'Z',
-                    'status': 'completed',
                     'aiResponse': analysis_data,
-                    'metadata': {
-                        **current_doc.get('metadata', {}),
-                        'elapsed_ms': result.get('elapsed_ms'),
-                        'responsePayloadSize': response_size
-                    }
+                    'metadata.elapsed_ms': result.get('elapsed_ms'),
+                    'metadata.responsePayloadSize': response_size
                 })
                 
-                collection.upsert(doc_id, current_doc)
+                if not update['applied']:
+                    ic(f"🛑 Task was {update['status']}, aborting update for {doc_id}")
+                    return
+                invalidate_results(cb_config['cluster'], cb_config['bucketConfig'])
                 ic(f"✅ Updated doc {doc_id} with success results")
             except Exception as e:
                 ic(f"⚠️ Failed to update doc with results: {str(e)}")
@@ -759,11 +1293,7 @@ def background_ai_task(doc_id, provider, model, api_key, api_url, endpoint, prom
         else:
             # Update Couchbase doc with failure
             try:
-                # Get current doc
-                current_doc = collection.get(doc_id).content_as[dict]
-                
-                current_doc.update({
-                    'status': 'failed',
+                update = status_updater.transition(collection, doc_id, 'failed', {
                     'failedAt': datetime.utcnow().isoformat() + 'Z',
                     'error': {
                         'message': result.get('error'),
@@ -774,7 +1304,10 @@ def background_ai_task(doc_id, provider, model, api_key, api_url, endpoint, prom
                     }
                 })
                 
-                collection.upsert(doc_id, current_doc)
+                if not update['applied']:
+                    ic(f"🛑 Task was {update['status']}, not recording failure for {doc_id}")
+                    return
+                invalidate_results(cb_config['cluster'], cb_config['bucketConfig'])
                 ic(f"✅ Updated doc {doc_id} with failure status")
             except Exception as e:
                 ic(f"⚠️ Failed to update doc with error: {str(e)}")
@@ -829,7 +1362,12 @@ def analyze_with_ai():
         ic("=" * 80)
         
         # Extract parameters
-        raw_data = request_data.get('data', {})
+        raw_data = _resolve_raw_data(request_data)
+        if raw_data is None:
+            return jsonify({
+                'success': False,
+                'error': 'Dataset not found or expired'
+            }), 404
         prompt = request_data.get('prompt', 'Analyze query performance')
         extra_instructions = request_data.get('extra_instructions', '')
         language = request_data.get('language', 'English')
@@ -876,10 +1414,7 @@ def analyze_with_ai():
                 }), 500
             
             # Load user::config document
-            bucket = cluster.bucket(cb_config['bucketConfig']['bucket'])
-            prefs_collection = bucket.scope(cb_config['bucketConfig']['preferencesScope']).collection(
-                cb_config['bucketConfig']['preferencesCollection']
-            )
+            prefs_collection = get_collection(cluster, cb_config['bucketConfig'], 'preferences')
             
             user_prefs = prefs_collection.get('user_config').content_as[dict]
             ai_apis = user_prefs.get('aiApis', [])
@@ -987,6 +1522,15 @@ def analyze_with_ai():
                 payload_content = ai_request_payload if isinstance(ai_request_payload, str) else json.dumps(ai_request_payload)
                 payload_size = len(payload_content.encode('utf-8'))
                 
+                cluster = get_couchbase_connection(cb_config['cluster'])
+                collection = get_collection(cluster, cb_config['bucketConfig'], 'analyzer') if cluster else None
+                
+                # Re-analyzing the same capture yields the same payload apart from its
+                # build timestamp: store the stable part once as a content-addressed
+                # blob, keep the per-build fields on the analysis document
+                stable_payload, payload_volatile = ai_analyzer.split_volatile_metadata(ai_payload_data)
+                payload_blob = blob_storage.save_content_blob(collection, stable_payload) if collection else {}
+                
                 initial_doc = {
                     'docType': 'ai_analysis',
                     'createdAt': datetime.utcnow().isoformat() + 'Z',
@@ -997,26 +1541,25 @@ def analyze_with_ai():
                     'language': language,
                     'options': options,
                     'sourceCluster': raw_data.get('clusterName', 'Unknown Cluster'),
-                    'payload': ai_payload_data, # Always store JSON structure for readability/compatibility
                     'parseJson': request_data.get('parseContext', {}),
                     'sentToApiAs': 'toon' if use_toon and TOON_AVAILABLE else 'json',
                     'metadata': {
                         'obfuscated': obfuscation_mapping is not None,
                         'selections': selections,
-                        'total_queries': len(raw_data.get('everyQueryData', [])),
+                        'total_queries': ai_analyzer.get_total_queries(raw_data),
                         'requestPayloadSize': payload_size
                     }
                 }
+                if payload_blob.get('success'):
+                    initial_doc['payloadRef'] = payload_blob['key']
+                    initial_doc['payloadMetadata'] = payload_volatile
+                    initial_doc['metadata']['payloadDeduplicated'] = payload_blob['deduplicated']
+                else:
+                    initial_doc['payload'] = ai_payload_data # Always store JSON structure for readability/compatibility
                 
-                cluster = get_couchbase_connection(cb_config['cluster'])
-                if cluster:
-                    bucket_name = cb_config['bucketConfig']['bucket']
-                    scope_name = cb_config['bucketConfig']['analyzerScope']
-                    collection_name = cb_config['bucketConfig']['analyzerCollection']
-                    
-                    bucket = cluster.bucket(bucket_name)
-                    collection = bucket.scope(scope_name).collection(collection_name)
+                if collection:
                     collection.upsert(doc_id, initial_doc)
+                    invalidate_results(cb_config['cluster'], cb_config['bucketConfig'])
                     saved_doc_id = doc_id
                     
                     ic(f"✅ Saved initial request: {doc_id} (status: pending)")
@@ -1030,7 +1573,7 @@ def analyze_with_ai():
             analysis_data = {
                 'summary': {
                     'note': 'Placeholder - AI call not executed',
-                    'total_queries_analyzed': len(raw_data.get('everyQueryData', [])),
+                    'total_queries_analyzed': ai_analyzer.get_total_queries(raw_data),
                     'saved_without_ai_call': True
                 }
             }
@@ -1040,21 +1583,15 @@ def analyze_with_ai():
                 try:
                     cluster = get_couchbase_connection(cb_config['cluster'])
                     if cluster:
-                        bucket = cluster.bucket(cb_config['bucketConfig']['bucket'])
-                        collection = bucket.scope(cb_config['bucketConfig']['analyzerScope']).collection(
-                            cb_config['bucketConfig']['analyzerCollection']
-                        )
+                        collection = get_collection(cluster, cb_config['bucketConfig'], 'analyzer')
                         
-                        import uuid
                         from datetime import datetime
                         
-                        current_doc = collection.get(saved_doc_id).content_as[dict]
-                        current_doc.update({
+                        status_updater.transition(collection, saved_doc_id, 'completed', {
                             'completedAt': datetime.utcnow().isoformat() + 'Z',
-                            'status': 'completed',
                             'aiResponse': analysis_data
                         })
-                        collection.upsert(saved_doc_id, current_doc)
+                        invalidate_results(cb_config['cluster'], cb_config['bucketConfig'])
                         ic(f"✅ Updated placeholder doc {saved_doc_id}")
                 except Exception as e:
                     ic(f"⚠️ Failed to update placeholder doc: {str(e)}")
@@ -1140,23 +1677,20 @@ def cancel_ai_analysis():
         if not cluster:
             return jsonify({'success': False, 'error': 'Not connected'}), 500
             
-        bucket = cluster.bucket(bucket_config['bucket'])
-        collection = bucket.scope(bucket_config['analyzerScope']).collection(
-            bucket_config['analyzerCollection']
-        )
+        collection = get_collection(cluster, bucket_config, 'analyzer')
         
         # Update status to cancelled
         try:
-            current_doc = collection.get(doc_id).content_as[dict]
             # Allow cancelling pending, submitted, or even processing states
-            if current_doc.get('status') in ['pending', 'submitted', 'processing']:
-                current_doc['status'] = 'cancelled'
-                current_doc['cancelledAt'] = datetime.utcnow().isoformat() + 'Z'
-                collection.upsert(doc_id, current_doc)
+            update = status_updater.transition(collection, doc_id, 'cancelled', {
+                'cancelledAt': datetime.utcnow().isoformat() + 'Z'
+            })
+            if update['applied']:
+                invalidate_results(cb_config, bucket_config)
                 ic(f"🚫 Cancelled analysis: {doc_id}")
                 return jsonify({'success': True, 'status': 'cancelled'})
             else:
-                return jsonify({'success': False, 'error': f'Cannot cancel status: {current_doc.get("status")}'})
+                return jsonify({'success': False, 'error': f'Cannot cancel status: {update["status"]}'})
         except DocumentNotFoundException:
             return jsonify({'success': False, 'error': 'Document not found'}), 404
             
@@ -1164,6 +1698,38 @@ def cancel_ai_analysis():
         ic(f"❌ Error cancelling analysis: {str(e)}")
         return jsonify({'success': False, 'error': str(e)}), 500
 
+def status_lookup_specs():
+    """Sub-document paths polled by /api/ai/status: status, error, metadata.elapsed_ms"""
+    return [
+        SD.get("status"),
+        SD.get("error"),
+        SD.get("metadata.elapsed_ms")
+    ]
+
+def status_response(result, document_id):
+    """Status response from a lookup_in result of status_lookup_specs() (sync or async SDK)"""
+    status = result.content_as[str](0)
+    
+    response = {
+        'success': True,
+        'status': status,
+        'document_id': document_id
+    }
+    
+    if status == 'completed':
+        # We don't need the full analysis for polling check
+        try:
+            response['elapsed_ms'] = result.content_as[int](2)
+        except:
+            response['elapsed_ms'] = 0
+    elif status == 'failed':
+        try:
+            response['error'] = result.content_as[dict](1)
+        except:
+            response['error'] = {'message': 'Unknown error'}
+    
+    return response
+
 @app.route('/api/ai/status/<document_id>', methods=['POST'])
 def check_ai_status(document_id):
     """
@@ -1179,44 +1745,12 @@ def check_ai_status(document_id):
         if not cluster:
             return jsonify({'success': False, 'error': 'Not connected'}), 500
             
-        bucket = cluster.bucket(bucket_config.get('bucket'))
-        collection = bucket.scope(bucket_config.get('analyzerScope')).collection(
-            bucket_config.get('analyzerCollection')
-        )
+        collection = get_collection(cluster, bucket_config, 'analyzer')
         
         # Use Sub-Document API to fetch only status and minimal metadata
         try:
-            # Lookup status, error, and metadata.elapsed_ms
-            # Path "status" -> index 0
-            # Path "error" -> index 1
-            # Path "metadata.elapsed_ms" -> index 2
-            result = collection.lookup_in(document_id, [
-                SD.get("status"),
-                SD.get("error"),
-                SD.get("metadata.elapsed_ms")
-            ])
-            
-            status = result.content_as[str](0)
-            
-            response = {
-                'success': True,
-                'status': status,
-                'document_id': document_id
-            }
-            
-            if status == 'completed':
-                # We don't need the full analysis for polling check
-                try:
-                    response['elapsed_ms'] = result.content_as[int](2)
-                except:
-                    response['elapsed_ms'] = 0
-            elif status == 'failed':
-                try:
-                    response['error'] = result.content_as[dict](1)
-                except:
-                    response['error'] = {'message': 'Unknown error'}
-                    
-            return jsonify(response)
+            result = collection.lookup_in(document_id, status_lookup_specs())
+            return jsonify(status_response(result, document_id))
             
         except PathNotFoundException:
             # Status field might not exist yet? Should unlikely happen if doc exists
@@ -1227,6 +1761,66 @@ def check_ai_status(document_id):
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)}), 500
 
+@app.route('/api/ai/payload/<document_id>', methods=['POST'])
+def get_ai_payload(document_id):
+    """
+    Payload an AI analysis was built from
+    Request body: {"config": {...}, "bucketConfig": {...}}
+    
+    Newer analyses reference a shared content-addressed blob (payloadRef);
+    older ones embed the payload.
+    """
+    try:
+        data = request.json
+        cb_config = data.get('config', {})
+        bucket_config = data.get('bucketConfig', {})
+        
+        cluster = get_couchbase_connection(cb_config)
+        if not cluster:
+            return jsonify({'success': False, 'error': 'Not connected'}), 500
+            
+        collection = get_collection(cluster, bucket_config, 'analyzer')
+        result = collection.lookup_in(document_id, [SD.get('payloadRef'), SD.get('payload'), SD.get('payloadMetadata')])
+        
+        if result.exists(0):
+            payload_ref = result.content_as[str](0)
+            blob = blob_storage.load_blob(collection, payload_ref)
+            if not blob['success']:
+                return jsonify({'success': False, 'error': blob['error']}), 500
+            volatile = result.content_as[dict](2) if result.exists(2) else None
+            payload = ai_analyzer.restore_volatile_metadata(blob['data'], volatile)
+            return jsonify({'success': True, 'payload': payload, 'payloadRef': payload_ref})
+        if result.exists(1):
+            return jsonify({'success': True, 'payload': result.content_as[dict](1)})
+        return jsonify({'success': False, 'status': 'not_found', 'error': 'Analysis has no payload'}), 404
+            
+    except DocumentNotFoundException:
+        return jsonify({'success': False, 'status': 'not_found'}), 404
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+@app.route('/api/couchbase/sweep-blobs', methods=['POST'])
+def sweep_blobs():
+    """
+    Remove content-addressed payload blobs no AI analysis references any more
+    Request body: {"config": {...}, "bucketConfig": {...}, "graceSeconds": 86400}
+    """
+    try:
+        data = request.json
+        cb_config = data.get('config', {})
+        bucket_config = data.get('bucketConfig', {})
+        
+        cluster = get_couchbase_connection(cb_config)
+        if not cluster:
+            return jsonify({'success': False, 'error': 'Not connected'}), 500
+        
+        collection = get_collection(cluster, bucket_config, 'analyzer')
+        grace_seconds = max(0, float(data.get('graceSeconds', BLOB_SWEEP_GRACE_SECONDS)))
+        result = blob_storage.sweep_content_blobs(cluster, collection, bucket_config, grace_seconds)
+        return jsonify(result), (200 if result['success'] else 500)
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)}), 500
+
 @app.route('/api/ai/stats', methods=['GET'])
 def get_ai_cache_stats():
     """
@@ -1255,73 +1849,82 @@ def get_ai_cache_stats():
             'error': str(e)
         }), 500
 
+def history_query_from_request(data):
+    """History page query (statement + named parameters) for an /api/ai/history request body"""
+    return history.build_history_query(
+        data.get('bucketConfig', {}),
+        limit=data.get('limit', history.HISTORY_PAGE_SIZE),
+        cursor=data.get('cursor'),
+        offset=data.get('offset', 0),
+        source_cluster=data.get('sourceCluster'),
+        provider=data.get('provider')
+    )
+
 @app.route('/api/ai/history', methods=['POST'])
 def get_ai_analysis_history():
     """
     Get AI analysis history from Couchbase
+    Uses index: analysis_history_v3 (ordered, covered, keyset-paginated, prepared)
     
     Request body:
     {
         "config": {...},
         "bucketConfig": {...},
         "limit": 10,
-        "offset": 0
+        "cursor": "..." (optional, next_cursor of the previous page),
+        "offset": 0 (optional, legacy paging when no cursor is given),
+        "sourceCluster": "..." (optional),
+        "provider": "openai" (optional),
+        "refresh": true (optional, bypass the result cache)
     }
     
     Response:
     {
         "success": true,
         "results": [...],
-        "count": 10
+        "count": 10,
+        "has_more": true,
+        "next_cursor": "..."
     }
     """
+    cluster_config = {}
     try:
-        data = request.json
+        data = request.json or {}
         cluster_config = data.get('config', {})
-        bucket_config = data.get('bucketConfig', {})
-        limit = data.get('limit', 10)
-        offset = data.get('offset', 0)
-        
-        cluster = get_couchbase_connection(cluster_config)
-        if not cluster:
-            return jsonify({'success': False, 'error': 'Not connected'}), 500
-        
-        # Build N1QL query
-        bucket = bucket_config.get('bucket', 'cb_tools')
-        scope = bucket_config.get('analyzerScope', 'query')
-        collection = bucket_config.get('analyzerCollection', 'analyzer')
-        
-        query = f'''
-            SELECT `createdAt`,
-                   `provider`,
-                   `status`,
-                   `prompt`,
-                   `sourceCluster`,
-                   `metadata`,
-                   `parseJson`.`filters`,
-                   META().id as documentId
-            FROM `{bucket}`.`{scope}`.`{collection}`
-            WHERE docType = "ai_analysis"
-            ORDER BY `createdAt` DESC
-            LIMIT $limit
-            OFFSET $offset
-        '''
+        limit = data.get('limit', history.HISTORY_PAGE_SIZE)
         
-        ic(f"📋 Fetching AI analysis history: limit={limit}, offset={offset}")
+        try:
+            query = history_query_from_request(data)
+        except ValueError as e:
+            return jsonify({'success': False, 'error': str(e)}), 400
         
-        # Execute query
-        result = cluster.query(query, limit=limit, offset=offset)
-        rows = [row for row in result]
+        def run_history_query():
+            cluster = get_couchbase_connection(cluster_config)
+            if not cluster:
+                raise ConnectionError('Not connected')
+            
+            ic(f"📋 Fetching AI analysis history: limit={limit}, cursor={bool(data.get('cursor'))}")
+            
+            # Prepared once per statement variant, then reused
+            result = cluster.query(query['statement'], QueryOptions(named_parameters=query['params'], adhoc=False))
+            page = history.history_page([row for row in result], limit)
+            
+            ic(f"✅ Retrieved {page['count']} analysis records")
+            return page
         
-        ic(f"✅ Retrieved {len(rows)} analysis records")
+        # Identical refreshes within the TTL are answered from memory
+        cache_key = result_cache.ResultCache.key(
+            cluster_config, result_cache.keyspace_tag(data.get('bucketConfig', {})), query['statement'], query['params']
+        )
+        page = result_cache.result_cache.cached(cache_key, run_history_query, refresh=bool(data.get('refresh')))
         
         return jsonify({
             'success': True,
-            'results': rows,
-            'count': len(rows)
+            **page
         })
         
     except Exception as e:
+        report_couchbase_error(cluster_config, e)
         ic(f"❌ Error fetching analysis history: {str(e)}")
         return jsonify({
             'success': False,
@@ -1347,10 +1950,6 @@ def get_ai_clusters():
         bucket_config = data.get('bucketConfig', {})
         term = data.get('term', '')
         
-        cluster = get_couchbase_connection(cluster_config)
-        if not cluster:
-            return jsonify({'success': False, 'error': 'Not connected'}), 500
-        
         bucket = bucket_config.get('bucket', 'cb_tools')
         scope = bucket_config.get('analyzerScope', 'query')
         collection = bucket_config.get('analyzerCollection', 'analyzer')
@@ -1371,16 +1970,26 @@ def get_ai_clusters():
         
         # Add wildcard for prefix matching
         search_term = f"{term}*" if term else "*"
-        ic(f"🔎 Searching clusters with SEARCH term: '{search_term}'")
         
-        result = cluster.query(
-            query, 
-            QueryOptions(
-                adhoc=False, 
-                named_parameters={'term': search_term}
+        def run_clusters_query():
+            cluster = get_couchbase_connection(cluster_config)
+            if not cluster:
+                raise ConnectionError('Not connected')
+            
+            ic(f"🔎 Searching clusters with SEARCH term: '{search_term}'")
+            result = cluster.query(
+                query, 
+                QueryOptions(
+                    adhoc=False, 
+                    named_parameters={'term': search_term}
+                )
             )
+            return [row for row in result]
+        
+        cache_key = result_cache.ResultCache.key(
+            cluster_config, result_cache.keyspace_tag(bucket_config), query, {'term': search_term}
         )
-        clusters = [row for row in result]
+        clusters = result_cache.result_cache.cached(cache_key, run_clusters_query, refresh=bool(data.get('refresh')))
         
         return jsonify({
             'success': True,
@@ -0,0 +1,286 @@
+#!/usr/bin/env python3
+"""
+ASGI server variant for Liquid Snake
+Runs the same API on an event loop: uvicorn asgi_app:application --port 5555
+
+Architecture:
+- The KV and history routes that many analysts poll at once are native async
+  Quart handlers on the async SDK (acouchbase), so a waiting KV round trip
+  holds no thread:
+  - POST /api/ai/status/<documentId>
+  - POST /api/ai/history
+  - POST /api/couchbase/load-analyzer/<requestId>
+  - POST /api/couchbase/test
+  - GET /api/ai/stats, GET /api/couchbase/pool-stats
+- Every other route (ad-hoc and streamed queries, ingest, AI analysis,
+  preferences, static files, ...) is served by the Flask app from app.py
+  through a WSGI adapter with its own thread pool, so the API surface is
+  identical
+- Async connections come from cb_pool.AsyncClusterPool (one per cluster
+  config, owned by the event loop) with their own CollectionResolver; the
+  Flask routes keep using app.py's pool
+- Response shapes come from the helpers app.py uses (status_response,
+  history_query_from_request, history.history_page), so both servers
+  answer the same way
+- Run a single worker process: server-side datasets and AI sessions live
+  in process memory (ai_analyzer.SessionCache)
+"""
+
+from datetime import timedelta
+from a2wsgi import WSGIMiddleware
+from acouchbase.cluster import Cluster
+from couchbase.auth import PasswordAuthenticator
+from couchbase.diagnostics import ClusterState
+from couchbase.exceptions import (
+    DocumentNotFoundException,
+    PathNotFoundException,
+    ServiceUnavailableException,
+    TimeoutException
+)
+from couchbase.options import ClusterOptions, QueryOptions
+from icecream import ic
+from quart import Quart, jsonify, request
+from quart_cors import cors
+from werkzeug.exceptions import MethodNotAllowed, NotFound
+
+import ai_analyzer
+import cb_pool
+import history
+import result_cache
+import app as flask_server
+
+# Threads serving the Flask routes (long AI calls, uploads)
+WSGI_WORKERS = 32
+
+
+async def _connect_cluster(config):
+    """Open an async Couchbase cluster and wait until it is ready (raises if auth fails)"""
+    connection_string = f"couchbase://{cb_pool.normalize_host(config['url'])}"
+    ic(f"🔌 Connecting to Couchbase (async): {connection_string}", config['username'])
+
+    cluster = await Cluster.connect(
+        connection_string,
+        ClusterOptions(PasswordAuthenticator(config['username'], config['password']))
+    )
+    await cluster.wait_until_ready(timedelta(seconds=10))
+    return cluster
+
+async def _probe_cluster(cluster):
+    """Raise if the SDK has no live connection (diagnostics sends no requests)"""
+    result = await cluster.diagnostics()
+    if result.state == ClusterState.Offline:
+        raise ConnectionError("Cluster diagnostics report offline")
+
+# Async connection pool (one connection per cluster config)
+cluster_pool = cb_pool.AsyncClusterPool(_connect_cluster, probe=_probe_cluster)
+
+# Bucket/collection handles per async connection
+collection_resolver = cb_pool.CollectionResolver(warm_defaults=False)
+cluster_pool.on_close.append(collection_resolver.forget)
+
+quart_app = cors(Quart(__name__, static_folder=None))
+
+async def get_couchbase_connection(config):
+    """Get or create async Couchbase cluster connection"""
+    if not config.get('username') or not config.get('password'):
+        ic("⚠️ Missing credentials - username or password is empty")
+        return None
+
+    return await cluster_pool.get(config)
+
+def get_collection(cluster, bucket_config, kind='analyzer'):
+    """Cached async collection handle for a request's bucketConfig"""
+    return collection_resolver.collection(cluster, bucket_config, kind)
+
+async def report_couchbase_error(config, error):
+    """
+    Drop a pooled connection after a connection-level failure so it reconnects
+
+    A timeout may just be a slow query or KV op, so the connection is only
+    dropped if the diagnostics probe also fails.
+    """
+    if isinstance(error, ServiceUnavailableException):
+        cluster_pool.mark_unhealthy(config, error)
+    elif isinstance(error, TimeoutException):
+        await cluster_pool.probe(config, error)
+
+@quart_app.route('/api/couchbase/test', methods=['POST'])
+async def test_connection():
+    """Test Couchbase connection"""
+    cluster_config = {}
+    try:
+        data = await request.get_json()
+        cluster_config = data.get('config', {})
+        cluster = await get_couchbase_connection(cluster_config)
+
+        if not cluster:
+            return jsonify({
+                'success': False,
+                'error': 'Failed to connect'
+            }), 500
+
+        bucket_name = data.get('bucketConfig', {}).get('bucket', 'cb_tools')
+        await collection_resolver.bucket(cluster, bucket_name).ping()
+
+        return jsonify({
+            'success': True,
+            'message': f'Connected to Couchbase cluster at {cluster_config["url"]}'
+        })
+    except Exception as e:
+        await report_couchbase_error(cluster_config, e)
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
+@quart_app.route('/api/couchbase/pool-stats', methods=['GET'])
+async def get_pool_stats():
+    """Pooled connections of both servers (no credentials)"""
+    return jsonify({
+        'success': True,
+        'stats': {
+            **cluster_pool.stats(),
+            'handles': collection_resolver.stats(),
+            'sync': {
+                **flask_server.cluster_pool.stats(),
+                'handles': flask_server.collection_resolver.stats()
+            }
+        }
+    })
+
+@quart_app.route('/api/couchbase/load-analyzer/<request_id>', methods=['POST'])
+async def load_analyzer_data(request_id):
+    """Load query analyzer data"""
+    cluster_config = {}
+    try:
+        data = await request.get_json()
+        cluster_config = data.get('config', {})
+
+        cluster = await get_couchbase_connection(cluster_config)
+        if not cluster:
+            return jsonify({'success': False, 'error': 'Not connected'}), 500
+
+        collection = get_collection(cluster, data.get('bucketConfig', {}), 'analyzer')
+        result = await collection.get(request_id)
+
+        return jsonify({
+            'success': True,
+            'data': result.content_as[dict]
+        })
+    except Exception as e:
+        await report_couchbase_error(cluster_config, e)
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
+@quart_app.route('/api/ai/status/<document_id>', methods=['POST'])
+async def check_ai_status(document_id):
+    """
+    Check status of AI analysis document
+    Request body: {"config": {...}, "bucketConfig": {...}}
+    """
+    cb_config = {}
+    try:
+        data = await request.get_json()
+        cb_config = data.get('config', {})
+
+        cluster = await get_couchbase_connection(cb_config)
+        if not cluster:
+            return jsonify({'success': False, 'error': 'Not connected'}), 500
+
+        collection = get_collection(cluster, data.get('bucketConfig', {}), 'analyzer')
+
+        try:
+            result = await collection.lookup_in(document_id, flask_server.status_lookup_specs())
+            return jsonify(flask_server.status_response(result, document_id))
+        except PathNotFoundException:
+            return jsonify({'success': True, 'status': 'unknown', 'document_id': document_id})
+
+    except DocumentNotFoundException:
+        return jsonify({'success': False, 'status': 'not_found'}), 404
+    except Exception as e:
+        await report_couchbase_error(cb_config, e)
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+@quart_app.route('/api/ai/stats', methods=['GET'])
+async def get_ai_cache_stats():
+    """Get AI cache statistics"""
+    return jsonify({
+        'success': True,
+        'stats': ai_analyzer.get_cache_stats()
+    })
+
+@quart_app.route('/api/ai/history', methods=['POST'])
+async def get_ai_analysis_history():
+    """Get AI analysis history from Couchbase (same request/response as the Flask route)"""
+    cluster_config = {}
+    try:
+        data = await request.get_json() or {}
+        cluster_config = data.get('config', {})
+
+        try:
+            query = flask_server.history_query_from_request(data)
+        except ValueError as e:
+            return jsonify({'success': False, 'error': str(e)}), 400
+
+        # Same result cache as the Flask routes, so their writes invalidate these pages too
+        cache_key = result_cache.ResultCache.key(
+            cluster_config, result_cache.keyspace_tag(data.get('bucketConfig', {})), query['statement'], query['params']
+        )
+        if not data.get('refresh'):
+            found, page = result_cache.result_cache.get(cache_key)
+            if found:
+                return jsonify({'success': True, **page})
+        generation = result_cache.result_cache.generation(cache_key)
+
+        cluster = await get_couchbase_connection(cluster_config)
+        if not cluster:
+            return jsonify({'success': False, 'error': 'Not connected'}), 500
+
+        result = cluster.query(query['statement'], QueryOptions(named_parameters=query['params'], adhoc=False))
+        rows = [row async for row in result.rows()]
+        page = history.history_page(rows, data.get('limit', history.HISTORY_PAGE_SIZE))
+        result_cache.result_cache.put(cache_key, page, generation)
+
+        return jsonify({
+            'success': True,
+            **page
+        })
+    except Exception as e:
+        await report_couchbase_error(cluster_config, e)
+        ic(f"❌ Error fetching analysis history: {str(e)}")
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
+@quart_app.after_serving
+async def close_connections():
+    cluster_pool.close_all()
+
+# Every route not defined above is answered by the Flask app
+flask_asgi = WSGIMiddleware(flask_server.app, workers=WSGI_WORKERS)
+
+def _is_async_route(scope):
+    if scope['type'] != 'http':
+        return True
+    try:
+        quart_app.url_map.bind('').match(scope['path'], method=scope['method'])
+        return True
+    except (NotFound, MethodNotAllowed):
+        return False
+
+async def application(scope, receive, send):
+    """ASGI entry point: native async routes first, Flask for the rest"""
+    if _is_async_route(scope):
+        await quart_app(scope, receive, send)
+    else:
+        await flask_asgi(scope, receive, send)
+
+if __name__ == '__main__':
+    import uvicorn
+
+    ic("🚀 Liquid Snake Server (ASGI)")
+    ic(f"📡 Serving at http://localhost:{flask_server.PORT}")
+    uvicorn.run(application, host='0.0.0.0', port=flask_server.PORT)
@@ -25396,18 +25396,13 @@ ${info.features.map((f) => `   • ${f}`).join("\n")}
             // Sort timestamps
             const sortedTimestamps = Array.from(allTimestamps).sort();
             
-            // Sample timestamps if too many (limit to ~60 points)
-            let sampledTimestamps = sortedTimestamps;
-            let samplingFactor = 1;
-            
-            if (sortedTimestamps.length > 100) {
-                samplingFactor = Math.ceil(sortedTimestamps.length / 60);
-                sampledTimestamps = sortedTimestamps.filter((_, i) => i % samplingFactor === 0);
-            }
+            // Send the complete timeline: the server downsamples each chart with a
+            // spike-preserving min/max (or LTTB) pass, where every-Nth sampling here would drop spikes
+            const sampledTimestamps = sortedTimestamps;
             
             charts.common_timeline = {
                 labels: sampledTimestamps,
-                note: samplingFactor > 1 ? `Sampled 1/${samplingFactor} points from unified timeline` : 'Complete timeline'
+                note: 'Complete timeline'
             };
             
             chartDefs.forEach(def => {
@@ -26444,6 +26439,8 @@ ${info.features.map((f) => `   • ${f}`).join("\n")}
 
         let aiHistoryCurrentPage = 1;
         let aiHistoryPageSize = 10;
+        // next_cursor of each loaded page: aiHistoryCursors[n - 1] starts page n
+        let aiHistoryCursors = [null];
 
         /**
          * Load AI analysis history from Couchbase
@@ -26460,7 +26457,8 @@ ${info.features.map((f) => `   • ${f}`).join("\n")}
             }
             
             try {
-                const offset = (page - 1) * aiHistoryPageSize;
+                if (page === 1) aiHistoryCursors = [null];
+                const cursor = aiHistoryCursors[page - 1];
                 
                 const response = await fetch('/api/ai/history', {
                     method: 'POST',
@@ -26469,13 +26467,15 @@ ${info.features.map((f) => `   • ${f}`).join("\n")}
                         config: cbConfig.cluster,
                         bucketConfig: cbConfig.bucketConfig,
                         limit: aiHistoryPageSize,
-                        offset: offset
+                        // Keyset cursor when known; offset only if a page is reached without one
+                        ...(cursor ? { cursor } : { offset: (page - 1) * aiHistoryPageSize })
                     })
                 });
                 
                 const result = await response.json();
                 
                 if (result.success && result.results) {
+                    aiHistoryCursors[page] = result.next_cursor || null;
                     displayAIHistory(result.results, result.count); // Pass count of returned rows
                     Logger.info(`[AI] ✅ Loaded ${result.count} analysis records (Page ${page})`);
                 }
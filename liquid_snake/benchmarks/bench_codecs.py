@@ -0,0 +1,80 @@
+#!/usr/bin/env python3
+"""
+Benchmark: BlobStorage codecs (ratio and MB/s) on the sample exports
+
+Every sample/*.json export is compressed whole, and record by record (one
+completed_requests object or plan per document, where trained dictionaries
+matter). The dictionary is trained on every other record and measured on
+the rest, so it is never scored on its own training data.
+
+Usage:
+    python benchmarks/bench_codecs.py [sample_dir]
+"""
+
+import glob
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from blob_codecs import ZSTD_AVAILABLE, get_codec, load_samples, train_dictionary
+
+CANDIDATES = [
+    ('gzip', 6), ('gzip', 9),
+    ('zstd', 1), ('zstd', 3), ('zstd', 9), ('zstd', 19),
+    ('lz4', 0), ('lz4', 9),
+]
+
+
+def bench(name, level, documents, dictionary=None, repeat=3):
+    """(ratio, compress MB/s, decompress MB/s) over a list of documents"""
+    codec = get_codec(name)
+    raw = sum(len(doc) for doc in documents)
+    compress_s = decompress_s = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        packed = [codec.compress(doc, level, dictionary) for doc in documents]
+        compress_s = min(compress_s, time.perf_counter() - start)
+        start = time.perf_counter()
+        unpacked = [codec.decompress(doc, dictionary) for doc in packed]
+        decompress_s = min(decompress_s, time.perf_counter() - start)
+    assert unpacked == documents
+    return raw / sum(len(doc) for doc in packed), raw / compress_s / 1e6, raw / decompress_s / 1e6
+
+
+def report(title, documents, dictionary=None):
+    print(f"\n{title}: {len(documents):,} documents, {sum(len(d) for d in documents) / 1e6:.2f} MB")
+    print(f"{'codec':<18}{'ratio':>8}{'comp MB/s':>12}{'decomp MB/s':>13}")
+    rows = [(name, level, None) for name, level in CANDIDATES if get_codec(name).available]
+    if dictionary is not None:
+        rows += [('zstd', 3, dictionary), ('zstd', 9, dictionary)]
+    for name, level, dict_data in rows:
+        ratio, comp, decomp = bench(name, level, documents, dict_data)
+        label = f"{name}-{level}" + ('+dict' if dict_data is not None else '')
+        print(f"{label:<18}{ratio:>8.2f}{comp:>12.1f}{decomp:>13.1f}")
+
+
+if __name__ == "__main__":
+    sample_dir = sys.argv[1] if len(sys.argv) > 1 else os.path.join(
+        os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))), 'sample')
+    paths = sorted(glob.glob(os.path.join(sample_dir, '*.json')))
+    if not paths:
+        sys.exit(f"No sample exports in {sample_dir}")
+
+    whole = []
+    for path in paths:
+        with open(path, 'r', encoding='utf-8') as handle:
+            whole.append(json.dumps(json.load(handle)).encode('utf-8'))
+    report('Whole exports', whole)
+
+    records = load_samples(paths)
+    training, measured = records[::2], records[1::2]
+    dictionary = None
+    if ZSTD_AVAILABLE:
+        dictionary = train_dictionary(training)
+        print(f"\nDictionary: {len(dictionary):,} bytes from {len(training):,} records")
+    else:
+        print("\nzstandard not installed: skipping zstd and dictionary rows")
+    report('Per-record documents', measured, dictionary)
@@ -0,0 +1,62 @@
+#!/usr/bin/env python3
+"""
+Benchmark: vectorized duration parsing vs a naive per-string regex loop
+
+Usage:
+    python benchmarks/bench_durations.py [row_count]
+"""
+
+import os
+import random
+import re
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from durations import parse_durations_ms
+
+_NAIVE = re.compile(r'^(\d+\.?\d*)(ms|ns|µs|us|s)$')
+_NAIVE_UNITS = {'s': 1000.0, 'ms': 1.0, 'µs': 0.001, 'us': 0.001, 'ns': 0.000001}
+
+
+def naive_parse(values):
+    """Per-string loop in the style of the frontend parseTime (without its cache)"""
+    out = []
+    for value in values:
+        match = _NAIVE.match(value) if isinstance(value, str) else None
+        out.append(float(match.group(1)) * _NAIVE_UNITS[match.group(2)] if match else float('nan'))
+    return out
+
+
+def make_values(count, seed=42):
+    """Realistic mix of phaseTimes / elapsedTime strings"""
+    rng = random.Random(seed)
+    units = ['s', 'ms', 'ms', 'ms', 'µs', 'µs', 'ns']
+    return [f'{rng.random() * 1000:.{rng.randint(3, 9)}f}{rng.choice(units)}' for _ in range(count)]
+
+
+def bench(func, values, repeat=3):
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func(values)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+if __name__ == "__main__":
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000
+    values = make_values(count)
+
+    naive_s = bench(naive_parse, values)
+    vector_s = bench(parse_durations_ms, values)
+
+    assert np.allclose(naive_parse(values[:1000]), parse_durations_ms(values[:1000]))
+
+    print(f"rows:        {count:,}")
+    print(f"naive loop:  {naive_s:.3f}s  ({count / naive_s / 1e6:.2f}M rows/s)")
+    print(f"vectorized:  {vector_s:.3f}s  ({count / vector_s / 1e6:.2f}M rows/s)")
+    print(f"speedup:     {naive_s / vector_s:.1f}x")
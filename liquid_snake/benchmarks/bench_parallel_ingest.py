@@ -0,0 +1,72 @@
+#!/usr/bin/env python3
+"""
+Benchmark: one large NDJSON upload, serial ingest vs parallel_ingest shards
+
+The sample export is repeated into an NDJSON file of the requested size.
+The serial path is ingest.ingest_to_dataset plus the query-group,
+Service Pressure and timeline aggregation the parallel path precomputes,
+so both columns produce the same result.
+
+Usage:
+    python benchmarks/bench_parallel_ingest.py [size_mb] [workers]
+"""
+
+import json
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import ingest
+import parallel_ingest
+from insights import ServicePressureRules
+from query_groups import QueryGroupEngine
+from timeline import TimelineBuckets
+
+SAMPLE = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))),
+                      'sample', 'test_system_completed_requests.json')
+
+
+def write_ndjson(path, size_mb):
+    with open(SAMPLE, 'r', encoding='utf-8') as handle:
+        rows = list(ingest.iter_completed_requests(handle))
+    lines = [json.dumps(row) + '\n' for row in rows]
+    written = copy = 0
+    with open(path, 'w', encoding='utf-8') as out:
+        while written < size_mb * 1024 * 1024:
+            for line in lines:
+                line = line.replace('"requestId": "', f'"requestId": "{copy}-', 1)
+                out.write(line)
+                written += len(line)
+            copy += 1
+
+
+def serial(path):
+    with open(path, 'rb') as handle:
+        dataset = ingest.ingest_to_dataset(handle)['dataset']
+    engine = QueryGroupEngine()
+    engine.add_dataset(dataset)
+    ServicePressureRules(dataset).evaluate()
+    TimelineBuckets.from_dataset(dataset)
+    return len(dataset)
+
+
+def parallel(path, workers):
+    return len(parallel_ingest.ingest_parallel([path], max_workers=workers)['dataset'])
+
+
+if __name__ == "__main__":
+    size_mb = int(sys.argv[1]) if len(sys.argv) > 1 else 256
+    workers = int(sys.argv[2]) if len(sys.argv) > 2 else (os.cpu_count() or 1)
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'upload.ndjson')
+        write_ndjson(path, size_mb)
+        tasks = len(parallel_ingest.plan_ingest_tasks([path], workers))
+        print(f"{os.path.getsize(path) / 1e6:.0f} MB NDJSON, {os.cpu_count()} CPU(s), "
+              f"{workers} worker(s), {tasks} task(s)")
+        for label, run in (('serial', lambda: serial(path)), ('parallel', lambda: parallel(path, workers))):
+            start = time.perf_counter()
+            records = run()
+            print(f"{label:<10}{records:>10,} records {time.perf_counter() - start:>8.2f}s")
@@ -0,0 +1,115 @@
+#!/usr/bin/env python3
+"""
+Blob Chunks Module
+Splitting and checksum verification of blobs larger than one KV document
+
+Architecture:
+- A compressed blob above BLOB_CHUNK_BYTES is cut into ordered chunks;
+  each chunk is its own binary document and the blob's own key becomes a
+  manifest whose blob_meta (XATTR and body header) lists the chunk keys,
+  sizes and SHA-256 checksums (plus a checksum of the whole blob)
+- Chunk keys carry a per-save generation, so a save never overwrites the
+  chunks the current manifest points to; the manifest is switched last and
+  the previous generation's chunks are removed afterwards
+- Chunks are written and read concurrently (the SDK releases the GIL while
+  waiting on KV), so large blobs move at parallel KV throughput
+- verify_chunks() checks every chunk's size and checksum and the whole
+  blob's checksum before blob_storage.py stream-decodes the chunks, so a
+  torn or partially overwritten blob fails loudly
+- No SDK dependency: blob_storage.py does the KV operations
+"""
+
+import hashlib
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Iterable, List, Optional, TypeVar
+
+# Chunk size (well below the 20MB document limit)
+BLOB_CHUNK_BYTES = 8 * 1024 * 1024
+
+# Concurrent chunk reads/writes per blob
+BLOB_CHUNK_WORKERS = 8
+
+T = TypeVar('T')
+R = TypeVar('R')
+
+
+class ChunkIntegrityError(ValueError):
+    """A chunk or the reassembled blob does not match its manifest"""
+
+
+def new_generation() -> str:
+    """Token distinguishing one save's chunk keys from another's"""
+    return uuid.uuid4().hex[:12]
+
+
+def chunk_key(key: str, generation: str, index: int) -> str:
+    return f"{key}::chunk::{generation}::{index}"
+
+
+def split_chunks(key: str, data: bytes, generation: str,
+                 chunk_bytes: int = BLOB_CHUNK_BYTES) -> List[Dict[str, Any]]:
+    """
+    Ordered chunks of data
+
+    Returns:
+        List of {'key', 'size', 'sha256', 'data'} (data is a memoryview slice)
+    """
+    view = memoryview(data)
+    chunks = []
+    for index, start in enumerate(range(0, len(data), chunk_bytes)):
+        piece = view[start:start + chunk_bytes]
+        chunks.append({
+            'key': chunk_key(key, generation, index),
+            'size': len(piece),
+            'sha256': hashlib.sha256(piece).hexdigest(),
+            'data': piece
+        })
+    return chunks
+
+
+def chunk_manifest(data: bytes, chunks: List[Dict[str, Any]], generation: str) -> Dict[str, Any]:
+    """Chunk fields for blob_meta (everything but the chunk bytes)"""
+    return {
+        'chunked': True,
+        'generation': generation,
+        'chunkSize': max((c['size'] for c in chunks), default=0),
+        'sha256': hashlib.sha256(data).hexdigest(),
+        'chunks': [{'key': c['key'], 'size': c['size'], 'sha256': c['sha256']} for c in chunks]
+    }
+
+
+def chunk_keys(blob_meta: Optional[Dict[str, Any]]) -> List[str]:
+    """Chunk keys a blob_meta points to (empty for single-document blobs)"""
+    if not blob_meta or not blob_meta.get('chunked'):
+        return []
+    return [chunk['key'] for chunk in blob_meta.get('chunks', [])]
+
+
+def verify_chunks(blob_meta: Dict[str, Any], pieces: List[bytes]) -> None:
+    """
+    Check chunk bodies against the manifest without joining them
+
+    Raises:
+        ChunkIntegrityError: If a chunk or the whole blob does not match
+    """
+    chunks = blob_meta.get('chunks', [])
+    if len(pieces) != len(chunks):
+        raise ChunkIntegrityError(f"Expected {len(chunks)} chunks, got {len(pieces)}")
+    whole = hashlib.sha256()
+    for chunk, piece in zip(chunks, pieces):
+        if len(piece) != chunk['size'] or hashlib.sha256(piece).hexdigest() != chunk['sha256']:
+            raise ChunkIntegrityError(f"Chunk {chunk['key']} does not match its checksum")
+        whole.update(piece)
+    if blob_meta.get('sha256') and whole.hexdigest() != blob_meta['sha256']:
+        raise ChunkIntegrityError('Reassembled blob does not match its checksum')
+
+
+def map_concurrently(fn: Callable[[T], R], items: Iterable[T],
+                     max_workers: int = BLOB_CHUNK_WORKERS) -> List[R]:
+    """fn over items on a thread pool, results in input order; the first error is raised"""
+    items = list(items)
+    if len(items) <= 1:
+        return [fn(item) for item in items]
+    with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(items)))) as pool:
+        return list(pool.map(fn, items))
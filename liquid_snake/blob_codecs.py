@@ -0,0 +1,571 @@
+#!/usr/bin/env python3
+"""
+Blob Codecs Module
+Compression codec registry and zstd dictionaries for BlobStorage
+
+Architecture:
+- Codecs are looked up by the name recorded in the blob_meta XATTR
+  ('compression'), so every blob decodes with the codec it was written
+  with; blobs saved before this module ('gzip', 'none', no metadata) load
+  unchanged
+- gzip is always available and is the default codec for new blobs; zstd
+  (levels 1-22, optional dictionary) and lz4 (frame format, levels 0-16)
+  need zstandard / lz4 and are only used for new blobs when configured
+  (LIQUID_SNAKE_BLOB_CODEC or BlobStorage(codec=...)); a configured codec
+  that is not installed fails at startup with the package to install
+- completed_requests records and plans repeat the same field names and
+  operator trees, so a zstd dictionary trained on sample records
+  (train_dictionary) shrinks them further; a dictionary is identified by
+  the hash of its bytes ('dictionaryId' in blob_meta), is stored once in
+  Couchbase by BlobStorage and kept in a DictionaryCache after first use
+- Saves and loads stream (encode_stream / decode_stream): JSON is
+  serialized once, element by element with the C encoder, and each piece is
+  compressed as it is produced while its bytes are counted, so the full
+  uncompressed encoding never sits in memory next to the compressed bytes;
+  the output is byte-identical to json.dumps
+- The canonical encoding (sorted keys, compact separators) is hashed while
+  it is compressed, which gives BlobStorage content addresses in the same
+  single pass
+- Blob bodies start with a self-describing header (BODY_MAGIC, length,
+  the blob_meta JSON), so one get returns everything needed to decode a
+  blob; bodies without the magic are from before the header and are
+  described by their blob_meta XATTR only. The format is one-way: servers
+  without the header support read an LSB1 body as compressed bytes and
+  fail, so in a mixed-version deployment every reader is upgraded before
+  any writer saves blobs
+- No SDK dependency; see benchmarks/bench_codecs.py for ratio and MB/s
+"""
+
+import gzip
+import hashlib
+import json
+import os
+import struct
+import threading
+import zlib
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+from icecream import ic
+
+# Optional codecs
+try:
+    import zstandard
+    ZSTD_AVAILABLE = True
+except ImportError:
+    ZSTD_AVAILABLE = False
+
+try:
+    import lz4.frame as lz4_frame
+    LZ4_AVAILABLE = True
+except ImportError:
+    LZ4_AVAILABLE = False
+
+# Package providing each optional codec
+CODEC_PACKAGES = {'zstd': 'zstandard', 'lz4': 'lz4'}
+
+# Codec for new blobs unless LIQUID_SNAKE_BLOB_CODEC names another one
+DEFAULT_CODEC = 'gzip'
+CODEC_ENV = 'LIQUID_SNAKE_BLOB_CODEC'
+
+# Target size of trained zstd dictionaries
+DICTIONARY_BYTES = 112 * 1024
+
+# Key prefix of dictionary documents (raw dictionary bytes)
+DICTIONARY_KEY_PREFIX = 'blob_dict::'
+
+# Uncompressed bytes handed to a streaming compressor at a time
+STREAM_PIECE_BYTES = 1024 * 1024
+
+# Marks a blob body that starts with its header; followed by a 4-byte big-endian header length
+BODY_MAGIC = b'LSB1'
+
+# Key prefix of content-addressed blobs (followed by the SHA-256 of the canonical bytes)
+CONTENT_KEY_PREFIX = 'blob::sha256::'
+
+# Container levels serialized element by element (deeper values go to json.dumps whole)
+STREAM_JSON_DEPTH = 2
+
+
+class _Passthrough:
+    """compressobj/decompressobj of the 'none' codec"""
+
+    def compress(self, data: bytes) -> bytes:
+        return bytes(data)
+
+    decompress = compress
+
+    def flush(self) -> bytes:
+        return b''
+
+
+class Codec:
+    """
+    A compression codec; subclasses implement _compress/_decompress
+    """
+    name = 'none'
+    available = True
+    default_level: Optional[int] = None
+    supports_dictionary = False
+
+    def missing_message(self) -> str:
+        return (f"Compression codec {self.name} is not installed "
+                f"(pip install {CODEC_PACKAGES.get(self.name, self.name)})")
+
+    def level(self, level: Optional[int] = None) -> Optional[int]:
+        """Requested level or the codec default"""
+        return self.default_level if level is None else int(level)
+
+    def compress(self, data: bytes, level: Optional[int] = None,
+                 dictionary: Optional[bytes] = None) -> bytes:
+        if not self.available:
+            raise ValueError(self.missing_message())
+        if dictionary is not None and not self.supports_dictionary:
+            raise ValueError(f"Compression codec {self.name} does not support dictionaries")
+        return self._compress(data, self.level(level), dictionary)
+
+    def decompress(self, data: bytes, dictionary: Optional[bytes] = None) -> bytes:
+        if not self.available:
+            raise ValueError(self.missing_message())
+        return self._decompress(data, dictionary)
+
+    def compressobj(self, level: Optional[int] = None, dictionary: Optional[bytes] = None) -> Any:
+        """Incremental compressor with compress(piece) and flush()"""
+        if not self.available:
+            raise ValueError(self.missing_message())
+        if dictionary is not None and not self.supports_dictionary:
+            raise ValueError(f"Compression codec {self.name} does not support dictionaries")
+        return self._compressobj(self.level(level), dictionary)
+
+    def decompressobj(self, dictionary: Optional[bytes] = None) -> Any:
+        """Incremental decompressor with decompress(piece) and flush()"""
+        if not self.available:
+            raise ValueError(self.missing_message())
+        return self._decompressobj(dictionary)
+
+    def _compress(self, data: bytes, level: Optional[int], dictionary: Optional[bytes]) -> bytes:
+        return bytes(data)
+
+    def _decompress(self, data: bytes, dictionary: Optional[bytes]) -> bytes:
+        return bytes(data)
+
+    def _compressobj(self, level: Optional[int], dictionary: Optional[bytes]) -> Any:
+        return _Passthrough()
+
+    def _decompressobj(self, dictionary: Optional[bytes]) -> Any:
+        return _Passthrough()
+
+
+class GzipCodec(Codec):
+    name = 'gzip'
+    default_level = 6
+
+    def _compress(self, data, level, dictionary):
+        # mtime=0 ensures deterministic output for same input
+        return gzip.compress(data, compresslevel=level, mtime=0)
+
+    def _decompress(self, data, dictionary):
+        return gzip.decompress(data)
+
+    def _compressobj(self, level, dictionary):
+        # wbits=31: gzip container (mtime 0), readable by gzip.decompress
+        return zlib.compressobj(level, zlib.DEFLATED, 31)
+
+    def _decompressobj(self, dictionary):
+        return zlib.decompressobj(31)
+
+
+class ZstdCodec(Codec):
+    name = 'zstd'
+    available = ZSTD_AVAILABLE
+    default_level = 3
+    supports_dictionary = True
+
+    def __init__(self):
+        # (De)compressor objects are not thread-safe, but loading a dictionary
+        # costs more than compressing a small document: keep them per thread
+        self._local = threading.local()
+
+    def _cached(self, kind: str, level: Optional[int], dictionary: Optional[bytes]) -> Any:
+        cache = getattr(self._local, 'cache', None)
+        if cache is None:
+            cache = self._local.cache = {}
+        # bytes cache their hash, so keying on the dictionary itself stays cheap
+        key = (kind, level, dictionary)
+        if key not in cache:
+            dict_data = zstandard.ZstdCompressionDict(dictionary) if dictionary is not None else None
+            if kind == 'compress':
+                cache[key] = zstandard.ZstdCompressor(level=level, dict_data=dict_data)
+            else:
+                cache[key] = zstandard.ZstdDecompressor(dict_data=dict_data)
+        return cache[key]
+
+    def _compress(self, data, level, dictionary):
+        return self._cached('compress', level, dictionary).compress(data)
+
+    def _decompress(self, data, dictionary):
+        # Streamed frames carry no content size, which one-shot decompress() needs
+        return self._decompressobj(dictionary).decompress(data)
+
+    def _compressobj(self, level, dictionary):
+        return self._cached('compress', level, dictionary).compressobj()
+
+    def _decompressobj(self, dictionary):
+        return self._cached('decompress', None, dictionary).decompressobj()
+
+
+class Lz4Codec(Codec):
+    name = 'lz4'
+    available = LZ4_AVAILABLE
+    default_level = 0
+
+    def _compress(self, data, level, dictionary):
+        return lz4_frame.compress(data, compression_level=level)
+
+    def _decompress(self, data, dictionary):
+        return lz4_frame.decompress(data)
+
+    def _compressobj(self, level, dictionary):
+        return _Lz4Stream(level)
+
+    def _decompressobj(self, dictionary):
+        return _Lz4Stream(None)
+
+
+class _Lz4Stream:
+    """LZ4FrameCompressor/Decompressor behind the compressobj interface"""
+
+    def __init__(self, level: Optional[int]):
+        self._compressor = lz4_frame.LZ4FrameCompressor(compression_level=level) if level is not None else None
+        self._decompressor = lz4_frame.LZ4FrameDecompressor() if level is None else None
+        self._started = False
+
+    def compress(self, data: bytes) -> bytes:
+        header = b''
+        if not self._started:
+            header = self._compressor.begin()
+            self._started = True
+        return header + self._compressor.compress(data)
+
+    def decompress(self, data: bytes) -> bytes:
+        return self._decompressor.decompress(data)
+
+    def flush(self) -> bytes:
+        if self._compressor is None:
+            return b''
+        return self.compress(b'') + self._compressor.flush()
+
+
+CODECS: Dict[str, Codec] = {codec.name: codec for codec in (Codec(), GzipCodec(), ZstdCodec(), Lz4Codec())}
+
+
+def get_codec(name: Optional[str]) -> Codec:
+    """
+    Codec by blob_meta name ('none' when no name was recorded)
+
+    Raises:
+        ValueError: If the codec is unknown
+    """
+    codec = CODECS.get(name or 'none')
+    if codec is None:
+        raise ValueError(f"Unsupported compression type: {name}")
+    return codec
+
+
+def available_codecs() -> List[str]:
+    return [name for name, codec in CODECS.items() if codec.available]
+
+
+def require_codec(name: Optional[str]) -> Codec:
+    """
+    Codec configured for new blobs, which must be installed
+
+    Raises:
+        ValueError: If the codec is unknown or its package is not installed
+    """
+    codec = get_codec(name)
+    if not codec.available:
+        raise ValueError(f"{codec.missing_message()}, or choose another codec "
+                         f"({', '.join(available_codecs())}); {CODEC_ENV} unset means {DEFAULT_CODEC}")
+    return codec
+
+
+def default_codec() -> str:
+    """
+    Codec for new blobs: LIQUID_SNAKE_BLOB_CODEC, otherwise gzip
+
+    Installing zstandard or lz4 alone never changes it.
+
+    Raises:
+        ValueError: If the configured codec is unknown or not installed
+    """
+    name = os.environ.get(CODEC_ENV) or DEFAULT_CODEC
+    require_codec(name)
+    return name
+
+
+# ============================================================================
+# Dictionaries
+# ============================================================================
+
+def dictionary_id(dictionary: bytes) -> str:
+    """Content hash identifying a dictionary"""
+    return hashlib.sha256(dictionary).hexdigest()[:16]
+
+
+def dictionary_key(dict_id: str) -> str:
+    return f"{DICTIONARY_KEY_PREFIX}{dict_id}"
+
+
+def sample_documents(records: Iterable[Any]) -> List[bytes]:
+    """
+    Training samples from a system:completed_requests export
+
+    Each record's completed_requests object and plan become separate
+    samples, matching how they are serialized when saved.
+    """
+    samples = []
+    for record in records:
+        if not isinstance(record, dict):
+            continue
+        parts = [record[field] for field in ('completed_requests', 'plan') if field in record]
+        for part in parts or [record]:
+            samples.append(json.dumps(part).encode('utf-8'))
+    return samples
+
+
+def load_samples(paths: Iterable[str]) -> List[bytes]:
+    """sample_documents of every JSON export in paths"""
+    samples = []
+    for path in paths:
+        with open(path, 'r', encoding='utf-8') as handle:
+            records = json.load(handle)
+        samples.extend(sample_documents(records if isinstance(records, list) else [records]))
+    return samples
+
+
+def train_dictionary(samples: List[bytes], dict_size: int = DICTIONARY_BYTES) -> bytes:
+    """
+    Train a zstd dictionary on sample documents
+
+    Raises:
+        ValueError: If zstandard is not installed or there are no samples
+    """
+    if not ZSTD_AVAILABLE:
+        raise ValueError("Compression codec zstd is not installed")
+    if not samples:
+        raise ValueError("No samples to train a dictionary on")
+    dictionary = zstandard.train_dictionary(dict_size, samples).as_bytes()
+    ic(f"📖 Trained {len(dictionary)} byte dictionary on {len(samples)} samples")
+    return dictionary
+
+
+class DictionaryCache:
+    """
+    Thread-safe dictionary bytes by dictionaryId
+    """
+
+    def __init__(self):
+        self._dictionaries: Dict[str, bytes] = {}
+        self._lock = threading.Lock()
+
+    def add(self, dictionary: bytes) -> str:
+        dict_id = dictionary_id(dictionary)
+        with self._lock:
+            self._dictionaries[dict_id] = bytes(dictionary)
+        return dict_id
+
+    def get(self, dict_id: str, fetch: Optional[Callable[[str], bytes]] = None) -> bytes:
+        """
+        Dictionary by id, fetched (and verified) on first use
+
+        Raises:
+            KeyError: If the dictionary is unknown and there is no fetch
+            ValueError: If the fetched bytes do not hash to dict_id
+        """
+        with self._lock:
+            dictionary = self._dictionaries.get(dict_id)
+        if dictionary is not None:
+            return dictionary
+        if fetch is None:
+            raise KeyError(f"Unknown compression dictionary {dict_id}")
+        dictionary = bytes(fetch(dict_id))
+        if dictionary_id(dictionary) != dict_id:
+            raise ValueError(f"Compression dictionary {dict_id} does not match its id")
+        with self._lock:
+            self._dictionaries[dict_id] = dictionary
+        return dictionary
+
+    def __contains__(self, dict_id: str) -> bool:
+        with self._lock:
+            return dict_id in self._dictionaries
+
+
+# ============================================================================
+# Streaming
+# ============================================================================
+
+def content_key(digest: str) -> str:
+    """Key of a content-addressed blob from its canonical SHA-256 hex digest"""
+    return f"{CONTENT_KEY_PREFIX}{digest}"
+
+
+def build_sweep_query(bucket_config: Optional[Dict[str, Any]], before: float) -> Dict[str, Any]:
+    """
+    Statement and named parameters listing unreferenced content blobs
+
+    A content blob is unreferenced when no ai_analysis document's payloadRef
+    names it and it was neither saved nor deduplicated against since before
+    (blob_meta.referencedAt, epoch seconds). Chunk documents are excluded;
+    BlobStorage removes them with their manifest. Uses the
+    blob_content_keys and analysis_payload_refs indexes (cb_indexes.txt).
+    """
+    bucket_config = bucket_config or {}
+    keyspace = '`{}`.`{}`.`{}`'.format(bucket_config.get('bucket', 'cb_tools'),
+                                       bucket_config.get('analyzerScope', 'query'),
+                                       bucket_config.get('analyzerCollection', 'analyzer'))
+    statement = f'''
+        SELECT RAW META(b).id
+        FROM {keyspace} AS b
+        WHERE META(b).id LIKE $prefix
+          AND META(b).id NOT LIKE "%::chunk::%"
+          AND IFMISSINGORNULL(META(b).xattrs.blob_meta.referencedAt, META(b).xattrs.blob_meta.`timestamp`, 0) < $before
+          AND META(b).id NOT IN (
+              SELECT RAW a.payloadRef FROM {keyspace} AS a
+              WHERE a.docType = "ai_analysis" AND a.payloadRef LIKE $prefix)
+    '''
+    return {'statement': statement, 'params': {'prefix': CONTENT_KEY_PREFIX + '%', 'before': before}}
+
+
+def content_type_of(data: Any) -> str:
+    """blob_meta contentType of a value ('json', 'text' or 'binary')"""
+    if isinstance(data, (dict, list)):
+        return 'json'
+    if isinstance(data, (bytes, bytearray, memoryview)):
+        return 'binary'
+    return 'text'
+
+
+def iter_json(data: Any, depth: int = STREAM_JSON_DEPTH, canonical: bool = False) -> Iterator[str]:
+    """
+    json.dumps(data) in pieces
+
+    Lists and string-keyed dicts are opened up to depth levels and every
+    element is serialized by the C encoder, so no piece is much larger than
+    one element and the joined output equals json.dumps(data) - or, with
+    canonical, json.dumps(data, sort_keys=True, separators=(',', ':')).
+    """
+    options = {'sort_keys': True, 'separators': (',', ':')} if canonical else {}
+    item_sep, key_sep = (',', ':') if canonical else (', ', ': ')
+    if depth <= 0 or not isinstance(data, (list, dict)) or not data:
+        yield json.dumps(data, **options)
+    elif isinstance(data, list):
+        yield '['
+        for index, item in enumerate(data):
+            if index:
+                yield item_sep
+            yield from iter_json(item, depth - 1, canonical)
+        yield ']'
+    elif not all(isinstance(key, str) for key in data):
+        # json.dumps coerces non-string keys; leave that to it
+        yield json.dumps(data, **options)
+    else:
+        yield '{'
+        items = sorted(data.items()) if canonical else data.items()
+        for index, (key, value) in enumerate(items):
+            yield (item_sep if index else '') + json.dumps(key) + key_sep
+            yield from iter_json(value, depth - 1, canonical)
+        yield '}'
+
+
+def iter_encoded(data: Any, piece_bytes: int = STREAM_PIECE_BYTES,
+                 canonical: bool = False) -> Iterator[bytes]:
+    """Uncompressed blob bytes of data in pieces of about piece_bytes"""
+    if isinstance(data, (bytes, bytearray, memoryview)):
+        view = memoryview(data)
+        for start in range(0, len(view), piece_bytes):
+            yield view[start:start + piece_bytes]
+        return
+    if isinstance(data, (dict, list)):
+        buffer: List[str] = []
+        size = 0
+        for fragment in iter_json(data, canonical=canonical):
+            buffer.append(fragment)
+            size += len(fragment)
+            if size >= piece_bytes:
+                yield ''.join(buffer).encode('utf-8')
+                buffer, size = [], 0
+        if buffer:
+            yield ''.join(buffer).encode('utf-8')
+        return
+    text = data if isinstance(data, str) else str(data)
+    for start in range(0, len(text), piece_bytes):
+        yield text[start:start + piece_bytes].encode('utf-8')
+
+
+def encode_stream(data: Any,
+                  codec: str,
+                  level: Optional[int] = None,
+                  dictionary: Optional[bytes] = None,
+                  piece_bytes: int = STREAM_PIECE_BYTES,
+                  canonical: bool = False,
+                  hasher: Any = None) -> Tuple[bytes, str, int]:
+    """
+    Serialize and compress data in one pass
+
+    Args:
+        canonical: Serialize JSON with sorted keys and compact separators
+        hasher: hashlib object updated with the uncompressed bytes
+
+    Returns:
+        (compressed_bytes, content_type, original_size in bytes)
+    """
+    compressor = get_codec(codec).compressobj(level, dictionary)
+    output: List[bytes] = []
+    original_size = 0
+    for piece in iter_encoded(data, piece_bytes, canonical):
+        original_size += len(piece)
+        if hasher is not None:
+            hasher.update(piece)
+        output.append(compressor.compress(piece))
+    output.append(compressor.flush())
+    return b''.join(output), content_type_of(data), original_size
+
+
+def decode_stream(pieces: Iterable[bytes],
+                  codec: Optional[str],
+                  dictionary: Optional[bytes] = None) -> bytearray:
+    """Decompress compressed pieces (one blob, in order) into one buffer"""
+    decompressor = get_codec(codec).decompressobj(dictionary)
+    output = bytearray()
+    for piece in pieces:
+        output += decompressor.decompress(piece)
+    output += decompressor.flush()
+    return output
+
+
+# ============================================================================
+# Body header
+# ============================================================================
+
+def pack_body(header: Dict[str, Any], payload: bytes = b'') -> bytes:
+    """Blob body: BODY_MAGIC, header length, header JSON, payload"""
+    encoded = json.dumps(header, separators=(',', ':')).encode('utf-8')
+    return b''.join((BODY_MAGIC, struct.pack('>I', len(encoded)), encoded, payload))
+
+
+def unpack_body(body: bytes) -> Tuple[Optional[Dict[str, Any]], memoryview]:
+    """
+    (header, payload) of a blob body; header is None for bodies without one
+
+    Raises:
+        ValueError: If the header is truncated
+    """
+    view = memoryview(body)
+    if bytes(view[:len(BODY_MAGIC)]) != BODY_MAGIC:
+        return None, view
+    start = len(BODY_MAGIC) + 4
+    if len(view) < start:
+        raise ValueError('Truncated blob header')
+    (length,) = struct.unpack('>I', view[len(BODY_MAGIC):start])
+    if len(view) < start + length:
+        raise ValueError('Truncated blob header')
+    return json.loads(bytes(view[start:start + length])), view[start + length:]
@@ -4,92 +4,174 @@ Blob Storage Module for Couchbase
 Handles storage of large binary objects (blobs) with compression and XATTR metadata.
 
 Features:
-- Automatic compression (gzip) for large data
-- Stores metadata in XATTRs (extended attributes)
+- Pluggable compression (gzip, zstd with levels and trained dictionaries,
+  lz4; see blob_codecs.py), recorded per blob in blob_meta so older blobs
+  still load
+- Stores metadata in XATTRs (extended attributes) and as a header at the
+  start of the body, so loading a blob is a single get; load_many loads
+  several blobs concurrently
 - Supports JSON, strings, and binary data
-- Handles Couchbase 20MB limit check (warns if exceeded)
+- Content-addressed blobs (save_content_blob): the key is the hash of the
+  canonical bytes, so identical payloads are stored once and shared; every
+  save or dedup hit stamps blob_meta.referencedAt, and sweep_content_blobs
+  removes blobs no ai_analysis document references once they are older
+  than a grace period
+- Data is serialized once and compressed as it is serialized (streaming),
+  and decompressed piece by piece on load, so large datasets never hold
+  the uncompressed and compressed bytes side by side
+- Blobs above the chunk size are stored as ordered chunk documents behind a
+  manifest (see blob_chunks.py), so size is not bound by the 20MB limit
 """
 
-import gzip
+import hashlib
 import json
 import time
 from datetime import datetime
-from typing import Any, Dict, Tuple, Union, Optional
+from typing import Any, Dict, List, Tuple, Union, Optional
 import couchbase.subdocument as SD
 from couchbase.collection import Collection
-from couchbase.options import UpsertOptions
+from couchbase.options import QueryOptions, RemoveOptions, UpsertOptions
 from couchbase.transcoder import RawBinaryTranscoder
 from icecream import ic
 
+from blob_codecs import (
+    DictionaryCache,
+    available_codecs,
+    decode_stream,
+    default_codec,
+    build_sweep_query,
+    content_key,
+    dictionary_key,
+    encode_stream,
+    get_codec,
+    pack_body,
+    require_codec,
+    unpack_body
+)
+from blob_chunks import (
+    BLOB_CHUNK_BYTES,
+    chunk_keys,
+    chunk_manifest,
+    map_concurrently,
+    new_generation,
+    split_chunks,
+    verify_chunks
+)
+
 # 20MB limit in bytes (Couchbase Memcached limit)
 COUCHBASE_KV_LIMIT = 20 * 1024 * 1024
 
+# Concurrent blob loads in load_many
+BLOB_LOAD_WORKERS = 16
+
+# Unreferenced content blobs younger than this are kept (an analysis may be about to reference them)
+BLOB_SWEEP_GRACE_SECONDS = 24 * 60 * 60
+
 class BlobStorage:
     """
     Manages binary object storage in Couchbase with XATTR metadata
     """
     
-    def __init__(self):
-        pass
+    def __init__(self,
+                 chunk_bytes: int = BLOB_CHUNK_BYTES,
+                 codec: Optional[str] = None,
+                 level: Optional[int] = None):
+        """
+        Args:
+            chunk_bytes: Compressed size above which blobs are chunked
+            codec: Default codec name (default_codec(): LIQUID_SNAKE_BLOB_CODEC or gzip)
+            level: Default level of that codec (codec default if None)
+            
+        Raises:
+            ValueError: If the codec is unknown or its package is not installed
+        """
+        self.chunk_bytes = chunk_bytes
+        self.codec = codec or default_codec()
+        self.level = level
+        require_codec(self.codec)
+        self.dictionaries = DictionaryCache()
+        # Dictionary used for new saves with a dictionary-capable codec
+        self.dictionary_id: Optional[str] = None
 
-    def compress_data(self, data: Union[str, bytes, Dict, list]) -> Tuple[bytes, str, str]:
+    def use_dictionary(self, dictionary: bytes) -> str:
+        """Compress new saves with a trained dictionary; returns its dictionaryId"""
+        self.dictionary_id = self.dictionaries.add(dictionary)
+        return self.dictionary_id
+
+    def save_dictionary(self, collection: Collection, dictionary: bytes) -> str:
+        """
+        Store a dictionary next to the blobs that use it and make it the default
+        
+        Blobs only record the dictionaryId, so the dictionary document must
+        exist before blobs compressed with it are loaded elsewhere.
+        """
+        dict_id = self.use_dictionary(dictionary)
+        collection.upsert(
+            dictionary_key(dict_id),
+            bytes(dictionary),
+            UpsertOptions(transcoder=RawBinaryTranscoder())
+        )
+        ic(f"📖 Saved compression dictionary {dict_id}")
+        return dict_id
+
+    def _fetch_dictionary(self, collection: Collection) -> Any:
+        return lambda dict_id: collection.get(
+            dictionary_key(dict_id),
+            transcoder=RawBinaryTranscoder()
+        ).content_as[bytes]
+
+    def compress_data(self,
+                      data: Union[str, bytes, Dict, list],
+                      codec: Optional[str] = None,
+                      level: Optional[int] = None,
+                      dictionary: Optional[bytes] = None) -> Tuple[bytes, str, str]:
         """
         Compress data and return bytes, compression type, and original data type
         
         Args:
             data: Input data (string, bytes, or JSON-serializable object)
+            codec: Codec name (default: this instance's codec)
+            level: Codec level (default: this instance's level for its own codec)
+            dictionary: zstd dictionary bytes
             
         Returns:
             Tuple of (compressed_bytes, compression_type, content_type)
         """
-        content_type = 'binary'
-        bytes_data = b''
-        
-        # Convert input to bytes
-        if isinstance(data, str):
-            bytes_data = data.encode('utf-8')
-            content_type = 'text'
-        elif isinstance(data, (dict, list)):
-            bytes_data = json.dumps(data).encode('utf-8')
-            content_type = 'json'
-        elif isinstance(data, bytes):
-            bytes_data = data
-            content_type = 'binary'
-        else:
-            # Try string conversion for other types
-            bytes_data = str(data).encode('utf-8')
-            content_type = 'text'
-            
-        # Compress using gzip
-        # mtime=0 ensures deterministic output for same input
-        compressed_data = gzip.compress(bytes_data, mtime=0)
-        
-        return compressed_data, 'gzip', content_type
+        codec_name = codec or self.codec
+        if level is None and codec_name == self.codec:
+            level = self.level
+        compressed_data, content_type, _ = encode_stream(data, codec_name, level, dictionary)
+        return compressed_data, codec_name, content_type
 
-    def decompress_data(self, data: bytes, compression_type: str, content_type: str) -> Any:
+    def decompress_data(self,
+                        data: bytes,
+                        compression_type: str,
+                        content_type: str,
+                        dictionary: Optional[bytes] = None) -> Any:
         """
         Decompress data and convert back to original format
+        
+        Args:
+            data: Compressed bytes, or the compressed pieces of a chunked blob in order
         """
-        if compression_type == 'gzip':
-            decompressed = gzip.decompress(data)
-        elif compression_type == 'none' or not compression_type:
-            decompressed = data
-        else:
-            raise ValueError(f"Unsupported compression type: {compression_type}")
+        pieces = [data] if isinstance(data, (bytes, bytearray, memoryview)) else data
+        decompressed = decode_stream(pieces, compression_type, dictionary)
             
         # Convert back to original type
         if content_type == 'json':
-            return json.loads(decompressed.decode('utf-8'))
+            return json.loads(decompressed)
         elif content_type == 'text':
             return decompressed.decode('utf-8')
         else:
-            return decompressed
+            return bytes(decompressed)
 
     def save_blob(self, 
                   collection: Collection, 
                   key: str, 
                   data: Any, 
-                  metadata: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+                  metadata: Optional[Dict[str, Any]] = None,
+                  codec: Optional[str] = None,
+                  level: Optional[int] = None) -> Dict[str, Any]:
         """
         Save data as a compressed blob with XATTR metadata
         
@@ -98,77 +180,232 @@ class BlobStorage:
             key: Document key
             data: Data to store
             metadata: Additional custom metadata dict
+            codec: Codec name (default: this instance's codec)
+            level: Codec level (default: codec default)
             
         Returns:
             Dict with operation status and stats
         """
         try:
             start_time = time.time()
-            
-            # 1. Prepare data
-            compressed_bytes, compress_type, content_type = self.compress_data(data)
-            
-            original_size = len(str(data)) if isinstance(data, (str, bytes)) else len(json.dumps(data))
-            compressed_size = len(compressed_bytes)
-            compression_ratio = round((1 - (compressed_size / original_size)) * 100, 2) if original_size > 0 else 0
-            
-            ic(f"💾 Saving blob {key}: {original_size} -> {compressed_size} bytes ({compression_ratio}% saved)")
-            
-            # Check limit
-            if compressed_size > COUCHBASE_KV_LIMIT:
-                ic(f"❌ Error: Compressed data size ({compressed_size} bytes) exceeds Couchbase 20MB limit")
-                raise ValueError(f"Data too large: {compressed_size} bytes (limit: {COUCHBASE_KV_LIMIT})")
-            
-            # 2. Store binary body
-            # We use RawBinaryTranscoder to ensure bytes are stored as-is without SDK encoding
-            collection.upsert(
-                key, 
-                compressed_bytes, 
-                UpsertOptions(transcoder=RawBinaryTranscoder())
-            )
-            
-            # 3. Store Metadata in XATTRs
-            # We use a specific key 'blob_meta' to store our system metadata
-            blob_meta = {
-                'compression': compress_type,
-                'contentType': content_type,
-                'originalSize': original_size,
-                'compressedSize': compressed_size,
-                'updatedAt': datetime.utcnow().isoformat() + 'Z',
-                'timestamp': time.time()
+            encoded = self._prepare(data, codec, level)
+            return self._store(collection, key, encoded, metadata, start_time)
+        except Exception as e:
+            ic(f"💥 Error saving blob {key}: {str(e)}")
+            return {
+                'success': False,
+                'error': str(e)
             }
+
+    def save_content_blob(self,
+                          collection: Collection,
+                          data: Any,
+                          codec: Optional[str] = None,
+                          level: Optional[int] = None) -> Dict[str, Any]:
+        """
+        Save data under a content address (blob::sha256::<hash>)
+        
+        The key is the SHA-256 of the canonical encoding (JSON with sorted
+        keys), computed while compressing. If a complete blob with that key
+        already exists, nothing is uploaded; its blob_meta.referencedAt is
+        stamped instead, which keeps sweep_content_blobs away from it.
+        Content blobs are immutable and shared by every document that
+        references them.
+        
+        Returns:
+            Dict with operation status, 'key', 'deduplicated' and stats
+        """
+        try:
+            start_time = time.time()
+            hasher = hashlib.sha256()
+            encoded = self._prepare(data, codec, level, hasher)
+            key = content_key(hasher.hexdigest())
             
-            # Merge user metadata if provided
-            if metadata:
-                blob_meta['userMeta'] = metadata
-                
-            # Use mutate_in to set XATTR
-            # Store under key "blob_meta" in XATTRs
-            collection.mutate_in(
-                key,
-                [SD.upsert('blob_meta', blob_meta, xattr=True)]
-            )
-            
-            elapsed_ms = int((time.time() - start_time) * 1000)
+            # blob_meta is written last, so the stamp only succeeds on a complete blob
+            if self._touch(collection, key):
+                ic(f"♻️ Blob {key} already stored, skipping upload")
+                return {
+                    'success': True,
+                    'key': key,
+                    'deduplicated': True,
+                    'stats': {
+                        'original_size': encoded['original_size'],
+                        'elapsed_ms': int((time.time() - start_time) * 1000)
+                    }
+                }
             
+            result = self._store(collection, key, encoded, None, start_time,
+                                 {'contentSha256': hasher.hexdigest(), 'referencedAt': time.time()})
+            result['deduplicated'] = False
+            return result
+        except Exception as e:
+            ic(f"💥 Error saving content blob: {str(e)}")
             return {
-                'success': True,
-                'key': key,
-                'stats': {
-                    'original_size': original_size,
-                    'compressed_size': compressed_size,
-                    'ratio_percent': compression_ratio,
-                    'elapsed_ms': elapsed_ms
-                }
+                'success': False,
+                'error': str(e)
             }
-            
+
+    def _touch(self, collection: Collection, key: str) -> bool:
+        """Stamp blob_meta.referencedAt; False if the blob does not exist or is incomplete"""
+        try:
+            collection.mutate_in(key, [SD.upsert('blob_meta.referencedAt', time.time(), xattr=True)])
+            return True
+        except Exception:
+            return False
+
+    def sweep_content_blobs(self,
+                            cluster: Any,
+                            collection: Collection,
+                            bucket_config: Optional[Dict[str, Any]] = None,
+                            grace_seconds: float = BLOB_SWEEP_GRACE_SECONDS) -> Dict[str, Any]:
+        """
+        Remove content blobs that no ai_analysis document references
+        
+        Each candidate is removed with the CAS of a fresh lookup that still
+        shows it outside the grace period, so a blob that a concurrent save
+        deduplicated against (and stamped) in the meantime is kept.
+        
+        Returns:
+            Dict with operation status and 'removed' / 'kept' counts
+        """
+        try:
+            before = time.time() - grace_seconds
+            query = build_sweep_query(bucket_config, before)
+            candidates = list(cluster.query(query['statement'], QueryOptions(named_parameters=query['params'])))
+            removed = kept = 0
+            for key in candidates:
+                try:
+                    lookup = collection.lookup_in(key, [SD.get('blob_meta', xattr=True)])
+                    blob_meta = lookup.content_as[dict](0)
+                    if blob_meta.get('referencedAt', blob_meta.get('timestamp', 0)) >= before:
+                        kept += 1
+                        continue
+                    collection.remove(key, RemoveOptions(cas=lookup.cas))
+                except Exception as e:
+                    ic(f"⚠️ Kept blob {key}: {str(e)}")
+                    kept += 1
+                    continue
+                self._remove_keys(collection, chunk_keys(blob_meta))
+                removed += 1
+            ic(f"🧹 Blob sweep: removed {removed}, kept {kept}")
+            return {'success': True, 'removed': removed, 'kept': kept}
         except Exception as e:
-            ic(f"💥 Error saving blob {key}: {str(e)}")
+            ic(f"💥 Error sweeping blobs: {str(e)}")
             return {
                 'success': False,
                 'error': str(e)
             }
 
+    def _prepare(self, data: Any, codec: Optional[str], level: Optional[int],
+                 hasher: Any = None) -> Dict[str, Any]:
+        """Serialize and compress data with the requested (or default) codec and dictionary"""
+        codec_name = codec or self.codec
+        if level is None and codec_name == self.codec:
+            level = self.level
+        dict_id = self.dictionary_id if get_codec(codec_name).supports_dictionary else None
+        dictionary = self.dictionaries.get(dict_id) if dict_id else None
+        compressed_bytes, content_type, original_size = encode_stream(
+            data, codec_name, level, dictionary, canonical=hasher is not None, hasher=hasher)
+        return {
+            'compressed': compressed_bytes,
+            'codec': codec_name,
+            'level': get_codec(codec_name).level(level),
+            'dictionary_id': dict_id,
+            'content_type': content_type,
+            'original_size': original_size
+        }
+
+    def _store(self,
+               collection: Collection,
+               key: str,
+               encoded: Dict[str, Any],
+               metadata: Optional[Dict[str, Any]],
+               start_time: float,
+               extra_meta: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        """Write an encoded blob (single document or chunks) and its blob_meta XATTR"""
+        compressed_bytes = encoded['compressed']
+        original_size = encoded['original_size']
+        compressed_size = len(compressed_bytes)
+        compression_ratio = round((1 - (compressed_size / original_size)) * 100, 2) if original_size > 0 else 0
+        
+        ic(f"💾 Saving blob {key}: {original_size} -> {compressed_size} bytes ({compression_ratio}% saved)")
+        
+        # Chunks of a previous save are removed once the new blob is in place
+        previous_chunks = chunk_keys(self._lookup_meta(collection, key))
+        chunked = compressed_size > self.chunk_bytes
+        chunk_meta = {}
+        
+        # 1. Store chunks (the blob's own body then only carries the header)
+        # We use RawBinaryTranscoder to ensure bytes are stored as-is without SDK encoding
+        if chunked:
+            generation = new_generation()
+            chunks = split_chunks(key, compressed_bytes, generation, self.chunk_bytes)
+            try:
+                map_concurrently(lambda chunk: collection.upsert(
+                    chunk['key'],
+                    bytes(chunk['data']),
+                    UpsertOptions(transcoder=RawBinaryTranscoder())
+                ), chunks)
+            except Exception:
+                self._remove_keys(collection, [chunk['key'] for chunk in chunks])
+                raise
+            chunk_meta = chunk_manifest(compressed_bytes, chunks, generation)
+            ic(f"🧩 Wrote {len(chunks)} chunks for {key}")
+        
+        # 2. Metadata
+        # We use a specific key 'blob_meta' to store our system metadata
+        blob_meta = {
+            'compression': encoded['codec'],
+            'compressionLevel': encoded['level'],
+            'contentType': encoded['content_type'],
+            'originalSize': original_size,
+            'compressedSize': compressed_size,
+            'updatedAt': datetime.utcnow().isoformat() + 'Z',
+            'timestamp': time.time(),
+            **chunk_meta,
+            **(extra_meta or {})
+        }
+        if encoded['dictionary_id']:
+            blob_meta['dictionaryId'] = encoded['dictionary_id']
+        
+        # Merge user metadata if provided
+        if metadata:
+            blob_meta['userMeta'] = metadata
+        
+        # 3. Store body: blob_meta header + compressed bytes (none for chunked blobs),
+        # so a load needs a single get
+        collection.upsert(
+            key, 
+            pack_body(blob_meta, b'' if chunked else compressed_bytes), 
+            UpsertOptions(transcoder=RawBinaryTranscoder())
+        )
+            
+        # 4. Index the metadata in XATTRs (queries, existence checks)
+        # Store under key "blob_meta" in XATTRs
+        collection.mutate_in(
+            key,
+            [SD.upsert('blob_meta', blob_meta, xattr=True)]
+        )
+        
+        stale_chunks = [k for k in previous_chunks if k not in set(chunk_keys(blob_meta))]
+        if stale_chunks:
+            self._remove_keys(collection, stale_chunks)
+        
+        elapsed_ms = int((time.time() - start_time) * 1000)
+        
+        return {
+            'success': True,
+            'key': key,
+            'stats': {
+                'codec': encoded['codec'],
+                'original_size': original_size,
+                'compressed_size': compressed_size,
+                'ratio_percent': compression_ratio,
+                'chunks': len(chunk_meta.get('chunks', [])),
+                'elapsed_ms': elapsed_ms
+            }
+        }
+
     def load_blob(self, collection: Collection, key: str) -> Dict[str, Any]:
         """
         Load blob and metadata, automatically decompressing
@@ -181,31 +418,37 @@ class BlobStorage:
             Dict with 'data' and 'metadata'
         """
         try:
-            # 1. Get Metadata (XATTR)
-            # We try to lookup the blob_meta XATTR
-            try:
-                lookup_res = collection.lookup_in(
-                    key,
-                    [SD.get('blob_meta', xattr=True)]
-                )
-                blob_meta = lookup_res.content_as[dict](0)
-            except Exception as e:
-                ic(f"⚠️ No blob metadata found for {key}, assuming raw uncompressed data")
-                blob_meta = {}
-            
-            # 2. Get Binary Body
+            # 1. Get Binary Body (with its blob_meta header)
             # Use RawBinaryTranscoder to get bytes back
             get_res = collection.get(
                 key, 
                 transcoder=RawBinaryTranscoder()
             )
-            raw_bytes = get_res.content_as[bytes]
+            blob_meta, raw_bytes = unpack_body(get_res.content_as[bytes])
+            
+            # Bodies written before the header: metadata only lives in the XATTR
+            if blob_meta is None:
+                blob_meta = self._lookup_meta(collection, key)
+                if not blob_meta:
+                    ic(f"⚠️ No blob metadata found for {key}, assuming raw uncompressed data")
+            
+            # 2. Chunked blob: the body is a manifest, fetch the chunks in parallel
+            if blob_meta.get('chunked'):
+                pieces = map_concurrently(lambda chunk_key: collection.get(
+                    chunk_key,
+                    transcoder=RawBinaryTranscoder()
+                ).content_as[bytes], chunk_keys(blob_meta))
+                verify_chunks(blob_meta, pieces)
+                raw_bytes = pieces
             
             # 3. Decompress based on metadata
             compression = blob_meta.get('compression')
             content_type = blob_meta.get('contentType', 'binary')
+            dictionary = None
+            if blob_meta.get('dictionaryId'):
+                dictionary = self.dictionaries.get(blob_meta['dictionaryId'], self._fetch_dictionary(collection))
             
-            data = self.decompress_data(raw_bytes, compression, content_type)
+            data = self.decompress_data(raw_bytes, compression, content_type, dictionary)
             
             return {
                 'success': True,
@@ -223,6 +466,64 @@ class BlobStorage:
                 'error': str(e)
             }
 
+    def load_many(self,
+                  collection: Collection,
+                  keys: List[str],
+                  max_workers: int = BLOB_LOAD_WORKERS) -> Dict[str, Dict[str, Any]]:
+        """
+        Load several blobs concurrently
+        
+        Every blob is one get (plus its chunks), and the gets run in parallel,
+        so N blobs cost about one round trip instead of N sequential ones.
+        
+        Returns:
+            {key: load_blob result}, in the order of keys (duplicates loaded once)
+        """
+        unique = list(dict.fromkeys(keys))
+        results = map_concurrently(lambda key: self.load_blob(collection, key), unique, max_workers)
+        loaded = dict(zip(unique, results))
+        ic(f"📦 Loaded {sum(1 for r in results if r['success'])}/{len(unique)} blobs")
+        return loaded
+
+    def delete_blob(self, collection: Collection, key: str) -> Dict[str, Any]:
+        """
+        Remove a blob and, for chunked blobs, all of its chunks
+        
+        Returns:
+            Dict with operation status and the number of chunks removed
+        """
+        try:
+            stale_chunks = chunk_keys(self._lookup_meta(collection, key))
+            collection.remove(key)
+            self._remove_keys(collection, stale_chunks)
+            return {
+                'success': True,
+                'key': key,
+                'chunks': len(stale_chunks)
+            }
+        except Exception as e:
+            ic(f"💥 Error deleting blob {key}: {str(e)}")
+            return {
+                'success': False,
+                'error': str(e)
+            }
+
+    def _lookup_meta(self, collection: Collection, key: str) -> Dict[str, Any]:
+        """blob_meta XATTR of a key, empty if the document or XATTR does not exist"""
+        try:
+            return collection.lookup_in(key, [SD.get('blob_meta', xattr=True)]).content_as[dict](0)
+        except Exception:
+            return {}
+
+    def _remove_keys(self, collection: Collection, keys: list) -> None:
+        """Best-effort concurrent removal of chunk documents"""
+        def remove(chunk_key):
+            try:
+                collection.remove(chunk_key)
+            except Exception as e:
+                ic(f"⚠️ Could not remove chunk {chunk_key}: {str(e)}")
+        map_concurrently(remove, keys)
+
 # Global instance
 blob_storage = BlobStorage()
 
@@ -245,3 +546,8 @@ if __name__ == "__main__":
     c_str, algo_str, ctype_str = bs.compress_data(test_str)
     d_str = bs.decompress_data(c_str, algo_str, ctype_str)
     ic(f"String match: {d_str == test_str}")
+    
+    # Test every installed codec
+    for codec_name in available_codecs():
+        c_json, algo_json, ctype_json = bs.compress_data(test_data, codec=codec_name)
+        ic(f"{codec_name}: {len(c_json)} bytes, match: {bs.decompress_data(c_json, algo_json, ctype_json) == test_data}")
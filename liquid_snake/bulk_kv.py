@@ -0,0 +1,112 @@
+#!/usr/bin/env python3
+"""
+Bulk KV Module
+Batch get/upsert/remove of analyzer documents with a result per item
+
+Architecture:
+- One HTTP request carries a list of ids (or documents); the whole list
+  goes to the SDK's *_multi operations, which pipeline the KV requests
+  concurrently instead of one round trip after another
+- Failures are per item: the SDK returns successes and exceptions by key,
+  and every requested id gets its own {success, error} entry in request
+  order; one missing document never fails the batch
+- Duplicate ids are collapsed (the last document wins for saves) and the
+  batch size is capped at BULK_MAX_ITEMS
+- The collection is passed in, so this module has no SDK dependency;
+  not-found exception types are injected like in capture.CaptureStore
+"""
+
+from typing import Any, Callable, Dict, List, Tuple
+from icecream import ic
+
+# Upper bound on ids/documents per bulk request
+BULK_MAX_ITEMS = 1000
+
+
+def validate_ids(ids: Any) -> List[str]:
+    """
+    Unique document ids in request order
+
+    Raises:
+        ValueError: If ids is not a non-empty list of strings or is too long
+    """
+    if not isinstance(ids, list) or not ids:
+        raise ValueError('requestIds must be a non-empty list')
+    if not all(isinstance(key, str) and key for key in ids):
+        raise ValueError('requestIds must be non-empty strings')
+    unique = list(dict.fromkeys(ids))
+    if len(unique) > BULK_MAX_ITEMS:
+        raise ValueError(f'At most {BULK_MAX_ITEMS} documents per request')
+    return unique
+
+
+def validate_documents(documents: Any) -> Dict[str, Any]:
+    """
+    {requestId: data} from [{"requestId": ..., "data": {...}}, ...]
+
+    Raises:
+        ValueError: If an item has no requestId or the batch is too long
+    """
+    if not isinstance(documents, list) or not documents:
+        raise ValueError('documents must be a non-empty list')
+    docs: Dict[str, Any] = {}
+    for item in documents:
+        key = item.get('requestId') if isinstance(item, dict) else None
+        if not isinstance(key, str) or not key:
+            raise ValueError('Every document needs a requestId')
+        docs[key] = item.get('data', {})
+    if len(docs) > BULK_MAX_ITEMS:
+        raise ValueError(f'At most {BULK_MAX_ITEMS} documents per request')
+    return docs
+
+
+def _item_results(keys: List[str],
+                  multi_result: Any,
+                  value: Callable[[Any], Dict[str, Any]],
+                  not_found: Tuple[type, ...]) -> Dict[str, Any]:
+    results = getattr(multi_result, 'results', None) or {}
+    exceptions = getattr(multi_result, 'exceptions', None) or {}
+    items = []
+    for key in keys:
+        if key in results:
+            items.append({'requestId': key, 'success': True, **value(results[key])})
+            continue
+        error = exceptions.get(key)
+        item = {'requestId': key, 'success': False,
+                'error': str(error) if error is not None else 'No result returned'}
+        if not_found and isinstance(error, not_found):
+            item['error'] = 'Document not found'
+            item['status'] = 'not_found'
+        items.append(item)
+
+    succeeded = sum(1 for item in items if item['success'])
+    return {
+        'success': True,
+        'results': items,
+        'succeeded': succeeded,
+        'failed': len(items) - succeeded
+    }
+
+
+def bulk_get(collection: Any, keys: List[str], not_found: Tuple[type, ...] = ()) -> Dict[str, Any]:
+    """Fetch documents in one multi-get"""
+    multi = collection.get_multi(keys, return_exceptions=True)
+    response = _item_results(keys, multi, lambda r: {'data': r.content_as[dict]}, not_found)
+    ic(f"📦 Bulk load: {response['succeeded']}/{len(keys)} documents")
+    return response
+
+
+def bulk_upsert(collection: Any, docs: Dict[str, Any], not_found: Tuple[type, ...] = ()) -> Dict[str, Any]:
+    """Write documents in one multi-upsert"""
+    multi = collection.upsert_multi(docs, return_exceptions=True)
+    response = _item_results(list(docs), multi, lambda r: {'cas': r.cas}, not_found)
+    ic(f"📦 Bulk save: {response['succeeded']}/{len(docs)} documents")
+    return response
+
+
+def bulk_remove(collection: Any, keys: List[str], not_found: Tuple[type, ...] = ()) -> Dict[str, Any]:
+    """Delete documents in one multi-remove"""
+    multi = collection.remove_multi(keys, return_exceptions=True)
+    response = _item_results(keys, multi, lambda r: {}, not_found)
+    ic(f"📦 Bulk delete: {response['succeeded']}/{len(keys)} documents")
+    return response
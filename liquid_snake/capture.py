@@ -0,0 +1,519 @@
+#!/usr/bin/env python3
+"""
+Continuous Capture Module
+Polls system:completed_requests incrementally and keeps a rolling capture
+in the analyzer collection
+
+Architecture:
+- system:completed_requests is a per-node ring buffer, so each node keeps
+  its own watermark: the latest completion time seen (requestTime +
+  elapsedTime, computed by the query service). Rows are inserted when a
+  request completes, so a slow query that started long ago still lands
+  after the watermark
+- A poll only asks each known node for rows at or after its watermark
+  minus CAPTURE_OVERLAP_MS (nodes not seen yet are pulled in full); rows
+  in the overlap are dropped by requestId, so nothing is captured twice
+- New rows are appended as chunk documents, split by encoded size so a
+  burst of large plans never exceeds the 20MB document limit; the state
+  document (watermarks, chunk list, counts) is written after its chunks, so
+  a failed poll never references half-written data and the next poll simply
+  pulls again
+- Polls of one capture are serialized by a lock shared per capture id, and
+  the state is written with CAS where the store is given replace options;
+  chunk keys carry a per-write token, so a writer that loses the CAS race
+  removes only its own chunks
+- The capture is rolling: once it holds more than max_records, the oldest
+  chunks are removed
+- One daemon thread per capture (same pattern as ClusterPool's cleanup
+  thread); queries and collections come from injected functions, so this
+  module has no SDK dependency
+"""
+
+import hashlib
+import json
+import threading
+import uuid
+import time
+from datetime import datetime
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+from icecream import ic
+
+from cb_pool import normalize_host
+from collector import _normalize_row
+from dataset import CompletedRequestsDataset, DatasetBuilder
+
+# Default seconds between polls
+CAPTURE_INTERVAL_SECONDS = 30
+
+# Lower bound on the poll interval
+CAPTURE_MIN_INTERVAL_SECONDS = 5
+
+# Re-read this much before each node's watermark to catch late inserts
+CAPTURE_OVERLAP_MS = 5000
+
+# Records per chunk document
+CAPTURE_CHUNK_RECORDS = 2000
+
+# Encoded bytes per chunk document (well below the 20MB document limit)
+CAPTURE_CHUNK_BYTES = 8 * 1024 * 1024
+
+# A single record above this is stored without its plan
+CAPTURE_MAX_RECORD_BYTES = 16 * 1024 * 1024
+
+# Seconds a restart waits for the replaced capture's in-flight poll
+CAPTURE_STOP_TIMEOUT_SECONDS = 10
+
+# Records kept in a rolling capture before the oldest chunks are dropped
+CAPTURE_MAX_RECORDS = 500000
+
+CAPTURE_KEY_PREFIX = 'capture::'
+
+# Completion time of a request in epoch ms (0 if requestTime is unparseable)
+END_EXPRESSION = (
+    'IFMISSINGORNULL(STR_TO_MILLIS(requestTime), 0) + '
+    'IFMISSINGORNULL(STR_TO_DURATION(elapsedTime), 0) / 1000000'
+)
+
+CAPTURE_QUERY = (
+    'SELECT *, meta().plan, ' + END_EXPRESSION + ' AS capture_end_ms '
+    'FROM system:completed_requests{where}'
+)
+
+RunQuery = Callable[[str, Dict[str, Any]], Iterable[Any]]
+
+
+def capture_id_for(config: Dict[str, Any]) -> str:
+    """Stable capture id for a cluster (host and username; unaffected by password changes)"""
+    key = f"{normalize_host(config.get('url', ''))}|{config.get('username') or ''}"
+    return hashlib.sha256(key.encode('utf-8')).hexdigest()[:16]
+
+
+def build_capture_query(watermarks: Dict[str, Dict[str, Any]],
+                        overlap_ms: int = CAPTURE_OVERLAP_MS) -> Dict[str, Any]:
+    """
+    Statement and named parameters for one incremental poll
+
+    Each known node is bounded by its own watermark; unknown nodes are
+    pulled in full. Rows without a node share the '' watermark.
+    """
+    if not watermarks:
+        return {'statement': CAPTURE_QUERY.format(where=''), 'params': {}}
+
+    conditions = []
+    params: Dict[str, Any] = {}
+    known = sorted(node for node in watermarks if node)
+    for i, node in enumerate(known):
+        params[f'node{i}'] = node
+        params[f'since{i}'] = watermarks[node]['end_ms'] - overlap_ms
+        conditions.append(f'(node = $node{i} AND {END_EXPRESSION} >= $since{i})')
+    if '' in watermarks:
+        params['since_unknown'] = watermarks['']['end_ms'] - overlap_ms
+        conditions.append(f'(node IS NOT VALUED AND {END_EXPRESSION} >= $since_unknown)')
+    else:
+        conditions.append('node IS NOT VALUED')
+    params['known_nodes'] = known
+    conditions.append('node NOT IN $known_nodes')
+    return {
+        'statement': CAPTURE_QUERY.format(where=' WHERE ' + ' OR '.join(conditions)),
+        'params': params
+    }
+
+
+def select_new_rows(rows: Iterable[Any],
+                    watermarks: Dict[str, Dict[str, Any]],
+                    overlap_ms: int = CAPTURE_OVERLAP_MS) -> Tuple[List[Dict[str, Any]], Dict[str, Dict[str, Any]]]:
+    """
+    Drop rows already captured and advance the per-node watermarks
+
+    Args:
+        rows: Rows from build_capture_query's statement
+        watermarks: {node: {'end_ms': float, 'recent': {requestId: end_ms}}}
+
+    Returns:
+        Tuple of (new request dicts, updated watermarks)
+    """
+    marks = {node: {'end_ms': mark['end_ms'], 'recent': dict(mark.get('recent', {}))}
+             for node, mark in watermarks.items()}
+    new_requests = []
+
+    for row in rows:
+        end_ms = float(row.get('capture_end_ms') or 0) if isinstance(row, dict) else 0.0
+        request = _normalize_row(row)
+        if request is None:
+            continue
+        node = request.get('node') or ''
+        request_id = request.get('requestId')
+        mark = marks.setdefault(node, {'end_ms': 0.0, 'recent': {}})
+
+        # Older than the overlap window: captured by an earlier poll
+        if node in watermarks and end_ms < watermarks[node]['end_ms'] - overlap_ms:
+            continue
+        if request_id is not None:
+            if request_id in mark['recent']:
+                continue
+            mark['recent'][request_id] = end_ms
+        new_requests.append(request)
+        mark['end_ms'] = max(mark['end_ms'], end_ms)
+
+    # Only ids inside the next overlap window can come back
+    for mark in marks.values():
+        cutoff = mark['end_ms'] - overlap_ms
+        mark['recent'] = {rid: end for rid, end in mark['recent'].items() if end >= cutoff}
+
+    return new_requests, marks
+
+
+class CaptureConflict(Exception):
+    """The capture state changed under a poll (another writer got there first)"""
+
+
+_poll_locks: Dict[str, threading.Lock] = {}
+_poll_locks_guard = threading.Lock()
+
+
+def poll_lock_for(capture_id: str) -> threading.Lock:
+    """One lock per capture id, shared by every job polling that capture"""
+    with _poll_locks_guard:
+        return _poll_locks.setdefault(capture_id, threading.Lock())
+
+
+def _encoded_size(record: Dict[str, Any]) -> int:
+    return len(json.dumps(record, default=str).encode('utf-8'))
+
+
+def split_chunks(records: List[Dict[str, Any]],
+                 chunk_records: int = CAPTURE_CHUNK_RECORDS,
+                 chunk_bytes: int = CAPTURE_CHUNK_BYTES,
+                 max_record_bytes: int = CAPTURE_MAX_RECORD_BYTES) -> List[List[Dict[str, Any]]]:
+    """
+    Group records into chunks bounded by count and by encoded bytes
+
+    A record over max_record_bytes is kept without its plan (flagged with
+    plan_dropped), so one huge plan cannot block the capture.
+    """
+    batches: List[List[Dict[str, Any]]] = []
+    batch: List[Dict[str, Any]] = []
+    batch_bytes = 0
+    for record in records:
+        size = _encoded_size(record)
+        if size > max_record_bytes and record.get('plan'):
+            ic(f"⚠️ Capture record {record.get('requestId')} is {size:,} bytes; storing it without its plan")
+            record = {**record, 'plan': None, 'plan_dropped': True}
+            size = _encoded_size(record)
+        if batch and (len(batch) >= chunk_records or batch_bytes + size > chunk_bytes):
+            batches.append(batch)
+            batch, batch_bytes = [], 0
+        batch.append(record)
+        batch_bytes += size
+    if batch:
+        batches.append(batch)
+    return batches
+
+
+class CaptureStore:
+    """
+    Rolling capture documents in the analyzer collection
+
+    capture::<id> holds the state; capture::<id>::<seq>-<token> holds the records.
+    """
+
+    def __init__(self,
+                 get_collection: Callable[[], Any],
+                 not_found: Tuple[type, ...] = (KeyError,),
+                 replace_options: Optional[Callable[[int], Any]] = None,
+                 cas_mismatch: Tuple[type, ...] = (),
+                 exists: Tuple[type, ...] = ()):
+        """
+        Args:
+            get_collection: Returns the analyzer collection (called per operation)
+            not_found: Exception types meaning the document does not exist
+            replace_options: Builds replace options guarded by a CAS; without
+                it the state is upserted unconditionally
+            cas_mismatch: Exception types raised when the CAS no longer matches
+            exists: Exception types raised when inserting an existing document
+        """
+        self._get_collection = get_collection
+        self._not_found = not_found
+        self._replace_options = replace_options
+        self._conflicts = tuple(cas_mismatch) + tuple(exists) + (tuple(not_found) if replace_options else ())
+
+    @staticmethod
+    def state_key(capture_id: str) -> str:
+        return f'{CAPTURE_KEY_PREFIX}{capture_id}'
+
+    def load_state(self, capture_id: str) -> Optional[Dict[str, Any]]:
+        return self.load_state_cas(capture_id)[0]
+
+    def load_state_cas(self, capture_id: str) -> Tuple[Optional[Dict[str, Any]], Optional[int]]:
+        """(state, cas); (None, None) if there is no capture"""
+        try:
+            result = self._get_collection().get(self.state_key(capture_id))
+        except self._not_found:
+            return None, None
+        return result.content_as[dict], getattr(result, 'cas', None)
+
+    def _write_state(self, collection: Any, state: Dict[str, Any], cas: Optional[int]) -> None:
+        key = self.state_key(state['capture_id'])
+        if self._replace_options is None:
+            collection.upsert(key, state)
+        elif cas is None:
+            collection.insert(key, state)
+        else:
+            collection.replace(key, state, self._replace_options(cas))
+
+    def _remove_chunks(self, collection: Any, chunks: List[Dict[str, Any]]) -> None:
+        for chunk in chunks:
+            try:
+                collection.remove(chunk['key'])
+            except self._not_found:
+                pass
+
+    def append(self, state: Dict[str, Any], records: List[Dict[str, Any]],
+               chunk_records: int = CAPTURE_CHUNK_RECORDS,
+               max_records: int = CAPTURE_MAX_RECORDS,
+               chunk_bytes: int = CAPTURE_CHUNK_BYTES,
+               cas: Optional[int] = None) -> Dict[str, Any]:
+        """
+        Write records as new chunks, trim the oldest chunks, then write the state
+
+        Args:
+            cas: CAS of the state that was loaded (None for a new capture)
+
+        Returns:
+            The updated state document
+
+        Raises:
+            CaptureConflict: The state changed since it was loaded; the
+                chunks written by this call are removed again
+        """
+        collection = self._get_collection()
+        state = dict(state)
+        chunks = list(state.get('chunks', []))
+        seq = state.get('next_seq', 0)
+        token = uuid.uuid4().hex[:8]
+        written: List[Dict[str, Any]] = []
+
+        try:
+            for batch in split_chunks(records, chunk_records, chunk_bytes):
+                key = f"{self.state_key(state['capture_id'])}::{seq}-{token}"
+                collection.upsert(key, {
+                    'type': 'capture_chunk',
+                    'capture_id': state['capture_id'],
+                    'records': batch,
+                    'created': datetime.utcnow().isoformat() + 'Z'
+                })
+                written.append({'key': key, 'count': len(batch)})
+                seq += 1
+        except Exception:
+            self._remove_chunks(collection, written)
+            raise
+        chunks.extend(written)
+
+        dropped = []
+        while len(chunks) > 1 and sum(c['count'] for c in chunks) > max_records:
+            dropped.append(chunks.pop(0))
+
+        state['chunks'] = chunks
+        state['next_seq'] = seq
+        state['record_count'] = sum(c['count'] for c in chunks)
+        state['updated'] = datetime.utcnow().isoformat() + 'Z'
+        try:
+            self._write_state(collection, state, cas)
+        except self._conflicts as e:
+            self._remove_chunks(collection, written)
+            raise CaptureConflict(f"Capture {state['capture_id']} changed during the poll; retrying next poll") from e
+        except Exception:
+            self._remove_chunks(collection, written)
+            raise
+
+        self._remove_chunks(collection, dropped)
+        return state
+
+    def load_dataset(self, capture_id: str, keep_plans: bool = True) -> Optional[CompletedRequestsDataset]:
+        """Rebuild the rolling capture as a dataset (None if there is no capture)"""
+        state = self.load_state(capture_id)
+        if state is None:
+            return None
+        collection = self._get_collection()
+        builder = DatasetBuilder(keep_plans=keep_plans)
+        for chunk in state.get('chunks', []):
+            try:
+                records = collection.get(chunk['key']).content_as[dict].get('records', [])
+            except self._not_found:
+                ic(f"⚠️ Capture chunk {chunk['key']} is missing")
+                continue
+            for record in records:
+                builder.append(record)
+        return builder.build()
+
+    def delete(self, capture_id: str) -> bool:
+        """Remove the state and all chunks; False if there was no capture"""
+        state = self.load_state(capture_id)
+        if state is None:
+            return False
+        collection = self._get_collection()
+        self._remove_chunks(collection, state.get('chunks', []))
+        collection.remove(self.state_key(capture_id))
+        return True
+
+
+class CaptureJob:
+    """
+    Scheduled incremental capture of one cluster
+    """
+
+    def __init__(self,
+                 capture_id: str,
+                 label: str,
+                 run_query: RunQuery,
+                 store: CaptureStore,
+                 interval_seconds: float = CAPTURE_INTERVAL_SECONDS,
+                 max_records: int = CAPTURE_MAX_RECORDS,
+                 on_error: Optional[Callable[[Exception], None]] = None):
+        self.capture_id = capture_id
+        self.label = label
+        self.run_query = run_query
+        self.store = store
+        self.interval_seconds = max(CAPTURE_MIN_INTERVAL_SECONDS, interval_seconds)
+        self.max_records = max_records
+        self.on_error = on_error
+        self.polls = 0
+        self.last_poll: Optional[float] = None
+        self.last_new = 0
+        self.last_error: Optional[str] = None
+        self.record_count = 0
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._poll_lock = poll_lock_for(capture_id)
+
+    def poll_once(self) -> int:
+        """
+        Pull new rows once and append them to the capture
+
+        Returns:
+            Number of new records captured
+        """
+        with self._poll_lock:
+            state, cas = self.store.load_state_cas(self.capture_id)
+            state = state or {
+                'type': 'capture',
+                'capture_id': self.capture_id,
+                'cluster': self.label,
+                'watermarks': {},
+                'chunks': [],
+                'next_seq': 0,
+                'record_count': 0,
+                'created': datetime.utcnow().isoformat() + 'Z'
+            }
+            query = build_capture_query(state['watermarks'])
+            rows = self.run_query(query['statement'], query['params'])
+            new_requests, watermarks = select_new_rows(rows, state['watermarks'])
+
+            state['watermarks'] = watermarks
+            state = self.store.append(state, new_requests, max_records=self.max_records, cas=cas)
+
+            self.polls += 1
+            self.last_poll = time.time()
+            self.last_new = len(new_requests)
+            self.last_error = None
+            self.record_count = state['record_count']
+            if new_requests:
+                ic(f"📡 Capture {self.label}: +{len(new_requests)} records ({self.record_count} total)")
+            return len(new_requests)
+
+    def _run(self) -> None:
+        while not self._stop.is_set():
+            try:
+                self.poll_once()
+            except Exception as e:
+                self.last_error = str(e)
+                ic(f"⚠️ Capture {self.label} poll failed", str(e))
+                if self.on_error:
+                    self.on_error(e)
+            self._stop.wait(self.interval_seconds)
+
+    def start(self) -> None:
+        """Start polling in a daemon thread (first poll runs immediately)"""
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: Optional[float] = None) -> None:
+        self._stop.set()
+        if self._thread and timeout is not None:
+            self._thread.join(timeout)
+
+    @property
+    def running(self) -> bool:
+        return bool(self._thread and self._thread.is_alive() and not self._stop.is_set())
+
+    def status(self) -> Dict[str, Any]:
+        return {
+            'capture_id': self.capture_id,
+            'cluster': self.label,
+            'running': self.running,
+            'interval_seconds': self.interval_seconds,
+            'polls': self.polls,
+            'last_poll': datetime.utcfromtimestamp(self.last_poll).isoformat() + 'Z' if self.last_poll else None,
+            'last_new': self.last_new,
+            'record_count': self.record_count,
+            'max_records': self.max_records,
+            'last_error': self.last_error
+        }
+
+
+class CaptureScheduler:
+    """
+    Registry of running captures, one per cluster
+    """
+
+    def __init__(self):
+        self._jobs: Dict[str, CaptureJob] = {}
+        self._lock = threading.Lock()
+
+    def start(self, job: CaptureJob) -> CaptureJob:
+        """
+        Start a capture, replacing any capture already running for the same cluster
+
+        The replaced job is joined (bounded); a poll still running after that
+        holds the capture's shared poll lock, so the new job waits for it.
+        """
+        with self._lock:
+            previous = self._jobs.get(job.capture_id)
+            self._jobs[job.capture_id] = job
+        if previous:
+            previous.stop(CAPTURE_STOP_TIMEOUT_SECONDS)
+        job.start()
+        ic(f"📡 Capture started for {job.label} every {job.interval_seconds}s")
+        return job
+
+    def stop(self, capture_id: str) -> bool:
+        with self._lock:
+            job = self._jobs.pop(capture_id, None)
+        if not job:
+            return False
+        job.stop()
+        ic(f"🛑 Capture stopped for {job.label}")
+        return True
+
+    def get(self, capture_id: str) -> Optional[CaptureJob]:
+        with self._lock:
+            return self._jobs.get(capture_id)
+
+    def stop_all(self) -> None:
+        with self._lock:
+            jobs = list(self._jobs.values())
+            self._jobs.clear()
+        for job in jobs:
+            job.stop()
+
+    def status(self) -> List[Dict[str, Any]]:
+        with self._lock:
+            jobs = list(self._jobs.values())
+        return [job.status() for job in jobs]
+
+
+# Global scheduler
+capture_scheduler = CaptureScheduler()
@@ -0,0 +1,572 @@
+#!/usr/bin/env python3
+"""
+Couchbase Cluster Pool Module
+Keeps one connection per cluster so switching clusters does not reconnect
+
+Architecture:
+- Connections are keyed by a fingerprint of the normalized config
+  (host, username, password hash); other config fields do not matter
+- The pool lock only guards the entry map; connecting (and its blocking
+  wait_until_ready) happens under a per-fingerprint lock, so a slow cluster
+  never blocks requests for the others and is connected only once
+- Each entry tracks health: a request that hits a connection-level error
+  marks it unhealthy and the next get() reconnects; failed connects are
+  not retried for CONNECT_RETRY_SECONDS. An ordinary timeout (a slow query
+  or KV op) does not: probe() runs the injected health probe (e.g. SDK
+  diagnostics) and only a failed probe marks the entry unhealthy
+- A replaced connection is retired, not closed: other requests (e.g. a
+  stream in progress) may still hold it, so it is closed by the idle sweep
+  once it has been retired for idle_seconds
+- Idle entries are closed by a background thread (same pattern as
+  ai_analyzer.SessionCache); the least recently used entry is closed when
+  the pool is full
+- CollectionResolver caches bucket/scope/collection handles per connection
+  and bucketConfig, and pre-opens known buckets in the background when a
+  connection is made (wired through the pool's on_connect/on_close hooks)
+- AsyncClusterPool is the same pool for the asyncio server (asgi_app.py):
+  connects are awaited under a per-fingerprint asyncio.Lock and idle
+  entries are evicted from get() instead of a background thread, since
+  async clusters belong to the event loop
+- The connect function is injected, so this module has no SDK dependency
+"""
+
+import asyncio
+import hashlib
+import inspect
+import json
+import threading
+import time
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Set, Tuple
+from icecream import ic
+
+# Close connections unused for this long
+POOL_IDLE_SECONDS = 30 * 60
+
+# Upper bound on open cluster connections
+POOL_MAX_CLUSTERS = 8
+
+# After a failed connect, return None for this long instead of reconnecting
+CONNECT_RETRY_SECONDS = 5
+
+# bucketConfig defaults (config.json.template)
+DEFAULT_BUCKET_CONFIG = {
+    'bucket': 'cb_tools',
+    'analyzerScope': 'query',
+    'analyzerCollection': 'analyzer',
+    'preferencesScope': '_default',
+    'preferencesCollection': '_default'
+}
+
+# bucketConfig keys naming the scope and collection of each kind of document
+COLLECTION_KINDS = {
+    'analyzer': ('analyzerScope', 'analyzerCollection'),
+    'preferences': ('preferencesScope', 'preferencesCollection')
+}
+
+
+def normalize_host(url: str) -> str:
+    """Hostname/IP from a cluster URL (protocol and port stripped, lowercased)"""
+    host = (url or '').strip()
+    for prefix in ('couchbases://', 'couchbase://', 'https://', 'http://'):
+        if host.lower().startswith(prefix):
+            host = host[len(prefix):]
+            break
+    return host.split('/')[0].split(':')[0].lower()
+
+
+def config_fingerprint(config: Dict[str, Any]) -> str:
+    """Stable pool key for a cluster config; the password only enters as a hash"""
+    normalized = {
+        'host': normalize_host(config.get('url', '')),
+        'username': config.get('username') or '',
+        'password': hashlib.sha256((config.get('password') or '').encode('utf-8')).hexdigest()
+    }
+    return hashlib.sha256(json.dumps(normalized, sort_keys=True).encode('utf-8')).hexdigest()
+
+
+class PoolEntry:
+    """
+    One cluster connection and its health
+    """
+
+    def __init__(self, fingerprint: str, label: str):
+        self.fingerprint = fingerprint
+        self.label = label
+        self.cluster: Any = None
+        self.healthy = False
+        self.connected_at: Optional[float] = None
+        self.last_used = time.time()
+        self.failures = 0
+        self.failed_at: Optional[float] = None
+        self.last_error: Optional[str] = None
+        self.connect_lock = threading.Lock()
+
+    def to_dict(self, now: float) -> Dict[str, Any]:
+        return {
+            'cluster': self.label,
+            'healthy': self.healthy,
+            'connected_seconds': round(now - self.connected_at, 1) if self.connected_at else None,
+            'idle_seconds': round(now - self.last_used, 1),
+            'failures': self.failures,
+            'last_error': self.last_error
+        }
+
+
+class ClusterPool:
+    """
+    Thread-safe pool of cluster connections keyed by config fingerprint
+    """
+
+    def __init__(self,
+                 connect: Callable[[Dict[str, Any]], Any],
+                 idle_seconds: float = POOL_IDLE_SECONDS,
+                 max_clusters: int = POOL_MAX_CLUSTERS,
+                 cleanup_interval_seconds: Optional[float] = 60,
+                 probe: Optional[Callable[[Any], Any]] = None):
+        """
+        Initialize pool
+
+        Args:
+            connect: Opens a ready cluster for a config, raising on failure
+            idle_seconds: Idle time after which a connection is closed
+            max_clusters: Maximum number of open connections
+            cleanup_interval_seconds: How often to close idle connections (None: never)
+            probe: Raises if a cluster's connection is down (used by probe())
+        """
+        self._connect = connect
+        self._probe = probe
+        self._entries: Dict[str, PoolEntry] = {}
+        # (retired at, cluster) of replaced connections awaiting the idle sweep
+        self._retired: List[Tuple[float, Any]] = []
+        self._lock = threading.Lock()
+        self.idle_seconds = idle_seconds
+        self.max_clusters = max_clusters
+        # Called with each newly connected cluster (e.g. to warm handle caches)
+        self.on_connect: List[Callable[[Any, Dict[str, Any]], None]] = []
+        # Called with each cluster before it is closed
+        self.on_close: List[Callable[[Any], None]] = []
+
+        if cleanup_interval_seconds:
+            self._start_cleanup_thread(cleanup_interval_seconds)
+
+    def _start_cleanup_thread(self, interval: float) -> None:
+        """Start background thread that closes idle connections"""
+        def cleanup_worker():
+            while True:
+                time.sleep(interval)
+                self.evict_idle()
+
+        thread = threading.Thread(target=cleanup_worker, daemon=True)
+        thread.start()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def _close(self, cluster: Any) -> None:
+        for callback in self.on_close:
+            try:
+                callback(cluster)
+            except Exception as e:
+                ic("⚠️ Pool close callback failed", str(e))
+        try:
+            cluster.close()
+        except Exception:
+            pass
+
+    def get(self, config: Dict[str, Any]) -> Any:
+        """
+        Cluster for a config, connecting on first use
+
+        Returns:
+            Connected cluster, or None if the connect failed
+        """
+        fingerprint = config_fingerprint(config)
+        with self._lock:
+            entry = self._entries.get(fingerprint)
+            if entry is None:
+                entry = self._entries[fingerprint] = PoolEntry(
+                    fingerprint, f"{config.get('username')}@{normalize_host(config.get('url', ''))}"
+                )
+            entry.last_used = time.time()
+            if entry.healthy:
+                return entry.cluster
+
+        with entry.connect_lock:
+            # Another thread may have connected while we waited
+            if entry.healthy:
+                return entry.cluster
+            if entry.failed_at and time.time() - entry.failed_at < CONNECT_RETRY_SECONDS:
+                return None
+
+            stale = entry.cluster
+            try:
+                ic(f"🔌 Pool connecting to {entry.label}")
+                cluster = self._connect(config)
+            except Exception as e:
+                entry.failures += 1
+                entry.failed_at = time.time()
+                entry.last_error = str(e)
+                ic(f"❌ Pool connect to {entry.label} failed", str(e))
+                return None
+
+            with self._lock:
+                entry.cluster = cluster
+                entry.healthy = True
+                entry.connected_at = entry.last_used = time.time()
+                entry.failed_at = None
+                if stale is not None:
+                    self._retired.append((time.time(), stale))
+                evicted = self._evict_over_capacity(keep=fingerprint)
+
+            ic(f"✅ Pool connected to {entry.label}", len(self._entries))
+
+        for old in evicted:
+            self._close(old)
+        for callback in self.on_connect:
+            try:
+                callback(cluster, config)
+            except Exception as e:
+                ic("⚠️ Pool connect callback failed", str(e))
+        return cluster
+
+    def _evict_over_capacity(self, keep: str) -> List[Any]:
+        """Drop least recently used connected entries above max_clusters (caller holds the lock)"""
+        evicted = []
+        connected = sorted(
+            (e for e in self._entries.values() if e.cluster is not None and e.fingerprint != keep),
+            key=lambda e: e.last_used
+        )
+        while connected and len(connected) + 1 > self.max_clusters:
+            entry = connected.pop(0)
+            del self._entries[entry.fingerprint]
+            evicted.append(entry.cluster)
+            ic(f"🗑️ Pool evicted {entry.label} (capacity)")
+        return evicted
+
+    def mark_unhealthy(self, config: Dict[str, Any], error: Any = None) -> None:
+        """Force the next get() for this config to reconnect"""
+        with self._lock:
+            entry = self._entries.get(config_fingerprint(config))
+            if entry is None:
+                return
+            entry.healthy = False
+            entry.failures += 1
+            entry.last_error = str(error) if error is not None else entry.last_error
+        ic(f"⚠️ Pool marked {entry.label} unhealthy", str(error))
+
+    def probe(self, config: Dict[str, Any], error: Any = None) -> bool:
+        """
+        Check a pooled cluster after an error that may or may not be connection-level
+
+        Runs the injected probe against the current connection (never
+        connects); only a failing probe marks the entry unhealthy.
+
+        Returns:
+            False if the entry was marked unhealthy
+        """
+        with self._lock:
+            entry = self._entries.get(config_fingerprint(config))
+            cluster = entry.cluster if entry is not None and entry.healthy else None
+        if cluster is None or self._probe is None:
+            return True
+        try:
+            self._probe(cluster)
+            return True
+        except Exception as e:
+            self.mark_unhealthy(config, f"{error} (probe: {e})" if error is not None else e)
+            return False
+
+    def evict_idle(self) -> int:
+        """
+        Close connections idle longer than idle_seconds, and replaced
+        connections retired for that long
+
+        Returns:
+            How many connections were closed
+        """
+        now = time.time()
+        with self._lock:
+            idle = [e for e in self._entries.values() if now - e.last_used > self.idle_seconds]
+            for entry in idle:
+                del self._entries[entry.fingerprint]
+            retired = [cluster for retired_at, cluster in self._retired if now - retired_at > self.idle_seconds]
+            self._retired = [(t, c) for t, c in self._retired if now - t <= self.idle_seconds]
+
+        for entry in idle:
+            if entry.cluster is not None:
+                self._close(entry.cluster)
+        for cluster in retired:
+            self._close(cluster)
+        if idle or retired:
+            ic(f"🧹 Pool closed {len(idle)} idle and {len(retired)} retired connection(s)", [e.label for e in idle])
+        return len(idle) + len(retired)
+
+    def close_all(self) -> None:
+        """Close every connection"""
+        with self._lock:
+            entries = list(self._entries.values())
+            self._entries.clear()
+            retired = [cluster for _, cluster in self._retired]
+            self._retired = []
+        for entry in entries:
+            if entry.cluster is not None:
+                self._close(entry.cluster)
+        for cluster in retired:
+            self._close(cluster)
+
+    def stats(self) -> Dict[str, Any]:
+        """Get pool statistics (no credentials)"""
+        now = time.time()
+        with self._lock:
+            entries = [entry.to_dict(now) for entry in self._entries.values()]
+        return {
+            'clusters': entries,
+            'connected': sum(1 for e in entries if e['healthy']),
+            'retired': len(self._retired),
+            'max_clusters': self.max_clusters,
+            'idle_seconds': self.idle_seconds
+        }
+
+
+class AsyncClusterPool(ClusterPool):
+    """
+    ClusterPool for async clusters (acouchbase), used from one event loop
+    """
+
+    def __init__(self,
+                 connect: Callable[[Dict[str, Any]], Awaitable[Any]],
+                 idle_seconds: float = POOL_IDLE_SECONDS,
+                 max_clusters: int = POOL_MAX_CLUSTERS,
+                 cleanup_interval_seconds: Optional[float] = 60,
+                 probe: Optional[Callable[[Any], Awaitable[Any]]] = None):
+        """
+        Initialize pool
+
+        Args:
+            connect: Coroutine function opening a ready cluster for a config, raising on failure
+            idle_seconds: Idle time after which a connection is closed
+            max_clusters: Maximum number of open connections
+            cleanup_interval_seconds: Minimum time between idle sweeps run by get() (None: never)
+            probe: Coroutine function raising if a cluster's connection is down
+        """
+        super().__init__(connect, idle_seconds, max_clusters, cleanup_interval_seconds=None, probe=probe)
+        self.cleanup_interval_seconds = cleanup_interval_seconds
+        self._last_cleanup = time.time()
+        self._connect_locks: Dict[str, asyncio.Lock] = {}
+
+    def _close(self, cluster: Any) -> None:
+        for callback in self.on_close:
+            try:
+                callback(cluster)
+            except Exception as e:
+                ic("⚠️ Pool close callback failed", str(e))
+        try:
+            closing = cluster.close()
+            if inspect.isawaitable(closing):
+                asyncio.ensure_future(closing)
+        except Exception:
+            pass
+
+    async def probe(self, config: Dict[str, Any], error: Any = None) -> bool:
+        """Async ClusterPool.probe (awaits the injected probe)"""
+        with self._lock:
+            entry = self._entries.get(config_fingerprint(config))
+            cluster = entry.cluster if entry is not None and entry.healthy else None
+        if cluster is None or self._probe is None:
+            return True
+        try:
+            result = self._probe(cluster)
+            if inspect.isawaitable(result):
+                await result
+            return True
+        except Exception as e:
+            self.mark_unhealthy(config, f"{error} (probe: {e})" if error is not None else e)
+            return False
+
+    async def get(self, config: Dict[str, Any]) -> Any:
+        """
+        Cluster for a config, connecting on first use
+
+        Returns:
+            Connected cluster, or None if the connect failed
+        """
+        if self.cleanup_interval_seconds and time.time() - self._last_cleanup > self.cleanup_interval_seconds:
+            self._last_cleanup = time.time()
+            self.evict_idle()
+
+        fingerprint = config_fingerprint(config)
+        with self._lock:
+            entry = self._entries.get(fingerprint)
+            if entry is None:
+                entry = self._entries[fingerprint] = PoolEntry(
+                    fingerprint, f"{config.get('username')}@{normalize_host(config.get('url', ''))}"
+                )
+            entry.last_used = time.time()
+            if entry.healthy:
+                return entry.cluster
+            connect_lock = self._connect_locks.setdefault(fingerprint, asyncio.Lock())
+
+        async with connect_lock:
+            # Another task may have connected while we waited
+            if entry.healthy:
+                return entry.cluster
+            if entry.failed_at and time.time() - entry.failed_at < CONNECT_RETRY_SECONDS:
+                return None
+
+            stale = entry.cluster
+            try:
+                ic(f"🔌 Pool connecting to {entry.label}")
+                cluster = await self._connect(config)
+            except Exception as e:
+                entry.failures += 1
+                entry.failed_at = time.time()
+                entry.last_error = str(e)
+                ic(f"❌ Pool connect to {entry.label} failed", str(e))
+                return None
+
+            with self._lock:
+                entry.cluster = cluster
+                entry.healthy = True
+                entry.connected_at = entry.last_used = time.time()
+                entry.failed_at = None
+                if stale is not None:
+                    self._retired.append((time.time(), stale))
+                evicted = self._evict_over_capacity(keep=fingerprint)
+
+            ic(f"✅ Pool connected to {entry.label}", len(self._entries))
+
+        for old in evicted:
+            self._close(old)
+        for callback in self.on_connect:
+            try:
+                callback(cluster, config)
+            except Exception as e:
+                ic("⚠️ Pool connect callback failed", str(e))
+        return cluster
+
+
+# (bucket, scope, collection)
+Keyspace = Tuple[str, str, str]
+
+
+def resolve_keyspace(bucket_config: Optional[Dict[str, Any]], kind: str = 'analyzer') -> Keyspace:
+    """bucket.scope.collection for a kind of document, defaulting missing bucketConfig keys"""
+    bucket_config = bucket_config or {}
+    scope_key, collection_key = COLLECTION_KINDS[kind]
+
+    def value(key: str) -> str:
+        return bucket_config.get(key) or DEFAULT_BUCKET_CONFIG[key]
+
+    return value('bucket'), value(scope_key), value(collection_key)
+
+
+class CollectionResolver:
+    """
+    Cache of bucket and collection handles per cluster connection
+    """
+
+    def __init__(self, warm_defaults: bool = True):
+        """
+        Initialize resolver
+
+        Args:
+            warm_defaults: Also pre-open the default bucketConfig keyspaces on connect
+        """
+        self._lock = threading.Lock()
+        self._buckets: Dict[Tuple[int, str], Any] = {}
+        self._collections: Dict[Tuple[int, Keyspace], Any] = {}
+        # Connection -> pool fingerprint, and the keyspaces used per fingerprint,
+        # so a reconnect warms what that cluster was actually used for
+        self._fingerprints: Dict[int, str] = {}
+        self._known: Dict[str, Set[Keyspace]] = {}
+        self.warm_defaults = warm_defaults
+        self.hits = 0
+        self.misses = 0
+
+    def bucket(self, cluster: Any, name: str) -> Any:
+        """Bucket handle (opened on first use per connection)"""
+        key = (id(cluster), name)
+        with self._lock:
+            bucket = self._buckets.get(key)
+        if bucket is None:
+            # Opening can block on the cluster: done outside the lock
+            bucket = cluster.bucket(name)
+            with self._lock:
+                bucket = self._buckets.setdefault(key, bucket)
+        return bucket
+
+    def collection(self, cluster: Any, bucket_config: Optional[Dict[str, Any]], kind: str = 'analyzer') -> Any:
+        """
+        Collection handle for a request's bucketConfig
+
+        Args:
+            cluster: Pooled cluster connection
+            bucket_config: Request bucketConfig (missing keys use DEFAULT_BUCKET_CONFIG)
+            kind: 'analyzer' or 'preferences'
+        """
+        keyspace = resolve_keyspace(bucket_config, kind)
+        key = (id(cluster), keyspace)
+        with self._lock:
+            collection = self._collections.get(key)
+            if collection is not None:
+                self.hits += 1
+                return collection
+            self.misses += 1
+            fingerprint = self._fingerprints.get(id(cluster))
+            if fingerprint is not None:
+                self._known.setdefault(fingerprint, set()).add(keyspace)
+
+        bucket_name, scope_name, collection_name = keyspace
+        collection = self.bucket(cluster, bucket_name).scope(scope_name).collection(collection_name)
+        with self._lock:
+            return self._collections.setdefault(key, collection)
+
+    def warm(self, cluster: Any, config: Dict[str, Any], background: bool = True) -> Optional[threading.Thread]:
+        """
+        Pre-open the keyspaces this cluster is known to use (pool on_connect hook)
+
+        Returns:
+            The warming thread when background=True
+        """
+        fingerprint = config_fingerprint(config)
+        with self._lock:
+            self._fingerprints[id(cluster)] = fingerprint
+            keyspaces = set(self._known.get(fingerprint, ()))
+        if self.warm_defaults:
+            keyspaces.update(resolve_keyspace(None, kind) for kind in COLLECTION_KINDS)
+
+        def open_all():
+            for bucket_name, scope_name, collection_name in sorted(keyspaces):
+                key = (id(cluster), (bucket_name, scope_name, collection_name))
+                try:
+                    collection = self.bucket(cluster, bucket_name).scope(scope_name).collection(collection_name)
+                    with self._lock:
+                        self._collections.setdefault(key, collection)
+                except Exception as e:
+                    ic(f"⚠️ Could not pre-open {bucket_name}.{scope_name}.{collection_name}", str(e))
+            ic(f"🔥 Pre-opened {len(keyspaces)} keyspace(s)")
+
+        if not background:
+            open_all()
+            return None
+        thread = threading.Thread(target=open_all, daemon=True)
+        thread.start()
+        return thread
+
+    def forget(self, cluster: Any) -> None:
+        """Drop every handle of a connection (pool on_close hook)"""
+        cluster_id = id(cluster)
+        with self._lock:
+            self._buckets = {k: v for k, v in self._buckets.items() if k[0] != cluster_id}
+            self._collections = {k: v for k, v in self._collections.items() if k[0] != cluster_id}
+            self._fingerprints.pop(cluster_id, None)
+
+    def stats(self) -> Dict[str, Any]:
+        """Get resolver statistics"""
+        with self._lock:
+            return {
+                'buckets': len(self._buckets),
+                'collections': len(self._collections),
+                'hits': self.hits,
+                'misses': self.misses
+            }
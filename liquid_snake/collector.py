@@ -0,0 +1,236 @@
+#!/usr/bin/env python3
+"""
+Completed Requests Collector Module
+Pulls system:completed_requests (with meta().plan) from a live cluster in parallel
+
+Architecture:
+- One discovery query returns, per query node, the requestTime range and
+  row count; each node is then split into requestTime windows
+- Every (node, window) slice is its own query; the node predicate lets the
+  query service route system:completed_requests to that node only
+- Windows partition the time axis as (-inf, b1), [b1, b2), ..., [bk, +inf),
+  so every row lands in exactly one slice (unparseable times count as 0)
+- Slices run on a bounded thread pool (the SDK releases the GIL on I/O);
+  rows are handed over in batches through a bounded queue to a single
+  consumer that appends them to a DatasetBuilder, so memory stays flat
+  and parsing overlaps the fetch
+- A failing slice is recorded in the stats; the other slices still land
+- Queries go through an injected run_query(statement, params) function,
+  so the collector does not depend on the SDK
+"""
+
+import json
+import queue
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Iterable, List, Optional
+from icecream import ic
+
+from dataset import DatasetBuilder
+from ingest import normalize_record
+
+# Concurrent slice queries
+COLLECT_MAX_WORKERS = 4
+
+# requestTime windows per query node
+COLLECT_WINDOWS_PER_NODE = 4
+
+# Upper bounds on caller-supplied workers and windows (each slice is a query on the cluster)
+COLLECT_MAX_WORKERS_LIMIT = 16
+COLLECT_WINDOWS_PER_NODE_LIMIT = 32
+
+# Rows per hand-over from a slice worker to the parser
+COLLECT_BATCH_ROWS = 500
+
+# Batches buffered between the workers and the parser
+COLLECT_QUEUE_BATCHES = 16
+
+# requestTime as epoch ms, 0 if the server cannot parse it
+TIME_EXPRESSION = 'IFMISSINGORNULL(STR_TO_MILLIS(requestTime), 0)'
+
+DISCOVERY_QUERY = (
+    'SELECT node, MIN(STR_TO_MILLIS(requestTime)) AS start_ms, '
+    'MAX(STR_TO_MILLIS(requestTime)) AS end_ms, COUNT(*) AS `count` '
+    'FROM system:completed_requests GROUP BY node'
+)
+
+SLICE_QUERY = 'SELECT *, meta().plan FROM system:completed_requests WHERE {where}'
+
+RunQuery = Callable[[str, Dict[str, Any]], Iterable[Any]]
+
+
+def plan_windows(start_ms: Optional[float], end_ms: Optional[float], windows: int) -> List[Dict[str, Optional[float]]]:
+    """
+    Split [start_ms, end_ms] into open-ended windows covering the whole axis
+
+    Returns:
+        List of {'start', 'end'} (epoch ms; None = unbounded), start inclusive, end exclusive
+    """
+    if start_ms is None or end_ms is None or windows <= 1 or end_ms <= start_ms:
+        return [{'start': None, 'end': None}]
+
+    step = (end_ms - start_ms) / windows
+    bounds = [int(start_ms + step * i) for i in range(1, windows)]
+    edges = [None] + bounds + [None]
+    return [{'start': edges[i], 'end': edges[i + 1]} for i in range(windows)]
+
+
+def build_slice_query(node: Optional[str], window: Dict[str, Optional[float]]) -> Dict[str, Any]:
+    """Statement and named parameters for one (node, window) slice"""
+    conditions = []
+    params: Dict[str, Any] = {}
+    if node is None:
+        conditions.append('node IS NOT VALUED')
+    else:
+        conditions.append('node = $node')
+        params['node'] = node
+    if window['start'] is not None:
+        conditions.append(f'{TIME_EXPRESSION} >= $start_ms')
+        params['start_ms'] = window['start']
+    if window['end'] is not None:
+        conditions.append(f'{TIME_EXPRESSION} < $end_ms')
+        params['end_ms'] = window['end']
+    return {'statement': SLICE_QUERY.format(where=' AND '.join(conditions)), 'params': params}
+
+
+def plan_slices(nodes: List[Dict[str, Any]], windows_per_node: int) -> List[Dict[str, Any]]:
+    """
+    Slices for every discovered node
+
+    Nodes with more rows get the full number of windows; tiny nodes
+    (fewer rows than one batch per window) are pulled in one slice.
+    """
+    slices = []
+    for node in nodes:
+        count = node.get('count') or 0
+        windows = windows_per_node if count >= windows_per_node * COLLECT_BATCH_ROWS else 1
+        for window in plan_windows(node.get('start_ms'), node.get('end_ms'), windows):
+            slices.append({'node': node.get('node'), 'window': window,
+                           **build_slice_query(node.get('node'), window)})
+    return slices
+
+
+def _clamp(value: Any, default: int, limit: int) -> int:
+    """value as an int in 1..limit (default if it is not a number)"""
+    try:
+        return max(1, min(limit, int(value)))
+    except (TypeError, ValueError):
+        return default
+
+
+def _normalize_row(row: Any) -> Optional[Dict[str, Any]]:
+    """Flatten a result row; decoded plans are kept as JSON text like uploaded ones"""
+    request = normalize_record(row)
+    if request is not None and isinstance(request.get('plan'), dict):
+        request['plan'] = json.dumps(request['plan'], separators=(',', ':'))
+    return request
+
+
+def collect_completed_requests(run_query: RunQuery,
+                               max_workers: int = COLLECT_MAX_WORKERS,
+                               windows_per_node: int = COLLECT_WINDOWS_PER_NODE,
+                               keep_plans: bool = True) -> Dict[str, Any]:
+    """
+    Pull system:completed_requests from a cluster into a columnar dataset
+
+    Args:
+        run_query: Executes a N1QL statement with named parameters, returning rows
+        max_workers: Concurrent slice queries (clamped to 1..COLLECT_MAX_WORKERS_LIMIT)
+        windows_per_node: requestTime windows per query node
+            (clamped to 1..COLLECT_WINDOWS_PER_NODE_LIMIT)
+        keep_plans: Keep raw plan JSON per row
+
+    Returns:
+        Dict with 'dataset' (CompletedRequestsDataset) and 'stats'
+    """
+    start_time = time.time()
+    max_workers = _clamp(max_workers, COLLECT_MAX_WORKERS, COLLECT_MAX_WORKERS_LIMIT)
+    windows_per_node = _clamp(windows_per_node, COLLECT_WINDOWS_PER_NODE, COLLECT_WINDOWS_PER_NODE_LIMIT)
+    nodes = list(run_query(DISCOVERY_QUERY, {}))
+    slices = plan_slices(nodes, windows_per_node)
+    ic(f"🛰️ Collecting completed_requests: {len(nodes)} node(s), {len(slices)} slice(s), {max_workers} worker(s)")
+
+    batches: 'queue.Queue' = queue.Queue(maxsize=COLLECT_QUEUE_BATCHES)
+    done = object()
+    cancelled = threading.Event()
+    slice_stats: List[Dict[str, Any]] = []
+
+    def put(item: Any) -> None:
+        # Give up instead of blocking forever once the consumer has stopped
+        while not cancelled.is_set():
+            try:
+                batches.put(item, timeout=0.1)
+                return
+            except queue.Full:
+                continue
+
+    def fetch(item: Dict[str, Any]) -> None:
+        stats = {'node': item['node'], 'window': item['window'], 'rows': 0, 'error': None}
+        slice_start = time.time()
+        batch = []
+        try:
+            for row in run_query(item['statement'], item['params']):
+                if cancelled.is_set():
+                    break
+                batch.append(row)
+                if len(batch) >= COLLECT_BATCH_ROWS:
+                    put(batch)
+                    stats['rows'] += len(batch)
+                    batch = []
+            if batch and not cancelled.is_set():
+                put(batch)
+                stats['rows'] += len(batch)
+        except Exception as e:
+            stats['error'] = str(e)
+            ic(f"⚠️ Slice {item['node']} {item['window']} failed", str(e))
+        stats['elapsed_ms'] = int((time.time() - slice_start) * 1000)
+        slice_stats.append(stats)
+        put(done)
+
+    builder = DatasetBuilder(keep_plans=keep_plans)
+    rows_skipped = 0
+    pool = ThreadPoolExecutor(max_workers=max_workers)
+    try:
+        for item in slices:
+            pool.submit(fetch, item)
+
+        # Single consumer: parsing runs while the slices are still fetching
+        remaining = len(slices)
+        while remaining:
+            batch = batches.get()
+            if batch is done:
+                remaining -= 1
+                continue
+            for row in batch:
+                request = _normalize_row(row)
+                if request is None:
+                    rows_skipped += 1
+                else:
+                    builder.append(request)
+    except BaseException:
+        cancelled.set()
+        raise
+    finally:
+        pool.shutdown(wait=False)
+
+    dataset = builder.build()
+    failed = [s for s in slice_stats if s['error']]
+    elapsed_ms = int((time.time() - start_time) * 1000)
+    stats = {
+        'record_count': len(dataset),
+        'rows_skipped': rows_skipped,
+        'node_count': len(nodes),
+        'slice_count': len(slices),
+        'max_workers': max_workers,
+        'windows_per_node': windows_per_node,
+        'failed_slices': failed,
+        'dataset_bytes': dataset.nbytes,
+        'elapsed_ms': elapsed_ms
+    }
+    ic(f"📥 Collected {len(dataset)} records from {len(nodes)} node(s) in {elapsed_ms}ms", len(failed))
+
+    return {
+        'dataset': dataset,
+        'stats': stats
+    }
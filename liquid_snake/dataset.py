@@ -0,0 +1,522 @@
+#!/usr/bin/env python3
+"""
+Columnar Dataset Module for parsed system:completed_requests
+Stores the numeric fields of each request as compact typed columns
+
+Architecture:
+- DatasetBuilder appends one request at a time into array.array buffers
+  (no per-record dicts are kept once a record has been appended)
+- CompletedRequestsDataset freezes the buffers into NumPy arrays
+- Duration strings are buffered and parsed in vectorized batches (durations.py)
+- Repeated strings (statements, users, states) are interned into code columns
+- Aggregations run vectorized over the columns
+- Plans stay raw JSON until plan_summary() decodes them (plans.py)
+- A sorted requestTime index (built on first use) turns time windows into
+  two binary searches
+"""
+
+import array
+import calendar
+import math
+import re
+from datetime import datetime, timezone
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+import numpy as np
+from icecream import ic
+
+from durations import parse_durations_ms
+from plans import summarize_plan
+
+# Duration strings ("2.732401s", "8.901µs") stored as float64 milliseconds
+DURATION_COLUMNS = ('elapsedTime', 'serviceTime', 'cpuTime')
+
+# Plain numbers stored as float64 (NaN when the field is missing)
+NUMBER_COLUMNS = ('usedMemory', 'resultCount', 'resultSize')
+
+# Raw duration strings buffered per column before a vectorized parse
+DURATION_FLUSH_ROWS = 16384
+
+_REQUEST_TIME = re.compile(
+    r'^(\d{4})-(\d{2})-(\d{2})[T ](\d{2}):(\d{2}):(\d{2})(?:\.(\d+))?'
+    r'\s*(Z|[+-]\d{2}:?\d{2})?'
+)
+
+
+def parse_request_time_ms(value: Any) -> float:
+    """
+    Parse a requestTime string into epoch milliseconds (UTC)
+
+    Accepts "2025-08-15T00:01:00.000Z", "2025-08-15 00:01:00.123456789 +0000 UTC"
+    and explicit offsets. Strings without an offset are treated as UTC.
+
+    Returns:
+        Epoch milliseconds as float, NaN if unparseable
+    """
+    if not isinstance(value, str):
+        return math.nan
+    match = _REQUEST_TIME.match(value.strip())
+    if not match:
+        return math.nan
+
+    year, month, day, hour, minute, second, fraction, offset = match.groups()
+    seconds = calendar.timegm((int(year), int(month), int(day), int(hour), int(minute), int(second)))
+    millis = seconds * 1000.0
+    if fraction:
+        millis += float('0.' + fraction) * 1000.0
+
+    if offset and offset != 'Z':
+        sign = -1 if offset[0] == '-' else 1
+        digits = offset[1:].replace(':', '')
+        offset_minutes = int(digits[:2]) * 60 + int(digits[2:])
+        millis -= sign * offset_minutes * 60000.0
+
+    return millis
+
+
+def _to_epoch_ms(value: Any) -> float:
+    """Epoch milliseconds from a number or a requestTime-style string"""
+    if isinstance(value, (int, float)):
+        return float(value)
+    millis = parse_request_time_ms(value)
+    if math.isnan(millis):
+        raise ValueError(f"Unparseable time: {value!r}")
+    return millis
+
+
+def epoch_ms_to_iso(value: float) -> Optional[str]:
+    """Format epoch milliseconds as an ISO-8601 UTC string"""
+    if value is None or math.isnan(value):
+        return None
+    return datetime.fromtimestamp(value / 1000.0, tz=timezone.utc).isoformat().replace('+00:00', 'Z')
+
+
+class StringTable:
+    """
+    Intern table mapping repeated strings to dense integer codes
+    """
+
+    def __init__(self, values: Optional[List[str]] = None):
+        self.values: List[str] = list(values or [])
+        self._index: Dict[str, int] = {value: code for code, value in enumerate(self.values)}
+
+    def code(self, value: Optional[str]) -> int:
+        """Return the code for value, adding it if new. None/empty/non-string maps to -1."""
+        if not value or not isinstance(value, str):
+            return -1
+        code = self._index.get(value)
+        if code is None:
+            code = len(self.values)
+            self.values.append(value)
+            self._index[value] = code
+        return code
+
+    def lookup(self, code: int) -> Optional[str]:
+        """Return the string for a code (-1 -> None)"""
+        return self.values[code] if code >= 0 else None
+
+    def __len__(self) -> int:
+        return len(self.values)
+
+
+def _describe(values: np.ndarray) -> Dict[str, Any]:
+    """Vectorized count/min/max/mean/percentiles ignoring NaN"""
+    valid = values[~np.isnan(values)]
+    if valid.size == 0:
+        return {'count': 0}
+
+    p50, p95, p99 = np.percentile(valid, [50, 95, 99])
+    return {
+        'count': int(valid.size),
+        'total': round(float(valid.sum()), 3),
+        'min': round(float(valid.min()), 3),
+        'max': round(float(valid.max()), 3),
+        'mean': round(float(valid.mean()), 3),
+        'p50': round(float(p50), 3),
+        'p95': round(float(p95), 3),
+        'p99': round(float(p99), 3)
+    }
+
+
+def _distinct_codes(codes: np.ndarray) -> int:
+    """Number of distinct interned strings used by a code column (-1 excluded)"""
+    return int(np.unique(codes[codes >= 0]).size)
+
+
+def _strings_nbytes(values: Sequence[Optional[str]]) -> int:
+    """Size of a string column; packed columns (snapshot.PackedStrings) know it without decoding"""
+    packed = getattr(values, 'nbytes', None)
+    if packed is not None:
+        return packed
+    return sum(len(s) for s in values if s)
+
+
+class CompletedRequestsDataset:
+    """
+    Immutable columnar view of a parsed completed_requests capture
+    """
+
+    def __init__(self,
+                 columns: Dict[str, np.ndarray],
+                 phase_counts: Dict[str, np.ndarray],
+                 phase_times: Dict[str, np.ndarray],
+                 statements: StringTable,
+                 users: StringTable,
+                 states: StringTable,
+                 request_ids: List[Optional[str]],
+                 plans: Optional[List[Optional[str]]] = None):
+        """
+        Initialize dataset (use DatasetBuilder rather than calling this directly)
+
+        Args:
+            columns: Numeric columns keyed by field name, plus 'requestTime' (epoch ms)
+                     and the '*_code' string-code columns
+            phase_counts: One int64 column per phaseCounts key
+            phase_times: One float64 millisecond column per phaseTimes key (NaN if absent)
+            statements: Intern table for statement / preparedText
+            users: Intern table for users
+            states: Intern table for state
+            request_ids: requestId per row
+            plans: Raw plan JSON per row (None if not kept)
+        """
+        self.columns = columns
+        self.phase_counts = phase_counts
+        self.phase_times = phase_times
+        self.statements = statements
+        self.users = users
+        self.states = states
+        self.request_ids = request_ids
+        self.plans = plans
+        self._time_order: Optional[np.ndarray] = None
+        self._sorted_times: Optional[np.ndarray] = None
+
+    def __len__(self) -> int:
+        return len(self.request_ids)
+
+    @property
+    def nbytes(self) -> int:
+        """Approximate memory held by columns and string tables"""
+        total = sum(col.nbytes for col in self.columns.values())
+        total += sum(col.nbytes for col in self.phase_counts.values())
+        total += sum(col.nbytes for col in self.phase_times.values())
+        total += sum(len(s) for s in self.statements.values)
+        total += sum(len(s) for s in self.users.values)
+        total += _strings_nbytes(self.request_ids)
+        if self.plans:
+            total += _strings_nbytes(self.plans)
+        return total
+
+    def column(self, name: str) -> np.ndarray:
+        """Return a numeric column by field name ('phaseTimes.<phase>' for phase times)"""
+        if name in self.columns:
+            return self.columns[name]
+        if name in self.phase_counts:
+            return self.phase_counts[name]
+        if name.startswith('phaseTimes.') and name[len('phaseTimes.'):] in self.phase_times:
+            return self.phase_times[name[len('phaseTimes.'):]]
+        raise KeyError(f"Unknown column: {name}")
+
+    def statement(self, row: int) -> Optional[str]:
+        """Return the statement text for a row"""
+        return self.statements.lookup(int(self.columns['statement_code'][row]))
+
+    def plan_summary(self, row: int) -> Optional[Dict[str, Any]]:
+        """
+        Operator statistics for a row's plan, decoded on first use (see plans.py)
+
+        Returns:
+            Shared summary dict, None if plans were not kept or the row has none
+        """
+        if not self.plans:
+            return None
+        return summarize_plan(self.plans[row])
+
+    def time_index(self) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Row order sorted by requestTime, built once on first use
+
+        Returns:
+            (row positions, their requestTime in ascending epoch ms); rows
+            without a parseable requestTime are left out
+        """
+        if self._time_order is None:
+            times = self.columns['requestTime']
+            valid_rows = np.flatnonzero(~np.isnan(times))
+            order = valid_rows[np.argsort(times[valid_rows], kind='stable')]
+            self._time_order = order
+            self._sorted_times = times[order]
+        return self._time_order, self._sorted_times
+
+    def time_window_rows(self, start: Any = None, end: Any = None) -> np.ndarray:
+        """
+        Row positions with start <= requestTime <= end, in time order
+
+        Two binary searches over the sorted index; the result is a slice view
+        of the index, not a copy.
+
+        Args:
+            start: Window start as epoch ms or requestTime string (None = open)
+            end: Window end as epoch ms or requestTime string (None = open)
+        """
+        order, sorted_times = self.time_index()
+        lo = 0 if start is None else int(np.searchsorted(sorted_times, _to_epoch_ms(start), side='left'))
+        hi = len(order) if end is None else int(np.searchsorted(sorted_times, _to_epoch_ms(end), side='right'))
+        return order[lo:max(lo, hi)]
+
+    def time_window(self, start: Any = None, end: Any = None) -> 'CompletedRequestsDataset':
+        """
+        Dataset restricted to start <= requestTime <= end (rows in time order)
+
+        When the window rows are contiguous in storage (e.g. a capture that
+        was already time-ordered) the columns are NumPy slice views.
+        """
+        return self.take(self.time_window_rows(start, end))
+
+    def take(self, rows: np.ndarray) -> 'CompletedRequestsDataset':
+        """Dataset made of the given row positions (string tables are shared)"""
+        rows = np.asarray(rows, dtype=np.int64)
+        if rows.size and rows[-1] - rows[0] == rows.size - 1 and np.all(np.diff(rows) == 1):
+            # Contiguous run: basic slicing gives views instead of copies
+            rows = slice(int(rows[0]), int(rows[-1]) + 1)
+            request_ids = self.request_ids[rows]
+            plans = self.plans[rows] if self.plans else self.plans
+        else:
+            request_ids = [self.request_ids[row] for row in rows]
+            plans = [self.plans[row] for row in rows] if self.plans else self.plans
+
+        return CompletedRequestsDataset(
+            columns={name: col[rows] for name, col in self.columns.items()},
+            phase_counts={name: col[rows] for name, col in self.phase_counts.items()},
+            phase_times={name: col[rows] for name, col in self.phase_times.items()},
+            statements=self.statements,
+            users=self.users,
+            states=self.states,
+            request_ids=request_ids,
+            plans=plans
+        )
+
+    def time_range(self) -> Dict[str, Optional[str]]:
+        """Earliest and latest requestTime as ISO strings"""
+        _, sorted_times = self.time_index()
+        if sorted_times.size == 0:
+            return {'start': None, 'end': None}
+        return {
+            'start': epoch_ms_to_iso(float(sorted_times[0])),
+            'end': epoch_ms_to_iso(float(sorted_times[-1]))
+        }
+
+    def summary(self) -> Dict[str, Any]:
+        """
+        Dashboard-style aggregate statistics computed over the columns
+
+        Returns:
+            Dict with totals, duration/memory/result distributions, phase counts and state counts
+        """
+        state_codes = self.columns['state_code']
+        state_counts = {}
+        if len(self):
+            counts = np.bincount(state_codes + 1, minlength=len(self.states) + 1)
+            state_counts = {
+                (self.states.lookup(code - 1) or 'unknown'): int(count)
+                for code, count in enumerate(counts) if count
+            }
+
+        return {
+            'total_queries': len(self),
+            'unique_statements': _distinct_codes(self.columns['statement_code']),
+            'unique_users': _distinct_codes(self.columns['user_code']),
+            'time_range': self.time_range(),
+            'durations_ms': {name: _describe(self.columns[name]) for name in DURATION_COLUMNS},
+            'used_memory_bytes': _describe(self.columns['usedMemory']),
+            'result_count': _describe(self.columns['resultCount']),
+            'result_size_bytes': _describe(self.columns['resultSize']),
+            'phase_counts': {name: int(col.sum()) for name, col in self.phase_counts.items()},
+            'phase_times_ms': {
+                name: round(float(np.nansum(col)), 3) for name, col in self.phase_times.items()
+            },
+            'states': state_counts
+        }
+
+
+class _DurationColumn:
+    """
+    Buffers raw duration strings and parses them in vectorized batches
+    """
+
+    def __init__(self, leading_rows: int = 0):
+        # Rows appended before this column first appeared are NaN
+        self.parsed = array.array('d', [math.nan]) * leading_rows
+        self.pending: List[Any] = []
+
+    def append(self, value: Any) -> None:
+        self.pending.append(value)
+        if len(self.pending) >= DURATION_FLUSH_ROWS:
+            self.flush()
+
+    def flush(self) -> None:
+        if self.pending:
+            self.parsed.frombytes(parse_durations_ms(self.pending).tobytes())
+            self.pending = []
+
+    def to_numpy(self) -> np.ndarray:
+        self.flush()
+        return np.frombuffer(self.parsed, dtype=np.float64).copy()
+
+
+class DatasetBuilder:
+    """
+    Append-only builder that converts request dicts into typed column buffers
+    """
+
+    def __init__(self, keep_plans: bool = True):
+        """
+        Args:
+            keep_plans: Keep the raw plan JSON string per row (needed for plan analysis)
+        """
+        self.keep_plans = keep_plans
+        self._durations = {name: _DurationColumn() for name in DURATION_COLUMNS}
+        self._numbers = {name: array.array('d') for name in NUMBER_COLUMNS}
+        self._request_time = array.array('d')
+        self._phase_counts: Dict[str, array.array] = {}
+        self._phase_times: Dict[str, _DurationColumn] = {}
+        self._codes = {name: array.array('i') for name in ('statement_code', 'user_code', 'state_code')}
+        self._statements = StringTable()
+        self._users = StringTable()
+        self._states = StringTable()
+        self._request_ids: List[Optional[str]] = []
+        self._plans: List[Optional[str]] = []
+
+    def __len__(self) -> int:
+        return len(self._request_ids)
+
+    def append(self, request: Dict[str, Any]) -> None:
+        """Append one (already normalized) completed request"""
+        row = len(self._request_ids)
+
+        for name, column in self._durations.items():
+            column.append(request.get(name))
+        for name in NUMBER_COLUMNS:
+            value = request.get(name)
+            self._numbers[name].append(float(value) if isinstance(value, (int, float)) else math.nan)
+        self._request_time.append(parse_request_time_ms(request.get('requestTime')))
+
+        phase_counts = request.get('phaseCounts') or {}
+        for phase in phase_counts:
+            if phase not in self._phase_counts:
+                # Backfill zeros for rows appended before this phase was first seen
+                self._phase_counts[phase] = array.array('q', bytes(8 * row))
+        for phase, column in self._phase_counts.items():
+            value = phase_counts.get(phase, 0)
+            column.append(int(value) if isinstance(value, (int, float)) else 0)
+
+        phase_times = request.get('phaseTimes') or {}
+        for phase in phase_times:
+            if phase not in self._phase_times:
+                self._phase_times[phase] = _DurationColumn(leading_rows=row)
+        for phase, column in self._phase_times.items():
+            column.append(phase_times.get(phase))
+
+        statement = request.get('statement') or request.get('preparedText')
+        self._codes['statement_code'].append(self._statements.code(statement))
+        self._codes['user_code'].append(self._users.code(request.get('users')))
+        self._codes['state_code'].append(self._states.code(request.get('state')))
+
+        self._request_ids.append(request.get('requestId'))
+        if self.keep_plans:
+            plan = request.get('plan')
+            self._plans.append(plan if isinstance(plan, str) or plan is None else None)
+
+    def extend(self, requests: Iterable[Dict[str, Any]]) -> None:
+        """Append many requests"""
+        for request in requests:
+            self.append(request)
+
+    def build(self) -> CompletedRequestsDataset:
+        """Freeze the buffers into a CompletedRequestsDataset"""
+        columns = {name: column.to_numpy() for name, column in self._durations.items()}
+        for name, buf in self._numbers.items():
+            columns[name] = np.frombuffer(buf, dtype=np.float64).copy()
+        columns['requestTime'] = np.frombuffer(self._request_time, dtype=np.float64).copy()
+        for name, buf in self._codes.items():
+            columns[name] = np.frombuffer(buf, dtype=np.int32).copy()
+
+        phase_counts = {
+            name: np.frombuffer(buf, dtype=np.int64).copy()
+            for name, buf in self._phase_counts.items()
+        }
+        phase_times = {name: column.to_numpy() for name, column in self._phase_times.items()}
+
+        dataset = CompletedRequestsDataset(
+            columns=columns,
+            phase_counts=phase_counts,
+            phase_times=phase_times,
+            statements=self._statements,
+            users=self._users,
+            states=self._states,
+            request_ids=self._request_ids,
+            plans=self._plans if self.keep_plans else None
+        )
+        ic(f"📊 Built columnar dataset: {len(dataset)} rows, ~{dataset.nbytes} bytes")
+        return dataset
+
+
+def build_dataset(requests: Iterable[Dict[str, Any]], keep_plans: bool = True) -> CompletedRequestsDataset:
+    """Build a dataset from an iterable of request dicts"""
+    builder = DatasetBuilder(keep_plans=keep_plans)
+    builder.extend(requests)
+    return builder.build()
+
+
+def concat_datasets(datasets: List[CompletedRequestsDataset]) -> CompletedRequestsDataset:
+    """
+    Concatenate datasets (e.g. one per file or shard) into one
+
+    String tables are merged and each part's code columns remapped; phases
+    missing from a part are 0 (phaseCounts) or NaN (phaseTimes) for its rows.
+    """
+    if not datasets:
+        return DatasetBuilder().build()
+    if len(datasets) == 1:
+        return datasets[0]
+
+    tables = {'statement_code': StringTable(), 'user_code': StringTable(), 'state_code': StringTable()}
+    part_tables = {'statement_code': 'statements', 'user_code': 'users', 'state_code': 'states'}
+    count_names = list(dict.fromkeys(name for d in datasets for name in d.phase_counts))
+    time_names = list(dict.fromkeys(name for d in datasets for name in d.phase_times))
+    keep_plans = all(d.plans is not None for d in datasets)
+
+    columns: Dict[str, List[np.ndarray]] = {name: [] for name in datasets[0].columns}
+    phase_counts: Dict[str, List[np.ndarray]] = {name: [] for name in count_names}
+    phase_times: Dict[str, List[np.ndarray]] = {name: [] for name in time_names}
+    request_ids: List[Optional[str]] = []
+    plans: List[Optional[str]] = []
+
+    for part in datasets:
+        rows = len(part)
+        for name, col in part.columns.items():
+            if name in tables:
+                table = getattr(part, part_tables[name])
+                # Append -1 so code -1 (missing) maps to itself via index -1
+                remap = np.array([tables[name].code(value) for value in table.values] + [-1], dtype=np.int32)
+                col = remap[col]
+            columns[name].append(col)
+        for name in count_names:
+            phase_counts[name].append(part.phase_counts.get(name, np.zeros(rows, dtype=np.int64)))
+        for name in time_names:
+            phase_times[name].append(part.phase_times.get(name, np.full(rows, np.nan)))
+        request_ids.extend(part.request_ids)
+        if keep_plans:
+            plans.extend(part.plans)
+
+    def join(parts: Dict[str, List[np.ndarray]]) -> Dict[str, np.ndarray]:
+        return {name: np.concatenate(arrays) for name, arrays in parts.items()}
+
+    return CompletedRequestsDataset(
+        columns=join(columns),
+        phase_counts=join(phase_counts),
+        phase_times=join(phase_times),
+        statements=tables['statement_code'],
+        users=tables['user_code'],
+        states=tables['state_code'],
+        request_ids=request_ids,
+        plans=plans if keep_plans else None
+    )
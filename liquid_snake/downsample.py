@@ -0,0 +1,225 @@
+#!/usr/bin/env python3
+"""
+Timeline Downsampling Module
+Caps timeline chart series at a point budget while keeping spikes
+
+Architecture:
+- lttb_indices: Largest-Triangle-Three-Buckets, keeps the visual shape
+- minmax_indices: min and max of every bucket, keeps every extreme
+- Both return indices into the original series, so labels and every series
+  of a chart are sliced with the same positions and stay aligned
+- Charts with several series are reduced on the envelope of their
+  standardized values, so a spike in a small series is not hidden by the
+  routine variation of a large one
+- Input chart dicts are never mutated (they live in the session cache)
+"""
+
+from typing import Any, Dict, List, Optional, Sequence
+import numpy as np
+
+# Default point budget per chart series in the AI payload
+TIMELINE_MAX_POINTS = 120
+
+DOWNSAMPLE_METHODS = ('minmax', 'lttb')
+DEFAULT_DOWNSAMPLE_METHOD = 'minmax'
+
+
+def _as_float(values: Sequence[Any]) -> np.ndarray:
+    """Series values as float64; None/non-numeric become NaN"""
+    return np.array(
+        [float(v) if isinstance(v, (int, float)) and not isinstance(v, bool) else np.nan for v in values],
+        dtype=np.float64
+    )
+
+
+def lttb_indices(values: np.ndarray, max_points: int) -> np.ndarray:
+    """
+    Largest-Triangle-Three-Buckets selection over evenly spaced points
+
+    Args:
+        values: Series values (NaN treated as 0)
+        max_points: Point budget (>= 3 to have any effect)
+
+    Returns:
+        Sorted indices, always including the first and last point
+    """
+    n = values.size
+    if max_points >= n or max_points < 3:
+        return np.arange(n)
+
+    y = np.nan_to_num(values)
+    x = np.arange(n, dtype=np.float64)
+    # Interior points split into max_points - 2 buckets
+    edges = np.linspace(1, n - 1, max_points - 1).astype(np.int64)
+
+    selected = np.empty(max_points, dtype=np.int64)
+    selected[0] = 0
+    selected[-1] = n - 1
+    previous = 0
+    for bucket in range(max_points - 2):
+        start, end = edges[bucket], edges[bucket + 1]
+        if bucket + 2 < len(edges):
+            next_start, next_end = edges[bucket + 1], edges[bucket + 2]
+        else:
+            next_start, next_end = n - 1, n
+        avg_x = x[next_start:next_end].mean()
+        avg_y = y[next_start:next_end].mean()
+
+        # Triangle area (x2) between previous pick, candidate and next bucket average
+        area = np.abs(
+            (x[previous] - avg_x) * (y[start:end] - y[previous]) -
+            (x[previous] - x[start:end]) * (avg_y - y[previous])
+        )
+        previous = start + int(np.argmax(area))
+        selected[bucket + 1] = previous
+    return selected
+
+
+def minmax_indices(high: np.ndarray, max_points: int, low: Optional[np.ndarray] = None) -> np.ndarray:
+    """
+    Keep the maximum and minimum of every bucket
+
+    Args:
+        high: Series whose per-bucket maximum is kept (NaN ignored)
+        max_points: Point budget
+        low: Series whose per-bucket minimum is kept (default: high)
+
+    Returns:
+        Sorted unique indices, including the first and last point
+    """
+    n = high.size
+    if max_points >= n or max_points < 4:
+        return np.arange(n)
+    low = high if low is None else low
+
+    high = np.where(np.isnan(high), -np.inf, high)
+    low = np.where(np.isnan(low), np.inf, low)
+    buckets = (max_points - 2) // 2
+    edges = np.linspace(1, n - 1, buckets + 1).astype(np.int64)
+
+    picks = [0, n - 1]
+    for start, end in zip(edges[:-1], edges[1:]):
+        if end > start:
+            picks.append(start + int(np.argmax(high[start:end])))
+            picks.append(start + int(np.argmin(low[start:end])))
+    return np.unique(picks)
+
+
+def select_indices(series: List[Sequence[Any]], max_points: int,
+                   method: str = DEFAULT_DOWNSAMPLE_METHOD) -> Optional[np.ndarray]:
+    """
+    Shared indices for one or more aligned series
+
+    Returns:
+        Sorted indices, or None if no reduction is needed
+    """
+    if method not in DOWNSAMPLE_METHODS:
+        raise ValueError(f"Unknown downsample method: {method}")
+    length = max((len(s) for s in series), default=0)
+    if length <= max_points:
+        return None
+
+    matrix = np.vstack([
+        np.pad(_as_float(s), (0, length - len(s)), constant_values=np.nan) for s in series
+    ])
+    missing = np.isnan(matrix)
+    # Standardize each series so an outlier in a small series outranks the
+    # routine variation of a large one (a single series keeps its shape)
+    counts = np.maximum((~missing).sum(axis=1, keepdims=True), 1)
+    filled = np.where(missing, 0.0, matrix)
+    means = filled.sum(axis=1, keepdims=True) / counts
+    stds = np.sqrt(np.where(missing, 0.0, (matrix - means) ** 2).sum(axis=1, keepdims=True) / counts)
+    stds[stds == 0] = 1.0
+    normalized = (matrix - means) / stds
+
+    all_missing = np.all(missing, axis=0)
+    high = np.where(all_missing, np.nan, np.max(np.where(missing, -np.inf, normalized), axis=0))
+    low = np.where(all_missing, np.nan, np.min(np.where(missing, np.inf, normalized), axis=0))
+
+    if method == 'lttb':
+        return lttb_indices(high, max_points)
+    return minmax_indices(high, max_points, low=low)
+
+
+def _take(values: Sequence[Any], indices: np.ndarray) -> List[Any]:
+    return [values[i] for i in indices if i < len(values)]
+
+
+def downsample_chart(chart: Dict[str, Any], labels: Optional[List[Any]], max_points: int,
+                     method: str = DEFAULT_DOWNSAMPLE_METHOD) -> Dict[str, Any]:
+    """
+    Downsample one timeline chart (returns a new dict; chart is not modified)
+
+    Handles the three shapes gatherTimelineChartsData has produced:
+    {'datasets': {name: [values]}} aligned to common_timeline labels,
+    Chart.js {'data': {'labels': [...], 'datasets': [{'data': [...]}]}},
+    and the older {'data': [{'value': ...}, ...]} list.
+    """
+    datasets = chart.get('datasets')
+    data = chart.get('data')
+
+    if isinstance(datasets, dict) and datasets:
+        indices = select_indices(list(datasets.values()), max_points, method)
+        if indices is None:
+            return chart
+        reduced = {**chart, 'datasets': {name: _take(values, indices) for name, values in datasets.items()}}
+        if labels:
+            reduced['labels'] = _take(labels, indices)
+        original = max(len(values) for values in datasets.values())
+    elif isinstance(data, dict) and isinstance(data.get('datasets'), list) and data['datasets']:
+        series = [d.get('data') or [] for d in data['datasets']]
+        indices = select_indices(series, max_points, method)
+        if indices is None:
+            return chart
+        reduced_data = {
+            **data,
+            'datasets': [{**d, 'data': _take(d.get('data') or [], indices)} for d in data['datasets']]
+        }
+        if isinstance(data.get('labels'), list):
+            reduced_data['labels'] = _take(data['labels'], indices)
+        reduced = {**chart, 'data': reduced_data}
+        original = max(len(s) for s in series)
+    elif isinstance(data, list) and data:
+        values = [point.get('value') if isinstance(point, dict) else point for point in data]
+        indices = select_indices([values], max_points, method)
+        if indices is None:
+            return chart
+        reduced = {**chart, 'data': _take(data, indices)}
+        original = len(data)
+    else:
+        return chart
+
+    reduced['_downsampled'] = {'method': method, 'original_points': original, 'points': int(indices.size)}
+    return reduced
+
+
+def downsample_timeline_charts(charts: Dict[str, Any], max_points: int = TIMELINE_MAX_POINTS,
+                               method: str = DEFAULT_DOWNSAMPLE_METHOD) -> Dict[str, Any]:
+    """
+    Downsample every chart in timelineChartsData
+
+    Charts aligned to common_timeline get their own 'labels' when reduced,
+    since each chart keeps the positions of its own spikes.
+
+    Returns:
+        New charts dict
+    """
+    common = charts.get('common_timeline')
+    labels = common.get('labels') if isinstance(common, dict) else None
+
+    result = {}
+    reduced_any = False
+    for chart_id, chart in charts.items():
+        if chart_id == 'common_timeline' or not isinstance(chart, dict):
+            result[chart_id] = chart
+            continue
+        result[chart_id] = downsample_chart(chart, labels, max_points, method)
+        reduced_any = reduced_any or result[chart_id] is not chart
+
+    if reduced_any and isinstance(common, dict):
+        result['common_timeline'] = {
+            **common,
+            'note': f'Downsampled to at most {max_points} points per chart ({method}); '
+                    f'reduced charts carry their own labels'
+        }
+    return result
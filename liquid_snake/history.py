@@ -0,0 +1,149 @@
+#!/usr/bin/env python3
+"""
+AI Analysis History Module
+Builds the keyset-paginated /api/ai/history query and its page cursors
+
+Architecture:
+- Pages are ordered by createdAt DESC, META().id ASC - the two leading keys
+  of analysis_history_v3 (cb_indexes.txt), named in a USE INDEX hint - so
+  the index returns rows already in page order and no sort is needed.
+  (analysis_old_table_v2 could not do this: its other keys sit between
+  createdAt and the implicit trailing META().id)
+- Without sourceCluster/provider filters the spans on createdAt are exact
+  and LIMIT is pushed to the index too; with them, the filters are applied
+  to the ordered scan, which still stops once the page is full
+- The next page starts after the last row's (createdAt, documentId):
+  createdAt <= $after_created bounds the index scan, and the tie-break on
+  META().id keeps rows with equal timestamps from being skipped or repeated,
+  so a deep page costs the same as the first one
+- Every projected and filtered field (including sourceCluster and provider)
+  is an index key, so the query is covered and never fetches the documents
+- The statement text only varies with which options are present; values
+  are named parameters so each variant is prepared once (adhoc=False) and
+  reused
+- Cursors are opaque url-safe base64 JSON; OFFSET paging is still accepted
+  for older clients
+"""
+
+import base64
+import json
+from typing import Any, Dict, List, Optional, Tuple
+
+# Index whose leading keys match the history ORDER BY (cb_indexes.txt)
+HISTORY_INDEX = 'analysis_history_v3'
+
+# Default and maximum rows per history page
+HISTORY_PAGE_SIZE = 10
+HISTORY_PAGE_MAX = 100
+
+HISTORY_FIELDS = '''`createdAt`,
+               `provider`,
+               `status`,
+               `prompt`,
+               `sourceCluster`,
+               `metadata`,
+               `parseJson`.`filters`,
+               META().id as documentId'''
+
+
+def encode_cursor(created_at: str, document_id: str) -> str:
+    """Opaque cursor for the page after (created_at, document_id)"""
+    raw = json.dumps([created_at, document_id], separators=(',', ':')).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+
+def decode_cursor(cursor: str) -> Tuple[str, str]:
+    """
+    (createdAt, documentId) from a cursor
+
+    Raises:
+        ValueError: If the cursor is malformed
+    """
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        created_at, document_id = json.loads(base64.urlsafe_b64decode(padded.encode('ascii')))
+    except Exception:
+        raise ValueError('Invalid history cursor')
+    if not isinstance(created_at, str) or not isinstance(document_id, str):
+        raise ValueError('Invalid history cursor')
+    return created_at, document_id
+
+
+def page_size(limit: Any) -> int:
+    """Clamp a requested page size to 1..HISTORY_PAGE_MAX"""
+    try:
+        return max(1, min(HISTORY_PAGE_MAX, int(limit)))
+    except (TypeError, ValueError):
+        return HISTORY_PAGE_SIZE
+
+
+def build_history_query(bucket_config: Optional[Dict[str, Any]],
+                        limit: Any = HISTORY_PAGE_SIZE,
+                        cursor: Optional[str] = None,
+                        offset: Any = 0,
+                        source_cluster: Optional[str] = None,
+                        provider: Optional[str] = None) -> Dict[str, Any]:
+    """
+    Statement and named parameters for one history page
+
+    One extra row is requested so the caller can tell whether another page exists.
+
+    Raises:
+        ValueError: If the cursor is malformed
+    """
+    bucket_config = bucket_config or {}
+    bucket = bucket_config.get('bucket', 'cb_tools')
+    scope = bucket_config.get('analyzerScope', 'query')
+    collection = bucket_config.get('analyzerCollection', 'analyzer')
+
+    conditions = ['docType = "ai_analysis"']
+    params: Dict[str, Any] = {'limit': page_size(limit) + 1}
+
+    if cursor:
+        after_created, after_id = decode_cursor(cursor)
+        conditions.append('`createdAt` <= $after_created')
+        conditions.append('(`createdAt` < $after_created OR META().id > $after_id)')
+        params['after_created'] = after_created
+        params['after_id'] = after_id
+    if source_cluster:
+        conditions.append('`sourceCluster` = $source_cluster')
+        params['source_cluster'] = source_cluster
+    if provider:
+        conditions.append('`provider` = $provider')
+        params['provider'] = provider
+
+    paging = 'LIMIT $limit'
+    offset = int(offset or 0)
+    if offset > 0 and not cursor:
+        paging += ' OFFSET $offset'
+        params['offset'] = offset
+
+    statement = f'''
+        SELECT {HISTORY_FIELDS}
+        FROM `{bucket}`.`{scope}`.`{collection}` USE INDEX (`{HISTORY_INDEX}` USING GSI)
+        WHERE {' AND '.join(conditions)}
+        ORDER BY `createdAt` DESC, META().id ASC
+        {paging}
+    '''
+    return {'statement': statement, 'params': params}
+
+
+def history_page(rows: List[Dict[str, Any]], limit: Any) -> Dict[str, Any]:
+    """
+    Response body for a page fetched with build_history_query
+
+    Returns:
+        {'results', 'count', 'has_more', 'next_cursor'}
+    """
+    size = page_size(limit)
+    has_more = len(rows) > size
+    rows = rows[:size]
+    next_cursor = None
+    if has_more and rows and isinstance(rows[-1].get('createdAt'), str):
+        next_cursor = encode_cursor(rows[-1]['createdAt'], rows[-1]['documentId'])
+    return {
+        'results': rows,
+        'count': len(rows),
+        'has_more': next_cursor is not None,
+        'next_cursor': next_cursor
+    }
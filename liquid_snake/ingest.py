@@ -0,0 +1,328 @@
+#!/usr/bin/env python3
+"""
+Streaming Ingest Module for system:completed_requests exports
+Parses large uploads record by record without materializing the raw text
+
+Features:
+- Incremental UTF-8 decoding of the upload in fixed-size chunks
+- Supports a top-level JSON array, a query response with a "results" array
+  under any key order ({"requestID": ..., "signature": ..., "results": [...]}),
+  and NDJSON / concatenated JSON objects
+- Unwraps the `SELECT *, meta().plan` row shape ({"completed_requests": {...}, "plan": "..."})
+- Only the current chunk plus the decoded records are held in memory
+- ingest_to_dataset() feeds records straight into a columnar dataset
+- request_uploads() picks multipart files without consuming a raw body
+"""
+
+import codecs
+import json
+import re
+import time
+from typing import Any, Dict, IO, Iterator, List, Optional
+from icecream import ic
+
+from dataset import CompletedRequestsDataset, DatasetBuilder
+
+# 1MB read size - large enough to amortize read() calls, small enough to keep RSS flat
+DEFAULT_CHUNK_SIZE = 1024 * 1024
+
+# A single record that cannot be decoded within this many buffered characters is
+# treated as malformed instead of buffering the rest of the upload
+MAX_RECORD_CHARS = 64 * 1024 * 1024
+
+_WHITESPACE = re.compile(r'[ \t\n\r]*')
+
+
+def normalize_record(item: Any) -> Optional[Dict[str, Any]]:
+    """
+    Flatten one exported row into a completed request dict
+
+    Rows from `SELECT *, meta().plan FROM system:completed_requests` look like
+    {"completed_requests": {...}, "plan": "..."}. The plan is moved onto the
+    request so downstream code only deals with one shape.
+
+    Returns:
+        Request dict, or None if the row is not an object
+    """
+    if not isinstance(item, dict):
+        return None
+
+    request = item.get('completed_requests', item)
+    if not isinstance(request, dict):
+        return None
+
+    if request is not item and 'plan' in item and 'plan' not in request:
+        request['plan'] = item['plan']
+
+    return request
+
+
+class CompletedRequestsReader:
+    """
+    Incremental reader that yields completed requests from a file-like stream
+    """
+
+    def __init__(self,
+                 stream: IO,
+                 chunk_size: int = DEFAULT_CHUNK_SIZE,
+                 max_record_chars: int = MAX_RECORD_CHARS):
+        """
+        Initialize reader
+
+        Args:
+            stream: Binary or text file-like object with a read(size) method
+            chunk_size: Number of bytes/characters to read per call
+            max_record_chars: Upper bound on the buffered size of one record
+        """
+        self._stream = stream
+        self._chunk_size = chunk_size
+        self._max_record_chars = max_record_chars
+        self._decoder = json.JSONDecoder()
+        self._text_decoder = codecs.getincrementaldecoder('utf-8')()
+        self._buf = ''
+        self._pos = 0
+        self._eof = False
+
+        self.bytes_read = 0
+        self.records_read = 0
+        self.rows_skipped = 0
+
+    def _fill(self) -> bool:
+        """Append the next chunk to the buffer, dropping consumed text. Returns False at EOF."""
+        if self._eof:
+            return False
+
+        chunk = self._stream.read(self._chunk_size)
+        if not chunk:
+            self._eof = True
+            text = self._text_decoder.decode(b'', final=True)
+        elif isinstance(chunk, bytes):
+            self.bytes_read += len(chunk)
+            text = self._text_decoder.decode(chunk)
+        else:
+            self.bytes_read += len(chunk.encode('utf-8'))
+            text = chunk
+
+        # Compact only when refilling so each record costs O(record) instead of O(buffer)
+        self._buf = self._buf[self._pos:] + text
+        self._pos = 0
+        return not self._eof or bool(text)
+
+    def _skip_whitespace(self) -> bool:
+        """Advance past whitespace, reading more input as needed. Returns False at EOF."""
+        while True:
+            self._pos = _WHITESPACE.match(self._buf, self._pos).end()
+            if self._pos < len(self._buf):
+                return True
+            if not self._fill():
+                return False
+
+    def _decode_value(self) -> Any:
+        """Decode one JSON value at the current position, reading more input until it is complete"""
+        while True:
+            try:
+                value, end = self._decoder.raw_decode(self._buf, self._pos)
+                # A scalar ending exactly at the buffer edge may continue in the next chunk
+                if end < len(self._buf) or self._eof or isinstance(value, (dict, list)):
+                    self._pos = end
+                    return value
+            except json.JSONDecodeError:
+                if self._eof:
+                    raise
+                if len(self._buf) - self._pos > self._max_record_chars:
+                    raise ValueError(
+                        f"Record at byte ~{self.bytes_read} exceeds {self._max_record_chars} characters or is malformed"
+                    )
+            self._fill()
+
+    def _expect(self, char: str) -> bool:
+        """Consume `char` if it is the next non-whitespace character"""
+        if self._skip_whitespace() and self._buf[self._pos] == char:
+            self._pos += 1
+            return True
+        return False
+
+    def _iter_array(self) -> Iterator[Any]:
+        """Yield elements of a JSON array whose opening bracket was already consumed"""
+        if self._expect(']'):
+            return
+        while True:
+            if not self._skip_whitespace():
+                raise ValueError("Unexpected end of input inside JSON array")
+            yield self._decode_value()
+
+            if not self._skip_whitespace():
+                raise ValueError("Unexpected end of input inside JSON array")
+            char = self._buf[self._pos]
+            self._pos += 1
+            if char == ']':
+                return
+            if char != ',':
+                raise ValueError(f"Expected ',' or ']' in JSON array, found {char!r}")
+
+    def _iter_object(self) -> Iterator[Any]:
+        """
+        Walk the top-level object at the current position field by field
+
+        A "results" array (wherever it sits among the response keys) is
+        streamed element by element; the other fields are decoded whole.
+        Without one the object is a record itself and is yielded as such.
+        """
+        self._pos += 1
+        fields: Dict[str, Any] = {}
+        found_results = False
+        if self._expect('}'):
+            yield fields
+            return
+        while True:
+            if not self._skip_whitespace():
+                raise ValueError("Unexpected end of input inside JSON object")
+            key = self._decode_value()
+            if not isinstance(key, str) or not self._expect(':'):
+                raise ValueError(f"Expected a string key and ':' in JSON object at byte ~{self.bytes_read}")
+            if not self._skip_whitespace():
+                raise ValueError("Unexpected end of input inside JSON object")
+            if key == 'results' and not found_results and self._buf[self._pos] == '[':
+                self._pos += 1
+                found_results = True
+                yield from self._iter_array()
+            else:
+                value = self._decode_value()
+                if not found_results:
+                    fields[key] = value
+            if self._expect('}'):
+                break
+            if not self._expect(','):
+                raise ValueError(f"Expected ',' or '}}' in JSON object at byte ~{self.bytes_read}")
+        if not found_results:
+            yield fields
+
+    def _iter_rows(self) -> Iterator[Any]:
+        """Yield raw rows regardless of the container format"""
+        if not self._skip_whitespace():
+            return
+
+        # Skip UTF-8 BOM
+        if self._buf[self._pos] == '\ufeff':
+            self._pos += 1
+            if not self._skip_whitespace():
+                return
+
+        if self._buf[self._pos] == '[':
+            self._pos += 1
+            yield from self._iter_array()
+            return
+
+        # Query response wrapper, or the first NDJSON / concatenated record
+        if self._buf[self._pos] == '{':
+            yield from self._iter_object()
+
+        # NDJSON / concatenated objects
+        while self._skip_whitespace():
+            yield self._decode_value()
+
+    def __iter__(self) -> Iterator[Dict[str, Any]]:
+        for row in self._iter_rows():
+            request = normalize_record(row)
+            if request is None:
+                self.rows_skipped += 1
+                continue
+            self.records_read += 1
+            yield request
+
+
+def iter_completed_requests(stream: IO, chunk_size: int = DEFAULT_CHUNK_SIZE) -> Iterator[Dict[str, Any]]:
+    """Convenience generator over CompletedRequestsReader"""
+    return iter(CompletedRequestsReader(stream, chunk_size=chunk_size))
+
+
+def ingest_completed_requests(stream: IO, chunk_size: int = DEFAULT_CHUNK_SIZE) -> Dict[str, Any]:
+    """
+    Parse an entire completed_requests upload incrementally
+
+    Args:
+        stream: Binary or text file-like object
+        chunk_size: Read size in bytes
+
+    Returns:
+        Dict with 'records' (list of request dicts) and 'stats'
+    """
+    start_time = time.time()
+    reader = CompletedRequestsReader(stream, chunk_size=chunk_size)
+    records: List[Dict[str, Any]] = list(reader)
+    elapsed_ms = int((time.time() - start_time) * 1000)
+
+    stats = {
+        'record_count': reader.records_read,
+        'rows_skipped': reader.rows_skipped,
+        'bytes_read': reader.bytes_read,
+        'elapsed_ms': elapsed_ms
+    }
+    ic(f"📥 Ingested {reader.records_read} records from {reader.bytes_read} bytes in {elapsed_ms}ms")
+
+    return {
+        'records': records,
+        'stats': stats
+    }
+
+
+def ingest_to_dataset(stream: IO,
+                      chunk_size: int = DEFAULT_CHUNK_SIZE,
+                      keep_plans: bool = True) -> Dict[str, Any]:
+    """
+    Parse an upload straight into a columnar dataset
+
+    Each record is appended to the column buffers and then dropped, so peak
+    memory follows the size of the columns rather than the raw JSON.
+
+    Args:
+        stream: Binary or text file-like object
+        chunk_size: Read size in bytes
+        keep_plans: Keep raw plan JSON per row
+
+    Returns:
+        Dict with 'dataset' (CompletedRequestsDataset) and 'stats'
+    """
+    start_time = time.time()
+    reader = CompletedRequestsReader(stream, chunk_size=chunk_size)
+    builder = DatasetBuilder(keep_plans=keep_plans)
+    builder.extend(reader)
+    dataset: CompletedRequestsDataset = builder.build()
+    elapsed_ms = int((time.time() - start_time) * 1000)
+
+    stats = {
+        'record_count': reader.records_read,
+        'rows_skipped': reader.rows_skipped,
+        'bytes_read': reader.bytes_read,
+        'dataset_bytes': dataset.nbytes,
+        'elapsed_ms': elapsed_ms
+    }
+    ic(f"📥 Ingested {reader.records_read} records into dataset ({dataset.nbytes} bytes) in {elapsed_ms}ms")
+
+    return {
+        'dataset': dataset,
+        'stats': stats
+    }
+
+
+def request_uploads(req: Any) -> List[Any]:
+    """
+    Uploaded files of a Flask/Werkzeug request, or [] for a raw-body upload
+
+    request.files is only touched for multipart bodies: for any other form
+    type (e.g. curl -d's application/x-www-form-urlencoded) it parses the
+    form and consumes request.stream, leaving an empty body to ingest.
+    """
+    if req.mimetype != 'multipart/form-data':
+        return []
+    return [upload for name in req.files for upload in req.files.getlist(name)]
+
+
+if __name__ == "__main__":
+    import sys
+
+    path = sys.argv[1] if len(sys.argv) > 1 else '../sample/test_system_completed_requests.json'
+    with open(path, 'rb') as f:
+        result = ingest_to_dataset(f)
+    ic(result['stats'])
+    ic(result['dataset'].summary())
@@ -0,0 +1,296 @@
+#!/usr/bin/env python3
+"""
+Server-side Insights Rules Engine
+Evaluates the Concurrent Query Conflicts (Service Pressure) rules over a columnar dataset
+
+Architecture:
+- Rules are the same thresholds as insights.js updateInsights and
+  settings/CONCURRENT_CONFLICTS_INSIGHT_LOGIC.md (flags A-H)
+- Each rule is a vectorized boolean predicate over dataset columns
+  (phaseTimes.* milliseconds, phaseCounts, elapsedTime); no per-request loop
+- Only the top-N sample rows are materialized back into dicts
+"""
+
+from typing import Any, Dict, List, Optional
+import numpy as np
+
+from dataset import CompletedRequestsDataset, epoch_ms_to_iso
+
+# Same values as CONCURRENT_CONFLICT_THRESHOLDS in insights.js
+CONCURRENT_CONFLICT_THRESHOLDS = {
+    # Query Service (Parse + Plan) pressure
+    'PARSE_PLAN_WARNING_MS': 1,
+    'PARSE_PLAN_CRITICAL_MS': 10,
+
+    # Data Service (Fetch) pressure - per-document timing
+    'FETCH_PER_DOC_WARNING_MS': 5,
+    'FETCH_PER_DOC_CRITICAL_MS': 10,
+    'MIN_FETCH_COUNT_FOR_ANALYSIS': 10,
+
+    # Index Service pressure - throughput analysis
+    'INDEX_SCAN_WARNING_RATE': 5000,
+    'INDEX_SCAN_CRITICAL_RATE': 1000,
+    'MIN_INDEX_SCAN_FOR_ANALYSIS': 100,
+
+    # CPU contention (Kernel time)
+    'KERNEL_TIME_WARNING_RATIO': 0.30,
+
+    # Multi-service pressure indicator
+    'MIN_SERVICES_UNDER_PRESSURE': 2,
+
+    # Reporting
+    'TOP_AFFECTED_QUERIES': 10
+}
+
+FLAG_NAMES = {
+    'A': 'Query Service Warning',
+    'B': 'Query Service Critical',
+    'C': 'Data Service Warning',
+    'D': 'Data Service Critical',
+    'E': 'Index Service Warning',
+    'F': 'Index Service Critical',
+    'G': 'CPU Contention',
+    'H': 'System-Wide Pressure'
+}
+
+CRITICAL_FLAGS = ('B', 'D', 'F', 'H')
+
+# Service -> flags that put it under pressure
+SERVICE_FLAGS = {
+    'Query Service': ('A', 'B'),
+    'Data Service': ('C', 'D'),
+    'Index Service': ('E', 'F'),
+    'CPU/OS': ('G',)
+}
+
+
+def _phase_time(dataset: CompletedRequestsDataset, phase: str) -> np.ndarray:
+    """Phase time column in ms; missing phases count as 0 like parseTime('0')"""
+    column = dataset.phase_times.get(phase)
+    if column is None:
+        return np.zeros(len(dataset))
+    return np.nan_to_num(column)
+
+
+def _phase_count(dataset: CompletedRequestsDataset, phase: str) -> np.ndarray:
+    column = dataset.phase_counts.get(phase)
+    if column is None:
+        return np.zeros(len(dataset))
+    return column.astype(np.float64)
+
+
+class ServicePressureRules:
+    """
+    Vectorized Service Pressure (A-H) classification of a dataset
+    """
+
+    def __init__(self, dataset: CompletedRequestsDataset, thresholds: Optional[Dict[str, Any]] = None):
+        """
+        Evaluate every rule over the dataset columns
+
+        Args:
+            dataset: Parsed completed_requests capture
+            thresholds: Overrides for CONCURRENT_CONFLICT_THRESHOLDS
+        """
+        self.dataset = dataset
+        self.thresholds = {**CONCURRENT_CONFLICT_THRESHOLDS, **(thresholds or {})}
+        t = self.thresholds
+
+        # errstate: ratios are only read where their eligibility mask holds
+        with np.errstate(divide='ignore', invalid='ignore'):
+            # Step 1: Query Service (Parse + Plan time)
+            self.parse_plan_ms = _phase_time(dataset, 'parse') + _phase_time(dataset, 'plan')
+            flag_b = self.parse_plan_ms >= t['PARSE_PLAN_CRITICAL_MS']
+            flag_a = ~flag_b & (self.parse_plan_ms >= t['PARSE_PLAN_WARNING_MS'])
+
+            # Step 2: Data Service (fetch time per document)
+            self.fetch_ms = _phase_time(dataset, 'fetch')
+            self.fetch_count = _phase_count(dataset, 'fetch')
+            fetch_eligible = self.fetch_count >= t['MIN_FETCH_COUNT_FOR_ANALYSIS']
+            self.fetch_per_doc = np.where(fetch_eligible, self.fetch_ms / self.fetch_count, np.nan)
+            flag_d = fetch_eligible & (self.fetch_per_doc >= t['FETCH_PER_DOC_CRITICAL_MS'])
+            flag_c = fetch_eligible & ~flag_d & (self.fetch_per_doc >= t['FETCH_PER_DOC_WARNING_MS'])
+
+            # Step 3: Index Service (scan throughput)
+            self.index_scan_ms = _phase_time(dataset, 'indexScan')
+            self.index_scan_count = _phase_count(dataset, 'indexScan')
+            scan_eligible = (self.index_scan_count >= t['MIN_INDEX_SCAN_FOR_ANALYSIS']) & (self.index_scan_ms > 0)
+            self.index_scan_rate = np.where(scan_eligible, self.index_scan_count / self.index_scan_ms * 1000, np.nan)
+            flag_f = scan_eligible & (self.index_scan_rate <= t['INDEX_SCAN_CRITICAL_RATE'])
+            flag_e = scan_eligible & ~flag_f & (self.index_scan_rate <= t['INDEX_SCAN_WARNING_RATE'])
+
+            # Step 4: CPU contention (kernel time share of elapsed)
+            self.kern_ms = _phase_time(dataset, 'kernTime')
+            self.elapsed_ms = dataset.columns['elapsedTime']
+            kernel_eligible = (self.elapsed_ms > 0) & (self.kern_ms > 0)
+            self.kernel_ratio = np.where(kernel_eligible, self.kern_ms / self.elapsed_ms, np.nan)
+            flag_g = kernel_eligible & (self.kernel_ratio >= t['KERNEL_TIME_WARNING_RATIO'])
+
+        self.flags: Dict[str, np.ndarray] = {
+            'A': flag_a, 'B': flag_b, 'C': flag_c, 'D': flag_d,
+            'E': flag_e, 'F': flag_f, 'G': flag_g
+        }
+        self.services = {
+            service: np.logical_or.reduce([self.flags[flag] for flag in flags])
+            for service, flags in SERVICE_FLAGS.items()
+        }
+
+        # Step 5: System-wide pressure (2+ services)
+        self.service_count = np.sum(list(self.services.values()), axis=0)
+        self.flags['H'] = self.service_count >= t['MIN_SERVICES_UNDER_PRESSURE']
+        self.affected = np.logical_or.reduce(list(self.flags.values()))
+
+    def _flag_details(self, row: int, flags: List[str]) -> Dict[str, str]:
+        """Same per-flag messages as the browser sample table"""
+        details = {}
+        for flag in flags:
+            if flag in ('A', 'B'):
+                suffix = ' (critically slow, should be <1ms)' if flag == 'B' else ' (should be <1ms)'
+                details[flag] = f"Parse+Plan took {self.parse_plan_ms[row]:.2f}ms{suffix}"
+            elif flag in ('C', 'D'):
+                message = (f"Fetch {self.fetch_per_doc[row]:.2f}ms per doc "
+                           f"({self.fetch_ms[row]:g}ms for {int(self.fetch_count[row])} docs)")
+                details[flag] = message + (' - critically slow' if flag == 'D' else '')
+            elif flag in ('E', 'F'):
+                message = (f"Index scan {round(self.index_scan_rate[row]):,} records/sec "
+                           f"({int(self.index_scan_count[row]):,} in {self.index_scan_ms[row]:g}ms)")
+                details[flag] = message + (' - critically slow' if flag == 'F' else '')
+            elif flag == 'G':
+                details[flag] = (f"Kernel time {self.kernel_ratio[row] * 100:.1f}% "
+                                 f"({self.kern_ms[row]:g}ms / {self.elapsed_ms[row]:g}ms)")
+            elif flag == 'H':
+                services = [service for service, mask in self.services.items() if mask[row]]
+                details[flag] = f"{len(services)} services under pressure: {', '.join(services)}"
+        return details
+
+    def _sample(self, row: int) -> Dict[str, Any]:
+        flags = [flag for flag in FLAG_NAMES if self.flags[flag][row]]
+
+        def optional(values: np.ndarray) -> Optional[float]:
+            value = float(values[row])
+            return None if np.isnan(value) else round(value, 3)
+
+        kernel_ratio = optional(self.kernel_ratio)
+        return {
+            'requestTime': epoch_ms_to_iso(float(self.dataset.columns['requestTime'][row])),
+            'statement': self.dataset.statement(row),
+            'flags': flags,
+            'flagDetails': self._flag_details(row, flags),
+            'elapsedTime': optional(self.elapsed_ms),
+            'parsePlanTime': round(float(self.parse_plan_ms[row]), 3),
+            'fetchPerDoc': optional(self.fetch_per_doc),
+            'indexScanRate': optional(self.index_scan_rate),
+            'kernelPercent': round(kernel_ratio * 100, 1) if kernel_ratio is not None else None
+        }
+
+    def top_rows(self, limit: int) -> np.ndarray:
+        """
+        Affected rows, worst first
+
+        Ordered by number of critical flags, then total flags, then elapsedTime.
+        """
+        rows = np.flatnonzero(self.affected)
+        if rows.size == 0:
+            return rows
+        critical = np.sum([self.flags[flag][rows] for flag in CRITICAL_FLAGS], axis=0)
+        total = np.sum([mask[rows] for mask in self.flags.values()], axis=0)
+        elapsed = np.nan_to_num(self.elapsed_ms[rows], nan=-1.0)
+        # lexsort: last key is primary
+        order = np.lexsort((-elapsed, -total, -critical))
+        return rows[order[:limit]]
+
+    def evaluate(self, limit: Optional[int] = None) -> Dict[str, Any]:
+        """
+        Per-flag counts, per-service counts and top-N samples
+
+        Args:
+            limit: Samples per flag and overall (default TOP_AFFECTED_QUERIES)
+        """
+        if limit is None:
+            limit = self.thresholds['TOP_AFFECTED_QUERIES']
+
+        flag_counts = {}
+        for flag, name in FLAG_NAMES.items():
+            rows = np.flatnonzero(self.flags[flag])
+            flag_counts[flag] = {
+                'name': name,
+                'count': int(rows.size),
+                'samples': [self._sample(int(row)) for row in rows[:limit]]
+            }
+
+        return {
+            'total_queries_analyzed': len(self.dataset),
+            'affected_queries_count': int(self.affected.sum()),
+            'flag_counts': flag_counts,
+            'services_under_pressure': {
+                service: int((mask & self.affected).sum()) for service, mask in self.services.items()
+            },
+            'samples': [self._sample(int(row)) for row in self.top_rows(limit)]
+        }
+
+
+def _sample_rank(sample: Dict[str, Any]) -> tuple:
+    """Same worst-first ordering as ServicePressureRules.top_rows"""
+    flags = sample['flags']
+    elapsed = sample.get('elapsedTime')
+    return (
+        sum(flag in CRITICAL_FLAGS for flag in flags),
+        len(flags),
+        elapsed if elapsed is not None else -1.0
+    )
+
+
+def merge_service_pressure(results: List[Dict[str, Any]], limit: Optional[int] = None) -> Dict[str, Any]:
+    """
+    Merge evaluate() results from several datasets (files or shards)
+
+    Counts are added; samples are re-ranked and cut back to the limit.
+    """
+    if limit is None:
+        limit = CONCURRENT_CONFLICT_THRESHOLDS['TOP_AFFECTED_QUERIES']
+
+    merged = {
+        'total_queries_analyzed': sum(r['total_queries_analyzed'] for r in results),
+        'affected_queries_count': sum(r['affected_queries_count'] for r in results),
+        'flag_counts': {
+            flag: {
+                'name': name,
+                'count': sum(r['flag_counts'][flag]['count'] for r in results),
+                'samples': [s for r in results for s in r['flag_counts'][flag]['samples']][:limit]
+            }
+            for flag, name in FLAG_NAMES.items()
+        },
+        'services_under_pressure': {
+            service: sum(r['services_under_pressure'][service] for r in results) for service in SERVICE_FLAGS
+        },
+        'samples': sorted((s for r in results for s in r['samples']), key=_sample_rank, reverse=True)[:limit]
+    }
+    return merged
+
+
+def build_server_insights(dataset: CompletedRequestsDataset, limit: Optional[int] = None,
+                          conflicts: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    """
+    Insights items (same shape as the browser's gatherInsightsData) computed from a dataset
+
+    Args:
+        dataset: Parsed capture
+        limit: Samples per flag and overall
+        conflicts: Precomputed (e.g. merged) evaluate() result to use instead
+
+    Returns:
+        Dict with an 'items' list
+    """
+    if conflicts is None:
+        conflicts = ServicePressureRules(dataset).evaluate(limit=limit)
+    return {
+        'items': [{
+            'id': 'concurrent-query-conflicts',
+            'title': 'Concurrent Query Conflicts',
+            'description': 'Queries showing service pressure: slow Parse+Plan (Query Service), '
+                           'slow fetch per document (Data Service), low index scan throughput '
+                           '(Index Service) or high kernel time (CPU contention)',
+            'counts': {'concurrent-conflicts-count': conflicts['affected_queries_count']},
+            **conflicts
+        }]
+    }
@@ -0,0 +1,222 @@
+#!/usr/bin/env python3
+"""
+Parallel Ingest Module for multi-file / large completed_requests captures
+Parses and pre-aggregates files (or NDJSON byte ranges) in a process pool
+
+Architecture:
+- A capture is split into tasks: one per file, and large NDJSON files are
+  further split into newline-aligned byte ranges (JSON arrays are not split)
+- Each worker parses its task into a columnar dataset and pre-aggregates it:
+  query groups (QueryGroupEngine), Service Pressure counts and samples
+  (ServicePressureRules) and per-minute timeline buckets (TimelineBuckets)
+- Every partial is mergeable, so the parent only concatenates datasets and
+  folds the partials - no request dict crosses a process boundary
+- A single task runs inline; there is nothing to gain from a pool
+- should_shard() tells callers holding one upload whether spooling it to
+  disk pays off (large NDJSON and more than one CPU)
+"""
+
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Dict, List, Optional, Tuple
+from icecream import ic
+
+from dataset import DatasetBuilder, concat_datasets
+from ingest import CompletedRequestsReader, DEFAULT_CHUNK_SIZE
+from insights import ServicePressureRules, merge_service_pressure
+from query_groups import QueryGroupEngine
+from timeline import DEFAULT_BUCKET_MS, TimelineBuckets
+
+# NDJSON files smaller than this are parsed as one task
+MIN_SHARD_BYTES = 32 * 1024 * 1024
+
+# A single upload below this is parsed serially from the request stream
+MIN_PARALLEL_BYTES = 2 * MIN_SHARD_BYTES
+
+# (path, start byte, end byte or None for EOF, keep_plans, bucket_ms)
+IngestTask = Tuple[str, int, Optional[int], bool, int]
+
+
+class _RangeReader:
+    """
+    Binary file view limited to [start, end) for CompletedRequestsReader
+    """
+
+    def __init__(self, path: str, start: int = 0, end: Optional[int] = None):
+        self._file = open(path, 'rb')
+        self._file.seek(start)
+        self._remaining = None if end is None else end - start
+
+    def read(self, size: int = -1) -> bytes:
+        if self._remaining is None:
+            return self._file.read(size)
+        if self._remaining <= 0:
+            return b''
+        size = self._remaining if size is None or size < 0 else min(size, self._remaining)
+        chunk = self._file.read(size)
+        self._remaining -= len(chunk)
+        return chunk
+
+    def close(self) -> None:
+        self._file.close()
+
+
+def _is_ndjson(path: str) -> bool:
+    """True if the first line of the file is a complete JSON object"""
+    with open(path, 'rb') as f:
+        first_line = f.readline(MIN_SHARD_BYTES).strip()
+    if first_line.startswith(b'\xef\xbb\xbf'):
+        first_line = first_line[3:]
+    if not first_line.startswith(b'{'):
+        return False
+    try:
+        return isinstance(json.loads(first_line), dict)
+    except ValueError:
+        return False
+
+
+def plan_ndjson_shards(path: str, shards: int) -> List[Tuple[int, Optional[int]]]:
+    """
+    Split an NDJSON file into up to `shards` byte ranges ending on newlines
+
+    Returns:
+        List of (start, end) ranges; the last end is None (EOF)
+    """
+    size = os.path.getsize(path)
+    if shards <= 1 or size == 0:
+        return [(0, None)]
+
+    boundaries = [0]
+    with open(path, 'rb') as f:
+        for i in range(1, shards):
+            target = max(size * i // shards, boundaries[-1])
+            f.seek(target)
+            f.readline()  # finish the line the target falls in
+            position = f.tell()
+            if position >= size:
+                break
+            if position > boundaries[-1]:
+                boundaries.append(position)
+
+    ends = boundaries[1:] + [None]
+    return list(zip(boundaries, ends))
+
+
+def plan_ingest_tasks(paths: List[str], max_workers: int,
+                      keep_plans: bool = True,
+                      bucket_ms: int = DEFAULT_BUCKET_MS) -> List[IngestTask]:
+    """
+    One task per file, with large NDJSON files split into byte-range shards
+
+    Shards are only planned when there are fewer files than workers.
+    """
+    tasks: List[IngestTask] = []
+    spare_workers = max(1, max_workers // max(1, len(paths)))
+    for path in paths:
+        shards = min(spare_workers, max(1, os.path.getsize(path) // MIN_SHARD_BYTES))
+        if shards > 1 and _is_ndjson(path):
+            tasks.extend((path, start, end, keep_plans, bucket_ms) for start, end in plan_ndjson_shards(path, shards))
+        else:
+            tasks.append((path, 0, None, keep_plans, bucket_ms))
+    return tasks
+
+
+def should_shard(path: str, max_workers: Optional[int] = None) -> bool:
+    """True if one file is NDJSON large enough to split into several byte-range tasks"""
+    return len(plan_ingest_tasks([path], max_workers or os.cpu_count() or 1)) > 1
+
+
+def _ingest_shard(task: IngestTask) -> Dict[str, Any]:
+    """
+    Worker: parse one file / byte range and pre-aggregate it
+
+    Top-level so it can be pickled into a worker process.
+    """
+    path, start, end, keep_plans, bucket_ms = task
+    stream = _RangeReader(path, start, end)
+    try:
+        reader = CompletedRequestsReader(stream, chunk_size=DEFAULT_CHUNK_SIZE)
+        builder = DatasetBuilder(keep_plans=keep_plans)
+        builder.extend(reader)
+        dataset = builder.build()
+    finally:
+        stream.close()
+
+    engine = QueryGroupEngine()
+    engine.add_dataset(dataset)
+
+    return {
+        'dataset': dataset,
+        'query_groups': engine,
+        'service_pressure': ServicePressureRules(dataset).evaluate(),
+        'timeline': TimelineBuckets.from_dataset(dataset, bucket_ms),
+        'record_count': reader.records_read,
+        'rows_skipped': reader.rows_skipped,
+        'bytes_read': reader.bytes_read
+    }
+
+
+def ingest_parallel(paths: List[str],
+                    max_workers: Optional[int] = None,
+                    keep_plans: bool = True,
+                    bucket_ms: int = DEFAULT_BUCKET_MS) -> Dict[str, Any]:
+    """
+    Parse and pre-aggregate several completed_requests files in parallel
+
+    Args:
+        paths: Export files (JSON array, {"results": [...]} or NDJSON), e.g. one per query node
+        max_workers: Worker processes (default: CPU count)
+        keep_plans: Keep raw plan JSON per row
+        bucket_ms: Timeline bucket width
+
+    Returns:
+        Dict with the merged 'dataset', 'query_group_engine', 'service_pressure',
+        'timeline_buckets' and 'stats'
+    """
+    start_time = time.time()
+    max_workers = max_workers or os.cpu_count() or 1
+    tasks = plan_ingest_tasks(paths, max_workers, keep_plans=keep_plans, bucket_ms=bucket_ms)
+
+    if len(tasks) == 1 or max_workers == 1:
+        partials = [_ingest_shard(task) for task in tasks]
+    else:
+        with ProcessPoolExecutor(max_workers=min(max_workers, len(tasks))) as pool:
+            partials = list(pool.map(_ingest_shard, tasks))
+
+    engine = QueryGroupEngine()
+    timeline = TimelineBuckets(bucket_ms)
+    for partial in partials:
+        engine.merge(partial['query_groups'])
+        timeline.merge(partial['timeline'])
+    dataset = concat_datasets([partial['dataset'] for partial in partials])
+    elapsed_ms = int((time.time() - start_time) * 1000)
+
+    stats = {
+        'record_count': sum(partial['record_count'] for partial in partials),
+        'rows_skipped': sum(partial['rows_skipped'] for partial in partials),
+        'bytes_read': sum(partial['bytes_read'] for partial in partials),
+        'dataset_bytes': dataset.nbytes,
+        'file_count': len(paths),
+        'task_count': len(tasks),
+        'elapsed_ms': elapsed_ms
+    }
+    ic(f"📥 Ingested {stats['record_count']} records from {len(paths)} file(s) "
+       f"in {len(tasks)} task(s) in {elapsed_ms}ms")
+
+    return {
+        'dataset': dataset,
+        'query_group_engine': engine,
+        'service_pressure': merge_service_pressure([partial['service_pressure'] for partial in partials]),
+        'timeline_buckets': timeline,
+        'stats': stats
+    }
+
+
+if __name__ == "__main__":
+    import sys
+
+    result = ingest_parallel(sys.argv[1:] or ['../sample/test_system_completed_requests.json'])
+    ic(result['stats'])
+    ic(result['dataset'].summary())
@@ -0,0 +1,277 @@
+#!/usr/bin/env python3
+"""
+Execution Plan Module for completed_requests plan JSON
+Decodes plans lazily and extracts per-request operator statistics
+
+Architecture:
+- Plans stay as raw JSON strings until a summary is first requested
+- Summaries are cached (LRU) under a hash of the plan text, so identical
+  plans (e.g. from prepared statements) are decoded and walked only once
+- The operator tree is walked iteratively with an explicit stack, so deep
+  plans cannot hit the recursion limit
+- Extraction mirrors the frontend analyzeCoreExecToKernelRatio,
+  analyzeStreamToElapsedRatio and extractIndexUsage walkers
+- plan_index_usage folds a dataset's per-row summaries into per-index
+  request counts and operator totals for the AI payload's indexes section
+"""
+
+import hashlib
+import json
+import threading
+from collections import Counter, OrderedDict
+from typing import Any, Dict, Iterator, Optional, Union
+
+from durations import parse_duration_ms
+
+# Distinct plan summaries kept in memory
+PLAN_CACHE_SIZE = 10000
+
+# Keys holding a single child operator / a list of child operators
+CHILD_KEYS = ('~child', 'input', 'left', 'right', 'first', 'second', 'scan')
+CHILDREN_KEYS = ('~children', 'inputs', 'scans')
+
+INDEX_SCAN_OPERATORS = ('IndexScan', 'IndexScan2', 'IndexScan3')
+PRIMARY_SCAN_OPERATORS = ('PrimaryScan', 'PrimaryScan2', 'PrimaryScan3')
+
+UNKNOWN_BSC = 'unknown.unknown.unknown'
+
+
+def plan_hash(plan_text: str) -> str:
+    """Stable cache key for a raw plan JSON string"""
+    return hashlib.blake2b(plan_text.encode('utf-8', 'surrogatepass'), digest_size=16).hexdigest()
+
+
+def extract_bsc(operator: Dict[str, Any]) -> str:
+    """
+    bucket.scope.collection for an operator (same rules as extractBSCFromOperator)
+
+    Newer plans carry bucket/scope/keyspace; older ones only keyspace (the bucket).
+    """
+    if operator.get('bucket'):
+        return f"{operator['bucket']}.{operator.get('scope') or '_default'}.{operator.get('keyspace') or '_default'}"
+    if operator.get('keyspace'):
+        return f"{operator['keyspace']}._default._default"
+    return UNKNOWN_BSC
+
+
+def iter_operators(root: Any) -> Iterator[Dict[str, Any]]:
+    """
+    Yield every operator in a plan tree, depth-first, without recursion
+
+    Follows ~child/~children, input(s), left/right, first/second, scan(s) and
+    ~subqueries[].executionTimings. Each operator object is yielded once.
+    """
+    stack = [root]
+    seen = set()
+    while stack:
+        operator = stack.pop()
+        if not isinstance(operator, dict) or id(operator) in seen:
+            continue
+        seen.add(id(operator))
+        yield operator
+
+        # Push in reverse so children come out in document order
+        pending = []
+        for key in CHILD_KEYS:
+            pending.append(operator.get(key))
+        for key in CHILDREN_KEYS:
+            children = operator.get(key)
+            if isinstance(children, list):
+                pending.extend(children)
+        subqueries = operator.get('~subqueries')
+        if isinstance(subqueries, list):
+            pending.extend(sub.get('executionTimings') for sub in subqueries if isinstance(sub, dict))
+        stack.extend(reversed(pending))
+
+
+def summarize_operators(root: Any) -> Dict[str, Any]:
+    """
+    Single-walk summary of a decoded plan
+
+    Returns:
+        Dict with exec/stream/core/kernel times (ms), core-to-kernel ratio,
+        index names (as index::bucket.scope.collection), primary and
+        sequential scan usage, and per-operator counts
+    """
+    exec_time = 0.0
+    stream_time = 0.0
+    kern_time = 0.0
+    max_kern_time = 0.0
+    indexes = []
+    operator_counts: Counter = Counter()
+    uses_primary = False
+    sequential_scan = False
+
+    for operator in iter_operators(root):
+        op_type = operator.get('#operator') or 'Unknown'
+        operator_counts[op_type] += 1
+
+        stats = operator.get('#stats')
+        if isinstance(stats, dict):
+            if stats.get('execTime'):
+                ms = parse_duration_ms(stats['execTime'])
+                if ms == ms:  # not NaN
+                    exec_time += ms
+                    if op_type == 'Stream':
+                        stream_time += ms
+            if stats.get('kernTime'):
+                ms = parse_duration_ms(stats['kernTime'])
+                if ms == ms:
+                    kern_time += ms
+                    max_kern_time = max(max_kern_time, ms)
+
+        if op_type in INDEX_SCAN_OPERATORS:
+            bsc = extract_bsc(operator)
+            for key in ('index', 'indexName'):
+                if operator.get(key):
+                    indexes.append(f"{operator[key]}::{bsc}")
+        elif op_type in PRIMARY_SCAN_OPERATORS:
+            uses_primary = True
+            indexes.append(f"{operator.get('index') or '#primary'}::{extract_bsc(operator)}")
+        if operator.get('using') == 'sequentialscan':
+            sequential_scan = True
+            indexes.append(f"#sequentialscan::{extract_bsc(operator)}")
+
+    core_time = exec_time - stream_time
+    return {
+        'exec_time_ms': round(exec_time, 6),
+        'stream_exec_time_ms': round(stream_time, 6),
+        'core_exec_time_ms': round(core_time, 6),
+        'kern_time_ms': round(kern_time, 6),
+        'max_kern_time_ms': round(max_kern_time, 6),
+        'core_to_kernel_ratio': (core_time / max_kern_time) * 100 if max_kern_time > 0 else 0,
+        'indexes': list(dict.fromkeys(indexes)),
+        'uses_primary': uses_primary,
+        'sequential_scan': sequential_scan,
+        'operator_counts': dict(operator_counts),
+        'operator_total': sum(operator_counts.values())
+    }
+
+
+class PlanCache:
+    """
+    Thread-safe LRU cache of plan summaries keyed by plan hash
+    """
+
+    def __init__(self, max_entries: int = PLAN_CACHE_SIZE):
+        self.max_entries = max_entries
+        self._entries: 'OrderedDict[str, Dict[str, Any]]' = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            summary = self._entries.get(key)
+            if summary is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return summary
+
+    def set(self, key: str, summary: Dict[str, Any]) -> None:
+        with self._lock:
+            self._entries[key] = summary
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self.hits = 0
+            self.misses = 0
+
+    def stats(self) -> Dict[str, Any]:
+        """Get cache statistics"""
+        with self._lock:
+            return {'entries': len(self._entries), 'hits': self.hits, 'misses': self.misses}
+
+
+# Global plan summary cache shared by all datasets
+plan_cache = PlanCache()
+
+
+def summarize_plan(plan: Union[str, Dict[str, Any], None],
+                   cache: Optional[PlanCache] = None) -> Optional[Dict[str, Any]]:
+    """
+    Summary for one request's plan, decoding a JSON string only on cache miss
+
+    Args:
+        plan: Raw plan JSON string, an already-decoded plan dict, or None
+        cache: Cache to use (default: module plan_cache)
+
+    Returns:
+        Summary dict (callers must not mutate it - it is shared), None if there
+        is no plan; undecodable plans yield {'error': ...}
+    """
+    if not plan:
+        return None
+    if isinstance(plan, dict):
+        return summarize_operators(plan)
+    if not isinstance(plan, str):
+        return None
+
+    cache = plan_cache if cache is None else cache
+    key = plan_hash(plan)
+    summary = cache.get(key)
+    if summary is None:
+        try:
+            summary = summarize_operators(json.loads(plan))
+        except (ValueError, RecursionError) as e:
+            summary = {'error': f"Undecodable plan: {type(e).__name__}"}
+        cache.set(key, summary)
+    return summary
+
+
+def plan_index_usage(dataset: Any, limit: int = 25) -> Optional[Dict[str, Any]]:
+    """
+    Index and operator usage over every request plan of a dataset
+
+    Args:
+        dataset: CompletedRequestsDataset (uses its plan_summary per row)
+        limit: Most used indexes / operators reported
+
+    Returns:
+        Dict with request counts, the top indexes (name, keyspace, requests)
+        and top operators; None if the dataset kept no plans
+    """
+    if dataset is None or not dataset.plans:
+        return None
+    index_requests: Counter = Counter()
+    operator_totals: Counter = Counter()
+    with_plans = primary = sequential = undecodable = 0
+    for row in range(len(dataset)):
+        summary = dataset.plan_summary(row)
+        if summary is None:
+            continue
+        if 'error' in summary:
+            undecodable += 1
+            continue
+        with_plans += 1
+        primary += summary['uses_primary']
+        sequential += summary['sequential_scan']
+        index_requests.update(summary['indexes'])
+        operator_totals.update(summary['operator_counts'])
+
+    indexes = []
+    for index, requests in index_requests.most_common(limit):
+        name, _, bsc = index.partition('::')
+        indexes.append({
+            'indexName': name,
+            'bucketScopeCollection': bsc,
+            'requests': requests
+        })
+    return {
+        'requests_with_plans': with_plans,
+        'undecodable_plans': undecodable,
+        'primary_scan_requests': primary,
+        'sequential_scan_requests': sequential,
+        'distinct_indexes': len(index_requests),
+        'indexes': indexes,
+        'operators': dict(operator_totals.most_common(limit))
+    }
@@ -0,0 +1,371 @@
+#!/usr/bin/env python3
+"""
+Query Group Aggregation Engine
+Server-side port of the frontend normalizeStatement / calculateGroupStats
+
+Architecture:
+- Requests are grouped by normalized statement (literals replaced with ?)
+  in a single pass; no per-group request lists are kept
+- Each group keeps running count/sum/min/max plus a DDSketch of serviceTime,
+  so p50/p95/p99 never need a full sort of the durations
+- Groups (and whole engines) merge by adding counters and sketch buckets,
+  so captures from several files or time slices combine cheaply
+- Columnar datasets (dataset.py) are grouped vectorized: each interned
+  statement is normalized once and the sketch buckets are counted with NumPy
+"""
+
+import math
+import re
+from collections import Counter
+from functools import lru_cache
+from typing import Any, Dict, Iterable, List, Optional
+import numpy as np
+
+from durations import parse_duration_ms
+
+# DDSketch relative accuracy: every quantile is within 1% of a real value
+SKETCH_RELATIVE_ACCURACY = 0.01
+
+# Durations below this (seconds) are counted in the sketch's zero bucket
+SKETCH_MIN_VALUE = 1e-9
+
+# Matches the frontend CACHE_LIMITS.normalizeStatement
+NORMALIZE_CACHE_SIZE = 10000
+
+# Same replacements, in the same order, as data-layer.js normalizeStatement.
+# re.ASCII keeps \b and \d identical to JavaScript regex semantics.
+_NORMALIZE_PATTERNS = (
+    (re.compile(r'\b\d+\b', re.ASCII), '?'),
+    (re.compile(r"'[^']*'"), '?'),
+    (re.compile(r'"[^"]*"'), '?'),
+    (re.compile(r'\[\s*\d+(?:\s*,\s*\d+)*\s*\]', re.ASCII), '[?]'),
+    (re.compile(r"\[\s*'[^']*'(?:\s*,\s*'[^']*')*\s*\]"), '[?]'),
+    (re.compile(r'IN\s*\([^)]+\)', re.IGNORECASE), 'IN (?)'),
+)
+
+# Frontend status buckets; a missing state counts as completed
+STATUS_KEYS = ('completed', 'fatal', 'cancelled', 'other')
+
+# Phase counts averaged per group (avg_<phase> in the analysis table)
+PHASE_COUNT_KEYS = ('fetch', 'primaryScan', 'indexScan')
+
+
+@lru_cache(maxsize=NORMALIZE_CACHE_SIZE)
+def normalize_statement(statement: Optional[str]) -> str:
+    """
+    Replace literals in a SQL++ statement with ? so similar queries group together
+
+    Args:
+        statement: Raw statement or preparedText
+
+    Returns:
+        Normalized statement ('' for empty input)
+    """
+    if not statement:
+        return ''
+    normalized = statement
+    for pattern, replacement in _NORMALIZE_PATTERNS:
+        normalized = pattern.sub(replacement, normalized)
+    return normalized.strip()
+
+
+class DDSketch:
+    """
+    Mergeable quantile sketch with relative-error guarantees (DDSketch)
+
+    Positive values are counted in logarithmic buckets of width gamma; a
+    quantile is the midpoint of the bucket holding that rank. Merging two
+    sketches adds bucket counts, so the result is identical to sketching
+    the combined values directly.
+    """
+
+    def __init__(self, relative_accuracy: float = SKETCH_RELATIVE_ACCURACY):
+        self.relative_accuracy = relative_accuracy
+        self.gamma = (1 + relative_accuracy) / (1 - relative_accuracy)
+        self._log_gamma = math.log(self.gamma)
+        self.buckets: Dict[int, int] = {}
+        self.zero_count = 0
+        self.count = 0
+
+    def _key(self, value: float) -> int:
+        return int(math.ceil(math.log(value) / self._log_gamma))
+
+    def _value(self, key: int) -> float:
+        return 2.0 * self.gamma ** key / (self.gamma + 1)
+
+    def add(self, value: float, count: int = 1) -> None:
+        """Add a non-negative value"""
+        if value <= SKETCH_MIN_VALUE:
+            self.zero_count += count
+        else:
+            key = self._key(value)
+            self.buckets[key] = self.buckets.get(key, 0) + count
+        self.count += count
+
+    def add_array(self, values: np.ndarray) -> None:
+        """Add a float array (NaN already removed) in one vectorized step"""
+        if values.size == 0:
+            return
+        positive = values[values > SKETCH_MIN_VALUE]
+        self.zero_count += int(values.size - positive.size)
+        if positive.size:
+            keys = np.ceil(np.log(positive) / self._log_gamma).astype(np.int64)
+            unique, counts = np.unique(keys, return_counts=True)
+            for key, count in zip(unique.tolist(), counts.tolist()):
+                self.buckets[key] = self.buckets.get(key, 0) + count
+        self.count += int(values.size)
+
+    def merge(self, other: 'DDSketch') -> None:
+        """Fold another sketch (same relative accuracy) into this one"""
+        if other.relative_accuracy != self.relative_accuracy:
+            raise ValueError("Cannot merge sketches with different relative accuracy")
+        for key, count in other.buckets.items():
+            self.buckets[key] = self.buckets.get(key, 0) + count
+        self.zero_count += other.zero_count
+        self.count += other.count
+
+    def quantile(self, q: float) -> Optional[float]:
+        """
+        Estimate the q-quantile (0 <= q <= 1)
+
+        Returns:
+            Estimated value, None if the sketch is empty
+        """
+        if self.count == 0:
+            return None
+        rank = q * (self.count - 1)
+        if rank < self.zero_count:
+            return 0.0
+        seen = self.zero_count
+        for key in sorted(self.buckets):
+            seen += self.buckets[key]
+            if seen > rank:
+                return self._value(key)
+        return self._value(max(self.buckets))
+
+
+class QueryGroupStats:
+    """
+    Running statistics for one normalized statement
+    """
+
+    def __init__(self, normalized_statement: str):
+        self.normalized_statement = normalized_statement
+        self.request_count = 0
+        self.total_count = 0  # requests with a valid serviceTime
+        self.duration_sum = 0.0
+        self.min_duration = math.inf
+        self.max_duration = -math.inf
+        self.sketch = DDSketch()
+        self.phase_count_sums = {key: 0.0 for key in PHASE_COUNT_KEYS}
+        self.result_count_sum = 0.0
+        self.result_size_sum = 0.0
+        self.user_query_counts: Counter = Counter()
+        self.status_counts = {key: 0 for key in STATUS_KEYS}
+
+    def add(self, request: Dict[str, Any]) -> None:
+        """Add one request dict"""
+        self.request_count += 1
+
+        ms = parse_duration_ms(request.get('serviceTime'))
+        if not math.isnan(ms):
+            seconds = ms / 1000
+            self.total_count += 1
+            self.duration_sum += seconds
+            self.min_duration = min(self.min_duration, seconds)
+            self.max_duration = max(self.max_duration, seconds)
+            self.sketch.add(seconds)
+
+        phase_counts = request.get('phaseCounts') or {}
+        for key in PHASE_COUNT_KEYS:
+            self.phase_count_sums[key] += _number(phase_counts.get(key))
+        self.result_count_sum += _number(request.get('resultCount'))
+        self.result_size_sum += _number(request.get('resultSize'))
+
+        users = request.get('users')
+        if users:
+            self.user_query_counts[users] += 1
+        self.status_counts[_status_key(request.get('state'))] += 1
+
+    def merge(self, other: 'QueryGroupStats') -> None:
+        """Fold another group's statistics into this one"""
+        self.request_count += other.request_count
+        self.total_count += other.total_count
+        self.duration_sum += other.duration_sum
+        self.min_duration = min(self.min_duration, other.min_duration)
+        self.max_duration = max(self.max_duration, other.max_duration)
+        self.sketch.merge(other.sketch)
+        for key in PHASE_COUNT_KEYS:
+            self.phase_count_sums[key] += other.phase_count_sums[key]
+        self.result_count_sum += other.result_count_sum
+        self.result_size_sum += other.result_size_sum
+        self.user_query_counts.update(other.user_query_counts)
+        for key in STATUS_KEYS:
+            self.status_counts[key] += other.status_counts[key]
+
+    def to_dict(self) -> Optional[Dict[str, Any]]:
+        """
+        Group row in the frontend analysis table shape (plus total and percentiles)
+
+        Returns:
+            Dict of statistics, None if no request had a valid serviceTime
+        """
+        if self.total_count == 0:
+            return None
+
+        count = self.total_count
+
+        def bounded(q: float) -> float:
+            # Sketch estimates can overshoot the observed range by the relative accuracy
+            return min(max(self.sketch.quantile(q), self.min_duration), self.max_duration)
+
+        return {
+            'normalized_statement': self.normalized_statement,
+            'user_query_counts': dict(self.user_query_counts),
+            'total_count': count,
+            'total_duration_in_seconds': self.duration_sum,
+            'min_duration_in_seconds': self.min_duration,
+            'max_duration_in_seconds': self.max_duration,
+            'avg_duration_in_seconds': self.duration_sum / count,
+            'median_duration_in_seconds': bounded(0.5),
+            'p95_duration_in_seconds': bounded(0.95),
+            'p99_duration_in_seconds': bounded(0.99),
+            **{f'avg_{key}': round(self.phase_count_sums[key] / count) for key in PHASE_COUNT_KEYS},
+            'avg_resultCount': round(self.result_count_sum / count),
+            'avg_resultSize': round(self.result_size_sum / count),
+            'status_counts': dict(self.status_counts)
+        }
+
+
+def _number(value: Any) -> float:
+    return float(value) if isinstance(value, (int, float)) and not isinstance(value, bool) else 0.0
+
+
+def _status_key(state: Optional[str]) -> str:
+    state = state.lower() if isinstance(state, str) and state else 'completed'
+    return state if state in STATUS_KEYS else 'other'
+
+
+class QueryGroupEngine:
+    """
+    Single-pass grouping of completed requests by normalized statement
+    """
+
+    def __init__(self):
+        self.groups: Dict[str, QueryGroupStats] = {}
+
+    def __len__(self) -> int:
+        return len(self.groups)
+
+    def _group(self, normalized: str) -> QueryGroupStats:
+        group = self.groups.get(normalized)
+        if group is None:
+            group = self.groups[normalized] = QueryGroupStats(normalized)
+        return group
+
+    def add(self, request: Dict[str, Any]) -> None:
+        """Add one request dict (requests without statement/preparedText are skipped)"""
+        statement = request.get('statement') or request.get('preparedText')
+        if not statement:
+            return
+        self._group(normalize_statement(statement)).add(request)
+
+    def extend(self, requests: Iterable[Dict[str, Any]]) -> None:
+        """Add many request dicts"""
+        for request in requests:
+            self.add(request)
+
+    def add_dataset(self, dataset) -> None:
+        """
+        Add every row of a CompletedRequestsDataset using its columns
+
+        Each interned statement is normalized once; rows are then split by
+        group with a stable argsort and every group is updated from array slices.
+        """
+        statement_codes = dataset.columns['statement_code']
+        rows = np.flatnonzero(statement_codes >= 0)
+        if rows.size == 0:
+            return
+
+        # Interned statement code -> local group id
+        normalized_keys: List[str] = []
+        local_ids: Dict[str, int] = {}
+        code_to_group = np.empty(len(dataset.statements), dtype=np.int64)
+        for code, statement in enumerate(dataset.statements.values):
+            normalized = normalize_statement(statement)
+            local_id = local_ids.get(normalized)
+            if local_id is None:
+                local_id = local_ids[normalized] = len(normalized_keys)
+                normalized_keys.append(normalized)
+            code_to_group[code] = local_id
+
+        row_groups = code_to_group[statement_codes[rows]]
+        order = np.argsort(row_groups, kind='stable')
+        rows = rows[order]
+        bounds = np.searchsorted(row_groups[order], np.arange(len(normalized_keys) + 1))
+
+        seconds = dataset.columns['serviceTime'] / 1000
+        result_count = np.nan_to_num(dataset.columns['resultCount'])
+        result_size = np.nan_to_num(dataset.columns['resultSize'])
+        user_codes = dataset.columns['user_code']
+        state_codes = dataset.columns['state_code']
+        state_keys = [_status_key(state) for state in dataset.states.values]
+
+        for local_id, normalized in enumerate(normalized_keys):
+            group_rows = rows[bounds[local_id]:bounds[local_id + 1]]
+            if group_rows.size == 0:
+                continue
+            group = self._group(normalized)
+            group.request_count += int(group_rows.size)
+
+            durations = seconds[group_rows]
+            durations = durations[~np.isnan(durations)]
+            if durations.size:
+                group.total_count += int(durations.size)
+                group.duration_sum += float(durations.sum())
+                group.min_duration = min(group.min_duration, float(durations.min()))
+                group.max_duration = max(group.max_duration, float(durations.max()))
+                group.sketch.add_array(durations)
+
+            for key in PHASE_COUNT_KEYS:
+                if key in dataset.phase_counts:
+                    group.phase_count_sums[key] += float(dataset.phase_counts[key][group_rows].sum())
+            group.result_count_sum += float(result_count[group_rows].sum())
+            group.result_size_sum += float(result_size[group_rows].sum())
+
+            codes, counts = np.unique(user_codes[group_rows], return_counts=True)
+            for code, count in zip(codes.tolist(), counts.tolist()):
+                if code >= 0:
+                    group.user_query_counts[dataset.users.lookup(code)] += count
+
+            codes, counts = np.unique(state_codes[group_rows], return_counts=True)
+            for code, count in zip(codes.tolist(), counts.tolist()):
+                key = state_keys[code] if code >= 0 else 'completed'
+                group.status_counts[key] += count
+
+    def merge(self, other: 'QueryGroupEngine') -> None:
+        """Fold another engine's groups into this one (e.g. another file or time slice)"""
+        for normalized, other_group in other.groups.items():
+            self._group(normalized).merge(other_group)
+
+    def results(self, sort_by: str = 'total_duration_in_seconds', limit: Optional[int] = None) -> List[Dict[str, Any]]:
+        """
+        Group rows sorted descending by a statistic
+
+        Args:
+            sort_by: Key of the group dict to sort by
+            limit: Maximum number of rows (None for all)
+
+        Returns:
+            List of group dicts (groups without a valid serviceTime are omitted)
+        """
+        rows = [row for row in (group.to_dict() for group in self.groups.values()) if row]
+        rows.sort(key=lambda row: row.get(sort_by, 0), reverse=True)
+        return rows[:limit] if limit is not None else rows
+
+
+def build_query_groups(requests: Iterable[Dict[str, Any]]) -> QueryGroupEngine:
+    """Group an iterable of request dicts"""
+    engine = QueryGroupEngine()
+    engine.extend(requests)
+    return engine
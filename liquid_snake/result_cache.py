@@ -0,0 +1,144 @@
+#!/usr/bin/env python3
+"""
+Query Result Cache Module
+Short-TTL in-process cache for read-mostly Couchbase endpoints
+
+Architecture:
+- Entries are keyed by (cluster fingerprint, keyspace, statement,
+  parameters); the fingerprint comes from cb_pool, so two users of the
+  same cluster and credentials share entries and different clusters never do
+- Each entry is tagged with its keyspace ('bucket.scope.collection'); the
+  writes this server makes (save-preferences, analyze, AI status changes,
+  analyzer saves/deletes) invalidate every entry of the keyspace they
+  touched, so this server never serves its own stale reads; a query that
+  was already running during an invalidation does not store its result
+- The TTL bounds staleness from writes made elsewhere (other servers,
+  the Couchbase UI); expired entries are dropped on access, and the
+  least recently used entry goes when max_entries is reached
+- Cached values are shared between requests and must not be mutated
+"""
+
+import json
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Optional, Tuple
+from icecream import ic
+
+from cb_pool import config_fingerprint, resolve_keyspace
+
+# Seconds a cached result is served
+RESULT_CACHE_TTL_SECONDS = 15
+
+# Upper bound on cached results
+RESULT_CACHE_MAX_ENTRIES = 512
+
+CacheKey = Tuple[str, str, str, str]
+
+
+def keyspace_tag(bucket_config: Optional[Dict[str, Any]], kind: str = 'analyzer') -> str:
+    """Invalidation tag for a request's bucketConfig ('analyzer' or 'preferences')"""
+    return '.'.join(resolve_keyspace(bucket_config, kind))
+
+
+class ResultCache:
+    """
+    Thread-safe TTL + LRU cache of query and KV results
+    """
+
+    def __init__(self, ttl_seconds: float = RESULT_CACHE_TTL_SECONDS,
+                 max_entries: int = RESULT_CACHE_MAX_ENTRIES):
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self._entries: 'OrderedDict[CacheKey, Tuple[float, Any]]' = OrderedDict()
+        self._lock = threading.Lock()
+        # Bumped per (fingerprint, tag) by invalidate()
+        self._generations: Dict[Tuple[str, str], int] = {}
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    @staticmethod
+    def key(config: Dict[str, Any], tag: str, statement: str, params: Any = None) -> CacheKey:
+        """Cache key for a statement (or KV operation name) and its parameters"""
+        return (config_fingerprint(config), tag, statement,
+                json.dumps(params, sort_keys=True, default=str))
+
+    def get(self, key: CacheKey) -> Tuple[bool, Any]:
+        """(found, value); expired entries count as misses"""
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and now - entry[0] <= self.ttl_seconds:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return True, entry[1]
+            if entry is not None:
+                del self._entries[key]
+            self.misses += 1
+            return False, None
+
+    def generation(self, key: CacheKey) -> int:
+        """Invalidation count of the key's keyspace (pass to put when the value was computed)"""
+        with self._lock:
+            return self._generations.get(key[:2], 0)
+
+    def put(self, key: CacheKey, value: Any, generation: Optional[int] = None) -> None:
+        """Store a value unless its keyspace was invalidated since generation was read"""
+        with self._lock:
+            if generation is not None and self._generations.get(key[:2], 0) != generation:
+                return
+            self._entries[key] = (time.time(), value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def cached(self, key: CacheKey, compute: Callable[[], Any], refresh: bool = False) -> Any:
+        """
+        Cached value for key, computing and storing it on a miss
+
+        Args:
+            key: From ResultCache.key
+            compute: Runs the query; exceptions propagate and nothing is cached
+            refresh: Skip the lookup (the fresh result is still stored)
+        """
+        if not refresh:
+            found, value = self.get(key)
+            if found:
+                return value
+        generation = self.generation(key)
+        value = compute()
+        self.put(key, value, generation)
+        return value
+
+    def invalidate(self, config: Dict[str, Any], tag: str) -> int:
+        """Drop every entry of a keyspace on a cluster; returns how many were dropped"""
+        fingerprint = config_fingerprint(config)
+        with self._lock:
+            stale = [key for key in self._entries if key[0] == fingerprint and key[1] == tag]
+            for key in stale:
+                del self._entries[key]
+            self._generations[(fingerprint, tag)] = self._generations.get((fingerprint, tag), 0) + 1
+            self.invalidations += 1
+        if stale:
+            ic(f"🧽 Result cache: dropped {len(stale)} entries for {tag}")
+        return len(stale)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                'entries': len(self._entries),
+                'hits': self.hits,
+                'misses': self.misses,
+                'invalidations': self.invalidations,
+                'ttl_seconds': self.ttl_seconds,
+                'max_entries': self.max_entries
+            }
+
+
+# Global cache
+result_cache = ResultCache()
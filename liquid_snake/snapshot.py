@@ -0,0 +1,360 @@
+#!/usr/bin/env python3
+"""
+Dataset Snapshot Module
+Persists parsed datasets on disk so a capture can be reopened without re-parsing
+
+Architecture:
+- A snapshot is a directory named by the SHA-256 of the uploaded bytes
+- Every numeric column is one .npy file, loaded back with mmap_mode='r',
+  so reopening reads only the pages a query actually touches
+- requestId and raw plan strings are packed into one UTF-8 blob plus an
+  offsets array (PackedStrings) and decoded per row on access
+- Interned string tables (statements, users, states) are stored in meta.json
+- Plan summaries are stored per distinct plan hash and primed into the
+  plan cache on load, so plans are not decoded again
+- Snapshots are written to a temp directory and renamed into place, so a
+  crashed or concurrent write never leaves a half-written snapshot
+- The store is capped by total size and by age: every save prunes expired
+  snapshots, then the least recently used ones until the total fits. Loads
+  touch meta.json, so its mtime is the last use. A pruned snapshot that is
+  still memory-mapped stays readable until it is closed (POSIX unlink
+  semantics)
+"""
+
+import hashlib
+import json
+import os
+import re
+import secrets
+import shutil
+import time
+from typing import Any, Dict, IO, Iterator, List, Optional, Sequence, Union
+import numpy as np
+from icecream import ic
+
+from dataset import CompletedRequestsDataset, StringTable
+from plans import PlanCache, plan_cache, plan_hash, summarize_plan
+
+# Bump when the on-disk layout changes; older snapshots are then ignored
+SNAPSHOT_FORMAT_VERSION = 1
+
+DEFAULT_SNAPSHOT_DIR = os.environ.get(
+    'LIQUID_SNAKE_SNAPSHOT_DIR',
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), '.snapshots')
+)
+
+# Total bytes kept on disk before the least recently used snapshots are pruned
+SNAPSHOT_MAX_BYTES = int(os.environ.get('LIQUID_SNAKE_SNAPSHOT_MAX_BYTES', 10 * 1024 ** 3))
+
+# Snapshots unused for longer than this are pruned
+SNAPSHOT_MAX_AGE_SECONDS = int(os.environ.get('LIQUID_SNAKE_SNAPSHOT_MAX_AGE_SECONDS', 30 * 24 * 3600))
+
+_CONTENT_HASH = re.compile(r'^[0-9a-f]{64}$')
+
+
+class HashingReader:
+    """
+    File-like wrapper that SHA-256 hashes every byte read through it
+    """
+
+    def __init__(self, stream: IO):
+        self._stream = stream
+        self._hash = hashlib.sha256()
+
+    def read(self, size: int = -1) -> bytes:
+        chunk = self._stream.read(size)
+        if chunk:
+            self._hash.update(chunk if isinstance(chunk, bytes) else chunk.encode('utf-8'))
+        return chunk
+
+    def hexdigest(self) -> str:
+        return self._hash.hexdigest()
+
+
+def hash_files(paths: List[str], chunk_size: int = 1024 * 1024) -> str:
+    """SHA-256 over the concatenated contents of several files (in order)"""
+    digest = hashlib.sha256()
+    for path in paths:
+        with open(path, 'rb') as f:
+            for chunk in iter(lambda: f.read(chunk_size), b''):
+                digest.update(chunk)
+    return digest.hexdigest()
+
+
+class PackedStrings(Sequence):
+    """
+    Read-only sequence of optional strings stored as one UTF-8 blob + offsets
+    """
+
+    def __init__(self, data: Union[bytes, np.ndarray], offsets: np.ndarray, nulls: np.ndarray):
+        self._data = data
+        self._offsets = offsets
+        self._nulls = nulls
+
+    @staticmethod
+    def pack(values: Sequence[Optional[str]]) -> Dict[str, Any]:
+        """Encode values into {'data': bytes, 'offsets': int64[n+1], 'nulls': bool[n]}"""
+        encoded = [value.encode('utf-8', 'surrogatepass') if isinstance(value, str) else b'' for value in values]
+        offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+        np.cumsum([len(chunk) for chunk in encoded], out=offsets[1:])
+        return {
+            'data': b''.join(encoded),
+            'offsets': offsets,
+            'nulls': np.array([not isinstance(value, str) for value in values], dtype=bool)
+        }
+
+    def __len__(self) -> int:
+        return int(self._nulls.size)
+
+    @property
+    def nbytes(self) -> int:
+        """Encoded size of the strings in this sequence"""
+        return int(self._offsets[-1] - self._offsets[0])
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            start, stop, step = index.indices(len(self))
+            if step != 1:
+                return [self[i] for i in range(start, stop, step)]
+            stop = max(start, stop)
+            return PackedStrings(self._data, self._offsets[start:stop + 1], self._nulls[start:stop])
+        if index < 0:
+            index += len(self)
+        if self._nulls[index]:
+            return None
+        return bytes(self._data[self._offsets[index]:self._offsets[index + 1]]).decode('utf-8', 'surrogatepass')
+
+    def __iter__(self) -> Iterator[Optional[str]]:
+        for index in range(len(self)):
+            yield self[index]
+
+
+class SnapshotStore:
+    """
+    Directory of dataset snapshots keyed by content hash
+    """
+
+    def __init__(self, root: str = DEFAULT_SNAPSHOT_DIR,
+                 max_bytes: int = SNAPSHOT_MAX_BYTES,
+                 max_age_seconds: float = SNAPSHOT_MAX_AGE_SECONDS):
+        """
+        Args:
+            root: Snapshot directory
+            max_bytes: Total size kept before LRU pruning (0 disables the cap)
+            max_age_seconds: Unused snapshots older than this are pruned (0 disables)
+        """
+        self.root = root
+        self.max_bytes = max_bytes
+        self.max_age_seconds = max_age_seconds
+
+    def path(self, content_hash: str) -> str:
+        if not _CONTENT_HASH.match(content_hash or ''):
+            raise ValueError(f"Invalid content hash: {content_hash!r}")
+        return os.path.join(self.root, content_hash)
+
+    def exists(self, content_hash: str) -> bool:
+        try:
+            return os.path.isfile(os.path.join(self.path(content_hash), 'meta.json'))
+        except ValueError:
+            return False
+
+    def delete(self, content_hash: str) -> bool:
+        if not self.exists(content_hash):
+            return False
+        shutil.rmtree(self.path(content_hash), ignore_errors=True)
+        return True
+
+    def _touch(self, content_hash: str) -> None:
+        try:
+            os.utime(os.path.join(self.path(content_hash), 'meta.json'))
+        except OSError:
+            pass
+
+    def entries(self) -> List[Dict[str, Any]]:
+        """Complete snapshots with their size and last use, least recently used first"""
+        entries = []
+        try:
+            names = os.listdir(self.root)
+        except FileNotFoundError:
+            return entries
+        for name in names:
+            directory = os.path.join(self.root, name)
+            try:
+                if not _CONTENT_HASH.match(name):
+                    continue
+                last_used = os.path.getmtime(os.path.join(directory, 'meta.json'))
+                size = sum(entry.stat().st_size for entry in os.scandir(directory) if entry.is_file())
+            except OSError:
+                continue
+            entries.append({'content_hash': name, 'bytes': size, 'last_used': last_used})
+        entries.sort(key=lambda entry: entry['last_used'])
+        return entries
+
+    def prune(self, keep: Optional[str] = None) -> List[str]:
+        """
+        Remove expired snapshots, then least recently used ones over max_bytes
+
+        Args:
+            keep: Content hash never pruned (the snapshot just written)
+
+        Returns:
+            Content hashes removed
+        """
+        entries = self.entries()
+        total = sum(entry['bytes'] for entry in entries)
+        entries = [entry for entry in entries if entry['content_hash'] != keep]
+        cutoff = time.time() - self.max_age_seconds if self.max_age_seconds else None
+        removed = []
+        for entry in entries:
+            expired = cutoff is not None and entry['last_used'] < cutoff
+            over = bool(self.max_bytes) and total > self.max_bytes
+            if not (expired or over):
+                continue
+            if self.delete(entry['content_hash']):
+                removed.append(entry['content_hash'])
+                total -= entry['bytes']
+        if removed:
+            ic(f"🧹 Pruned {len(removed)} snapshot(s); {total / 1e6:.1f} MB kept")
+        return removed
+
+    def save(self, content_hash: str, dataset: CompletedRequestsDataset,
+             include_plan_summaries: bool = True) -> str:
+        """
+        Write a dataset snapshot (no-op if one already exists for the hash)
+
+        Args:
+            content_hash: SHA-256 of the uploaded bytes
+            dataset: Parsed dataset
+            include_plan_summaries: Summarize every distinct plan and store the summaries
+
+        Returns:
+            Snapshot directory
+        """
+        target = self.path(content_hash)
+        if self.exists(content_hash):
+            self._touch(content_hash)
+            return target
+
+        start_time = time.time()
+        os.makedirs(self.root, exist_ok=True)
+        tmp = os.path.join(self.root, f'.{content_hash}.{os.getpid()}.{secrets.token_hex(4)}.tmp')
+        os.makedirs(tmp)
+        try:
+            meta = {
+                'format_version': SNAPSHOT_FORMAT_VERSION,
+                'rows': len(dataset),
+                'columns': list(dataset.columns),
+                'phase_counts': list(dataset.phase_counts),
+                'phase_times': list(dataset.phase_times),
+                'statements': dataset.statements.values,
+                'users': dataset.users.values,
+                'states': dataset.states.values,
+                'has_plans': dataset.plans is not None,
+                'created': time.time()
+            }
+            for prefix, names, columns in (('col', meta['columns'], dataset.columns),
+                                           ('pc', meta['phase_counts'], dataset.phase_counts),
+                                           ('pt', meta['phase_times'], dataset.phase_times)):
+                for i, name in enumerate(names):
+                    np.save(os.path.join(tmp, f'{prefix}_{i}.npy'), np.ascontiguousarray(columns[name]))
+
+            self._save_strings(tmp, 'request_ids', dataset.request_ids)
+            if dataset.plans is not None:
+                self._save_strings(tmp, 'plans', dataset.plans)
+                if include_plan_summaries:
+                    summaries = {}
+                    for plan in dataset.plans:
+                        if isinstance(plan, str) and plan:
+                            key = plan_hash(plan)
+                            if key not in summaries:
+                                summaries[key] = summarize_plan(plan)
+                    with open(os.path.join(tmp, 'plan_summaries.json'), 'w') as f:
+                        json.dump(summaries, f)
+
+            # meta.json last: its presence marks a complete snapshot
+            with open(os.path.join(tmp, 'meta.json'), 'w') as f:
+                json.dump(meta, f)
+            try:
+                os.rename(tmp, target)
+            except OSError:
+                # Another writer finished first; its snapshot is equivalent
+                shutil.rmtree(tmp, ignore_errors=True)
+        except BaseException:
+            shutil.rmtree(tmp, ignore_errors=True)
+            raise
+
+        ic(f"💾 Snapshot {content_hash[:12]} written: {len(dataset)} rows in {int((time.time() - start_time) * 1000)}ms")
+        self.prune(keep=content_hash)
+        return target
+
+    def load(self, content_hash: str, cache: Optional[PlanCache] = None) -> Optional[CompletedRequestsDataset]:
+        """
+        Reopen a snapshot with memory-mapped columns
+
+        Args:
+            content_hash: SHA-256 of the uploaded bytes
+            cache: Plan cache to prime with stored summaries (default: module plan_cache)
+
+        Returns:
+            Dataset, or None if there is no (current-format) snapshot for the hash
+        """
+        if not self.exists(content_hash):
+            return None
+        start_time = time.time()
+        directory = self.path(content_hash)
+        with open(os.path.join(directory, 'meta.json')) as f:
+            meta = json.load(f)
+        if meta.get('format_version') != SNAPSHOT_FORMAT_VERSION:
+            ic(f"⚠️ Snapshot {content_hash[:12]} has format {meta.get('format_version')}, ignoring")
+            return None
+        self._touch(content_hash)
+
+        def columns(prefix: str, names: List[str]) -> Dict[str, np.ndarray]:
+            return {
+                name: np.load(os.path.join(directory, f'{prefix}_{i}.npy'), mmap_mode='r')
+                for i, name in enumerate(names)
+            }
+
+        dataset = CompletedRequestsDataset(
+            columns=columns('col', meta['columns']),
+            phase_counts=columns('pc', meta['phase_counts']),
+            phase_times=columns('pt', meta['phase_times']),
+            statements=StringTable(meta['statements']),
+            users=StringTable(meta['users']),
+            states=StringTable(meta['states']),
+            request_ids=self._load_strings(directory, 'request_ids'),
+            plans=self._load_strings(directory, 'plans') if meta['has_plans'] else None
+        )
+
+        summaries_path = os.path.join(directory, 'plan_summaries.json')
+        if os.path.isfile(summaries_path):
+            cache = plan_cache if cache is None else cache
+            with open(summaries_path) as f:
+                for key, summary in json.load(f).items():
+                    cache.set(key, summary)
+
+        ic(f"📂 Snapshot {content_hash[:12]} opened: {meta['rows']} rows in {int((time.time() - start_time) * 1000)}ms")
+        return dataset
+
+    @staticmethod
+    def _save_strings(directory: str, name: str, values: Sequence[Optional[str]]) -> None:
+        packed = PackedStrings.pack(values)
+        with open(os.path.join(directory, f'{name}.bin'), 'wb') as f:
+            f.write(packed['data'])
+        np.save(os.path.join(directory, f'{name}.offsets.npy'), packed['offsets'])
+        np.save(os.path.join(directory, f'{name}.nulls.npy'), packed['nulls'])
+
+    @staticmethod
+    def _load_strings(directory: str, name: str) -> PackedStrings:
+        path = os.path.join(directory, f'{name}.bin')
+        # np.memmap cannot map an empty file
+        data = np.memmap(path, dtype=np.uint8, mode='r') if os.path.getsize(path) else b''
+        return PackedStrings(
+            data,
+            np.load(os.path.join(directory, f'{name}.offsets.npy'), mmap_mode='r'),
+            np.load(os.path.join(directory, f'{name}.nulls.npy'), mmap_mode='r')
+        )
+
+
+# Global snapshot store
+snapshot_store = SnapshotStore()
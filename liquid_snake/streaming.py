@@ -0,0 +1,113 @@
+#!/usr/bin/env python3
+"""
+Streaming Response Module
+Encodes query rows incrementally as NDJSON or as a JSON document
+
+Architecture:
+- Rows are pulled from the SDK result iterator one at a time and encoded
+  immediately; nothing holds the full result set
+- Encoded rows are batched into chunks of about STREAM_CHUNK_BYTES so a
+  large result is not written one tiny chunk per row; the opening bytes
+  and the first row are flushed right away so the first byte is not
+  delayed by the query
+- An error raised by the iterator mid-stream is reported in-band (an
+  {"error": ...} line for NDJSON, "success": false for JSON), since the
+  HTTP status has already been sent
+"""
+
+import json
+from typing import Any, Callable, Iterable, Iterator, Optional
+
+# Target size of each streamed chunk
+STREAM_CHUNK_BYTES = 64 * 1024
+
+STREAM_FORMATS = ('ndjson', 'json')
+
+MIMETYPES = {
+    'ndjson': 'application/x-ndjson',
+    'json': 'application/json'
+}
+
+
+def _encode(value: Any) -> bytes:
+    return json.dumps(value, separators=(',', ':'), default=str).encode('utf-8')
+
+
+def _batched(pieces: Iterator[bytes], chunk_bytes: int, immediate: int = 1) -> Iterator[bytes]:
+    """Join small pieces into chunks; the first `immediate` pieces are yielded on their own"""
+    buffer = []
+    size = 0
+    for piece in pieces:
+        if immediate > 0:
+            immediate -= 1
+            yield piece
+            continue
+        buffer.append(piece)
+        size += len(piece)
+        if size >= chunk_bytes:
+            yield b''.join(buffer)
+            buffer = []
+            size = 0
+    if buffer:
+        yield b''.join(buffer)
+
+
+def iter_ndjson(rows: Iterable[Any],
+                on_error: Optional[Callable[[Exception], None]] = None,
+                chunk_bytes: int = STREAM_CHUNK_BYTES) -> Iterator[bytes]:
+    """
+    One JSON row per line
+
+    An error while iterating ends the stream with an {"error": "..."} line.
+    """
+    def pieces():
+        try:
+            for row in rows:
+                yield _encode(row) + b'\n'
+        except Exception as e:
+            if on_error:
+                on_error(e)
+            yield _encode({'error': str(e)}) + b'\n'
+
+    return _batched(pieces(), chunk_bytes)
+
+
+def iter_json_results(rows: Iterable[Any],
+                      on_error: Optional[Callable[[Exception], None]] = None,
+                      chunk_bytes: int = STREAM_CHUNK_BYTES) -> Iterator[bytes]:
+    """
+    {"results": [...], "success": ..., "row_count": n} written incrementally
+
+    Same shape as the buffered /api/couchbase/query response; the status
+    fields come last because they are only known at the end.
+    """
+    def pieces():
+        yield b'{"results":['
+        count = 0
+        error = None
+        try:
+            for row in rows:
+                yield (b',' if count else b'') + _encode(row)
+                count += 1
+        except Exception as e:
+            error = e
+            if on_error:
+                on_error(e)
+        trailer = {'success': error is None, 'row_count': count}
+        if error is not None:
+            trailer['error'] = str(error)
+        yield b'],' + _encode(trailer)[1:]
+
+    # The opening bytes and the first row
+    return _batched(pieces(), chunk_bytes, immediate=2)
+
+
+def stream_rows(rows: Iterable[Any], fmt: str,
+                on_error: Optional[Callable[[Exception], None]] = None,
+                chunk_bytes: int = STREAM_CHUNK_BYTES) -> Iterator[bytes]:
+    """Encoder for a stream format ('ndjson' or 'json')"""
+    if fmt == 'ndjson':
+        return iter_ndjson(rows, on_error=on_error, chunk_bytes=chunk_bytes)
+    if fmt == 'json':
+        return iter_json_results(rows, on_error=on_error, chunk_bytes=chunk_bytes)
+    raise ValueError(f"Unknown stream format: {fmt}")
@@ -396,6 +396,24 @@ class TestAIPayloadBuilder:
         result = builder._build_indexes(data)
         assert 'note' in result
     
+    def test_build_indexes_from_plans(self, builder):
+        """Test index usage is taken from request plans when a dataset is cached"""
+        from dataset import build_dataset
+        plan = json.dumps({'#operator': 'Sequence', '~children': [
+            {'#operator': 'IndexScan3', 'index': 'idx_type', 'bucket': 'travel', 'scope': 'inventory', 'keyspace': 'airline'},
+            {'#operator': 'Fetch'}
+        ]})
+        dataset = build_dataset([{'requestId': f'r{i}', 'plan': plan if i % 2 else None} for i in range(6)])
+        
+        result = builder._build_indexes({'indexData': [], 'dataset': dataset})
+        usage = result['plan_index_usage']
+        assert usage['requests_with_plans'] == 3
+        assert usage['indexes'] == [{'indexName': 'idx_type', 'bucketScopeCollection': 'travel.inventory.airline', 'requests': 3}]
+        assert usage['operators']['Fetch'] == 3
+        
+        with_catalog = builder._build_indexes({'indexData': [{'name': 'idx_type'}], 'dataset': dataset})
+        assert with_catalog['total_indexes'] == 1 and 'plan_index_usage' in with_catalog
+    
     def test_build_flow_diagram_empty(self, builder):
         """Test flow diagram with empty data"""
         data = {'flowDiagramData': {}}
@@ -0,0 +1,169 @@
+#!/usr/bin/env python3
+"""
+Unit Tests for Analysis Status Module
+Tests sub-document status transitions, CAS retries and the cancel/complete race
+(with a fake collection that enforces CAS)
+"""
+
+import pytest
+import sys
+import os
+import types
+
+# Add parent directory to path to import analysis_status
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from analysis_status import StatusUpdater
+
+
+class CasMismatch(Exception):
+    pass
+
+
+class PathMissing(Exception):
+    pass
+
+
+# Stand-in for couchbase.subdocument
+fake_sd = types.SimpleNamespace(
+    get=lambda path: ('get', path),
+    upsert=lambda path, value, create_parents=False: ('upsert', path, value)
+)
+
+
+class _LookupResult:
+    def __init__(self, values, cas):
+        self.cas = cas
+        self.content_as = {str: lambda i: self._value(values, i)}
+
+    @staticmethod
+    def _value(values, i):
+        if values[i] is None:
+            raise PathMissing()
+        return values[i]
+
+
+class CasCollection:
+    """Single-process collection with CAS; before_mutate runs between lookup and mutate"""
+
+    def __init__(self, docs):
+        self.docs = docs
+        self.cas = {key: 1 for key in docs}
+        self.before_mutate = None
+        self.full_reads = 0
+
+    def get(self, key):
+        self.full_reads += 1
+        raise AssertionError('transitions must not read the whole document')
+
+    def lookup_in(self, key, specs):
+        values = []
+        for _, path in specs:
+            values.append(self.docs[key].get(path))
+        return _LookupResult(values, self.cas[key])
+
+    def mutate_in(self, key, specs, cas):
+        if self.before_mutate:
+            hook, self.before_mutate = self.before_mutate, None
+            hook()
+        if cas != self.cas[key]:
+            raise CasMismatch()
+        for _, path, value in specs:
+            target = self.docs[key]
+            parts = path.split('.')
+            for part in parts[:-1]:
+                target = target.setdefault(part, {})
+            target[parts[-1]] = value
+        self.cas[key] += 1
+        return types.SimpleNamespace(cas=self.cas[key])
+
+
+def _updater():
+    return StatusUpdater(fake_sd, lambda cas: cas, cas_mismatch=(CasMismatch,), path_not_found=(PathMissing,))
+
+
+@pytest.fixture
+def collection():
+    return CasCollection({'doc': {'status': 'pending', 'payload': 'x' * 1000, 'metadata': {'obfuscated': False}}})
+
+
+# ============================================================================
+# Transition Tests
+# ============================================================================
+
+class TestTransitions:
+    """Tests for StatusUpdater.transition"""
+
+    def test_completes_with_paths_only(self, collection):
+        """Test completion writes status and nested metadata without touching other fields"""
+        update = _updater().transition(collection, 'doc', 'completed', {
+            'aiResponse': {'summary': 'ok'},
+            'metadata.elapsed_ms': 1200
+        })
+        doc = collection.docs['doc']
+
+        assert update == {'applied': True, 'status': 'completed', 'cas': 2}
+        assert doc['status'] == 'completed'
+        assert doc['metadata'] == {'obfuscated': False, 'elapsed_ms': 1200}
+        assert doc['payload'] == 'x' * 1000
+        assert collection.full_reads == 0
+
+    @pytest.mark.parametrize('terminal', ['completed', 'failed', 'cancelled'])
+    def test_terminal_status_kept(self, collection, terminal):
+        """Test a finished analysis is never moved to another status"""
+        collection.docs['doc']['status'] = terminal
+
+        update = _updater().transition(collection, 'doc', 'cancelled', {'cancelledAt': 'now'})
+
+        assert update['applied'] is False and update['status'] == terminal
+        assert 'cancelledAt' not in collection.docs['doc']
+
+    def test_missing_status_path(self, collection):
+        """Test a document without a status is only changed when None is allowed"""
+        del collection.docs['doc']['status']
+
+        assert _updater().transition(collection, 'doc', 'completed')['applied'] is False
+        assert _updater().transition(collection, 'doc', 'completed', allowed_from=[None])['applied'] is True
+
+
+# ============================================================================
+# Race Tests
+# ============================================================================
+
+class TestCancelRace:
+    """Tests for concurrent cancel and completion"""
+
+    def test_cancel_during_completion_wins(self, collection):
+        """Test a cancel landing between the task's read and write stops the completion"""
+        updater = _updater()
+        cancels = []
+        collection.before_mutate = lambda: cancels.append(
+            updater.transition(collection, 'doc', 'cancelled', {'cancelledAt': 'now'})
+        )
+
+        update = updater.transition(collection, 'doc', 'completed', {'aiResponse': {'summary': 'late'}})
+
+        assert cancels[0]['applied'] is True
+        assert update == {'applied': False, 'status': 'cancelled', 'cas': 2}
+        assert 'aiResponse' not in collection.docs['doc']
+
+    def test_completion_during_cancel_wins(self, collection):
+        """Test a cancel loses (and reports the status) when the task completed first"""
+        updater = _updater()
+        collection.before_mutate = lambda: updater.transition(collection, 'doc', 'completed', {'aiResponse': {}})
+
+        update = updater.transition(collection, 'doc', 'cancelled', {'cancelledAt': 'now'})
+
+        assert update['applied'] is False and update['status'] == 'completed'
+        assert 'cancelledAt' not in collection.docs['doc']
+
+    def test_unrelated_change_retried(self, collection):
+        """Test a CAS change that keeps the status active is retried and applied"""
+        def touch():
+            collection.cas['doc'] += 1
+
+        collection.before_mutate = touch
+        update = _updater().transition(collection, 'doc', 'failed', {'error': {'message': 'boom'}})
+
+        assert update['applied'] is True
+        assert collection.docs['doc']['error'] == {'message': 'boom'}
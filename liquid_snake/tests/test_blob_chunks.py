@@ -0,0 +1,141 @@
+#!/usr/bin/env python3
+"""
+Unit Tests for Blob Chunks Module
+Tests chunk splitting, manifests, checksum verification and concurrent mapping
+"""
+
+import pytest
+import sys
+import os
+import threading
+import time
+
+# Add parent directory to path to import blob_chunks
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from blob_chunks import (
+    ChunkIntegrityError,
+    chunk_key,
+    chunk_keys,
+    chunk_manifest,
+    map_concurrently,
+    new_generation,
+    split_chunks,
+    verify_chunks
+)
+
+
+# ============================================================================
+# Splitting and manifests
+# ============================================================================
+
+class TestSplitChunks:
+    def test_chunks_cover_data_in_order(self):
+        data = bytes(range(256)) * 10
+        chunks = split_chunks('blob', data, 'g1', chunk_bytes=1000)
+        assert [c['size'] for c in chunks] == [1000, 1000, 560]
+        assert [c['key'] for c in chunks] == [chunk_key('blob', 'g1', i) for i in range(3)]
+        assert b''.join(bytes(c['data']) for c in chunks) == data
+
+    def test_empty_data_has_no_chunks(self):
+        assert split_chunks('blob', b'', 'g1', chunk_bytes=10) == []
+
+    def test_generations_give_distinct_keys(self):
+        first, second = new_generation(), new_generation()
+        assert first != second
+        assert chunk_key('blob', first, 0) != chunk_key('blob', second, 0)
+
+    def test_manifest_has_no_chunk_bytes(self):
+        data = b'x' * 25
+        chunks = split_chunks('blob', data, 'g1', chunk_bytes=10)
+        manifest = chunk_manifest(data, chunks, 'g1')
+        assert manifest['chunked'] is True
+        assert manifest['chunkSize'] == 10
+        assert all(set(c) == {'key', 'size', 'sha256'} for c in manifest['chunks'])
+        assert chunk_keys(manifest) == [c['key'] for c in chunks]
+
+    def test_chunk_keys_of_single_document_blob(self):
+        assert chunk_keys(None) == []
+        assert chunk_keys({'compression': 'gzip'}) == []
+
+
+# ============================================================================
+# Verification
+# ============================================================================
+
+class TestVerifyChunks:
+    def _manifest(self, data):
+        chunks = split_chunks('blob', data, 'g1', chunk_bytes=7)
+        return chunk_manifest(data, chunks, 'g1'), [bytes(c['data']) for c in chunks]
+
+    def test_round_trip(self):
+        data = os.urandom(50)
+        manifest, pieces = self._manifest(data)
+        verify_chunks(manifest, pieces)
+        assert b''.join(pieces) == data
+
+    def test_tampered_chunk_raises(self):
+        manifest, pieces = self._manifest(b'abcdefghijklmnopqrstuvwxyz')
+        pieces[1] = b'XXXXXXX'
+        with pytest.raises(ChunkIntegrityError):
+            verify_chunks(manifest, pieces)
+
+    def test_missing_chunk_raises(self):
+        manifest, pieces = self._manifest(b'abcdefghijklmnopqrstuvwxyz')
+        with pytest.raises(ChunkIntegrityError):
+            verify_chunks(manifest, pieces[:-1])
+
+    def test_truncated_chunk_raises(self):
+        manifest, pieces = self._manifest(b'abcdefghijklmnopqrstuvwxyz')
+        pieces[-1] = pieces[-1][:-1]
+        with pytest.raises(ChunkIntegrityError):
+            verify_chunks(manifest, pieces)
+
+    def test_reordered_chunks_raise(self):
+        manifest, pieces = self._manifest(os.urandom(50))
+        pieces.reverse()
+        with pytest.raises(ChunkIntegrityError):
+            verify_chunks(manifest, pieces)
+
+    def test_integrity_error_is_value_error(self):
+        assert issubclass(ChunkIntegrityError, ValueError)
+
+
+# ============================================================================
+# Concurrent mapping
+# ============================================================================
+
+class TestMapConcurrently:
+    def test_preserves_input_order(self):
+        def slow_echo(i):
+            time.sleep(0.001 * (10 - i))
+            return i
+        assert map_concurrently(slow_echo, range(10)) == list(range(10))
+
+    def test_bounds_workers(self):
+        active = []
+        peak = []
+        lock = threading.Lock()
+
+        def work(i):
+            with lock:
+                active.append(i)
+                peak.append(len(active))
+            time.sleep(0.01)
+            with lock:
+                active.remove(i)
+            return i
+
+        map_concurrently(work, range(12), max_workers=3)
+        assert max(peak) <= 3
+
+    def test_error_propagates(self):
+        def fail(i):
+            if i == 2:
+                raise RuntimeError('boom')
+            return i
+        with pytest.raises(RuntimeError):
+            map_concurrently(fail, range(5))
+
+    def test_empty(self):
+        assert map_concurrently(lambda i: i, []) == []
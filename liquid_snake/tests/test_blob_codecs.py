@@ -0,0 +1,310 @@
+#!/usr/bin/env python3
+"""
+Unit Tests for Blob Codecs Module
+Tests the codec registry, legacy gzip blobs and zstd dictionaries
+"""
+
+import gzip
+import hashlib
+import json
+import pytest
+import sys
+import os
+
+# Add parent directory to path to import blob_codecs
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import blob_codecs
+from blob_codecs import (
+    DictionaryCache,
+    available_codecs,
+    content_key,
+    content_type_of,
+    decode_stream,
+    default_codec,
+    dictionary_id,
+    encode_stream,
+    get_codec,
+    iter_encoded,
+    iter_json,
+    load_samples,
+    pack_body,
+    require_codec,
+    sample_documents,
+    train_dictionary,
+    unpack_body
+)
+
+SAMPLE = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))),
+                      'sample', 'test_system_completed_requests.json')
+
+PAYLOAD = json.dumps([{'statement': 'SELECT 1', 'elapsedTime': f'{i}ms'} for i in range(200)]).encode('utf-8')
+
+
+# ============================================================================
+# Registry
+# ============================================================================
+
+class TestRegistry:
+    def test_gzip_and_none_always_available(self):
+        assert {'none', 'gzip'} <= set(available_codecs())
+
+    def test_missing_name_is_uncompressed(self):
+        assert get_codec(None).name == 'none'
+        assert get_codec('').decompress(b'raw') == b'raw'
+
+    def test_unknown_codec_raises(self):
+        with pytest.raises(ValueError):
+            get_codec('brotli')
+
+    def test_default_codec_is_gzip(self, monkeypatch):
+        monkeypatch.delenv(blob_codecs.CODEC_ENV, raising=False)
+        # Installing zstandard / lz4 does not change the codec of new blobs
+        assert default_codec() == 'gzip'
+
+    def test_configured_codec(self, monkeypatch):
+        monkeypatch.setenv(blob_codecs.CODEC_ENV, 'none')
+        assert default_codec() == 'none'
+
+    def test_configured_codec_not_installed(self, monkeypatch):
+        monkeypatch.setattr(get_codec('zstd'), 'available', False)
+        monkeypatch.setenv(blob_codecs.CODEC_ENV, 'zstd')
+        with pytest.raises(ValueError, match='pip install zstandard'):
+            default_codec()
+        with pytest.raises(ValueError, match='pip install zstandard'):
+            require_codec('zstd')
+
+    def test_missing_codec_load_names_package(self, monkeypatch):
+        monkeypatch.setattr(get_codec('lz4'), 'available', False)
+        with pytest.raises(ValueError, match='pip install lz4'):
+            get_codec('lz4').decompress(b'frame')
+
+    def test_unknown_configured_codec(self, monkeypatch):
+        monkeypatch.setenv(blob_codecs.CODEC_ENV, 'brotli')
+        with pytest.raises(ValueError):
+            default_codec()
+
+    @pytest.mark.parametrize('name', ['none', 'gzip', 'zstd', 'lz4'])
+    def test_round_trip(self, name):
+        codec = get_codec(name)
+        if not codec.available:
+            pytest.skip(f'{name} not installed')
+        assert codec.decompress(codec.compress(PAYLOAD)) == PAYLOAD
+
+    def test_legacy_gzip_blob_loads(self):
+        legacy = gzip.compress(PAYLOAD, mtime=0)
+        assert get_codec('gzip').decompress(legacy) == PAYLOAD
+
+    def test_levels(self):
+        gz = get_codec('gzip')
+        assert gz.level() == 6
+        assert gz.level(9) == 9
+        for level in (1, 9):
+            assert gz.decompress(gz.compress(PAYLOAD, level)) == PAYLOAD
+
+    def test_dictionary_rejected_by_gzip(self):
+        with pytest.raises(ValueError):
+            get_codec('gzip').compress(PAYLOAD, dictionary=b'dict')
+
+
+# ============================================================================
+# Dictionaries
+# ============================================================================
+
+class TestSamples:
+    def test_records_split_into_request_and_plan(self):
+        records = [{'completed_requests': {'requestId': 'a'}, 'plan': {'#operator': 'Sequence'}},
+                   {'completed_requests': {'requestId': 'b'}}]
+        samples = sample_documents(records)
+        assert [json.loads(s) for s in samples] == [{'requestId': 'a'}, {'#operator': 'Sequence'},
+                                                     {'requestId': 'b'}]
+
+    def test_plain_records_used_whole(self):
+        assert sample_documents([{'name': 'idx'}, 'skip']) == [b'{"name": "idx"}']
+
+
+class TestDictionaryCache:
+    def test_add_and_get(self):
+        cache = DictionaryCache()
+        dict_id = cache.add(b'dictionary bytes')
+        assert dict_id == dictionary_id(b'dictionary bytes')
+        assert dict_id in cache
+        assert cache.get(dict_id) == b'dictionary bytes'
+
+    def test_fetch_once(self):
+        cache = DictionaryCache()
+        calls = []
+
+        def fetch(dict_id):
+            calls.append(dict_id)
+            return b'stored'
+
+        dict_id = dictionary_id(b'stored')
+        assert cache.get(dict_id, fetch) == b'stored'
+        assert cache.get(dict_id, fetch) == b'stored'
+        assert calls == [dict_id]
+
+    def test_unknown_without_fetch(self):
+        with pytest.raises(KeyError):
+            DictionaryCache().get('missing')
+
+    def test_fetched_bytes_verified(self):
+        with pytest.raises(ValueError):
+            DictionaryCache().get(dictionary_id(b'expected'), lambda _: b'other')
+
+
+@pytest.mark.skipif(not blob_codecs.ZSTD_AVAILABLE, reason='zstandard not installed')
+class TestTrainedDictionary:
+    def test_dictionary_round_trip(self):
+        samples = load_samples([SAMPLE])
+        dictionary = train_dictionary(samples[::2], dict_size=16 * 1024)
+        zstd = get_codec('zstd')
+        for document in samples[1::2][:20]:
+            packed = zstd.compress(document, dictionary=dictionary)
+            assert zstd.decompress(packed, dictionary) == document
+
+    def test_dictionary_shrinks_small_documents(self):
+        samples = load_samples([SAMPLE])
+        dictionary = train_dictionary(samples[::2], dict_size=16 * 1024)
+        zstd = get_codec('zstd')
+        measured = samples[1::2]
+        plain = sum(len(zstd.compress(d)) for d in measured)
+        with_dict = sum(len(zstd.compress(d, dictionary=dictionary)) for d in measured)
+        assert with_dict < plain
+
+    def test_no_samples(self):
+        with pytest.raises(ValueError):
+            train_dictionary([])
+
+
+# ============================================================================
+# Streaming
+# ============================================================================
+
+NESTED = {
+    'completed_requests': [{'requestId': str(i), 'statement': 'SELECT "é"', 'phaseTimes': {'fetch': f'{i}ms'}}
+                           for i in range(300)],
+    'empty_list': [],
+    'empty_dict': {},
+    'none': None,
+    'int_keys': {1: 'a', 2: 'b'}
+}
+
+
+class TestIterJson:
+    @pytest.mark.parametrize('value', [NESTED, [], {}, [[1, [2, [3]]], {'a': {'b': {'c': 1}}}], 'text', 3.5, None])
+    def test_matches_json_dumps(self, value):
+        assert ''.join(iter_json(value)) == json.dumps(value)
+
+    def test_pieces_are_per_element(self):
+        pieces = list(iter_json(NESTED))
+        assert len(pieces) > 300
+        assert max(len(p) for p in pieces) < len(json.dumps(NESTED)) / 10
+
+
+class TestEncodeStream:
+    @pytest.mark.parametrize('name', ['none', 'gzip', 'zstd', 'lz4'])
+    def test_round_trip_and_size(self, name):
+        if not get_codec(name).available:
+            pytest.skip(f'{name} not installed')
+        encoded = json.dumps(NESTED).encode('utf-8')
+        compressed, content_type, original_size = encode_stream(NESTED, name, piece_bytes=1024)
+        assert content_type == 'json'
+        assert original_size == len(encoded)
+        # Streamed output is a regular frame for the one-shot decoder too
+        assert get_codec(name).decompress(compressed) == encoded
+        pieces = [compressed[i:i + 100] for i in range(0, len(compressed), 100)]
+        assert bytes(decode_stream(pieces, name)) == encoded
+
+    def test_text_counts_utf8_bytes(self):
+        compressed, content_type, original_size = encode_stream('é' * 10, 'gzip', piece_bytes=3)
+        assert (content_type, original_size) == ('text', 20)
+        assert bytes(decode_stream([compressed], 'gzip')).decode('utf-8') == 'é' * 10
+
+    def test_binary(self):
+        data = os.urandom(5000)
+        assert b''.join(bytes(p) for p in iter_encoded(data, 1024)) == data
+        compressed, content_type, original_size = encode_stream(data, 'gzip')
+        assert (content_type, original_size) == ('binary', 5000)
+        assert bytes(decode_stream([compressed], 'gzip')) == data
+
+    def test_gzip_stream_reads_legacy_blobs(self):
+        assert bytes(decode_stream([gzip.compress(PAYLOAD, mtime=0)], 'gzip')) == PAYLOAD
+
+    def test_content_types(self):
+        assert [content_type_of(v) for v in ({}, [], b'', 'x', 5)] == ['json', 'json', 'binary', 'text', 'text']
+
+    @pytest.mark.skipif(not blob_codecs.ZSTD_AVAILABLE, reason='zstandard not installed')
+    def test_zstd_stream_with_dictionary(self):
+        samples = load_samples([SAMPLE])
+        dictionary = train_dictionary(samples, dict_size=16 * 1024)
+        compressed, _, _ = encode_stream(NESTED, 'zstd', dictionary=dictionary)
+        assert json.loads(decode_stream([compressed], 'zstd', dictionary)) == json.loads(json.dumps(NESTED))
+
+
+# ============================================================================
+# Content addresses
+# ============================================================================
+
+class TestCanonical:
+    def test_canonical_matches_sorted_compact_dumps(self):
+        expected = json.dumps({k: v for k, v in NESTED.items() if k != 'int_keys'},
+                              sort_keys=True, separators=(',', ':'))
+        value = {k: v for k, v in NESTED.items() if k != 'int_keys'}
+        assert ''.join(iter_json(value, canonical=True)) == expected
+
+    def test_hash_ignores_key_order_and_codec(self):
+        first = {'b': [1, {'y': 2, 'x': 1}], 'a': 'text'}
+        second = {'a': 'text', 'b': [1, {'x': 1, 'y': 2}]}
+        digests = set()
+        for value, codec in ((first, 'gzip'), (second, 'none')):
+            hasher = hashlib.sha256()
+            encode_stream(value, codec, canonical=True, hasher=hasher)
+            digests.add(hasher.hexdigest())
+        assert len(digests) == 1
+
+    def test_hash_is_of_canonical_bytes(self):
+        hasher = hashlib.sha256()
+        _, _, size = encode_stream({'b': 1, 'a': 2}, 'gzip', canonical=True, hasher=hasher)
+        assert hasher.hexdigest() == hashlib.sha256(b'{"a":2,"b":1}').hexdigest()
+        assert size == len(b'{"a":2,"b":1}')
+
+    def test_different_content_different_key(self):
+        keys = set()
+        for value in ({'a': 1}, {'a': 2}):
+            hasher = hashlib.sha256()
+            encode_stream(value, 'gzip', canonical=True, hasher=hasher)
+            keys.add(content_key(hasher.hexdigest()))
+        assert len(keys) == 2
+        assert all(key.startswith('blob::sha256::') for key in keys)
+
+
+# ============================================================================
+# Body header
+# ============================================================================
+
+class TestBodyHeader:
+    def test_round_trip(self):
+        header = {'compression': 'gzip', 'contentType': 'json', 'originalSize': 10}
+        payload = gzip.compress(PAYLOAD, mtime=0)
+        unpacked, rest = unpack_body(pack_body(header, payload))
+        assert unpacked == header
+        assert bytes(rest) == payload
+        assert bytes(decode_stream([rest], unpacked['compression'])) == PAYLOAD
+
+    def test_manifest_without_payload(self):
+        header = {'chunked': True, 'chunks': [{'key': 'k::chunk::g::0', 'size': 1, 'sha256': 'x'}]}
+        unpacked, rest = unpack_body(pack_body(header))
+        assert unpacked == header
+        assert len(rest) == 0
+
+    @pytest.mark.parametrize('legacy', [gzip.compress(b'old', mtime=0), b'', b'raw text', b'LSB'])
+    def test_legacy_bodies_have_no_header(self, legacy):
+        header, rest = unpack_body(legacy)
+        assert header is None
+        assert bytes(rest) == legacy
+
+    def test_truncated_header_raises(self):
+        body = pack_body({'compression': 'gzip'}, b'data')
+        with pytest.raises(ValueError):
+            unpack_body(body[:10])
@@ -0,0 +1,432 @@
+#!/usr/bin/env python3
+"""
+Unit Tests for Blob Storage Module
+Tests BlobStorage save/load paths against an in-memory collection
+
+The couchbase SDK is replaced by minimal modules when it is not installed,
+and blob_storage.SD by FakeSD, so the fake collection sees plain tuples.
+"""
+
+import importlib.util
+import json
+import pytest
+import sys
+import os
+import time
+import types
+
+# Add parent directory to path to import blob_storage
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def _install_sdk_stubs():
+    """Just enough of the couchbase package for blob_storage to import"""
+    if importlib.util.find_spec('couchbase') is not None:
+        return
+    modules = {name: types.ModuleType(name) for name in (
+        'couchbase', 'couchbase.subdocument', 'couchbase.collection',
+        'couchbase.options', 'couchbase.transcoder')}
+    modules['couchbase.subdocument'].get = lambda path, xattr=False: ('get', path, xattr)
+    modules['couchbase.subdocument'].upsert = lambda path, value, xattr=False, create_parents=False: ('upsert', path, value, xattr)
+    modules['couchbase.collection'].Collection = object
+    for name in ('QueryOptions', 'RemoveOptions', 'UpsertOptions'):
+        setattr(modules['couchbase.options'], name, lambda **kwargs: dict(kwargs))
+    modules['couchbase.transcoder'].RawBinaryTranscoder = lambda: None
+    modules['couchbase'].subdocument = modules['couchbase.subdocument']
+    sys.modules.update(modules)
+
+
+_install_sdk_stubs()
+
+import ai_analyzer
+import blob_storage
+from blob_codecs import BODY_MAGIC, CONTENT_KEY_PREFIX, pack_body
+from blob_storage import BlobStorage
+
+
+# ============================================================================
+# In-memory collection
+# ============================================================================
+
+class DocumentNotFound(KeyError):
+    pass
+
+
+class PathNotFound(KeyError):
+    pass
+
+
+class CasMismatch(Exception):
+    pass
+
+
+class FakeSD:
+    @staticmethod
+    def get(path, xattr=False):
+        return ('get', path, xattr)
+
+    @staticmethod
+    def upsert(path, value, xattr=False, create_parents=False):
+        return ('upsert', path, value, xattr)
+
+
+_MISSING = object()
+
+
+class _Content:
+    def __init__(self, getter):
+        self._getter = getter
+
+    def __getitem__(self, _type):
+        return self._getter
+
+
+class _GetResult:
+    def __init__(self, body, cas):
+        self.cas = cas
+        self.content_as = _Content(body)
+
+
+class _LookupResult:
+    def __init__(self, values, cas):
+        self.cas = cas
+        self._values = values
+        self.content_as = _Content(self._value)
+
+    def _value(self, index):
+        if self._values[index] is _MISSING:
+            raise PathNotFound(index)
+        return self._values[index]
+
+    def exists(self, index):
+        return self._values[index] is not _MISSING
+
+
+def _resolve(root, path):
+    for part in path.split('.'):
+        if not isinstance(root, dict) or part not in root:
+            return _MISSING
+        root = root[part]
+    return root
+
+
+class FakeCollection:
+    """Binary bodies, user XATTRs (dropped by full-document writes) and CAS"""
+
+    def __init__(self, fail_upsert=None):
+        self.docs = {}
+        self.xattrs = {}
+        self.cas = {}
+        self.calls = []
+        self.fail_upsert = fail_upsert or (lambda key: False)
+        self._next_cas = 0
+
+    def _bump(self, key):
+        self._next_cas += 1
+        self.cas[key] = self._next_cas
+
+    def _require(self, key):
+        if key not in self.docs:
+            raise DocumentNotFound(key)
+
+    def upsert(self, key, value, *options):
+        self.calls.append(('upsert', key))
+        if self.fail_upsert(key):
+            raise RuntimeError(f'upsert of {key} failed')
+        self.docs[key] = bytes(value)
+        self.xattrs[key] = {}
+        self._bump(key)
+
+    def get(self, key, *options, **kwargs):
+        self.calls.append(('get', key))
+        self._require(key)
+        return _GetResult(self.docs[key], self.cas[key])
+
+    def lookup_in(self, key, specs, *options):
+        self.calls.append(('lookup_in', key))
+        self._require(key)
+        values = []
+        for _, path, xattr in specs:
+            root = self.xattrs[key] if xattr else json.loads(self.docs[key])
+            values.append(_resolve(root, path))
+        return _LookupResult(values, self.cas[key])
+
+    def mutate_in(self, key, specs, *options):
+        self.calls.append(('mutate_in', key))
+        self._require(key)
+        for _, path, value, xattr in specs:
+            parts = path.split('.')
+            parent = _resolve(self.xattrs[key], '.'.join(parts[:-1])) if len(parts) > 1 else self.xattrs[key]
+            if not isinstance(parent, dict):
+                raise PathNotFound(path)
+            parent[parts[-1]] = value
+        self._bump(key)
+
+    def remove(self, key, *options):
+        self.calls.append(('remove', key))
+        self._require(key)
+        for option in options:
+            if option and option.get('cas') not in (None, self.cas[key]):
+                raise CasMismatch(key)
+        del self.docs[key]
+        self.xattrs.pop(key, None)
+
+
+class FakeCluster:
+    def __init__(self, rows):
+        self.rows = rows
+        self.statements = []
+
+    def query(self, statement, *options):
+        self.statements.append((statement, options))
+        return iter(self.rows)
+
+
+@pytest.fixture(autouse=True)
+def fake_sd(monkeypatch):
+    monkeypatch.setattr(blob_storage, 'SD', FakeSD)
+
+
+@pytest.fixture
+def collection():
+    return FakeCollection()
+
+
+@pytest.fixture
+def storage():
+    return BlobStorage(codec='gzip')
+
+
+def _upserts(collection):
+    return [key for op, key in collection.calls if op == 'upsert']
+
+
+# ============================================================================
+# Content-addressed blobs
+# ============================================================================
+
+ANALYZER_DATA = {
+    'version': '3.29.1',
+    'everyQueryData': [
+        {'id': 1, 'statement': 'SELECT * FROM users'},
+        {'id': 2, 'statement': 'SELECT * FROM orders'}
+    ],
+    'dashboardStats': {'total_queries': 100},
+    'analysisData': [{'statement': 'SELECT * FROM ?', 'totalDuration': 5000, 'count': 10}],
+    'indexData': [{'name': 'idx_users', 'keyspace_id': 'users'}]
+}
+
+
+class TestContentBlobs:
+    def test_same_content_stored_once(self, storage, collection):
+        first = storage.save_content_blob(collection, {'b': [1, 2], 'a': 'x'})
+        uploads = len(_upserts(collection))
+        second = storage.save_content_blob(collection, {'a': 'x', 'b': [1, 2]})
+        assert first['key'] == second['key']
+        assert first['key'].startswith(CONTENT_KEY_PREFIX)
+        assert (first['deduplicated'], second['deduplicated']) == (False, True)
+        assert len(_upserts(collection)) == uploads
+
+    def test_dedup_stamps_referenced_at(self, storage, collection):
+        key = storage.save_content_blob(collection, {'a': 1})['key']
+        collection.xattrs[key]['blob_meta']['referencedAt'] = 0
+        storage.save_content_blob(collection, {'a': 1})
+        assert collection.xattrs[key]['blob_meta']['referencedAt'] > 0
+
+    def test_incomplete_blob_is_rewritten(self, storage, collection):
+        key = storage.save_content_blob(collection, {'a': 1})['key']
+        # Body written, blob_meta not yet (interrupted save)
+        collection.xattrs[key] = {}
+        result = storage.save_content_blob(collection, {'a': 1})
+        assert result['deduplicated'] is False
+        assert storage.load_blob(collection, key)['data'] == {'a': 1}
+
+    def test_two_analyses_of_one_capture_share_payload(self, storage, collection):
+        refs = []
+        for _ in range(2):
+            payload = ai_analyzer.payload_builder.build_payload_from_data(
+                raw_data=ANALYZER_DATA,
+                user_prompt='Analyze performance',
+                selections={'dashboard': True, 'query_groups': True},
+                options={}
+            )
+            stable, volatile = ai_analyzer.split_volatile_metadata(payload)
+            assert 'timestamp' in volatile and 'timestamp' not in stable['metadata']
+            refs.append(storage.save_content_blob(collection, stable))
+            time.sleep(0.001)
+        assert refs[0]['key'] == refs[1]['key']
+        assert refs[1]['deduplicated'] is True
+
+    def test_volatile_metadata_restored(self):
+        payload = {'prompt': 'p', 'metadata': {'timestamp': 't', 'session_id': 's', 'analyzer_version': 'v'}}
+        stable, volatile = ai_analyzer.split_volatile_metadata(payload)
+        assert stable['metadata'] == {'analyzer_version': 'v'}
+        assert payload['metadata']['timestamp'] == 't'
+        assert ai_analyzer.restore_volatile_metadata(stable, volatile) == payload
+
+
+class TestSweep:
+    def test_removes_unreferenced_blob_and_chunks(self, collection):
+        storage = BlobStorage(codec='none', chunk_bytes=64)
+        key = storage.save_content_blob(collection, os.urandom(300))['key']
+        collection.xattrs[key]['blob_meta']['referencedAt'] = 0
+        result = storage.sweep_content_blobs(FakeCluster([key]), collection, {}, grace_seconds=60)
+        assert (result['removed'], result['kept']) == (1, 0)
+        assert collection.docs == {}
+
+    def test_keeps_blob_referenced_after_query(self, storage, collection):
+        key = storage.save_content_blob(collection, {'a': 1})['key']
+        # The query saw an old blob, but a save deduplicated against it since
+        result = storage.sweep_content_blobs(FakeCluster([key]), collection, {}, grace_seconds=60)
+        assert (result['removed'], result['kept']) == (0, 1)
+        assert key in collection.docs
+
+    def test_query_excludes_chunks_and_referenced(self, storage, collection):
+        cluster = FakeCluster([])
+        storage.sweep_content_blobs(cluster, collection, {'bucket': 'b'}, grace_seconds=60)
+        statement, options = cluster.statements[0]
+        assert '`b`.`query`.`analyzer`' in statement
+        assert '::chunk::' in statement and 'payloadRef' in statement
+
+
+# ============================================================================
+# Chunked blobs
+# ============================================================================
+
+def _chunk_docs(collection, key):
+    return sorted(k for k in collection.docs if k.startswith(f'{key}::chunk::'))
+
+
+class TestChunkedBlobs:
+    DATA = {'completed_requests': [{'requestId': f'r{i}', 'plan': os.urandom(64).hex()} for i in range(200)]}
+
+    def test_large_blob_round_trips(self, collection):
+        storage = BlobStorage(codec='gzip', chunk_bytes=4096)
+        result = storage.save_blob(collection, 'big', self.DATA)
+        assert result['success'] and result['stats']['chunks'] > 1
+        chunks = _chunk_docs(collection, 'big')
+        assert len(chunks) == result['stats']['chunks']
+        assert all(len(collection.docs[k]) <= 4096 for k in chunks)
+
+        loaded = storage.load_blob(collection, 'big')
+        assert loaded['success'] and loaded['data'] == self.DATA
+        assert loaded['metadata']['chunked'] is True
+
+    def test_overwrite_removes_stale_generation(self, collection):
+        storage = BlobStorage(codec='none', chunk_bytes=1024)
+        storage.save_blob(collection, 'big', os.urandom(5000))
+        first = _chunk_docs(collection, 'big')
+        replacement = os.urandom(3000)
+        storage.save_blob(collection, 'big', replacement)
+        second = _chunk_docs(collection, 'big')
+
+        assert first and second and not set(first) & set(second)
+        assert storage.load_blob(collection, 'big')['data'] == replacement
+
+    def test_overwrite_with_small_blob_removes_chunks(self, collection):
+        storage = BlobStorage(codec='none', chunk_bytes=1024)
+        storage.save_blob(collection, 'big', os.urandom(5000))
+        storage.save_blob(collection, 'big', b'small')
+        assert _chunk_docs(collection, 'big') == []
+        assert storage.load_blob(collection, 'big')['data'] == b'small'
+
+    def test_failed_chunk_write_cleans_up(self):
+        collection = FakeCollection(fail_upsert=lambda key: key.endswith('::2'))
+        storage = BlobStorage(codec='none', chunk_bytes=1024)
+        result = storage.save_blob(collection, 'big', os.urandom(5000))
+
+        assert result['success'] is False and 'failed' in result['error']
+        assert collection.docs == {}
+
+    def test_failed_overwrite_keeps_previous_blob(self, collection):
+        storage = BlobStorage(codec='none', chunk_bytes=1024)
+        original = os.urandom(5000)
+        storage.save_blob(collection, 'big', original)
+        before = _chunk_docs(collection, 'big')
+        collection.fail_upsert = lambda key: '::chunk::' in key and key.endswith('::1')
+
+        assert storage.save_blob(collection, 'big', os.urandom(4000))['success'] is False
+        assert _chunk_docs(collection, 'big') == before
+        assert storage.load_blob(collection, 'big')['data'] == original
+
+    def test_checksum_mismatch_reported(self, collection):
+        storage = BlobStorage(codec='none', chunk_bytes=1024)
+        storage.save_blob(collection, 'big', os.urandom(5000))
+        tampered = _chunk_docs(collection, 'big')[1]
+        collection.docs[tampered] = b'x' * len(collection.docs[tampered])
+
+        result = storage.load_blob(collection, 'big')
+        assert result['success'] is False
+        assert 'checksum' in result['error']
+
+    def test_missing_chunk_reported(self, collection):
+        storage = BlobStorage(codec='none', chunk_bytes=1024)
+        storage.save_blob(collection, 'big', os.urandom(5000))
+        del collection.docs[_chunk_docs(collection, 'big')[0]]
+        assert storage.load_blob(collection, 'big')['success'] is False
+
+
+# ============================================================================
+# Single-get loads
+# ============================================================================
+
+class TestLoadPaths:
+    def test_header_body_loads_with_one_get(self, storage, collection):
+        storage.save_blob(collection, 'doc', {'a': [1, 2, 3]}, metadata={'owner': 'x'})
+        assert collection.docs['doc'].startswith(BODY_MAGIC)
+        collection.calls.clear()
+
+        loaded = storage.load_blob(collection, 'doc')
+        assert loaded['data'] == {'a': [1, 2, 3]}
+        assert loaded['metadata']['userMeta'] == {'owner': 'x'}
+        assert collection.calls == [('get', 'doc')]
+
+    def test_legacy_body_falls_back_to_xattr(self, storage, collection):
+        legacy = storage.compress_data({'legacy': True}, 'gzip')[0]
+        collection.docs['old'] = legacy
+        collection.xattrs['old'] = {'blob_meta': {'compression': 'gzip', 'contentType': 'json'}}
+        collection.cas['old'] = 1
+
+        loaded = storage.load_blob(collection, 'old')
+        assert loaded['success'] and loaded['data'] == {'legacy': True}
+        assert ('lookup_in', 'old') in collection.calls
+
+    def test_legacy_body_without_meta_is_raw(self, storage, collection):
+        collection.docs['raw'] = b'plain bytes'
+        collection.xattrs['raw'] = {}
+        collection.cas['raw'] = 1
+        assert storage.load_blob(collection, 'raw')['data'] == b'plain bytes'
+
+    def test_load_many_reports_errors_per_key(self, storage, collection):
+        storage.save_blob(collection, 'a', {'n': 1})
+        storage.save_blob(collection, 'b', 'text')
+        collection.docs['broken'] = pack_body({'compression': 'gzip', 'contentType': 'json'}, b'not gzip')
+        collection.cas['broken'] = 1
+
+        loaded = storage.load_many(collection, ['a', 'missing', 'b', 'broken', 'a'])
+        assert list(loaded) == ['a', 'missing', 'b', 'broken']
+        assert loaded['a']['data'] == {'n': 1} and loaded['b']['data'] == 'text'
+        assert loaded['missing']['success'] is False and loaded['broken']['success'] is False
+
+    def test_dedup_skips_upload(self, storage, collection):
+        storage.save_content_blob(collection, {'payload': list(range(100))})
+        collection.calls.clear()
+        result = storage.save_content_blob(collection, {'payload': list(range(100))})
+
+        assert result['deduplicated'] is True
+        assert [op for op, _ in collection.calls] == ['mutate_in']
+
+
+# ============================================================================
+# Codec configuration
+# ============================================================================
+
+class TestCodecConfiguration:
+    def test_gzip_by_default(self, monkeypatch):
+        monkeypatch.delenv('LIQUID_SNAKE_BLOB_CODEC', raising=False)
+        assert BlobStorage().codec == 'gzip'
+
+    def test_configured_codec_must_be_installed(self, monkeypatch):
+        monkeypatch.setattr(blob_storage.get_codec('zstd'), 'available', False)
+        with pytest.raises(ValueError, match='zstandard'):
+            BlobStorage(codec='zstd')
@@ -0,0 +1,146 @@
+#!/usr/bin/env python3
+"""
+Unit Tests for Bulk KV Module
+Tests validation and per-item results of multi-document operations (with a fake collection)
+"""
+
+import pytest
+import sys
+import os
+
+# Add parent directory to path to import bulk_kv
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import bulk_kv
+from bulk_kv import bulk_get, bulk_remove, bulk_upsert, validate_documents, validate_ids
+
+
+class NotFound(Exception):
+    pass
+
+
+class _GetResult:
+    def __init__(self, value):
+        self.content_as = {dict: value}
+
+
+class _MutationResult:
+    def __init__(self, cas):
+        self.cas = cas
+
+
+class _MultiResult:
+    def __init__(self):
+        self.results = {}
+        self.exceptions = {}
+
+
+class FakeCollection:
+    """Collection with *_multi operations; keys in `broken` fail with a timeout"""
+
+    def __init__(self, docs=None):
+        self.docs = dict(docs or {})
+        self.broken = set()
+        self.calls = []
+        self.cas = 100
+
+    def _multi(self, name, keys, apply):
+        self.calls.append((name, list(keys)))
+        multi = _MultiResult()
+        for key in keys:
+            if key in self.broken:
+                multi.exceptions[key] = TimeoutError(f'{key} timed out')
+            elif name != 'upsert' and key not in self.docs:
+                multi.exceptions[key] = NotFound(key)
+            else:
+                multi.results[key] = apply(key)
+        return multi
+
+    def get_multi(self, keys, return_exceptions=True):
+        return self._multi('get', keys, lambda key: _GetResult(self.docs[key]))
+
+    def upsert_multi(self, docs, return_exceptions=True):
+        def apply(key):
+            self.docs[key] = docs[key]
+            self.cas += 1
+            return _MutationResult(self.cas)
+        return self._multi('upsert', docs, apply)
+
+    def remove_multi(self, keys, return_exceptions=True):
+        def apply(key):
+            del self.docs[key]
+            return _MutationResult(0)
+        return self._multi('remove', keys, apply)
+
+
+# ============================================================================
+# Validation Tests
+# ============================================================================
+
+class TestValidation:
+    """Tests for validate_ids and validate_documents"""
+
+    def test_ids_deduplicated_in_order(self):
+        """Test duplicate ids collapse and order is kept"""
+        assert validate_ids(['b', 'a', 'b']) == ['b', 'a']
+
+    @pytest.mark.parametrize('ids', [None, [], 'abc', ['a', ''], ['a', 3]])
+    def test_invalid_ids(self, ids):
+        """Test malformed id lists are rejected"""
+        with pytest.raises(ValueError):
+            validate_ids(ids)
+
+    def test_documents(self):
+        """Test documents map ids to data and the last duplicate wins"""
+        docs = validate_documents([{'requestId': 'a', 'data': {'v': 1}}, {'requestId': 'a', 'data': {'v': 2}}])
+        assert docs == {'a': {'v': 2}}
+        with pytest.raises(ValueError):
+            validate_documents([{'data': {}}])
+
+    def test_batch_limit(self, monkeypatch):
+        """Test batches above BULK_MAX_ITEMS are rejected"""
+        monkeypatch.setattr(bulk_kv, 'BULK_MAX_ITEMS', 2)
+        with pytest.raises(ValueError):
+            validate_ids(['a', 'b', 'c'])
+        with pytest.raises(ValueError):
+            validate_documents([{'requestId': k} for k in 'abc'])
+
+
+# ============================================================================
+# Bulk Operation Tests
+# ============================================================================
+
+class TestBulkOperations:
+    """Tests for bulk_get, bulk_upsert and bulk_remove"""
+
+    def test_get_reports_each_item(self):
+        """Test one multi-get returns found, missing and failed items in request order"""
+        collection = FakeCollection({'a': {'v': 1}, 'c': {'v': 3}})
+        collection.broken.add('c')
+
+        response = bulk_get(collection, ['c', 'a', 'missing'], not_found=(NotFound,))
+
+        assert collection.calls == [('get', ['c', 'a', 'missing'])]
+        assert [item['requestId'] for item in response['results']] == ['c', 'a', 'missing']
+        assert response['results'][0] == {'requestId': 'c', 'success': False, 'error': 'c timed out'}
+        assert response['results'][1] == {'requestId': 'a', 'success': True, 'data': {'v': 1}}
+        assert response['results'][2]['status'] == 'not_found'
+        assert (response['succeeded'], response['failed']) == (1, 2)
+
+    def test_upsert(self):
+        """Test documents are written in one call with a CAS per item"""
+        collection = FakeCollection()
+        response = bulk_upsert(collection, {'a': {'v': 1}, 'b': {'v': 2}})
+
+        assert len(collection.calls) == 1
+        assert collection.docs == {'a': {'v': 1}, 'b': {'v': 2}}
+        assert [item['cas'] for item in response['results']] == [101, 102]
+
+    def test_remove(self):
+        """Test deletes continue past missing documents"""
+        collection = FakeCollection({'a': {}, 'b': {}})
+        response = bulk_remove(collection, ['a', 'gone', 'b'], not_found=(NotFound,))
+
+        assert collection.docs == {}
+        assert [item['success'] for item in response['results']] == [True, False, True]
+        assert response['results'][1]['error'] == 'Document not found'
@@ -0,0 +1,414 @@
+#!/usr/bin/env python3
+"""
+Unit Tests for Continuous Capture Module
+Tests watermark queries, de-duplication, rolling chunk storage and the
+poll loop against a mock ring buffer and an in-memory collection
+"""
+
+import pytest
+import copy
+import json
+import sys
+import os
+import threading
+import time
+
+# Add parent directory to path to import capture
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from capture import (
+    CaptureConflict, CaptureJob, CaptureScheduler, CaptureStore, build_capture_query, capture_id_for,
+    poll_lock_for, select_new_rows, split_chunks
+)
+
+# Couchbase rejects documents over 20MB
+DOCUMENT_LIMIT = 20 * 1024 * 1024
+
+
+class _Result:
+    def __init__(self, value, cas=None):
+        self.content_as = {dict: copy.deepcopy(value)}
+        self.cas = cas
+
+
+class CasMismatch(Exception):
+    pass
+
+
+class DocumentExists(Exception):
+    pass
+
+
+class MemoryCollection:
+    """In-memory stand-in for a KV collection (with CAS and the document size limit)"""
+
+    def __init__(self):
+        self.docs = {}
+        self.cas = {}
+        self._next_cas = 0
+
+    def _store(self, key, value):
+        if len(json.dumps(value, default=str)) > DOCUMENT_LIMIT:
+            raise ValueError(f'{key} is over the document size limit')
+        self.docs[key] = copy.deepcopy(value)
+        self._next_cas += 1
+        self.cas[key] = self._next_cas
+
+    def get(self, key):
+        if key not in self.docs:
+            raise KeyError(key)
+        return _Result(self.docs[key], self.cas[key])
+
+    def upsert(self, key, value):
+        self._store(key, value)
+
+    def insert(self, key, value):
+        if key in self.docs:
+            raise DocumentExists(key)
+        self._store(key, value)
+
+    def replace(self, key, value, options):
+        if key not in self.docs:
+            raise KeyError(key)
+        if options['cas'] != self.cas[key]:
+            raise CasMismatch(key)
+        self._store(key, value)
+
+    def remove(self, key):
+        if key not in self.docs:
+            raise KeyError(key)
+        del self.docs[key]
+
+
+class RingBuffer:
+    """
+    Mock system:completed_requests: evaluates the capture query's named
+    parameters against rows with a precomputed completion time
+    """
+
+    def __init__(self, capacity=1000):
+        self.capacity = capacity
+        self.rows = []
+        self.queries = []
+        self.next_id = 0
+
+    def complete(self, node, end_ms, plan=None):
+        request = {'requestId': f'r{self.next_id}', 'statement': f'SELECT {self.next_id}',
+                   'requestTime': '2025-08-15T00:00:00.000Z', 'elapsedTime': '1ms'}
+        if node is not None:
+            request['node'] = node
+        self.next_id += 1
+        self.rows.append({'completed_requests': request, 'plan': plan, 'capture_end_ms': end_ms})
+        del self.rows[:-self.capacity]
+        return request['requestId']
+
+    def _matches(self, params, row):
+        node = row['completed_requests'].get('node')
+        known = params.get('known_nodes', [])
+        if node is None:
+            return 'since_unknown' not in params or row['capture_end_ms'] >= params['since_unknown']
+        if node not in known:
+            return True
+        i = known.index(node)
+        return row['capture_end_ms'] >= params[f'since{i}']
+
+    def __call__(self, statement, params):
+        self.queries.append(params)
+        return [copy.deepcopy(row) for row in self.rows if not params or self._matches(params, row)]
+
+
+@pytest.fixture
+def collection():
+    return MemoryCollection()
+
+
+@pytest.fixture
+def store(collection):
+    return CaptureStore(lambda: collection)
+
+
+@pytest.fixture
+def cas_store(collection):
+    return CaptureStore(lambda: collection, replace_options=lambda cas: {'cas': cas},
+                        cas_mismatch=(CasMismatch,), exists=(DocumentExists,))
+
+
+# ============================================================================
+# Watermark Tests
+# ============================================================================
+
+class TestWatermarks:
+    """Tests for build_capture_query and select_new_rows"""
+
+    def test_first_poll_unbounded(self):
+        """Test a capture without watermarks pulls everything"""
+        query = build_capture_query({})
+
+        assert 'WHERE' not in query['statement']
+        assert 'meta().plan' in query['statement'] and 'capture_end_ms' in query['statement']
+        assert query['params'] == {}
+
+    def test_per_node_bounds(self):
+        """Test each node is bounded by its own watermark minus the overlap"""
+        query = build_capture_query({'b:8093': {'end_ms': 9000}, 'a:8093': {'end_ms': 20000}}, overlap_ms=1000)
+
+        assert query['params']['known_nodes'] == ['a:8093', 'b:8093']
+        assert query['params']['since0'] == 19000 and query['params']['since1'] == 8000
+        assert 'node IS NOT VALUED' in query['statement']
+
+    def test_overlap_deduplicated(self):
+        """Test rows seen in the overlap window are dropped and old ids pruned"""
+        ring = RingBuffer()
+        ring.complete('a', 1000)
+        ring.complete('a', 5000)
+        first, marks = select_new_rows(ring({}, {}), {}, overlap_ms=2000)
+        ring.complete('a', 5500)
+        second, marks = select_new_rows(ring({}, {}), marks, overlap_ms=2000)
+
+        assert [r['requestId'] for r in first] == ['r0', 'r1']
+        assert [r['requestId'] for r in second] == ['r2']
+        assert marks['a']['end_ms'] == 5500
+        assert set(marks['a']['recent']) == {'r1', 'r2'}
+
+    def test_input_watermarks_not_mutated(self):
+        """Test the caller's watermarks stay unchanged until the poll is stored"""
+        marks = {'a': {'end_ms': 100.0, 'recent': {'r9': 100.0}}}
+        ring = RingBuffer()
+        ring.complete('a', 200)
+        select_new_rows(ring({}, {}), marks)
+
+        assert marks == {'a': {'end_ms': 100.0, 'recent': {'r9': 100.0}}}
+
+
+# ============================================================================
+# CaptureStore Tests
+# ============================================================================
+
+class TestCaptureStore:
+    """Tests for CaptureStore"""
+
+    def _state(self):
+        return {'capture_id': 'c1', 'watermarks': {}, 'chunks': [], 'next_seq': 0}
+
+    def test_chunks_and_state(self, store, collection):
+        """Test records are split into chunks and the state lists them"""
+        records = [{'requestId': f'r{i}', 'statement': 'SELECT 1'} for i in range(25)]
+        state = store.append(self._state(), records, chunk_records=10)
+
+        assert [c['count'] for c in state['chunks']] == [10, 10, 5]
+        assert store.load_state('c1')['record_count'] == 25
+        assert sorted(store.load_dataset('c1').request_ids) == sorted(r['requestId'] for r in records)
+
+    def test_rolling_trim(self, store, collection):
+        """Test the oldest chunks are removed once the capture exceeds max_records"""
+        state = self._state()
+        for batch in range(5):
+            records = [{'requestId': f'b{batch}-{i}'} for i in range(10)]
+            state = store.append(state, records, chunk_records=10, max_records=30)
+
+        assert state['record_count'] == 30
+        assert [c['key'].split('-')[0] for c in state['chunks']] == ['capture::c1::2', 'capture::c1::3', 'capture::c1::4']
+        assert sorted(collection.docs) == sorted(['capture::c1'] + [c['key'] for c in state['chunks']])
+
+    def test_large_plans_split_by_bytes(self, store, collection):
+        """Test a burst of large plans is split below the document limit"""
+        plan = json.dumps({'#operator': 'Sequence', 'text': 'x' * 200000})
+        records = [{'requestId': f'r{i}', 'plan': plan} for i in range(300)]
+        state = store.append(self._state(), records)
+
+        assert len(state['chunks']) > 1
+        assert sum(c['count'] for c in state['chunks']) == 300
+        assert all(len(json.dumps(collection.docs[c['key']])) < DOCUMENT_LIMIT for c in state['chunks'])
+        assert len(store.load_dataset('c1')) == 300
+
+    def test_oversized_record_keeps_request(self):
+        """Test a record over the record limit is kept without its plan"""
+        records = [{'requestId': 'big', 'plan': 'x' * 1000}, {'requestId': 'small', 'plan': 'y'}]
+        batches = split_chunks(records, chunk_bytes=500, max_record_bytes=500)
+
+        assert [[r['requestId'] for r in b] for b in batches] == [['big', 'small']]
+        assert batches[0][0]['plan'] is None and batches[0][0]['plan_dropped'] is True
+        assert records[0]['plan'] == 'x' * 1000
+
+    def test_split_by_count_and_bytes(self):
+        """Test chunks close on whichever bound is reached first"""
+        records = [{'requestId': f'r{i}'} for i in range(10)]
+        size = len(json.dumps(records[0]))
+
+        assert [len(b) for b in split_chunks(records, chunk_records=4)] == [4, 4, 2]
+        assert [len(b) for b in split_chunks(records, chunk_bytes=size * 3)] == [3, 3, 3, 1]
+
+    def test_stale_state_conflicts(self, cas_store, collection):
+        """Test a write based on a stale state fails and removes its own chunks"""
+        cas_store.append(self._state(), [{'requestId': 'r0'}])
+        state, cas = cas_store.load_state_cas('c1')
+        cas_store.append(state, [{'requestId': 'r1'}], cas=cas)
+        before = dict(collection.docs)
+
+        with pytest.raises(CaptureConflict):
+            cas_store.append(state, [{'requestId': 'r2'}], cas=cas)
+        assert collection.docs.keys() == before.keys()
+        assert sorted(cas_store.load_dataset('c1').request_ids) == ['r0', 'r1']
+
+    def test_concurrent_create_conflicts(self, cas_store):
+        """Test two writers creating the same capture: the second one loses"""
+        cas_store.append(self._state(), [{'requestId': 'r0'}])
+
+        with pytest.raises(CaptureConflict):
+            cas_store.append(self._state(), [{'requestId': 'r1'}])
+        assert cas_store.load_dataset('c1').request_ids == ['r0']
+
+    def test_failed_chunk_write_cleans_up(self, store, collection):
+        """Test chunks already written are removed when a later chunk fails"""
+        real_upsert = collection.upsert
+        calls = []
+
+        def flaky_upsert(key, value):
+            calls.append(key)
+            if len(calls) == 2:
+                raise ConnectionError('kv down')
+            real_upsert(key, value)
+
+        collection.upsert = flaky_upsert
+        with pytest.raises(ConnectionError):
+            store.append(self._state(), [{'requestId': f'r{i}'} for i in range(20)], chunk_records=10)
+        assert collection.docs == {}
+
+    def test_delete(self, store, collection):
+        """Test deleting a capture removes its state and chunks"""
+        store.append(self._state(), [{'requestId': 'r0'}])
+
+        assert store.delete('c1') is True
+        assert collection.docs == {}
+        assert store.delete('c1') is False
+        assert store.load_dataset('c1') is None
+
+
+# ============================================================================
+# CaptureJob Tests
+# ============================================================================
+
+class TestCaptureJob:
+    """Tests for CaptureJob and CaptureScheduler"""
+
+    def test_incremental_polls(self, store):
+        """Test each poll stores only new rows, including late slow queries"""
+        ring = RingBuffer()
+        for i in range(3):
+            ring.complete('a:8093', 1000 + i)
+        ring.complete('b:8093', 1000)
+        job = CaptureJob('c1', 'admin@db', ring, store)
+
+        assert job.poll_once() == 4
+        assert job.poll_once() == 0
+        ring.complete('a:8093', 1003, plan={'#operator': 'Sequence'})
+        ring.complete(None, 50)
+        assert job.poll_once() == 2
+        assert job.poll_once() == 0
+
+        dataset = store.load_dataset('c1')
+        assert sorted(dataset.request_ids) == [f'r{i}' for i in range(6)]
+        assert ring.queries[-1]['known_nodes'] == ['a:8093', 'b:8093']
+        assert 'since_unknown' in ring.queries[-1]
+
+    def test_ring_buffer_overwrite(self, store):
+        """Test frequent polls keep rows the ring buffer has since overwritten"""
+        ring = RingBuffer(capacity=5)
+        job = CaptureJob('c1', 'admin@db', ring, store)
+        for i in range(20):
+            ring.complete('a', 1000 + i * 10)
+            if i % 3 == 0:
+                job.poll_once()
+        job.poll_once()
+
+        assert len(store.load_dataset('c1')) == 20
+
+    def test_failed_poll_does_not_advance(self, store):
+        """Test a poll that fails while storing is retried in full next time"""
+        ring = RingBuffer()
+        ring.complete('a', 1000)
+        job = CaptureJob('c1', 'admin@db', ring, store)
+
+        real_append = store.append
+        store.append = lambda *args, **kwargs: (_ for _ in ()).throw(ConnectionError('kv down'))
+        with pytest.raises(ConnectionError):
+            job.poll_once()
+        store.append = real_append
+
+        assert job.poll_once() == 1
+
+    def test_state_survives_restart(self, store):
+        """Test a new job for the same capture resumes from the stored watermarks"""
+        ring = RingBuffer()
+        ring.complete('a', 1000)
+        CaptureJob('c1', 'admin@db', ring, store).poll_once()
+        ring.complete('a', 2000)
+
+        assert CaptureJob('c1', 'admin@db', ring, store).poll_once() == 1
+
+    def test_scheduler_loop(self, store):
+        """Test the scheduler polls in the background, records errors and stops"""
+        ring = RingBuffer()
+        ring.complete('a', 1000)
+        scheduler = CaptureScheduler()
+        errors = []
+        job = CaptureJob('c1', 'admin@db', ring, store, on_error=errors.append)
+        scheduler.start(job)
+        deadline = time.time() + 2
+        while job.polls == 0 and time.time() < deadline:
+            time.sleep(0.01)
+
+        assert job.status()['running'] is True
+        assert job.status()['record_count'] == 1
+        assert scheduler.stop('c1') is True
+        assert scheduler.status() == []
+        assert scheduler.stop('c1') is False
+        assert errors == []
+
+    def test_jobs_share_poll_lock(self, cas_store):
+        """Test a replacement job waits for the replaced job's in-flight poll"""
+        ring = RingBuffer()
+        ring.complete('a', 1000)
+        entered, release = threading.Event(), threading.Event()
+
+        def slow_query(statement, params):
+            entered.set()
+            release.wait(2)
+            return ring(statement, params)
+
+        old = CaptureJob('c-lock', 'admin@db', slow_query, cas_store)
+        new = CaptureJob('c-lock', 'admin@db', ring, cas_store)
+        assert old._poll_lock is new._poll_lock is poll_lock_for('c-lock')
+
+        worker = threading.Thread(target=old.poll_once)
+        worker.start()
+        entered.wait(2)
+        results = []
+        second = threading.Thread(target=lambda: results.append(new.poll_once()))
+        second.start()
+        time.sleep(0.05)
+        assert results == []
+        release.set()
+        worker.join(2)
+        second.join(2)
+
+        assert results == [0]
+        assert cas_store.load_dataset('c-lock').request_ids == ['r0']
+
+    def test_restart_joins_previous_job(self, store):
+        """Test replacing a running capture waits for the previous thread"""
+        ring = RingBuffer()
+        scheduler = CaptureScheduler()
+        first = CaptureJob('c1', 'admin@db', ring, store)
+        scheduler.start(first)
+        scheduler.start(CaptureJob('c1', 'admin@db', ring, store))
+
+        assert not first._thread.is_alive()
+        scheduler.stop_all()
+
+    def test_capture_id(self):
+        """Test the capture id ignores protocol, port and password"""
+        base = {'url': 'http://db:8091', 'username': 'admin', 'password': 'a'}
+
+        assert capture_id_for(base) == capture_id_for({**base, 'url': 'https://DB:18091', 'password': 'b'})
+        assert capture_id_for(base) != capture_id_for({**base, 'username': 'other'})
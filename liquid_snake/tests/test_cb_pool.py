@@ -0,0 +1,470 @@
+#!/usr/bin/env python3
+"""
+Unit Tests for Couchbase Cluster Pool Module
+Tests fingerprinting, reuse across clusters, health, idle eviction,
+concurrent connects and cached collection handles (with fakes - no cluster needed)
+"""
+
+import pytest
+import asyncio
+import sys
+import os
+import threading
+import time
+
+# Add parent directory to path to import cb_pool
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import cb_pool
+from cb_pool import AsyncClusterPool, ClusterPool, CollectionResolver, config_fingerprint, normalize_host, resolve_keyspace
+
+
+class FakeCluster:
+    def __init__(self, config):
+        self.config = config
+        self.closed = False
+
+    def close(self):
+        self.closed = True
+
+
+class FakeConnector:
+    """Connect function recording calls; hosts in `failing` raise"""
+
+    def __init__(self, delay=0.0):
+        self.calls = []
+        self.failing = set()
+        self.delay = delay
+
+    def __call__(self, config):
+        self.calls.append(config['url'])
+        time.sleep(self.delay)
+        if config['url'] in self.failing:
+            raise ConnectionError('auth failed')
+        return FakeCluster(config)
+
+
+def _config(host, user='admin', password='secret'):
+    return {'url': f'http://{host}:8091', 'username': user, 'password': password, 'name': host}
+
+
+@pytest.fixture
+def connector():
+    return FakeConnector()
+
+
+@pytest.fixture
+def pool(connector):
+    return ClusterPool(connector, cleanup_interval_seconds=None)
+
+
+# ============================================================================
+# Fingerprint Tests
+# ============================================================================
+
+class TestFingerprint:
+    """Tests for normalize_host and config_fingerprint"""
+
+    @pytest.mark.parametrize('url, expected', [
+        ('http://10.0.0.5:8091', '10.0.0.5'),
+        ('HTTPS://Node1.Example.com:18091/ui', 'node1.example.com'),
+        ('couchbase://db', 'db'),
+        ('db', 'db'),
+    ])
+    def test_normalize_host(self, url, expected):
+        """Test protocol, port and path are stripped"""
+        assert normalize_host(url) == expected
+
+    def test_fingerprint(self):
+        """Test equivalent configs share a key and credentials change it"""
+        base = _config('db')
+        assert config_fingerprint(base) == config_fingerprint({**base, 'url': 'https://DB:18091', 'name': 'x'})
+        assert config_fingerprint(base) != config_fingerprint({**base, 'username': 'other'})
+        assert config_fingerprint(base) != config_fingerprint({**base, 'password': 'changed'})
+        assert 'secret' not in config_fingerprint(base)
+
+
+# ============================================================================
+# ClusterPool Tests
+# ============================================================================
+
+class TestClusterPool:
+    """Tests for ClusterPool"""
+
+    def test_switching_clusters_reuses_connections(self, pool, connector):
+        """Test alternating between clusters connects each only once"""
+        first = pool.get(_config('a'))
+        second = pool.get(_config('b'))
+        for _ in range(5):
+            assert pool.get(_config('a')) is first
+            assert pool.get(_config('b')) is second
+
+        assert connector.calls == ['http://a:8091', 'http://b:8091']
+        assert not first.closed and not second.closed
+
+    def test_failed_connect_backoff(self, pool, connector, monkeypatch):
+        """Test a failed connect returns None and is not retried immediately"""
+        connector.failing.add('http://a:8091')
+        assert pool.get(_config('a')) is None
+        assert pool.get(_config('a')) is None
+        assert connector.calls == ['http://a:8091']
+
+        connector.failing.clear()
+        monkeypatch.setattr(cb_pool, 'CONNECT_RETRY_SECONDS', 0)
+        assert pool.get(_config('a')) is not None
+        assert pool.stats()['clusters'][0]['failures'] == 1
+
+    def test_unhealthy_reconnects(self, pool, connector):
+        """Test mark_unhealthy makes the next get reconnect and retires the old connection"""
+        first = pool.get(_config('a'))
+        pool.mark_unhealthy(_config('a'), TimeoutError('timeout'))
+        second = pool.get(_config('a'))
+
+        assert second is not first
+        assert len(connector.calls) == 2
+        # Other requests may still hold the old cluster, so it stays open
+        assert not first.closed
+        assert pool.stats()['retired'] == 1
+
+    def test_retired_closed_by_idle_sweep(self, pool):
+        """Test a retired connection is closed once it has been retired for idle_seconds"""
+        first = pool.get(_config('a'))
+        pool.mark_unhealthy(_config('a'), TimeoutError('timeout'))
+        second = pool.get(_config('a'))
+
+        assert pool.evict_idle() == 0
+        assert not first.closed
+
+        pool.idle_seconds = 0
+        time.sleep(0.01)
+        pool.evict_idle()
+        assert first.closed and second.closed
+        assert pool.stats()['retired'] == 0
+
+    def test_close_all_closes_retired(self, pool):
+        """Test close_all also closes retired connections"""
+        first = pool.get(_config('a'))
+        pool.mark_unhealthy(_config('a'), TimeoutError('timeout'))
+        pool.get(_config('a'))
+        pool.close_all()
+        assert first.closed
+
+    def test_probe_success_keeps_connection(self, connector):
+        """Test a timeout whose probe passes does not drop the connection"""
+        pool = ClusterPool(connector, cleanup_interval_seconds=None, probe=lambda cluster: None)
+        first = pool.get(_config('a'))
+
+        assert pool.probe(_config('a'), TimeoutError('slow query')) is True
+        assert pool.get(_config('a')) is first
+        assert len(connector.calls) == 1
+
+    def test_probe_failure_marks_unhealthy(self, connector):
+        """Test a failing probe marks the entry unhealthy so the next get reconnects"""
+        def probe(cluster):
+            raise ConnectionError('offline')
+
+        pool = ClusterPool(connector, cleanup_interval_seconds=None, probe=probe)
+        first = pool.get(_config('a'))
+
+        assert pool.probe(_config('a'), TimeoutError('timeout')) is False
+        assert 'offline' in pool.stats()['clusters'][0]['last_error']
+        assert pool.get(_config('a')) is not first
+
+    def test_probe_without_connection(self, pool):
+        """Test probing an unknown config or a pool without a probe keeps it healthy"""
+        assert pool.probe(_config('missing'), TimeoutError('timeout')) is True
+        pool.get(_config('a'))
+        assert pool.probe(_config('a'), TimeoutError('timeout')) is True
+
+    def test_idle_eviction(self, pool):
+        """Test idle connections are closed and removed"""
+        cluster = pool.get(_config('a'))
+        pool.idle_seconds = 0
+        time.sleep(0.01)
+
+        assert pool.evict_idle() == 1
+        assert cluster.closed
+        assert len(pool) == 0
+
+    def test_capacity_evicts_least_recently_used(self, connector):
+        """Test the pool closes its least recently used connection when full"""
+        pool = ClusterPool(connector, max_clusters=2, cleanup_interval_seconds=None)
+        a = pool.get(_config('a'))
+        b = pool.get(_config('b'))
+        pool.get(_config('a'))
+        pool.get(_config('c'))
+
+        assert b.closed and not a.closed
+        assert pool.stats()['connected'] == 2
+
+    def test_concurrent_gets_connect_once(self):
+        """Test threads racing for the same cluster share one connect"""
+        connector = FakeConnector(delay=0.05)
+        pool = ClusterPool(connector, cleanup_interval_seconds=None)
+        results = []
+        threads = [threading.Thread(target=lambda: results.append(pool.get(_config('a')))) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        assert connector.calls == ['http://a:8091']
+        assert len({id(cluster) for cluster in results}) == 1
+
+    def test_slow_cluster_does_not_block_others(self):
+        """Test a connect in progress for one cluster does not block another"""
+        connector = FakeConnector()
+        pool = ClusterPool(connector, cleanup_interval_seconds=None)
+        release = threading.Event()
+        real_call = connector.__call__
+
+        def connect(config):
+            if config['url'] == 'http://slow:8091':
+                release.wait(2)
+            return real_call(config)
+
+        pool._connect = connect
+        slow = threading.Thread(target=pool.get, args=(_config('slow'),))
+        slow.start()
+        time.sleep(0.02)
+        started = time.time()
+        assert pool.get(_config('fast')) is not None
+        assert time.time() - started < 1
+        release.set()
+        slow.join()
+
+    def test_stats_have_no_credentials(self, pool):
+        """Test stats list clusters without passwords"""
+        pool.get(_config('a'))
+        stats = pool.stats()
+
+        assert stats['clusters'][0]['cluster'] == 'admin@a'
+        assert 'secret' not in str(stats)
+
+
+# ============================================================================
+# AsyncClusterPool Tests
+# ============================================================================
+
+class AsyncFakeCluster(FakeCluster):
+    async def close(self):
+        self.closed = True
+
+
+class AsyncFakeConnector(FakeConnector):
+    """Coroutine connect function recording calls"""
+
+    async def __call__(self, config):
+        self.calls.append(config['url'])
+        await asyncio.sleep(self.delay)
+        if config['url'] in self.failing:
+            raise ConnectionError('auth failed')
+        return AsyncFakeCluster(config)
+
+
+class TestAsyncClusterPool:
+    """Tests for AsyncClusterPool"""
+
+    def test_concurrent_gets_connect_once(self):
+        """Test tasks racing for the same cluster share one connect"""
+        connector = AsyncFakeConnector(delay=0.05)
+        pool = AsyncClusterPool(connector, cleanup_interval_seconds=None)
+
+        async def run():
+            return await asyncio.gather(*[pool.get(_config('a')) for _ in range(20)])
+
+        results = asyncio.run(run())
+        assert connector.calls == ['http://a:8091']
+        assert len({id(cluster) for cluster in results}) == 1
+
+    def test_slow_cluster_does_not_block_others(self):
+        """Test a connect in progress for one cluster does not delay another"""
+        connector = AsyncFakeConnector()
+        pool = AsyncClusterPool(connector, cleanup_interval_seconds=None)
+
+        async def connect(config):
+            if config['url'] == 'http://slow:8091':
+                await asyncio.sleep(0.5)
+            return await connector(config)
+
+        pool._connect = connect
+
+        async def run():
+            slow = asyncio.ensure_future(pool.get(_config('slow')))
+            await asyncio.sleep(0.01)
+            started = time.time()
+            fast = await pool.get(_config('fast'))
+            elapsed = time.time() - started
+            await slow
+            return fast, elapsed
+
+        fast, elapsed = asyncio.run(run())
+        assert fast is not None
+        assert elapsed < 0.25
+
+    def test_unhealthy_reconnects_and_retires(self):
+        """Test mark_unhealthy reconnects; the idle sweep awaits the old cluster's close"""
+        connector = AsyncFakeConnector()
+        pool = AsyncClusterPool(connector, cleanup_interval_seconds=None)
+
+        async def run():
+            first = await pool.get(_config('a'))
+            pool.mark_unhealthy(_config('a'), TimeoutError('timeout'))
+            second = await pool.get(_config('a'))
+            await asyncio.sleep(0)
+            still_open = not first.closed
+            pool.idle_seconds = 0
+            await asyncio.sleep(0.01)
+            pool.evict_idle()
+            await asyncio.sleep(0)
+            return first, second, still_open
+
+        first, second, still_open = asyncio.run(run())
+        assert second is not first
+        assert still_open
+        assert first.closed
+
+    def test_async_probe(self):
+        """Test the awaited probe only marks the entry unhealthy when it fails"""
+        connector = AsyncFakeConnector()
+        offline = set()
+
+        async def probe(cluster):
+            if cluster in offline:
+                raise ConnectionError('offline')
+
+        pool = AsyncClusterPool(connector, cleanup_interval_seconds=None, probe=probe)
+
+        async def run():
+            first = await pool.get(_config('a'))
+            kept = await pool.probe(_config('a'), TimeoutError('slow query'))
+            offline.add(first)
+            dropped = await pool.probe(_config('a'), TimeoutError('timeout'))
+            second = await pool.get(_config('a'))
+            return first, second, kept, dropped
+
+        first, second, kept, dropped = asyncio.run(run())
+        assert kept is True and dropped is False
+        assert second is not first
+
+    def test_failed_connect_backoff(self):
+        """Test a failed connect returns None and is not retried immediately"""
+        connector = AsyncFakeConnector()
+        connector.failing.add('http://a:8091')
+        pool = AsyncClusterPool(connector, cleanup_interval_seconds=None)
+
+        async def run():
+            return [await pool.get(_config('a')) for _ in range(3)]
+
+        assert asyncio.run(run()) == [None, None, None]
+        assert connector.calls == ['http://a:8091']
+
+    def test_idle_sweep_from_get(self):
+        """Test get() closes idle connections once the cleanup interval has passed"""
+        connector = AsyncFakeConnector()
+        pool = AsyncClusterPool(connector, idle_seconds=0, cleanup_interval_seconds=0.01)
+
+        async def run():
+            stale = await pool.get(_config('a'))
+            await asyncio.sleep(0.02)
+            await pool.get(_config('b'))
+            await asyncio.sleep(0)
+            return stale
+
+        stale = asyncio.run(run())
+        assert stale.closed
+        assert [c['cluster'] for c in pool.stats()['clusters']] == ['admin@b']
+
+
+# ============================================================================
+# CollectionResolver Tests
+# ============================================================================
+
+class FakeHandle:
+    def __init__(self, path, opens):
+        self.path = path
+        self.opens = opens
+
+    def scope(self, name):
+        return FakeHandle(f'{self.path}.{name}', self.opens)
+
+    def collection(self, name):
+        return FakeHandle(f'{self.path}.{name}', self.opens)
+
+
+class HandleCluster(FakeCluster):
+    """Fake cluster counting bucket opens"""
+
+    def __init__(self, config=None):
+        super().__init__(config)
+        self.opens = []
+
+    def bucket(self, name):
+        self.opens.append(name)
+        return FakeHandle(name, self.opens)
+
+
+class TestCollectionResolver:
+    """Tests for CollectionResolver and resolve_keyspace"""
+
+    def test_resolve_keyspace_defaults(self):
+        """Test missing bucketConfig keys fall back to the template defaults"""
+        assert resolve_keyspace(None) == ('cb_tools', 'query', 'analyzer')
+        assert resolve_keyspace({'bucket': 'b', 'preferencesScope': 's'}, 'preferences') == ('b', 's', '_default')
+
+    def test_handles_cached_per_cluster_and_config(self):
+        """Test repeated lookups reuse handles and each bucket is opened once"""
+        resolver = CollectionResolver()
+        cluster = HandleCluster()
+        config = {'bucket': 'cb_tools', 'analyzerScope': 'query', 'analyzerCollection': 'analyzer'}
+
+        first = resolver.collection(cluster, config)
+        for _ in range(10):
+            assert resolver.collection(cluster, dict(config)) is first
+        preferences = resolver.collection(cluster, config, 'preferences')
+
+        assert first.path == 'cb_tools.query.analyzer'
+        assert preferences.path == 'cb_tools._default._default'
+        assert cluster.opens == ['cb_tools']
+        assert resolver.stats() == {'buckets': 1, 'collections': 2, 'hits': 10, 'misses': 2}
+
+        other = HandleCluster()
+        assert resolver.collection(other, config) is not first
+
+    def test_pool_hooks_warm_and_forget(self):
+        """Test a reconnect pre-opens the keyspaces the cluster was used with and drops old handles"""
+        resolver = CollectionResolver(warm_defaults=False)
+        pool = ClusterPool(HandleCluster, cleanup_interval_seconds=None)
+        warmed = []
+        pool.on_connect.append(lambda cluster, config: warmed.append(resolver.warm(cluster, config)))
+        pool.on_close.append(resolver.forget)
+
+        cluster = pool.get(_config('a'))
+        warmed.pop().join()
+        resolver.collection(cluster, {'bucket': 'travel', 'analyzerScope': 's', 'analyzerCollection': 'c'})
+
+        pool.mark_unhealthy(_config('a'))
+        fresh = pool.get(_config('a'))
+        warmed.pop().join()
+
+        assert fresh.opens == ['travel']
+        # The retired cluster keeps its handles until the idle sweep closes it
+        assert resolver.stats()['collections'] == 2
+        assert resolver.collection(fresh, {'bucket': 'travel', 'analyzerScope': 's', 'analyzerCollection': 'c'}).path \
+            == 'travel.s.c'
+        assert fresh.opens == ['travel']
+
+        pool.idle_seconds = 0
+        time.sleep(0.01)
+        pool.evict_idle()
+        assert resolver.stats()['collections'] == 0
+
+    def test_warm_defaults_tolerates_missing_bucket(self):
+        """Test warming logs and skips keyspaces that cannot be opened"""
+        class MissingBucketCluster(HandleCluster):
+            def bucket(self, name):
+                raise KeyError(name)
+
+        resolver = CollectionResolver()
+        resolver.warm(MissingBucketCluster(), _config('a'), background=False)
+        assert resolver.stats()['collections'] == 0
@@ -0,0 +1,230 @@
+#!/usr/bin/env python3
+"""
+Unit Tests for Completed Requests Collector Module
+Tests window planning, slice queries and the parallel pull against a mock
+cluster that evaluates the collector's queries over in-memory rows
+"""
+
+import pytest
+import json
+import math
+import sys
+import os
+import threading
+import time
+
+# Add parent directory to path to import collector
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from collector import (
+    COLLECT_MAX_WORKERS, COLLECT_MAX_WORKERS_LIMIT, COLLECT_WINDOWS_PER_NODE, COLLECT_WINDOWS_PER_NODE_LIMIT,
+    DISCOVERY_QUERY, build_slice_query, collect_completed_requests, plan_slices, plan_windows
+)
+from dataset import parse_request_time_ms
+
+
+def _time_ms(request):
+    value = parse_request_time_ms(request.get('requestTime'))
+    return 0 if math.isnan(value) else value
+
+
+class MockCluster:
+    """
+    Stand-in for cluster.query over system:completed_requests
+
+    Understands the discovery query and the slice predicates the collector
+    builds (node, $start_ms, $end_ms); records peak concurrency.
+    """
+
+    def __init__(self, rows, delay=0.0, failing_nodes=()):
+        self.rows = rows
+        self.delay = delay
+        self.failing_nodes = set(failing_nodes)
+        self.statements = []
+        self.active = 0
+        self.peak = 0
+        self.lock = threading.Lock()
+
+    def discover(self):
+        nodes = {}
+        for row in self.rows:
+            request = row['completed_requests']
+            entry = nodes.setdefault(request.get('node'), {'node': request.get('node'), 'times': [], 'count': 0})
+            entry['count'] += 1
+            value = parse_request_time_ms(request.get('requestTime'))
+            if not math.isnan(value):
+                entry['times'].append(value)
+        return [{'node': n['node'], 'start_ms': min(n['times'], default=None),
+                 'end_ms': max(n['times'], default=None), 'count': n['count']} for n in nodes.values()]
+
+    def matches(self, statement, params, request):
+        if 'node IS NOT VALUED' in statement:
+            if request.get('node') is not None:
+                return False
+        elif request.get('node') != params['node']:
+            return False
+        time_ms = _time_ms(request)
+        if 'start_ms' in params and time_ms < params['start_ms']:
+            return False
+        if 'end_ms' in params and time_ms >= params['end_ms']:
+            return False
+        return True
+
+    def __call__(self, statement, params):
+        self.statements.append((statement, dict(params)))
+        if statement == DISCOVERY_QUERY:
+            return self.discover()
+        return self._slice(statement, params)
+
+    def _slice(self, statement, params):
+        with self.lock:
+            self.active += 1
+            self.peak = max(self.peak, self.active)
+        try:
+            time.sleep(self.delay)
+            if params.get('node') in self.failing_nodes:
+                raise TimeoutError('node unreachable')
+            for row in self.rows:
+                if self.matches(statement, params, row['completed_requests']):
+                    yield row
+        finally:
+            with self.lock:
+                self.active -= 1
+
+
+def _rows(count, nodes=('n1:8093', 'n2:8093', 'n3:8093')):
+    rows = []
+    for i in range(count):
+        request = {
+            'requestId': f'r{i}',
+            'node': nodes[i % len(nodes)],
+            'requestTime': f'2025-08-15T00:{(i // 60) % 60:02d}:{i % 60:02d}.000Z',
+            'statement': f'SELECT {i}',
+            'elapsedTime': '1.5ms',
+            'state': 'completed'
+        }
+        rows.append({'completed_requests': request, 'plan': {'#operator': 'Sequence', '~children': []}})
+    return rows
+
+
+# ============================================================================
+# Planning Tests
+# ============================================================================
+
+class TestPlanning:
+    """Tests for plan_windows, build_slice_query and plan_slices"""
+
+    def test_windows_cover_axis(self):
+        """Test windows are contiguous and unbounded at both ends"""
+        windows = plan_windows(0, 1000, 4)
+
+        assert [w['start'] for w in windows] == [None, 250, 500, 750]
+        assert [w['end'] for w in windows] == [250, 500, 750, None]
+
+    @pytest.mark.parametrize('start, end, windows', [(None, None, 4), (5, 5, 4), (0, 1000, 1)])
+    def test_single_window(self, start, end, windows):
+        """Test unknown or empty ranges fall back to one unbounded window"""
+        assert plan_windows(start, end, windows) == [{'start': None, 'end': None}]
+
+    def test_slice_query_uses_parameters(self):
+        """Test node and time bounds are passed as named parameters"""
+        query = build_slice_query('n1:8093', {'start': 10, 'end': None})
+
+        assert 'node = $node' in query['statement']
+        assert '$start_ms' in query['statement'] and '$end_ms' not in query['statement']
+        assert query['params'] == {'node': 'n1:8093', 'start_ms': 10}
+        assert 'meta().plan' in query['statement']
+
+    def test_missing_node(self):
+        """Test rows without a node are still selected"""
+        query = build_slice_query(None, {'start': None, 'end': None})
+
+        assert 'node IS NOT VALUED' in query['statement']
+        assert query['params'] == {}
+
+    def test_small_nodes_single_slice(self):
+        """Test nodes with few rows are not split"""
+        slices = plan_slices([
+            {'node': 'big', 'start_ms': 0, 'end_ms': 1000, 'count': 100000},
+            {'node': 'small', 'start_ms': 0, 'end_ms': 1000, 'count': 10}
+        ], 4)
+
+        assert [s['node'] for s in slices] == ['big'] * 4 + ['small']
+
+
+# ============================================================================
+# Collector Tests
+# ============================================================================
+
+class TestCollect:
+    """Tests for collect_completed_requests"""
+
+    def test_every_row_collected_once(self):
+        """Test sliced pulls return each row exactly once, unparseable times included"""
+        rows = _rows(3000)
+        rows[5]['completed_requests']['requestTime'] = 'not a time'
+        rows.append({'completed_requests': {'requestId': 'orphan', 'requestTime': '2025-08-15T00:00:01Z'}})
+        cluster = MockCluster(rows)
+
+        result = collect_completed_requests(cluster, max_workers=3, windows_per_node=2)
+        dataset = result['dataset']
+
+        assert sorted(dataset.request_ids) == sorted(r['completed_requests']['requestId'] for r in rows)
+        assert result['stats']['node_count'] == 4
+        assert result['stats']['slice_count'] == 7
+        assert result['stats']['record_count'] == len(rows)
+        assert result['stats']['failed_slices'] == []
+
+    def test_concurrency_bounded(self):
+        """Test no more than max_workers slice queries run at once"""
+        cluster = MockCluster(_rows(6000), delay=0.05)
+
+        result = collect_completed_requests(cluster, max_workers=2, windows_per_node=4)
+
+        assert result['stats']['slice_count'] == 12
+        assert cluster.peak == 2
+
+    def test_requested_sizes_clamped(self):
+        """Test huge or invalid maxWorkers / windowsPerNode are clamped to sane bounds"""
+        cluster = MockCluster(_rows(16000, nodes=('n1:8093',)))
+
+        result = collect_completed_requests(cluster, max_workers=10 ** 6, windows_per_node=10 ** 6)
+
+        assert result['stats']['max_workers'] == COLLECT_MAX_WORKERS_LIMIT
+        assert result['stats']['windows_per_node'] == COLLECT_WINDOWS_PER_NODE_LIMIT
+        assert result['stats']['slice_count'] == COLLECT_WINDOWS_PER_NODE_LIMIT
+        assert cluster.peak <= COLLECT_MAX_WORKERS_LIMIT
+        assert len(result['dataset']) == 16000
+
+    @pytest.mark.parametrize('value', [0, -3, 'many', None])
+    def test_invalid_sizes_use_bounds_or_defaults(self, value):
+        """Test zero and negative sizes become 1 and non-numbers the defaults"""
+        stats = collect_completed_requests(MockCluster(_rows(30)), max_workers=value, windows_per_node=value)['stats']
+
+        expected = (1, 1) if isinstance(value, int) else (COLLECT_MAX_WORKERS, COLLECT_WINDOWS_PER_NODE)
+        assert (stats['max_workers'], stats['windows_per_node']) == expected
+
+    def test_failed_slices_recorded(self):
+        """Test a failing node is reported while the other nodes still land"""
+        cluster = MockCluster(_rows(300), failing_nodes={'n2:8093'})
+
+        result = collect_completed_requests(cluster, max_workers=2)
+
+        assert len(result['dataset']) == 200
+        assert [s['node'] for s in result['stats']['failed_slices']] == ['n2:8093']
+        assert result['stats']['failed_slices'][0]['error'] == 'node unreachable'
+
+    def test_plans_kept_as_json(self):
+        """Test decoded plans are stored as JSON text like uploaded ones"""
+        result = collect_completed_requests(MockCluster(_rows(3)))
+        dataset = result['dataset']
+
+        assert json.loads(dataset.plans[0]) == {'#operator': 'Sequence', '~children': []}
+        assert collect_completed_requests(MockCluster(_rows(3)), keep_plans=False)['dataset'].plans in (None, [])
+
+    def test_empty_cluster(self):
+        """Test an empty system:completed_requests yields an empty dataset"""
+        result = collect_completed_requests(MockCluster([]))
+
+        assert len(result['dataset']) == 0
+        assert result['stats']['slice_count'] == 0
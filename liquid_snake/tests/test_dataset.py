@@ -0,0 +1,274 @@
+#!/usr/bin/env python3
+"""
+Unit Tests for Columnar Dataset Module
+Tests column building, string interning, aggregation and payload integration
+"""
+
+import pytest
+import io
+import json
+import math
+import sys
+import os
+
+import numpy as np
+
+# Add parent directory to path to import dataset
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from dataset import (
+    DatasetBuilder,
+    StringTable,
+    build_dataset,
+    parse_request_time_ms,
+    epoch_ms_to_iso,
+)
+from ingest import ingest_to_dataset
+from ai_analyzer import AIPayloadBuilder, get_total_queries
+
+
+def _request(i, **overrides):
+    request = {
+        'requestId': f'req-{i}',
+        'requestTime': f'2025-08-15T00:0{i % 10}:00.000Z',
+        'elapsedTime': f'{i + 1}ms',
+        'serviceTime': f'{i + 1}.5ms',
+        'cpuTime': '250µs',
+        'usedMemory': 1024 * i,
+        'resultCount': i,
+        'resultSize': 10 * i,
+        'phaseCounts': {'fetch': i},
+        'phaseTimes': {'fetch': f'{i}ms', 'run': '1m2.5s'},
+        'state': 'completed',
+        'users': 'Administrator',
+        'statement': 'SELECT * FROM users WHERE id = 1' if i % 2 else 'SELECT 1',
+        'plan': '{"#operator":"Sequence"}'
+    }
+    request.update(overrides)
+    return request
+
+
+# ============================================================================
+# Parsing Helper Tests
+# ============================================================================
+
+class TestParsingHelpers:
+    """Tests for requestTime parsing helpers"""
+
+    def test_parse_request_time_formats(self):
+        """Test ISO, Go-style and offset request times agree"""
+        base = parse_request_time_ms('2025-08-15T00:01:00.000Z')
+        assert parse_request_time_ms('2025-08-15 00:01:00.000000000 +0000 UTC') == base
+        assert parse_request_time_ms('2025-08-14T19:01:00.000-05:00') == base
+        assert epoch_ms_to_iso(base) == '2025-08-15T00:01:00Z'
+
+    def test_parse_request_time_invalid(self):
+        """Test unparseable request times return NaN"""
+        assert math.isnan(parse_request_time_ms('yesterday'))
+        assert math.isnan(parse_request_time_ms(None))
+
+
+# ============================================================================
+# StringTable Tests
+# ============================================================================
+
+class TestStringTable:
+    """Tests for StringTable class"""
+
+    def test_interning(self):
+        """Test repeated strings share a code and empty values map to -1"""
+        table = StringTable()
+        assert table.code('a') == 0
+        assert table.code('b') == 1
+        assert table.code('a') == 0
+        assert table.code('') == -1
+        assert table.code(None) == -1
+        assert table.lookup(1) == 'b'
+        assert table.lookup(-1) is None
+        assert len(table) == 2
+
+
+# ============================================================================
+# DatasetBuilder / CompletedRequestsDataset Tests
+# ============================================================================
+
+class TestCompletedRequestsDataset:
+    """Tests for DatasetBuilder and CompletedRequestsDataset"""
+
+    def test_columns_are_typed_arrays(self):
+        """Test numeric fields become float64 columns"""
+        dataset = build_dataset([_request(i) for i in range(4)])
+
+        assert len(dataset) == 4
+        assert dataset.column('elapsedTime').dtype == np.float64
+        assert list(dataset.column('elapsedTime')) == [1.0, 2.0, 3.0, 4.0]
+        assert list(dataset.column('resultCount')) == [0, 1, 2, 3]
+        assert dataset.column('statement_code').dtype == np.int32
+
+    def test_missing_values_are_nan(self):
+        """Test missing numbers and durations are NaN, not zero"""
+        request = _request(0)
+        del request['usedMemory']
+        del request['serviceTime']
+        dataset = build_dataset([request])
+
+        assert math.isnan(dataset.column('usedMemory')[0])
+        assert math.isnan(dataset.column('serviceTime')[0])
+
+    def test_phase_times_columns(self):
+        """Test phaseTimes become millisecond columns, NaN where the phase is absent"""
+        builder = DatasetBuilder()
+        builder.append(_request(1, phaseTimes={'fetch': '2ms'}))
+        builder.append(_request(2, phaseTimes={'indexScan': '1m2.5s'}))
+        dataset = builder.build()
+
+        assert dataset.column('phaseTimes.fetch')[0] == 2.0
+        assert math.isnan(dataset.column('phaseTimes.fetch')[1])
+        assert math.isnan(dataset.column('phaseTimes.indexScan')[0])
+        assert dataset.column('phaseTimes.indexScan')[1] == 62500.0
+
+    def test_phase_counts_backfilled(self):
+        """Test phases first seen mid-stream are zero for earlier rows"""
+        builder = DatasetBuilder()
+        builder.append(_request(1, phaseCounts={'fetch': 3}))
+        builder.append(_request(2, phaseCounts={'indexScan': 7}))
+        dataset = builder.build()
+
+        assert list(dataset.column('fetch')) == [3, 0]
+        assert list(dataset.column('indexScan')) == [0, 7]
+
+    def test_statements_interned(self):
+        """Test identical statements share one table entry"""
+        dataset = build_dataset([_request(i) for i in range(10)])
+        assert len(dataset.statements) == 2
+        assert dataset.statement(1) == 'SELECT * FROM users WHERE id = 1'
+
+    def test_keep_plans_flag(self):
+        """Test raw plans are only kept when requested"""
+        assert build_dataset([_request(0)]).plans == ['{"#operator":"Sequence"}']
+        assert build_dataset([_request(0)], keep_plans=False).plans is None
+
+    def test_summary(self):
+        """Test summary aggregates over columns"""
+        dataset = build_dataset([_request(i) for i in range(4)])
+        summary = dataset.summary()
+
+        assert summary['total_queries'] == 4
+        assert summary['durations_ms']['elapsedTime']['max'] == 4.0
+        assert summary['durations_ms']['elapsedTime']['mean'] == 2.5
+        assert summary['phase_counts'] == {'fetch': 6}
+        assert summary['phase_times_ms'] == {'fetch': 6.0, 'run': 250000.0}
+        assert summary['states'] == {'completed': 4}
+        assert summary['time_range']['start'] == '2025-08-15T00:00:00Z'
+
+    def test_empty_dataset_summary(self):
+        """Test an empty dataset summarizes without errors"""
+        summary = build_dataset([]).summary()
+        assert summary['total_queries'] == 0
+        assert summary['durations_ms']['elapsedTime'] == {'count': 0}
+
+
+# ============================================================================
+# Time Index Tests
+# ============================================================================
+
+class TestTimeIndex:
+    """Tests for the sorted requestTime index and time windows"""
+
+    def _unordered(self):
+        minutes = [5, 1, 9, 3, 7, 1]
+        requests = [_request(i, requestTime=f'2025-08-15T00:0{m}:00.000Z') for i, m in enumerate(minutes)]
+        requests.append(_request(6, requestTime='not a time'))
+        return build_dataset(requests)
+
+    def test_index_sorted_without_invalid_rows(self):
+        """Test the index orders rows by time (stable) and skips unparseable times"""
+        order, times = self._unordered().time_index()
+
+        assert list(order) == [1, 5, 3, 0, 4, 2]
+        assert list(np.diff(times) >= 0) == [True] * 5
+
+    def test_window_bounds_inclusive(self):
+        """Test start and end are inclusive and accept strings or epoch ms"""
+        dataset = self._unordered()
+        start = parse_request_time_ms('2025-08-15T00:01:00.000Z')
+
+        window = dataset.time_window(start, '2025-08-15T00:05:00Z')
+
+        assert window.request_ids == ['req-1', 'req-5', 'req-3', 'req-0']
+        assert list(dataset.time_window_rows(end='2025-08-15T00:00:59Z')) == []
+        assert len(dataset.time_window('2025-08-15T00:07:00Z')) == 2
+        assert len(dataset.time_window()) == 6
+
+    def test_window_rows_are_index_view(self):
+        """Test window rows slice the index instead of copying it"""
+        dataset = self._unordered()
+        rows = dataset.time_window_rows('2025-08-15T00:03:00Z', '2025-08-15T00:07:00Z')
+        assert rows.base is dataset.time_index()[0]
+
+    def test_contiguous_window_uses_views(self):
+        """Test a time-ordered capture gives column views"""
+        dataset = build_dataset([_request(i) for i in range(10)])
+        window = dataset.time_window('2025-08-15T00:02:00Z', '2025-08-15T00:06:00Z')
+
+        assert len(window) == 5
+        assert np.shares_memory(window.column('elapsedTime'), dataset.column('elapsedTime'))
+        assert window.statement(0) == dataset.statement(2)
+        assert window.summary()['total_queries'] == 5
+        assert window.summary()['time_range']['end'] == '2025-08-15T00:06:00Z'
+
+    def test_window_summary_counts_distinct_codes(self):
+        """Test unique counts reflect the window, not the shared string tables"""
+        dataset = build_dataset([_request(i) for i in range(10)])
+        assert dataset.summary()['unique_statements'] == 2
+        assert dataset.time_window(end='2025-08-15T00:00:00Z').summary()['unique_statements'] == 1
+
+    def test_invalid_window_time(self):
+        """Test an unparseable window bound is rejected"""
+        with pytest.raises(ValueError):
+            self._unordered().time_window('yesterday')
+
+
+# ============================================================================
+# Integration Tests
+# ============================================================================
+
+class TestDatasetIntegration:
+    """Tests for ingest and payload builder integration"""
+
+    def test_ingest_to_dataset(self):
+        """Test streaming ingest produces a dataset"""
+        rows = [{'completed_requests': _request(i), 'plan': '{}'} for i in range(6)]
+        raw = json.dumps(rows).encode('utf-8')
+        result = ingest_to_dataset(io.BytesIO(raw), chunk_size=32)
+
+        assert len(result['dataset']) == 6
+        assert result['stats']['record_count'] == 6
+        assert result['stats']['dataset_bytes'] > 0
+
+    def test_dashboard_metrics_from_dataset(self):
+        """Test the AI payload dashboard falls back to column aggregates"""
+        dataset = build_dataset([_request(i) for i in range(3)])
+        data = {'dataset': dataset, 'dashboardStats': {}}
+
+        result = AIPayloadBuilder()._build_dashboard_metrics(data)
+
+        assert result['source'] == 'server_dataset'
+        assert result['total_queries'] == 3
+        assert get_total_queries(data) == 3
+
+    def test_payload_scoped_to_time_window(self):
+        """Test options.time_window scopes the server dataset"""
+        dataset = build_dataset([_request(i) for i in range(10)])
+        payload = AIPayloadBuilder().build_payload_from_data(
+            raw_data={'dataset': dataset},
+            user_prompt='Analyze',
+            selections={'dashboard': True},
+            options={'time_window': {'start': '2025-08-15T00:08:00Z'}}
+        )
+
+        assert payload['data']['dashboard_metrics']['total_queries'] == 2
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
@@ -0,0 +1,156 @@
+#!/usr/bin/env python3
+"""
+Unit Tests for Timeline Downsampling Module
+Tests LTTB and min/max selection, spike preservation and chart payload shapes
+"""
+
+import pytest
+import copy
+import sys
+import os
+
+import numpy as np
+
+# Add parent directory to path to import downsample
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from downsample import (
+    downsample_chart,
+    downsample_timeline_charts,
+    lttb_indices,
+    minmax_indices,
+    select_indices,
+)
+from ai_analyzer import AIPayloadBuilder
+
+
+def _series(n, spike_at=None, spike=1000.0):
+    values = [float(i % 7) for i in range(n)]
+    if spike_at is not None:
+        values[spike_at] = spike
+    return values
+
+
+# ============================================================================
+# Index Selection Tests
+# ============================================================================
+
+class TestIndexSelection:
+    """Tests for lttb_indices, minmax_indices and select_indices"""
+
+    @pytest.mark.parametrize('select', [lttb_indices, minmax_indices])
+    def test_budget_and_endpoints(self, select):
+        """Test the budget is respected and first/last points are kept"""
+        values = np.array(_series(1000))
+        indices = select(values, 50)
+
+        assert len(indices) <= 50
+        assert indices[0] == 0
+        assert indices[-1] == 999
+        assert list(indices) == sorted(set(indices.tolist()))
+
+    @pytest.mark.parametrize('select', [lttb_indices, minmax_indices])
+    def test_spike_kept(self, select):
+        """Test an isolated spike survives downsampling"""
+        values = np.array(_series(5000, spike_at=3217))
+        assert 3217 in select(values, 60)
+
+    def test_minmax_keeps_dip(self):
+        """Test min/max also keeps a dip"""
+        values = np.full(1000, 10.0)
+        values[421] = -50.0
+        assert 421 in minmax_indices(values, 40)
+
+    @pytest.mark.parametrize('select', [lttb_indices, minmax_indices])
+    def test_short_series_untouched(self, select):
+        """Test series within budget keep every point"""
+        assert list(select(np.arange(10.0), 20)) == list(range(10))
+
+    def test_small_series_spike_not_hidden(self):
+        """Test a spike in a small-valued series survives next to a large series"""
+        large = [1000.0 + (i % 5) for i in range(2000)]
+        small = [1.0] * 2000
+        small[1234] = 5.0
+        indices = select_indices([large, small], 60)
+        assert 1234 in indices
+
+    def test_none_values_and_unknown_method(self):
+        """Test None values are tolerated and unknown methods rejected"""
+        values = [None if i % 3 else float(i) for i in range(500)]
+        assert len(select_indices([values], 40)) <= 40
+        assert select_indices([values], 1000) is None
+        with pytest.raises(ValueError):
+            select_indices([values], 40, method='average')
+
+
+# ============================================================================
+# Chart Shape Tests
+# ============================================================================
+
+class TestDownsampleCharts:
+    """Tests for downsample_chart and downsample_timeline_charts"""
+
+    def test_common_timeline_charts(self):
+        """Test aligned datasets get their own labels and the input is not mutated"""
+        labels = [f't{i}' for i in range(600)]
+        charts = {
+            'common_timeline': {'labels': labels, 'note': 'Complete timeline'},
+            'request_count': {'title': 'Request Count', 'datasets': {
+                'data': _series(600, spike_at=333), 'errors': _series(600)
+            }},
+            'memory_usage': {'title': 'Memory', 'datasets': {'data': _series(20)}}
+        }
+        original = copy.deepcopy(charts)
+
+        result = downsample_timeline_charts(charts, max_points=50)
+
+        assert charts == original
+        chart = result['request_count']
+        assert len(chart['labels']) == len(chart['datasets']['data']) == len(chart['datasets']['errors'])
+        assert len(chart['labels']) <= 50
+        assert 't333' in chart['labels']
+        assert chart['datasets']['data'][chart['labels'].index('t333')] == 1000.0
+        assert chart['_downsampled'] == {'method': 'minmax', 'original_points': 600, 'points': len(chart['labels'])}
+        assert result['memory_usage'] is charts['memory_usage']
+        assert 'Downsampled' in result['common_timeline']['note']
+
+    def test_chartjs_shape(self):
+        """Test Chart.js {'data': {'labels', 'datasets': [...]}} charts"""
+        chart = {'data': {'labels': list(range(400)), 'datasets': [
+            {'label': 'exec', 'data': _series(400, spike_at=77)},
+            {'label': 'kernel', 'data': _series(400)}
+        ]}}
+        result = downsample_chart(chart, None, 40, method='lttb')
+
+        assert 77 in result['data']['labels']
+        assert len(result['data']['datasets'][0]['data']) == len(result['data']['labels'])
+        assert result['data']['datasets'][1]['label'] == 'kernel'
+
+    def test_point_list_shape(self):
+        """Test the older [{'value': ...}] list shape"""
+        chart = {'data': [{'time': i, 'value': v} for i, v in enumerate(_series(300, spike_at=150))]}
+        result = downsample_chart(chart, None, 30)
+
+        assert {'time': 150, 'value': 1000.0} in result['data']
+        assert len(result['data']) <= 30
+
+
+# ============================================================================
+# AIPayloadBuilder Integration Tests
+# ============================================================================
+
+class TestPayloadTimeline:
+    """Tests for downsampling in _build_timeline_charts"""
+
+    def test_timeline_downsampled(self):
+        """Test the payload builder caps every chart at the point budget"""
+        data = {'timelineChartsData': {
+            'common_timeline': {'labels': list(range(1000))},
+            'cpu_time': {'datasets': {'data': _series(1000, spike_at=999 // 2)}}
+        }}
+        result = AIPayloadBuilder()._build_timeline_charts(data, max_points=100)
+
+        chart = result['charts']['cpu_time']
+        assert len(chart['datasets']['data']) <= 100
+        assert 1000.0 in chart['datasets']['data']
+        assert result['total_charts'] == 2
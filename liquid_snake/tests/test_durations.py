@@ -0,0 +1,82 @@
+#!/usr/bin/env python3
+"""
+Unit Tests for Vectorized Duration Parser
+Tests every Couchbase unit, compound durations, invalid input and scalar parity
+"""
+
+import pytest
+import math
+import random
+import sys
+import os
+
+import numpy as np
+
+# Add parent directory to path to import durations
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import durations
+from durations import parse_duration_ms, parse_durations_ms
+
+
+# ============================================================================
+# parse_durations_ms Tests
+# ============================================================================
+
+class TestParseDurationsMs:
+    """Tests for the vectorized parser"""
+
+    @pytest.mark.parametrize('text, expected', [
+        ('2.732401s', 2732.401),
+        ('681.413039ms', 681.413039),
+        ('8.901µs', 0.008901),
+        ('146us', 0.146),
+        ('250ns', 0.00025),
+        ('4m17.8098098s', 257809.8098),
+        ('1h4m17.8s', 3857800.0),
+        ('1h', 3600000.0),
+        ('12m', 720000.0),
+        (' 3ms ', 3.0),
+    ])
+    def test_units(self, text, expected):
+        """Test every unit Couchbase emits, including compound forms"""
+        assert parse_durations_ms([text])[0] == pytest.approx(expected)
+
+    @pytest.mark.parametrize('text', [None, '', 'bad', '5', 's', 'ms', '1.2.3s', '.5s', '1 s', '3msx', '1hms', 'x' * 100, 42])
+    def test_invalid_is_nan(self, text):
+        """Test malformed or missing values yield NaN"""
+        assert math.isnan(parse_durations_ms([text])[0])
+
+    def test_returns_float64(self):
+        """Test output dtype and shape"""
+        result = parse_durations_ms(['1s', '2s', None])
+        assert result.dtype == np.float64
+        assert result.shape == (3,)
+        assert len(parse_durations_ms([])) == 0
+
+    def test_accepts_generators_and_unicode_arrays(self):
+        """Test non-list inputs"""
+        assert list(parse_durations_ms(v for v in ['1s', '2ms'])) == [1000.0, 2.0]
+        assert list(parse_durations_ms(np.array(['1s', '2ms']))) == [1000.0, 2.0]
+        mixed = parse_durations_ms(np.array(['', '1.5s', '8µs']))
+        assert math.isnan(mixed[0]) and list(mixed[1:]) == [1500.0, 0.008]
+
+    def test_matches_scalar_parser_exactly(self, monkeypatch):
+        """Test vectorized results are bit-identical to the scalar reference across batches"""
+        monkeypatch.setattr(durations, 'BATCH_SIZE', 1000)
+        rng = random.Random(7)
+        units = ['s', 'ms', 'µs', 'us', 'ns']
+        values = [
+            f'{rng.random() * 1000:.{rng.randint(0, 9)}f}{rng.choice(units)}'
+            for _ in range(5000)
+        ]
+        values += ['1m2.5s', '2h', None, 'bad', '1' * 30 + 'ms', '1٠s', '3.5µs']
+
+        vectorized = parse_durations_ms(values)
+        scalar = np.array([parse_duration_ms(v) for v in values])
+
+        assert np.array_equal(vectorized, scalar, equal_nan=True)
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
@@ -0,0 +1,174 @@
+#!/usr/bin/env python3
+"""
+Unit Tests for AI Analysis History Module
+Tests cursor encoding, statement variants and keyset paging over an in-memory index
+"""
+
+import pytest
+import re
+import sys
+import os
+
+# Add parent directory to path to import history
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from history import HISTORY_FIELDS, HISTORY_INDEX, HISTORY_PAGE_MAX, build_history_query, decode_cursor, encode_cursor, history_page
+
+
+INDEXES_FILE = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'cb_indexes.txt')
+
+
+def _index_definition(name):
+    with open(INDEXES_FILE, 'r', encoding='utf-8') as handle:
+        for line in handle:
+            if f'CREATE INDEX `{name}`' in line:
+                return line.strip()
+    raise AssertionError(f'{name} missing from cb_indexes.txt')
+
+
+def _docs(count):
+    # Pairs of documents share a createdAt to exercise the id tie-break
+    return [{
+        'documentId': f'ai_analysis_{i:04d}',
+        'createdAt': f'2025-08-{1 + (i // 2) % 28:02d}T00:00:{(i // 56) % 60:02d}Z',
+        'provider': 'openai' if i % 3 else 'claude',
+        'sourceCluster': f'cluster-{i % 2}'
+    } for i in range(count)]
+
+
+def run_index(docs, query):
+    """Evaluate a history statement's keyset/filter parameters the way the index would"""
+    params = query['params']
+    rows = []
+    for doc in docs:
+        if 'after_created' in params:
+            if doc['createdAt'] > params['after_created']:
+                continue
+            if doc['createdAt'] == params['after_created'] and doc['documentId'] <= params['after_id']:
+                continue
+        if 'source_cluster' in params and doc['sourceCluster'] != params['source_cluster']:
+            continue
+        if 'provider' in params and doc['provider'] != params['provider']:
+            continue
+        rows.append(doc)
+    # createdAt DESC, META().id ASC
+    rows.sort(key=lambda d: d['documentId'])
+    rows.sort(key=lambda d: d['createdAt'], reverse=True)
+    rows = rows[params.get('offset', 0):]
+    return rows[:params['limit']]
+
+
+def _all_pages(docs, limit, **filters):
+    pages = []
+    cursor = None
+    while True:
+        query = build_history_query({}, limit=limit, cursor=cursor, **filters)
+        page = history_page(run_index(docs, query), limit)
+        pages.append(page)
+        cursor = page['next_cursor']
+        if not cursor:
+            return pages
+
+
+# ============================================================================
+# Cursor Tests
+# ============================================================================
+
+class TestCursor:
+    """Tests for encode_cursor and decode_cursor"""
+
+    def test_round_trip(self):
+        """Test cursors decode to the row they were made from"""
+        cursor = encode_cursor('2025-08-15T00:00:00Z', 'ai_analysis_1')
+
+        assert '=' not in cursor
+        assert decode_cursor(cursor) == ('2025-08-15T00:00:00Z', 'ai_analysis_1')
+
+    @pytest.mark.parametrize('cursor', ['garbage!', encode_cursor('a', 'b')[:-3], 'WzEsMl0'])
+    def test_invalid(self, cursor):
+        """Test malformed cursors raise ValueError"""
+        with pytest.raises(ValueError):
+            decode_cursor(cursor)
+
+
+# ============================================================================
+# Query Tests
+# ============================================================================
+
+class TestQuery:
+    """Tests for build_history_query"""
+
+    def test_statement_stable_across_pages(self):
+        """Test only parameters change between pages, so the prepared statement is reused"""
+        second = build_history_query({}, cursor=encode_cursor('2025-08-02', 'x'))
+        third = build_history_query({}, cursor=encode_cursor('2025-08-01', 'y'))
+
+        assert second['statement'] == third['statement']
+        assert second['params']['after_created'] != third['params']['after_created']
+
+    def test_index_order_and_keyspace(self):
+        """Test ordering matches the hinted index and the configured keyspace is used"""
+        query = build_history_query({'bucket': 'b', 'analyzerScope': 's', 'analyzerCollection': 'c'})
+
+        assert 'ORDER BY `createdAt` DESC, META().id ASC' in query['statement']
+        assert f'USE INDEX (`{HISTORY_INDEX}` USING GSI)' in query['statement']
+        assert '`b`.`s`.`c`' in query['statement']
+        assert 'OFFSET' not in query['statement']
+
+    def test_index_keys_cover_query(self):
+        """Test the ORDER BY is the index's key prefix and every projected field is a key"""
+        definition = _index_definition(HISTORY_INDEX)
+        keys = definition[definition.index('(') + 1:definition.index(') WHERE')]
+
+        assert keys.startswith('`createdAt` DESC INCLUDE MISSING,META().id,')
+        assert definition.endswith('WHERE (`docType` = "ai_analysis")')
+        for field in re.findall(r'`[^`]+`(?:\.`[^`]+`)?', HISTORY_FIELDS):
+            assert field in keys
+
+    def test_filters_and_limits(self):
+        """Test filters become parameters and the page size is clamped"""
+        query = build_history_query({}, limit=10000, source_cluster='prod', provider='openai')
+
+        assert query['params'] == {'limit': HISTORY_PAGE_MAX + 1, 'source_cluster': 'prod', 'provider': 'openai'}
+        assert '$source_cluster' in query['statement'] and '$provider' in query['statement']
+
+    def test_legacy_offset(self):
+        """Test offset paging is still available without a cursor"""
+        query = build_history_query({}, offset=20)
+
+        assert 'OFFSET $offset' in query['statement'] and query['params']['offset'] == 20
+        assert 'offset' not in build_history_query({}, offset=20, cursor=encode_cursor('a', 'b'))['params']
+
+
+# ============================================================================
+# Paging Tests
+# ============================================================================
+
+class TestPaging:
+    """Tests for keyset paging end to end"""
+
+    def test_pages_cover_everything_once(self):
+        """Test walking the cursors returns every document once, in order, despite equal timestamps"""
+        docs = _docs(47)
+        pages = _all_pages(docs, 10)
+        seen = [row['documentId'] for page in pages for row in page['results']]
+
+        assert [page['count'] for page in pages] == [10, 10, 10, 10, 7]
+        assert sorted(seen) == sorted(d['documentId'] for d in docs)
+        assert len(set(seen)) == len(seen)
+        assert pages[-1]['has_more'] is False
+
+    def test_filtered_paging(self):
+        """Test cursors combine with the sourceCluster and provider filters"""
+        docs = _docs(60)
+        pages = _all_pages(docs, 4, source_cluster='cluster-1', provider='openai')
+        seen = {row['documentId'] for page in pages for row in page['results']}
+
+        assert seen == {d['documentId'] for d in docs if d['sourceCluster'] == 'cluster-1' and d['provider'] == 'openai'}
+
+    def test_exact_page_boundary(self):
+        """Test a last page that is exactly full reports no further page"""
+        pages = _all_pages(_docs(20), 10)
+
+        assert [page['count'] for page in pages] == [10, 10]
+        assert pages[-1]['next_cursor'] is None
@@ -0,0 +1,238 @@
+#!/usr/bin/env python3
+"""
+Unit Tests for Streaming Ingest Module
+Tests container formats, chunk boundaries, and row normalization
+"""
+
+import pytest
+import hashlib
+import io
+import json
+import sys
+import os
+
+from flask import Flask, request
+
+# Add parent directory to path to import ingest
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from ingest import (
+    CompletedRequestsReader,
+    normalize_record,
+    iter_completed_requests,
+    ingest_completed_requests,
+    ingest_to_dataset,
+    request_uploads,
+)
+from snapshot import HashingReader
+
+SAMPLE_FILE = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))),
+    'sample', 'test_system_completed_requests.json'
+)
+
+
+def _rows(count):
+    return [
+        {
+            'completed_requests': {
+                'requestId': f'req-{i}',
+                'elapsedTime': '8.901µs',
+                'statement': f'SELECT {i}'
+            },
+            'plan': '{"#operator":"Sequence"}'
+        }
+        for i in range(count)
+    ]
+
+
+# ============================================================================
+# normalize_record Tests
+# ============================================================================
+
+class TestNormalizeRecord:
+    """Tests for normalize_record function"""
+
+    def test_unwraps_completed_requests_and_attaches_plan(self):
+        """Test meta().plan export rows are flattened"""
+        row = {'completed_requests': {'requestId': 'a'}, 'plan': '{}'}
+        result = normalize_record(row)
+        assert result == {'requestId': 'a', 'plan': '{}'}
+
+    def test_flat_request_passthrough(self):
+        """Test already flat requests are returned as-is"""
+        row = {'requestId': 'a', 'elapsedTime': '1s'}
+        assert normalize_record(row) is row
+
+    def test_non_object_returns_none(self):
+        """Test scalars and arrays are rejected"""
+        assert normalize_record(42) is None
+        assert normalize_record([1, 2]) is None
+        assert normalize_record({'completed_requests': 'x'}) is None
+
+
+# ============================================================================
+# CompletedRequestsReader Tests
+# ============================================================================
+
+class TestCompletedRequestsReader:
+    """Tests for CompletedRequestsReader class"""
+
+    @pytest.mark.parametrize('chunk_size', [1, 3, 7, 64, 1024 * 1024])
+    def test_json_array_any_chunk_size(self, chunk_size):
+        """Test array parsing across chunk boundaries, including split multibyte chars"""
+        raw = json.dumps(_rows(25), ensure_ascii=False, indent=2).encode('utf-8')
+        records = list(iter_completed_requests(io.BytesIO(raw), chunk_size=chunk_size))
+
+        assert len(records) == 25
+        assert records[0]['elapsedTime'] == '8.901µs'
+        assert records[24]['requestId'] == 'req-24'
+        assert records[3]['plan'] == '{"#operator":"Sequence"}'
+
+    def test_results_wrapper(self):
+        """Test {"results": [...]} query responses"""
+        raw = json.dumps({'results': _rows(3), 'status': 'success'}).encode('utf-8')
+        records = list(iter_completed_requests(io.BytesIO(raw), chunk_size=5))
+        assert [r['requestId'] for r in records] == ['req-0', 'req-1', 'req-2']
+
+    @pytest.mark.parametrize('chunk_size', [3, 64, 1 << 20])
+    def test_rest_response_key_order(self, chunk_size):
+        """Test a REST query response with requestID and signature before results"""
+        response = {
+            'requestID': 'b2c5e4a1-0d2f-4b7e-9a51-5f0c6d2b8e11',
+            'signature': {'*': '*', 'plan': 'json'},
+            'results': _rows(3),
+            'status': 'success',
+            'metrics': {'elapsedTime': '1.2ms', 'resultCount': 3}
+        }
+        raw = json.dumps(response, indent=2).encode('utf-8')
+        reader = CompletedRequestsReader(io.BytesIO(raw), chunk_size=chunk_size)
+        records = list(reader)
+        assert [r['requestId'] for r in records] == ['req-0', 'req-1', 'req-2']
+        assert records[0]['plan'] == '{"#operator":"Sequence"}'
+        assert reader.rows_skipped == 0
+
+    def test_ndjson_first_record_kept_whole(self):
+        """Test an NDJSON upload whose first record is walked field by field"""
+        rows = [{'requestId': 'a', 'phaseCounts': {'fetch': 2}, 'errors': [{'code': 1}]}, {'requestId': 'b'}]
+        raw = '\n'.join(json.dumps(r) for r in rows).encode('utf-8')
+        assert list(iter_completed_requests(io.BytesIO(raw), chunk_size=3)) == rows
+
+    def test_truncated_response_raises(self):
+        """Test a response cut inside its results array raises"""
+        raw = json.dumps({'requestID': 'x', 'results': _rows(3)}).encode('utf-8')[:-30]
+        with pytest.raises(ValueError):
+            list(iter_completed_requests(io.BytesIO(raw), chunk_size=16))
+
+    def test_ndjson(self):
+        """Test newline-delimited JSON"""
+        raw = '\n'.join(json.dumps(r) for r in _rows(4)).encode('utf-8')
+        records = list(iter_completed_requests(io.BytesIO(raw), chunk_size=11))
+        assert len(records) == 4
+
+    def test_text_stream_and_bom(self):
+        """Test text streams and a leading BOM"""
+        raw = '\ufeff' + json.dumps(_rows(2))
+        records = list(iter_completed_requests(io.StringIO(raw), chunk_size=4))
+        assert len(records) == 2
+
+    def test_empty_inputs(self):
+        """Test empty body and empty array"""
+        assert list(iter_completed_requests(io.BytesIO(b''))) == []
+        assert list(iter_completed_requests(io.BytesIO(b'  [ ]  '))) == []
+
+    def test_skips_non_object_rows(self):
+        """Test scalar rows are counted as skipped"""
+        reader = CompletedRequestsReader(io.BytesIO(b'[1, {"requestId": "a"}, "x"]'), chunk_size=2)
+        records = list(reader)
+        assert len(records) == 1
+        assert reader.rows_skipped == 2
+
+    def test_truncated_array_raises(self):
+        """Test truncated uploads raise instead of returning partial data silently"""
+        raw = json.dumps(_rows(3)).encode('utf-8')[:-20]
+        with pytest.raises(ValueError):
+            list(iter_completed_requests(io.BytesIO(raw), chunk_size=16))
+
+    def test_oversized_record_raises(self):
+        """Test malformed input does not buffer the whole upload"""
+        raw = b'[{"a": ' + b'1' * 200
+        reader = CompletedRequestsReader(io.BytesIO(raw), chunk_size=16, max_record_chars=64)
+        with pytest.raises(ValueError):
+            list(reader)
+
+
+# ============================================================================
+# ingest_completed_requests Tests
+# ============================================================================
+
+class TestIngestCompletedRequests:
+    """Tests for ingest_completed_requests function"""
+
+    def test_stats(self):
+        """Test stats reflect bytes and records read"""
+        raw = json.dumps(_rows(5)).encode('utf-8')
+        result = ingest_completed_requests(io.BytesIO(raw), chunk_size=100)
+
+        assert len(result['records']) == 5
+        assert result['stats']['record_count'] == 5
+        assert result['stats']['bytes_read'] == len(raw)
+        assert result['stats']['rows_skipped'] == 0
+
+    @pytest.mark.skipif(not os.path.exists(SAMPLE_FILE), reason='sample file not available')
+    def test_sample_file_matches_json_load(self):
+        """Test the streaming parser agrees with json.load on the bundled sample"""
+        with open(SAMPLE_FILE, 'rb') as f:
+            expected = [normalize_record(row) for row in json.load(f)]
+        with open(SAMPLE_FILE, 'rb') as f:
+            result = ingest_completed_requests(f, chunk_size=4096)
+
+        assert result['records'] == expected
+
+
+# ============================================================================
+# request_uploads Tests
+# ============================================================================
+
+class TestRequestUploads:
+    """Tests for picking the upload out of a Flask request"""
+
+    def _ingest(self, **kwargs):
+        app = Flask(__name__)
+        with app.test_request_context('/api/ingest', method='POST', **kwargs):
+            uploads = request_uploads(request)
+            stream = HashingReader(uploads[0].stream if uploads else request.stream)
+            result = ingest_to_dataset(stream)
+            return uploads, result, stream.hexdigest()
+
+    def test_raw_form_urlencoded_body(self):
+        """Test a curl -d style body (form-urlencoded) is read raw, not parsed as a form"""
+        raw = json.dumps(_rows(3)).encode('utf-8')
+        uploads, result, digest = self._ingest(data=raw, content_type='application/x-www-form-urlencoded')
+
+        assert uploads == []
+        assert result['stats']['record_count'] == 3
+        assert digest == hashlib.sha256(raw).hexdigest()
+
+    def test_raw_json_body(self):
+        """Test a raw JSON body is ingested from request.stream"""
+        raw = ''.join(json.dumps(row) + '\n' for row in _rows(4)).encode('utf-8')
+        uploads, result, digest = self._ingest(data=raw, content_type='application/json')
+
+        assert uploads == []
+        assert result['stats']['record_count'] == 4
+        assert digest == hashlib.sha256(raw).hexdigest()
+
+    def test_multipart_file(self):
+        """Test a multipart upload is read from its file part"""
+        raw = json.dumps(_rows(2)).encode('utf-8')
+        uploads, result, digest = self._ingest(data={'file': (io.BytesIO(raw), 'export.json')},
+                                               content_type='multipart/form-data')
+
+        assert len(uploads) == 1
+        assert result['stats']['record_count'] == 2
+        assert digest == hashlib.sha256(raw).hexdigest()
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
@@ -0,0 +1,141 @@
+#!/usr/bin/env python3
+"""
+Unit Tests for Server-side Insights Rules Engine
+Tests each Service Pressure flag (A-H), sample ranking and payload integration
+"""
+
+import pytest
+import sys
+import os
+
+# Add parent directory to path to import insights
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from insights import ServicePressureRules, build_server_insights
+from dataset import build_dataset
+from ai_analyzer import AIPayloadBuilder
+
+
+def _request(i, phase_times=None, phase_counts=None, elapsed='2s'):
+    return {
+        'requestId': f'req-{i}',
+        'requestTime': '2025-08-15T00:01:00.000Z',
+        'elapsedTime': elapsed,
+        'serviceTime': elapsed,
+        'statement': f'SELECT * FROM b WHERE id = {i}',
+        'phaseTimes': phase_times or {},
+        'phaseCounts': phase_counts or {}
+    }
+
+
+def _flags(requests):
+    rules = ServicePressureRules(build_dataset(requests))
+    return [[flag for flag, mask in rules.flags.items() if mask[row]] for row in range(len(requests))]
+
+
+# ============================================================================
+# ServicePressureRules Tests
+# ============================================================================
+
+class TestServicePressureRules:
+    """Tests for each flag predicate"""
+
+    @pytest.mark.parametrize('phase_times, phase_counts, expected', [
+        ({'parse': '500µs', 'plan': '400µs'}, {}, []),
+        ({'parse': '600µs', 'plan': '600µs'}, {}, ['A']),
+        ({'parse': '4ms', 'plan': '7ms'}, {}, ['B']),
+        ({'fetch': '60ms'}, {'fetch': 10}, ['C']),
+        ({'fetch': '100ms'}, {'fetch': 10}, ['D']),
+        ({'fetch': '100ms'}, {'fetch': 9}, []),
+        ({'indexScan': '100ms'}, {'indexScan': 400}, ['E']),
+        ({'indexScan': '1s'}, {'indexScan': 500}, ['F']),
+        ({'indexScan': '1s'}, {'indexScan': 99}, []),
+        ({'indexScan': '10ms'}, {'indexScan': 1000}, []),
+        ({'kernTime': '700ms'}, {}, ['G']),
+        ({'kernTime': '500ms'}, {}, []),
+    ])
+    def test_single_flags(self, phase_times, phase_counts, expected):
+        """Test each threshold boundary matches insights.js"""
+        assert _flags([_request(0, phase_times, phase_counts)]) == [expected]
+
+    def test_system_wide_pressure(self):
+        """Test H is raised when two or more services are under pressure"""
+        request = _request(0, {'parse': '20ms', 'kernTime': '1s'})
+        assert _flags([request]) == [['B', 'G', 'H']]
+
+    def test_evaluate_counts_and_samples(self):
+        """Test per-flag counts, service counts and worst-first samples"""
+        requests = [
+            _request(0, {'parse': '2ms'}),
+            _request(1, {'parse': '20ms', 'fetch': '200ms'}, {'fetch': 10}),
+            _request(2),
+            _request(3, {'kernTime': '1s'}, elapsed='4s'),
+        ]
+        result = ServicePressureRules(build_dataset(requests)).evaluate(limit=10)
+
+        assert result['total_queries_analyzed'] == 4
+        assert result['affected_queries_count'] == 2
+        assert result['flag_counts']['A']['count'] == 1
+        assert result['flag_counts']['B']['count'] == 1
+        assert result['flag_counts']['D']['count'] == 1
+        assert result['flag_counts']['H']['count'] == 1
+        assert result['flag_counts']['G']['count'] == 0
+        assert result['services_under_pressure'] == {
+            'Query Service': 2, 'Data Service': 1, 'Index Service': 0, 'CPU/OS': 0
+        }
+
+        worst = result['samples'][0]
+        assert worst['statement'] == 'SELECT * FROM b WHERE id = 1'
+        assert worst['flags'] == ['B', 'D', 'H']
+        assert worst['flagDetails']['D'] == 'Fetch 20.00ms per doc (200ms for 10 docs) - critically slow'
+        assert worst['flagDetails']['H'] == '2 services under pressure: Query Service, Data Service'
+        assert worst['fetchPerDoc'] == 20.0
+        assert worst['indexScanRate'] is None
+        assert worst['requestTime'] == '2025-08-15T00:01:00Z'
+
+    def test_custom_thresholds(self):
+        """Test thresholds can be overridden"""
+        dataset = build_dataset([_request(0, {'parse': '2ms'})])
+        rules = ServicePressureRules(dataset, thresholds={'PARSE_PLAN_WARNING_MS': 5})
+        assert rules.evaluate()['affected_queries_count'] == 0
+
+    def test_empty_dataset(self):
+        """Test an empty capture evaluates without errors"""
+        result = ServicePressureRules(build_dataset([])).evaluate()
+        assert result['affected_queries_count'] == 0
+        assert result['samples'] == []
+
+
+# ============================================================================
+# AIPayloadBuilder Integration Tests
+# ============================================================================
+
+class TestPayloadInsights:
+    """Tests for server-side insights in the AI payload"""
+
+    def test_insights_from_dataset(self):
+        """Test insights are computed from the dataset when the browser sent none"""
+        dataset = build_dataset([_request(0, {'parse': '2ms'})])
+        insights = AIPayloadBuilder()._build_insights({'dataset': dataset})
+
+        assert insights['source'] == 'server_dataset'
+        assert insights['total_insights'] == 1
+        item = insights['insights'][0]
+        assert item['id'] == 'concurrent-query-conflicts'
+        assert item['counts'] == {'concurrent-conflicts-count': 1}
+
+    def test_browser_insights_preferred(self):
+        """Test insightsData from the browser is still used as-is"""
+        dataset = build_dataset([_request(0)])
+        insights = AIPayloadBuilder()._build_insights({
+            'dataset': dataset,
+            'insightsData': {'items': [{'id': 'select-star-usage'}]}
+        })
+
+        assert 'source' not in insights
+        assert insights['insights'] == [{'id': 'select-star-usage'}]
+
+    def test_build_server_insights_shape(self):
+        """Test the items list mirrors gatherInsightsData"""
+        result = build_server_insights(build_dataset([_request(0)]))
+        assert [item['id'] for item in result['items']] == ['concurrent-query-conflicts']
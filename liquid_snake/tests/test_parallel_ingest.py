@@ -0,0 +1,250 @@
+#!/usr/bin/env python3
+"""
+Unit Tests for Parallel Ingest Module
+Tests shard planning, dataset concatenation, timeline buckets and that merged
+partials match a single-pass ingest of the same capture
+"""
+
+import pytest
+import json
+import sys
+import os
+
+import numpy as np
+
+# Add parent directory to path to import parallel_ingest
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import parallel_ingest
+from parallel_ingest import ingest_parallel, plan_ingest_tasks, plan_ndjson_shards, should_shard
+from dataset import build_dataset, concat_datasets
+from insights import ServicePressureRules
+from query_groups import QueryGroupEngine
+from timeline import TimelineBuckets
+from ai_analyzer import AIPayloadBuilder
+
+
+def _request(i, node='node1'):
+    return {
+        'requestId': f'{node}-{i}',
+        'requestTime': f'2025-08-15T00:{i % 5:02d}:{i % 60:02d}.000Z',
+        'elapsedTime': f'{(i % 7) + 1}s',
+        'serviceTime': f'{(i % 7) + 1}s',
+        'statement': f'SELECT * FROM b WHERE id = {i}' if i % 2 else f"SELECT name FROM u WHERE x = '{i}'",
+        'users': f'user{i % 3}',
+        'state': 'completed' if i % 10 else 'fatal',
+        'phaseTimes': {'fetch': f'{i}ms'},
+        'phaseCounts': {'fetch': i % 4} if i % 3 else {},
+        'resultCount': i
+    }
+
+
+def _write_ndjson(path, requests):
+    path.write_text(''.join(json.dumps(r) + '\n' for r in requests))
+    return str(path)
+
+
+def _write_array(path, requests):
+    path.write_text(json.dumps([{'completed_requests': r} for r in requests]))
+    return str(path)
+
+
+# ============================================================================
+# Shard Planning Tests
+# ============================================================================
+
+class TestShardPlanning:
+    """Tests for plan_ndjson_shards and plan_ingest_tasks"""
+
+    def test_shards_end_on_newlines(self, tmp_path):
+        """Test every shard boundary falls right after a newline and shards cover the file"""
+        path = _write_ndjson(tmp_path / 'a.ndjson', [_request(i) for i in range(200)])
+        data = open(path, 'rb').read()
+        shards = plan_ndjson_shards(path, 4)
+
+        assert len(shards) == 4
+        assert shards[0][0] == 0 and shards[-1][1] is None
+        for (start, end), (next_start, _) in zip(shards, shards[1:]):
+            assert end == next_start
+            assert data[end - 1:end] == b'\n'
+
+    def test_only_ndjson_is_sharded(self, tmp_path, monkeypatch):
+        """Test large NDJSON files are split while JSON arrays stay whole"""
+        monkeypatch.setattr(parallel_ingest, 'MIN_SHARD_BYTES', 1024)
+        ndjson = _write_ndjson(tmp_path / 'a.ndjson', [_request(i) for i in range(200)])
+        array = _write_array(tmp_path / 'b.json', [_request(i) for i in range(200)])
+
+        tasks = plan_ingest_tasks([ndjson, array], max_workers=8)
+
+        assert sum(task[0] == ndjson for task in tasks) == 4
+        assert [task[1:3] for task in tasks if task[0] == array] == [(0, None)]
+
+    def test_should_shard_single_upload(self, tmp_path, monkeypatch):
+        """Test one spooled upload is sharded only when it is large NDJSON and there are workers"""
+        monkeypatch.setattr(parallel_ingest, 'MIN_SHARD_BYTES', 1024)
+        ndjson = _write_ndjson(tmp_path / 'a.ndjson', [_request(i) for i in range(200)])
+        array = _write_array(tmp_path / 'b.json', [_request(i) for i in range(200)])
+        small = _write_ndjson(tmp_path / 'c.ndjson', [_request(0)])
+
+        assert should_shard(ndjson, max_workers=4) is True
+        assert should_shard(ndjson, max_workers=1) is False
+        assert should_shard(array, max_workers=4) is False
+        assert should_shard(small, max_workers=4) is False
+
+
+# ============================================================================
+# Merge Building Block Tests
+# ============================================================================
+
+class TestConcatDatasets:
+    """Tests for concat_datasets"""
+
+    def test_string_tables_remapped(self):
+        """Test codes from different string tables resolve to the right values"""
+        first = build_dataset([_request(i) for i in range(5)])
+        second = build_dataset([{'requestId': 'x', 'statement': 'DELETE FROM z', 'users': 'user1'}])
+
+        merged = concat_datasets([first, second])
+
+        assert len(merged) == 6
+        assert [merged.statement(row) for row in range(6)] == \
+            [first.statement(row) for row in range(5)] + ['DELETE FROM z']
+        assert merged.users.lookup(merged.columns['user_code'][5]) == 'user1'
+        assert np.isnan(merged.phase_times['fetch'][5])
+        assert merged.phase_counts['fetch'][5] == 0
+
+    def test_empty_and_single(self):
+        """Test the degenerate inputs"""
+        single = build_dataset([_request(1)])
+        assert concat_datasets([single]) is single
+        assert len(concat_datasets([])) == 0
+
+
+class TestTimelineBuckets:
+    """Tests for TimelineBuckets"""
+
+    def test_merge_matches_single_pass(self):
+        """Test merged buckets equal bucketing everything at once"""
+        requests = [_request(i) for i in range(100)]
+        merged = TimelineBuckets.from_dataset(build_dataset(requests[:40]))
+        merged.merge(TimelineBuckets.from_dataset(build_dataset(requests[40:])))
+
+        assert merged.buckets == pytest.approx(TimelineBuckets.from_dataset(build_dataset(requests)).buckets)
+
+    def test_charts(self):
+        """Test charts are aligned to the labels and gaps are zero-filled"""
+        requests = [
+            {'requestTime': '2025-08-15T00:00:10Z', 'elapsedTime': '2s'},
+            {'requestTime': '2025-08-15T00:00:50Z', 'elapsedTime': '4s'},
+            {'requestTime': '2025-08-15T00:02:00Z', 'elapsedTime': '1s'},
+        ]
+        charts = TimelineBuckets.from_dataset(build_dataset(requests)).to_charts()
+
+        assert len(charts['common_timeline']['labels']) == 3
+        assert charts['request_count']['datasets']['data'] == [2, 0, 1]
+        assert charts['elapsed_time']['datasets'] == {'avg_ms': [3000.0, 0, 1000.0], 'max_ms': [4000.0, 0, 1000.0]}
+
+    def test_avg_ignores_rows_without_elapsed(self):
+        """Test avg_ms divides by the rows that have an elapsedTime, not every row"""
+        requests = [
+            {'requestTime': '2025-08-15T00:00:10Z', 'elapsedTime': '4s'},
+            {'requestTime': '2025-08-15T00:00:20Z'},
+        ]
+        charts = TimelineBuckets.from_dataset(build_dataset(requests)).to_charts()
+
+        assert charts['request_count']['datasets']['data'] == [2]
+        assert charts['elapsed_time']['datasets'] == {'avg_ms': [4000.0], 'max_ms': [4000.0]}
+
+    def test_outlier_timestamp_stays_sparse(self):
+        """Test one 1970 requestTime does not zero-fill decades of buckets"""
+        requests = [
+            {'requestTime': '1970-01-01T00:00:00Z', 'elapsedTime': '1s'},
+            {'requestTime': '2025-08-15T00:00:10Z', 'elapsedTime': '2s'},
+            {'requestTime': '2025-08-15T00:01:10Z', 'elapsedTime': '3s'},
+        ]
+        charts = TimelineBuckets.from_dataset(build_dataset(requests)).to_charts()
+
+        assert len(charts['common_timeline']['labels']) == 3
+        assert charts['common_timeline']['labels'][0].startswith('1970-01-01')
+        assert charts['request_count']['datasets']['data'] == [1, 1, 1]
+        assert charts['elapsed_time']['datasets']['avg_ms'] == [1000.0, 2000.0, 3000.0]
+
+    def test_bucket_width_mismatch(self):
+        """Test timelines with different widths refuse to merge"""
+        with pytest.raises(ValueError):
+            TimelineBuckets(60000).merge(TimelineBuckets(1000))
+
+
+# ============================================================================
+# ingest_parallel Tests
+# ============================================================================
+
+class TestIngestParallel:
+    """Tests for ingest_parallel"""
+
+    @pytest.fixture
+    def capture(self, tmp_path):
+        nodes = {
+            'node1': [_request(i, 'node1') for i in range(0, 120)],
+            'node2': [_request(i, 'node2') for i in range(50, 150)],
+        }
+        paths = [
+            _write_ndjson(tmp_path / 'node1.ndjson', nodes['node1']),
+            _write_array(tmp_path / 'node2.json', nodes['node2']),
+        ]
+        return paths, nodes['node1'] + nodes['node2']
+
+    @pytest.mark.parametrize('max_workers', [1, 2])
+    def test_merged_partials_match_single_pass(self, capture, max_workers):
+        """Test merged aggregates equal aggregating the combined requests once"""
+        paths, requests = capture
+        result = ingest_parallel(paths, max_workers=max_workers)
+        expected = build_dataset(requests)
+        engine = QueryGroupEngine()
+        engine.add_dataset(expected)
+        pressure = ServicePressureRules(expected).evaluate()
+
+        assert result['stats']['record_count'] == len(requests) == len(result['dataset'])
+        assert result['stats']['file_count'] == 2
+        assert [result['dataset'].request_ids[row] for row in (0, 120)] == ['node1-0', 'node2-50']
+
+        merged_groups = result['query_group_engine'].results()
+        expected_groups = engine.results()
+        assert [g['normalized_statement'] for g in merged_groups] == \
+            [g['normalized_statement'] for g in expected_groups]
+        for merged, single in zip(merged_groups, expected_groups):
+            assert merged['total_count'] == single['total_count']
+            assert merged['status_counts'] == single['status_counts']
+            assert merged['total_duration_in_seconds'] == pytest.approx(single['total_duration_in_seconds'])
+
+        assert result['service_pressure']['affected_queries_count'] == pressure['affected_queries_count']
+        assert {f: c['count'] for f, c in result['service_pressure']['flag_counts'].items()} == \
+            {f: c['count'] for f, c in pressure['flag_counts'].items()}
+        assert result['timeline_buckets'].buckets == \
+            pytest.approx(TimelineBuckets.from_dataset(expected).buckets)
+
+    def test_sharded_ndjson(self, tmp_path, monkeypatch):
+        """Test byte-range shards of one NDJSON file lose and duplicate no record"""
+        monkeypatch.setattr(parallel_ingest, 'MIN_SHARD_BYTES', 2048)
+        path = _write_ndjson(tmp_path / 'big.ndjson', [_request(i) for i in range(300)])
+
+        result = ingest_parallel([path], max_workers=4)
+
+        assert result['stats']['task_count'] == 4
+        assert result['dataset'].request_ids == [f'node1-{i}' for i in range(300)]
+
+    def test_payload_uses_precomputed_aggregates(self, capture):
+        """Test the payload builder reads the cached aggregates and drops them when windowed"""
+        paths, _ = capture
+        result = ingest_parallel(paths, max_workers=1)
+        data = {key: result[key] for key in ('dataset', 'query_group_engine', 'service_pressure', 'timeline_buckets')}
+        builder = AIPayloadBuilder()
+
+        assert builder._build_query_groups(data)['total_patterns'] == len(result['query_group_engine'])
+        assert builder._build_insights(data)['insights'][0]['affected_queries_count'] == \
+            result['service_pressure']['affected_queries_count']
+        assert 'request_count' in builder._build_timeline_charts(data)['charts']
+
+        scoped = builder._scope_to_time_window(data, {'time_window': {'start': '2025-08-15T00:01:00Z'}})
+        assert 'query_group_engine' not in scoped and 'timeline_buckets' not in scoped
+        assert len(scoped['dataset']) < len(result['dataset'])
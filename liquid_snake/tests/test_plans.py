@@ -0,0 +1,195 @@
+#!/usr/bin/env python3
+"""
+Unit Tests for Execution Plan Module
+Tests the iterative operator walk, summary extraction and the plan summary cache
+"""
+
+import pytest
+import json
+import sys
+import os
+
+# Add parent directory to path to import plans
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import plans
+from plans import PlanCache, extract_bsc, iter_operators, plan_index_usage, summarize_operators, summarize_plan
+from dataset import build_dataset
+
+
+PLAN = {
+    '#operator': 'Authorize',
+    '#stats': {'execTime': '2µs'},
+    '~child': {
+        '#operator': 'Sequence',
+        '~children': [
+            {
+                '#operator': 'IndexScan3',
+                'index': 'idx_type',
+                'bucket': 'travel', 'scope': 'inventory', 'keyspace': 'airline',
+                '#stats': {'execTime': '3ms', 'kernTime': '1ms'}
+            },
+            {
+                '#operator': 'Fetch',
+                'keyspace': 'travel',
+                '#stats': {'execTime': '5ms', 'kernTime': '4ms'}
+            },
+            {
+                '#operator': 'PrimaryScan3',
+                'keyspace': 'beer',
+                '~subqueries': [{
+                    'executionTimings': {'#operator': 'Filter', '#stats': {'execTime': '1ms'}}
+                }]
+            },
+            {'#operator': 'Stream', '#stats': {'execTime': '2ms'}}
+        ]
+    }
+}
+
+
+# ============================================================================
+# Operator Walk Tests
+# ============================================================================
+
+class TestIterOperators:
+    """Tests for iter_operators and extract_bsc"""
+
+    def test_document_order(self):
+        """Test operators come out depth-first in document order, subqueries included"""
+        names = [op['#operator'] for op in iter_operators(PLAN)]
+        assert names == ['Authorize', 'Sequence', 'IndexScan3', 'Fetch', 'PrimaryScan3', 'Filter', 'Stream']
+
+    def test_deep_plan_no_recursion_limit(self):
+        """Test a plan deeper than the recursion limit is walked"""
+        depth = sys.getrecursionlimit() * 3
+        root = node = {'#operator': 'Filter'}
+        for _ in range(depth):
+            node['~child'] = {'#operator': 'Filter'}
+            node = node['~child']
+
+        assert summarize_operators(root)['operator_counts'] == {'Filter': depth + 1}
+
+    def test_shared_nodes_visited_once(self):
+        """Test an operator referenced twice is only counted once"""
+        shared = {'#operator': 'IndexScan3', 'index': 'idx'}
+        root = {'#operator': 'UnionAll', '~children': [shared, shared]}
+        assert len(list(iter_operators(root))) == 2
+
+    @pytest.mark.parametrize('operator, expected', [
+        ({'bucket': 'b', 'scope': 's', 'keyspace': 'c'}, 'b.s.c'),
+        ({'bucket': 'b'}, 'b._default._default'),
+        ({'keyspace': 'old'}, 'old._default._default'),
+        ({}, 'unknown.unknown.unknown'),
+    ])
+    def test_extract_bsc(self, operator, expected):
+        """Test bucket.scope.collection rules match extractBSCFromOperator"""
+        assert extract_bsc(operator) == expected
+
+
+# ============================================================================
+# Summary Tests
+# ============================================================================
+
+class TestSummarizeOperators:
+    """Tests for summarize_operators"""
+
+    def test_summary(self):
+        """Test times, indexes, primary usage and operator counts"""
+        summary = summarize_operators(PLAN)
+
+        assert summary['exec_time_ms'] == pytest.approx(11.002)
+        assert summary['stream_exec_time_ms'] == pytest.approx(2.0)
+        assert summary['core_exec_time_ms'] == pytest.approx(9.002)
+        assert summary['kern_time_ms'] == pytest.approx(5.0)
+        assert summary['max_kern_time_ms'] == pytest.approx(4.0)
+        assert summary['core_to_kernel_ratio'] == pytest.approx(225.05)
+        assert summary['indexes'] == ['idx_type::travel.inventory.airline', '#primary::beer._default._default']
+        assert summary['uses_primary'] is True
+        assert summary['sequential_scan'] is False
+        assert summary['operator_counts']['Filter'] == 1
+        assert summary['operator_total'] == 7
+
+    def test_sequential_scan(self):
+        """Test using=sequentialscan is reported"""
+        summary = summarize_operators({'#operator': 'PrimaryScan3', 'using': 'sequentialscan', 'keyspace': 'b'})
+        assert summary['sequential_scan'] is True
+        assert '#sequentialscan::b._default._default' in summary['indexes']
+
+
+# ============================================================================
+# Cache Tests
+# ============================================================================
+
+class TestSummarizePlan:
+    """Tests for summarize_plan and PlanCache"""
+
+    def test_identical_plans_decoded_once(self, monkeypatch):
+        """Test the same plan text is decoded only on the first call"""
+        cache = PlanCache()
+        decoded = []
+        real_loads = json.loads
+        monkeypatch.setattr(plans.json, 'loads', lambda text: decoded.append(text) or real_loads(text))
+        text = json.dumps(PLAN)
+
+        first = summarize_plan(text, cache=cache)
+        second = summarize_plan(text, cache=cache)
+
+        assert first is second
+        assert len(decoded) == 1
+        assert cache.stats() == {'entries': 1, 'hits': 1, 'misses': 1}
+
+    def test_lru_eviction(self):
+        """Test the least recently used summary is evicted"""
+        cache = PlanCache(max_entries=2)
+        texts = [json.dumps({'#operator': name}) for name in ('A', 'B', 'C')]
+        summarize_plan(texts[0], cache=cache)
+        summarize_plan(texts[1], cache=cache)
+        summarize_plan(texts[0], cache=cache)
+        summarize_plan(texts[2], cache=cache)
+
+        assert len(cache) == 2
+        assert cache.get(plans.plan_hash(texts[1])) is None
+        assert cache.get(plans.plan_hash(texts[0])) is not None
+
+    @pytest.mark.parametrize('plan', [None, '', 42])
+    def test_no_plan(self, plan):
+        """Test missing plans give None"""
+        assert summarize_plan(plan, cache=PlanCache()) is None
+
+    def test_invalid_plan(self):
+        """Test undecodable plan text yields an error summary"""
+        assert 'error' in summarize_plan('{"#operator":', cache=PlanCache())
+
+    def test_dataset_plan_summary(self):
+        """Test datasets summarize raw plan strings on demand"""
+        dataset = build_dataset([{'requestId': 'r1', 'plan': json.dumps(PLAN)}, {'requestId': 'r2'}])
+
+        assert dataset.plan_summary(0)['uses_primary'] is True
+        assert dataset.plan_summary(1) is None
+        assert build_dataset([{'plan': json.dumps(PLAN)}], keep_plans=False).plan_summary(0) is None
+
+
+# ============================================================================
+# Index Usage Tests
+# ============================================================================
+
+class TestPlanIndexUsage:
+    """Tests for plan_index_usage"""
+
+    def test_counts_requests_per_index(self):
+        """Test every plan is summarized once per row and folded per index"""
+        text = json.dumps(PLAN)
+        dataset = build_dataset([{'requestId': f'r{i}', 'plan': text} for i in range(4)]
+                                + [{'requestId': 'bad', 'plan': '{"#operator":'}, {'requestId': 'none'}])
+        usage = plan_index_usage(dataset)
+
+        assert usage['requests_with_plans'] == 4
+        assert usage['undecodable_plans'] == 1
+        assert usage['primary_scan_requests'] == 4
+        assert {i['indexName']: i['requests'] for i in usage['indexes']} == {'idx_type': 4, '#primary': 4}
+        assert usage['operators']['IndexScan3'] == 4
+
+    def test_no_plans(self):
+        """Test datasets without plans give None"""
+        assert plan_index_usage(None) is None
+        assert plan_index_usage(build_dataset([{'plan': json.dumps(PLAN)}], keep_plans=False)) is None
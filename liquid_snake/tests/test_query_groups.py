@@ -0,0 +1,239 @@
+#!/usr/bin/env python3
+"""
+Unit Tests for Query Group Aggregation Engine
+Tests statement normalization, the DDSketch, grouping, merging and payload integration
+"""
+
+import pytest
+import random
+import sys
+import os
+
+import numpy as np
+
+# Add parent directory to path to import query_groups
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from query_groups import DDSketch, QueryGroupEngine, build_query_groups, normalize_statement
+from dataset import build_dataset
+from ai_analyzer import AIPayloadBuilder
+
+
+def _request(i, **overrides):
+    request = {
+        'requestId': f'req-{i}',
+        'requestTime': '2025-08-15T00:01:00.000Z',
+        'serviceTime': f'{i + 1}ms',
+        'resultCount': 2,
+        'resultSize': 100,
+        'phaseCounts': {'fetch': 4, 'indexScan': 6},
+        'state': 'completed',
+        'users': 'Administrator' if i % 2 else 'app',
+        'statement': f'SELECT * FROM users WHERE id = {i}'
+    }
+    request.update(overrides)
+    return request
+
+
+# ============================================================================
+# normalize_statement Tests
+# ============================================================================
+
+class TestNormalizeStatement:
+    """Tests for the normalizeStatement port"""
+
+    @pytest.mark.parametrize('statement, expected', [
+        ('SELECT * FROM b WHERE id = 42', 'SELECT * FROM b WHERE id = ?'),
+        ("SELECT * FROM b WHERE name = 'bob'", 'SELECT * FROM b WHERE name = ?'),
+        ('SELECT * FROM b WHERE name = "bob"', 'SELECT * FROM b WHERE name = ?'),
+        ("SELECT * FROM b WHERE type IN ['a', 'b']", 'SELECT * FROM b WHERE type IN [?, ?]'),
+        ('SELECT * FROM b WHERE id IN (1, 2, 3)', 'SELECT * FROM b WHERE id IN (?)'),
+        ('SELECT * FROM b2c WHERE x = 1', 'SELECT * FROM b2c WHERE x = ?'),
+        ('  SELECT 1  ', 'SELECT ?'),
+        ('', ''),
+        (None, ''),
+    ])
+    def test_normalize(self, statement, expected):
+        """Test literals are replaced the same way as the frontend"""
+        assert normalize_statement(statement) == expected
+
+
+# ============================================================================
+# DDSketch Tests
+# ============================================================================
+
+class TestDDSketch:
+    """Tests for the DDSketch quantile sketch"""
+
+    def test_quantiles_within_relative_accuracy(self):
+        """Test p50/p95/p99 stay within 1% of the exact rank values"""
+        rng = random.Random(7)
+        values = [rng.lognormvariate(0, 2) for _ in range(5000)]
+        sketch = DDSketch()
+        for value in values:
+            sketch.add(value)
+
+        ordered = sorted(values)
+        for q in (0.5, 0.95, 0.99):
+            exact = ordered[int(q * (len(ordered) - 1))]
+            assert sketch.quantile(q) == pytest.approx(exact, rel=0.01)
+
+    def test_add_array_matches_add(self):
+        """Test the vectorized path fills the same buckets"""
+        values = np.array([0.0, 0.001, 0.5, 2.0, 2.0, 150.0])
+        one, many = DDSketch(), DDSketch()
+        for value in values:
+            one.add(float(value))
+        many.add_array(values)
+
+        assert one.buckets == many.buckets
+        assert one.zero_count == many.zero_count == 1
+        assert one.count == many.count == 6
+
+    def test_merge_equals_combined(self):
+        """Test merged sketches answer like one sketch over all values"""
+        left, right, both = DDSketch(), DDSketch(), DDSketch()
+        for value in range(1, 101):
+            (left if value % 2 else right).add(value)
+            both.add(value)
+        left.merge(right)
+
+        assert left.buckets == both.buckets
+        assert left.quantile(0.95) == both.quantile(0.95)
+
+    def test_merge_rejects_different_accuracy(self):
+        """Test sketches with different gamma cannot be merged"""
+        with pytest.raises(ValueError):
+            DDSketch(0.01).merge(DDSketch(0.02))
+
+    def test_empty(self):
+        """Test an empty sketch has no quantiles"""
+        assert DDSketch().quantile(0.5) is None
+
+
+# ============================================================================
+# QueryGroupEngine Tests
+# ============================================================================
+
+class TestQueryGroupEngine:
+    """Tests for QueryGroupEngine class"""
+
+    def test_groups_by_normalized_statement(self):
+        """Test literal variants share one group with frontend-style stats"""
+        engine = build_query_groups(
+            [_request(i) for i in range(10)] +
+            [_request(0, statement=None, preparedText="SELECT name FROM users WHERE type = 'x'")]
+        )
+
+        assert len(engine) == 2
+        group = engine.results()[0]
+        assert group['normalized_statement'] == 'SELECT * FROM users WHERE id = ?'
+        assert group['total_count'] == 10
+        assert group['min_duration_in_seconds'] == pytest.approx(0.001)
+        assert group['max_duration_in_seconds'] == pytest.approx(0.010)
+        assert group['avg_duration_in_seconds'] == pytest.approx(0.0055)
+        assert group['total_duration_in_seconds'] == pytest.approx(0.055)
+        assert group['median_duration_in_seconds'] == pytest.approx(0.005, rel=0.01)
+        assert group['p99_duration_in_seconds'] <= group['max_duration_in_seconds']
+        assert group['avg_fetch'] == 4
+        assert group['avg_indexScan'] == 6
+        assert group['avg_primaryScan'] == 0
+        assert group['avg_resultSize'] == 100
+        assert group['user_query_counts'] == {'app': 5, 'Administrator': 5}
+        assert group['status_counts'] == {'completed': 10, 'fatal': 0, 'cancelled': 0, 'other': 0}
+
+    def test_status_counts_and_invalid_durations(self):
+        """Test state buckets and that requests without serviceTime do not count as timed"""
+        engine = build_query_groups([
+            _request(0, state='fatal'),
+            _request(1, state='Cancelled'),
+            _request(2, state='timeout'),
+            _request(3, state=None, serviceTime=None),
+        ])
+        group = engine.results()[0]
+
+        assert group['total_count'] == 3
+        assert group['status_counts'] == {'completed': 1, 'fatal': 1, 'cancelled': 1, 'other': 1}
+
+    def test_requests_without_statement_skipped(self):
+        """Test requests without statement or preparedText are ignored"""
+        engine = build_query_groups([_request(0, statement='')])
+        assert len(engine) == 0
+        assert engine.results() == []
+
+    def test_merge_matches_single_pass(self):
+        """Test merging per-file engines equals grouping everything at once"""
+        requests = [_request(i, state='fatal' if i % 3 == 0 else 'completed') for i in range(40)]
+        first = build_query_groups(requests[:25])
+        first.merge(build_query_groups(requests[25:]))
+
+        merged, single = first.results(), build_query_groups(requests).results()
+
+        assert len(merged) == len(single) == 1
+        for key, value in merged[0].items():
+            assert value == pytest.approx(single[0][key]) if isinstance(value, float) else value == single[0][key]
+
+    def test_dataset_matches_request_dicts(self):
+        """Test the vectorized dataset path gives the same groups as the dict path"""
+        requests = [_request(i) for i in range(30)]
+        requests += [_request(i, statement='SELECT 1', state='fatal', users=None) for i in range(5)]
+        requests += [_request(99, serviceTime='bogus', phaseCounts={})]
+
+        engine = QueryGroupEngine()
+        engine.add_dataset(build_dataset(requests))
+        by_columns = engine.results()
+        by_dicts = build_query_groups(requests).results()
+
+        assert len(by_columns) == len(by_dicts) == 2
+        for left, right in zip(by_columns, by_dicts):
+            assert left.keys() == right.keys()
+            for key, value in left.items():
+                if isinstance(value, float):
+                    assert value == pytest.approx(right[key])
+                else:
+                    assert value == right[key]
+
+    def test_results_limit_and_sort(self):
+        """Test results can be limited and sorted by any statistic"""
+        engine = build_query_groups(
+            [_request(i) for i in range(5)] + [_request(0, statement='SELECT 1', serviceTime='1s')]
+        )
+
+        assert engine.results(limit=1)[0]['normalized_statement'] == 'SELECT ?'
+        assert engine.results(sort_by='total_count')[0]['total_count'] == 5
+
+
+# ============================================================================
+# AIPayloadBuilder Integration Tests
+# ============================================================================
+
+class TestPayloadQueryGroups:
+    """Tests for server-side query groups in the AI payload"""
+
+    def test_groups_from_dataset(self):
+        """Test query groups are computed from the server dataset when analysisData is absent"""
+        dataset = build_dataset([_request(i) for i in range(12)])
+        groups = AIPayloadBuilder()._build_query_groups({'dataset': dataset}, limit=5)
+
+        assert groups['source'] == 'server_dataset'
+        assert groups['total_patterns'] == 1
+        assert groups['patterns'][0]['total_count'] == 12
+
+    def test_groups_from_every_query_data(self):
+        """Test everyQueryData is grouped when no dataset or analysisData is present"""
+        groups = AIPayloadBuilder()._build_query_groups(
+            {'everyQueryData': [_request(i) for i in range(3)]}
+        )
+
+        assert groups['source'] == 'server_requests'
+        assert groups['patterns'][0]['total_count'] == 3
+
+    def test_browser_analysis_data_preferred(self):
+        """Test analysisData from the browser is still used as-is"""
+        groups = AIPayloadBuilder()._build_query_groups({
+            'analysisData': [{'statement': 'SELECT ?', 'total_count': 1}],
+            'everyQueryData': [_request(0)]
+        })
+
+        assert 'source' not in groups
+        assert groups['patterns'][0]['statement'] == 'SELECT ?'
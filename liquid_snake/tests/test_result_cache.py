@@ -0,0 +1,152 @@
+#!/usr/bin/env python3
+"""
+Unit Tests for Query Result Cache Module
+Tests keys, TTL, LRU bounds and keyspace invalidation
+"""
+
+import pytest
+import sys
+import os
+import time
+
+# Add parent directory to path to import result_cache
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from result_cache import ResultCache, keyspace_tag
+
+
+def _config(host='db', password='secret'):
+    return {'url': f'http://{host}:8091', 'username': 'admin', 'password': password}
+
+
+ANALYZER = keyspace_tag(None)
+PREFERENCES = keyspace_tag(None, 'preferences')
+
+
+class Counter:
+    """compute() stand-in counting executions"""
+
+    def __init__(self):
+        self.calls = 0
+
+    def __call__(self):
+        self.calls += 1
+        return [{'row': self.calls}]
+
+
+@pytest.fixture
+def cache():
+    return ResultCache(ttl_seconds=60)
+
+
+# ============================================================================
+# Key Tests
+# ============================================================================
+
+class TestKeys:
+    """Tests for ResultCache.key and keyspace_tag"""
+
+    def test_tags(self):
+        """Test tags follow bucketConfig defaults"""
+        assert ANALYZER == 'cb_tools.query.analyzer'
+        assert PREFERENCES == 'cb_tools._default._default'
+
+    def test_key_parts(self):
+        """Test clusters, credentials and parameter order are handled"""
+        key = ResultCache.key(_config(), ANALYZER, 'SELECT 1', {'a': 1, 'b': 2})
+
+        assert key == ResultCache.key(_config(), ANALYZER, 'SELECT 1', {'b': 2, 'a': 1})
+        assert key != ResultCache.key(_config('other'), ANALYZER, 'SELECT 1', {'a': 1, 'b': 2})
+        assert key != ResultCache.key(_config(password='x'), ANALYZER, 'SELECT 1', {'a': 1, 'b': 2})
+        assert key != ResultCache.key(_config(), ANALYZER, 'SELECT 1', {'a': 2, 'b': 2})
+        assert 'secret' not in str(key)
+
+
+# ============================================================================
+# Cache Tests
+# ============================================================================
+
+class TestResultCache:
+    """Tests for ResultCache"""
+
+    def test_hit_within_ttl(self, cache):
+        """Test repeated identical reads run the query once"""
+        compute = Counter()
+        key = ResultCache.key(_config(), ANALYZER, 'SELECT 1')
+        values = [cache.cached(key, compute) for _ in range(5)]
+
+        assert compute.calls == 1
+        assert all(value is values[0] for value in values)
+        assert cache.stats()['hits'] == 4
+
+    def test_expiry(self, cache):
+        """Test expired entries are recomputed"""
+        cache.ttl_seconds = 0.01
+        compute = Counter()
+        key = ResultCache.key(_config(), ANALYZER, 'SELECT 1')
+        cache.cached(key, compute)
+        time.sleep(0.02)
+        cache.cached(key, compute)
+
+        assert compute.calls == 2
+
+    def test_refresh(self, cache):
+        """Test refresh bypasses the lookup and stores the new value"""
+        compute = Counter()
+        key = ResultCache.key(_config(), ANALYZER, 'SELECT 1')
+        cache.cached(key, compute)
+
+        assert cache.cached(key, compute, refresh=True) == [{'row': 2}]
+        assert cache.cached(key, compute) == [{'row': 2}]
+
+    def test_errors_not_cached(self, cache):
+        """Test a failing query is retried on the next read"""
+        key = ResultCache.key(_config(), ANALYZER, 'SELECT 1')
+
+        def fail():
+            raise ConnectionError('Not connected')
+
+        with pytest.raises(ConnectionError):
+            cache.cached(key, fail)
+        assert cache.cached(key, Counter()) == [{'row': 1}]
+
+    def test_invalidation_scoped(self, cache):
+        """Test invalidation drops only the written keyspace on that cluster"""
+        keys = {
+            'history': ResultCache.key(_config(), ANALYZER, 'history'),
+            'clusters': ResultCache.key(_config(), ANALYZER, 'clusters'),
+            'prefs': ResultCache.key(_config(), PREFERENCES, 'get', 'user_config'),
+            'other': ResultCache.key(_config('other'), ANALYZER, 'history')
+        }
+        for key in keys.values():
+            cache.cached(key, Counter())
+
+        assert cache.invalidate(_config(), ANALYZER) == 2
+        assert cache.get(keys['history'])[0] is False
+        assert cache.get(keys['clusters'])[0] is False
+        assert cache.get(keys['prefs'])[0] is True
+        assert cache.get(keys['other'])[0] is True
+
+    def test_invalidation_during_compute(self, cache):
+        """Test a result computed across an invalidation is not stored"""
+        key = ResultCache.key(_config(), ANALYZER, 'history')
+
+        def compute():
+            cache.invalidate(_config(), ANALYZER)
+            return ['stale']
+
+        assert cache.cached(key, compute) == ['stale']
+        assert cache.get(key)[0] is False
+
+    def test_lru_bound(self):
+        """Test the least recently used entry is dropped at capacity"""
+        cache = ResultCache(max_entries=2)
+        a, b, c = (ResultCache.key(_config(), ANALYZER, name) for name in 'abc')
+        cache.put(a, 1)
+        cache.put(b, 2)
+        cache.get(a)
+        cache.put(c, 3)
+
+        assert cache.get(b)[0] is False
+        assert cache.get(a) == (True, 1)
+        assert cache.stats()['entries'] == 2
@@ -0,0 +1,246 @@
+#!/usr/bin/env python3
+"""
+Unit Tests for Dataset Snapshot Module
+Tests the save/load round trip, memory-mapped columns, packed strings and
+reopening a snapshot into a session
+"""
+
+import pytest
+import hashlib
+import io
+import json
+import os
+import sys
+import time
+
+import numpy as np
+
+# Add parent directory to path to import snapshot
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import ai_analyzer
+from snapshot import HashingReader, PackedStrings, SnapshotStore, hash_files
+from dataset import build_dataset
+from plans import PlanCache, plan_hash
+from query_groups import QueryGroupEngine
+
+
+PLAN = json.dumps({'#operator': 'PrimaryScan3', 'keyspace': 'beer', '#stats': {'execTime': '2ms'}})
+
+REQUESTS = [
+    {
+        'requestId': f'req-{i}',
+        'requestTime': f'2025-08-15T00:00:{i:02d}.000Z',
+        'elapsedTime': f'{i + 1}ms',
+        'serviceTime': f'{i + 1}ms',
+        'statement': f'SELECT * FROM b WHERE id = {i} /* é */',
+        'users': 'admin' if i % 2 else 'app',
+        'state': 'completed',
+        'phaseCounts': {'fetch': i},
+        'phaseTimes': {'fetch': f'{i}ms'},
+        'plan': PLAN if i % 3 == 0 else None
+    }
+    for i in range(20)
+] + [{'elapsedTime': '1s'}]
+
+HASH = hashlib.sha256(b'capture').hexdigest()
+
+
+@pytest.fixture
+def store(tmp_path):
+    return SnapshotStore(str(tmp_path / 'snapshots'))
+
+
+# ============================================================================
+# PackedStrings Tests
+# ============================================================================
+
+class TestPackedStrings:
+    """Tests for the packed string column"""
+
+    def test_round_trip_and_slices(self):
+        """Test values, None, non-ASCII and slice views"""
+        values = ['a', None, 'ünïcode', '', 'last']
+        packed = PackedStrings.pack(values)
+        strings = PackedStrings(packed['data'], packed['offsets'], packed['nulls'])
+
+        assert list(strings) == values
+        assert strings[-1] == 'last'
+        assert list(strings[1:4]) == [None, 'ünïcode', '']
+        assert strings[1:4].nbytes == len('ünïcode'.encode('utf-8'))
+        assert strings[::2] == ['a', 'ünïcode', 'last']
+
+
+# ============================================================================
+# SnapshotStore Tests
+# ============================================================================
+
+class TestSnapshotStore:
+    """Tests for save/load"""
+
+    def test_round_trip(self, store):
+        """Test every column, string table and string column survives"""
+        dataset = build_dataset(REQUESTS)
+        store.save(HASH, dataset)
+        loaded = store.load(HASH, cache=PlanCache())
+
+        assert len(loaded) == len(dataset)
+        for name, col in dataset.columns.items():
+            np.testing.assert_array_equal(loaded.columns[name], col)
+        np.testing.assert_array_equal(loaded.phase_counts['fetch'], dataset.phase_counts['fetch'])
+        np.testing.assert_array_equal(loaded.phase_times['fetch'], dataset.phase_times['fetch'])
+        assert loaded.statements.values == dataset.statements.values
+        assert list(loaded.request_ids) == dataset.request_ids
+        assert list(loaded.plans) == dataset.plans
+        assert loaded.summary() == dataset.summary()
+
+    def test_columns_are_memory_mapped(self, store):
+        """Test reopened columns are read-only memory maps"""
+        store.save(HASH, build_dataset(REQUESTS))
+        loaded = store.load(HASH)
+
+        assert isinstance(loaded.columns['elapsedTime'], np.memmap)
+        assert not loaded.columns['elapsedTime'].flags.writeable
+
+    def test_plan_summaries_primed(self, store):
+        """Test stored plan summaries are put in the plan cache on load"""
+        store.save(HASH, build_dataset(REQUESTS))
+        cache = PlanCache()
+        store.load(HASH, cache=cache)
+
+        assert cache.get(plan_hash(PLAN))['uses_primary'] is True
+
+    def test_loaded_dataset_operations(self, store):
+        """Test windows, takes and query groups work on a reopened dataset"""
+        dataset = build_dataset(REQUESTS)
+        store.save(HASH, dataset)
+        loaded = store.load(HASH)
+
+        window = loaded.time_window('2025-08-15T00:00:05Z', '2025-08-15T00:00:09Z')
+        assert list(window.request_ids) == [f'req-{i}' for i in range(5, 10)]
+        assert window.plan_summary(1)['uses_primary'] is True
+
+        engine = QueryGroupEngine()
+        engine.add_dataset(loaded)
+        assert len(engine.results()) == 1
+
+    def test_no_plans(self, store):
+        """Test datasets built without plans"""
+        store.save(HASH, build_dataset(REQUESTS, keep_plans=False))
+        assert store.load(HASH).plans is None
+
+    def test_missing_invalid_and_stale(self, store):
+        """Test unknown hashes, path-like hashes and old formats load as None"""
+        assert store.load(HASH) is None
+        assert store.exists('../../etc') is False
+        with pytest.raises(ValueError):
+            store.save('../../etc', build_dataset(REQUESTS))
+
+        store.save(HASH, build_dataset(REQUESTS))
+        meta_path = os.path.join(store.path(HASH), 'meta.json')
+        with open(meta_path) as f:
+            meta = json.load(f)
+        meta['format_version'] = 0
+        with open(meta_path, 'w') as f:
+            json.dump(meta, f)
+        assert store.load(HASH) is None
+
+    def test_save_is_idempotent(self, store):
+        """Test a second save of the same hash leaves the first snapshot and no temp dirs"""
+        store.save(HASH, build_dataset(REQUESTS))
+        store.save(HASH, build_dataset(REQUESTS[:2]))
+
+        assert len(store.load(HASH)) == len(REQUESTS)
+        assert os.listdir(store.root) == [HASH]
+
+
+# ============================================================================
+# Pruning Tests
+# ============================================================================
+
+def _hash(i):
+    return hashlib.sha256(f'capture-{i}'.encode()).hexdigest()
+
+
+def _age(store, content_hash, seconds):
+    last_used = time.time() - seconds
+    os.utime(os.path.join(store.path(content_hash), 'meta.json'), (last_used, last_used))
+
+
+class TestSnapshotPruning:
+    """Tests for the size and age caps"""
+
+    def test_lru_pruned_over_size_cap(self, tmp_path):
+        """Test saving past max_bytes removes the least recently used snapshots"""
+        store = SnapshotStore(str(tmp_path / 'snapshots'), max_bytes=0)
+        for i in range(3):
+            store.save(_hash(i), build_dataset(REQUESTS))
+            _age(store, _hash(i), 100 - i * 10)
+        one = store.entries()[0]['bytes']
+        store.max_bytes = int(one * 2.5)
+        # Reading the oldest snapshot makes it the most recently used
+        store.load(_hash(0))
+        store.save(_hash(3), build_dataset(REQUESTS))
+
+        assert sorted(e['content_hash'] for e in store.entries()) == sorted([_hash(0), _hash(3)])
+        assert sum(e['bytes'] for e in store.entries()) <= store.max_bytes
+
+    def test_expired_pruned(self, tmp_path):
+        """Test snapshots unused for longer than max_age_seconds are removed on save"""
+        store = SnapshotStore(str(tmp_path / 'snapshots'), max_bytes=0, max_age_seconds=3600)
+        store.save(_hash(0), build_dataset(REQUESTS))
+        store.save(_hash(1), build_dataset(REQUESTS))
+        _age(store, _hash(0), 7200)
+        store.save(_hash(2), build_dataset(REQUESTS))
+
+        assert not store.exists(_hash(0))
+        assert store.exists(_hash(1)) and store.exists(_hash(2))
+
+    def test_new_snapshot_kept_when_alone_over_cap(self, tmp_path):
+        """Test the snapshot just written survives even if it alone exceeds the cap"""
+        store = SnapshotStore(str(tmp_path / 'snapshots'), max_bytes=1)
+        store.save(_hash(0), build_dataset(REQUESTS))
+        store.save(_hash(1), build_dataset(REQUESTS))
+
+        assert [e['content_hash'] for e in store.entries()] == [_hash(1)]
+
+    def test_entries_skip_temp_and_incomplete(self, store):
+        """Test temp directories and snapshots without meta.json are not counted or pruned"""
+        store.save(HASH, build_dataset(REQUESTS))
+        os.makedirs(os.path.join(store.root, f'.{HASH}.1.ab.tmp'))
+        os.makedirs(os.path.join(store.root, _hash(9)))
+
+        assert [e['content_hash'] for e in store.entries()] == [HASH]
+        assert store.prune() == []
+
+
+# ============================================================================
+# Hashing and Session Tests
+# ============================================================================
+
+class TestSnapshotSessions:
+    """Tests for content hashing and open_dataset_snapshot"""
+
+    def test_hashing_reader_matches_files(self, tmp_path):
+        """Test the streamed hash equals hashing the files"""
+        body = json.dumps(REQUESTS).encode('utf-8')
+        path = tmp_path / 'capture.json'
+        path.write_bytes(body)
+        reader = HashingReader(io.BytesIO(body))
+        while reader.read(7):
+            pass
+
+        assert reader.hexdigest() == hash_files([str(path)]) == hashlib.sha256(body).hexdigest()
+
+    def test_open_dataset_snapshot(self, store, monkeypatch):
+        """Test a snapshot reopens into a cached session"""
+        monkeypatch.setattr(ai_analyzer, 'snapshot_store', store)
+        store.save(HASH, build_dataset(REQUESTS))
+
+        session_id = ai_analyzer.open_dataset_snapshot(HASH, version='1.0')
+        cached = ai_analyzer.get_cached_data(session_id)
+
+        assert cached['source'] == 'snapshot'
+        assert cached['content_hash'] == HASH
+        assert ai_analyzer.get_total_queries(cached) == len(REQUESTS)
+        assert ai_analyzer.open_dataset_snapshot(hashlib.sha256(b'other').hexdigest()) is None
@@ -0,0 +1,108 @@
+#!/usr/bin/env python3
+"""
+Unit Tests for Streaming Response Module
+Tests NDJSON and incremental JSON encoding, chunk batching and in-band errors
+"""
+
+import pytest
+import io
+import json
+import sys
+import os
+
+# Add parent directory to path to import streaming
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from streaming import iter_json_results, iter_ndjson, stream_rows
+from ingest import iter_completed_requests
+
+
+ROWS = [{'completed_requests': {'requestId': f'r{i}', 'statement': 'SELECT "ü"'}} for i in range(500)]
+
+
+def _failing(rows, after):
+    for i, row in enumerate(rows):
+        if i == after:
+            raise TimeoutError('query timed out')
+        yield row
+
+
+class TestNdjson:
+    """Tests for iter_ndjson"""
+
+    def test_rows_round_trip(self):
+        """Test every row is one line and the stream feeds /api/ingest's reader"""
+        body = b''.join(iter_ndjson(iter(ROWS), chunk_bytes=1024))
+
+        assert [json.loads(line) for line in body.splitlines()] == ROWS
+        assert [r['requestId'] for r in iter_completed_requests(io.BytesIO(body))] == [f'r{i}' for i in range(500)]
+
+    def test_first_row_flushed_then_batched(self):
+        """Test the first row is its own chunk and later chunks are batched"""
+        chunks = list(iter_ndjson(iter(ROWS), chunk_bytes=4096))
+
+        assert chunks[0].count(b'\n') == 1
+        assert 1 < len(chunks) < len(ROWS) / 10
+        assert all(len(chunk) < 4096 + 200 for chunk in chunks)
+
+    def test_rows_pulled_lazily(self):
+        """Test rows are consumed as chunks are read, not up front"""
+        pulled = []
+
+        def rows():
+            for row in ROWS:
+                pulled.append(row)
+                yield row
+
+        stream = iter_ndjson(rows(), chunk_bytes=1024)
+        next(stream)
+        assert len(pulled) == 1
+
+    def test_error_line(self):
+        """Test an iterator error ends the stream with an error line and is reported"""
+        errors = []
+        lines = b''.join(iter_ndjson(_failing(ROWS, 3), on_error=errors.append)).splitlines()
+
+        assert len(lines) == 4
+        assert json.loads(lines[-1]) == {'error': 'query timed out'}
+        assert isinstance(errors[0], TimeoutError)
+
+
+class TestJsonResults:
+    """Tests for iter_json_results"""
+
+    @pytest.mark.parametrize('rows', [ROWS, []])
+    def test_document(self, rows):
+        """Test the streamed document matches the buffered response shape"""
+        chunks = list(iter_json_results(iter(rows), chunk_bytes=2048))
+
+        assert chunks[0] == b'{"results":['
+        assert json.loads(b''.join(chunks)) == {'results': rows, 'success': True, 'row_count': len(rows)}
+
+    def test_first_row_flushed_then_batched(self):
+        """Test the opening bytes and the first row are their own chunks, before the second row is pulled"""
+        pulled = []
+
+        def rows():
+            for row in ROWS:
+                pulled.append(row)
+                yield row
+
+        stream = iter_json_results(rows(), chunk_bytes=4096)
+        assert next(stream) == b'{"results":['
+        assert json.loads(next(stream)) == ROWS[0]
+        assert len(pulled) == 1
+        assert len(list(stream)) < len(ROWS) / 10
+
+    def test_error_trailer(self):
+        """Test a mid-stream error keeps the document valid"""
+        document = json.loads(b''.join(iter_json_results(_failing(ROWS, 10))))
+
+        assert document['success'] is False
+        assert document['error'] == 'query timed out'
+        assert len(document['results']) == document['row_count'] == 10
+
+    def test_unknown_format(self):
+        """Test unknown formats are rejected"""
+        with pytest.raises(ValueError):
+            stream_rows(iter(ROWS), 'csv')
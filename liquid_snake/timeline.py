@@ -0,0 +1,123 @@
+#!/usr/bin/env python3
+"""
+Timeline Buckets Module
+Mergeable per-interval request counts and latency over requestTime
+
+Architecture:
+- Buckets are keyed by requestTime floored to the bucket width (epoch ms)
+- Each bucket keeps the row count, the count of rows with an elapsedTime,
+  their elapsedTime sum and max, so buckets from several files or shards
+  merge by adding (counts/sum) and taking max
+- to_charts() emits the timelineChartsData shape used by the AI payload;
+  gaps are zero-filled only up to MAX_DENSE_BUCKETS, so one outlier
+  requestTime (e.g. 1970) cannot blow up the chart
+"""
+
+from typing import Any, Dict
+import numpy as np
+
+from dataset import CompletedRequestsDataset, epoch_ms_to_iso
+
+# Default bucket width: one minute
+DEFAULT_BUCKET_MS = 60000
+
+# Widest first..last span (in buckets) that is zero-filled; wider timelines
+# only chart their non-empty buckets
+MAX_DENSE_BUCKETS = 10080
+
+
+class TimelineBuckets:
+    """
+    Request count and elapsedTime aggregates per time bucket
+    """
+
+    def __init__(self, bucket_ms: int = DEFAULT_BUCKET_MS):
+        self.bucket_ms = bucket_ms
+        # bucket start (epoch ms) -> [count, elapsed_count, elapsed_sum_ms, elapsed_max_ms]
+        self.buckets: Dict[int, list] = {}
+
+    def __len__(self) -> int:
+        return len(self.buckets)
+
+    @classmethod
+    def from_dataset(cls, dataset: CompletedRequestsDataset,
+                     bucket_ms: int = DEFAULT_BUCKET_MS) -> 'TimelineBuckets':
+        """Bucket a dataset's rows (rows without requestTime are skipped)"""
+        timeline = cls(bucket_ms)
+        timeline.add_dataset(dataset)
+        return timeline
+
+    def add_dataset(self, dataset: CompletedRequestsDataset) -> None:
+        """Add every row of a dataset, vectorized per bucket"""
+        times = dataset.columns['requestTime']
+        valid = ~np.isnan(times)
+        if not valid.any():
+            return
+
+        starts = (np.floor(times[valid] / self.bucket_ms) * self.bucket_ms).astype(np.int64)
+        elapsed = dataset.columns['elapsedTime'][valid]
+        keys, inverse, counts = np.unique(starts, return_inverse=True, return_counts=True)
+
+        has_elapsed = ~np.isnan(elapsed)
+        timed = np.bincount(inverse[has_elapsed], minlength=keys.size)
+        sums = np.bincount(inverse, weights=np.where(has_elapsed, elapsed, 0.0), minlength=keys.size)
+        maxes = np.full(keys.size, -np.inf)
+        np.maximum.at(maxes, inverse[has_elapsed], elapsed[has_elapsed])
+
+        for row in zip(keys.tolist(), counts.tolist(), timed.tolist(), sums.tolist(), maxes.tolist()):
+            self._add(*row)
+
+    def _add(self, key: int, count: int, timed: int, total: float, peak: float) -> None:
+        bucket = self.buckets.get(key)
+        if bucket is None:
+            self.buckets[key] = [count, timed, total, peak]
+        else:
+            bucket[0] += count
+            bucket[1] += timed
+            bucket[2] += total
+            bucket[3] = max(bucket[3], peak)
+
+    def merge(self, other: 'TimelineBuckets') -> None:
+        """Fold another timeline (same bucket width) into this one"""
+        if other.bucket_ms != self.bucket_ms:
+            raise ValueError("Cannot merge timelines with different bucket widths")
+        for key, (count, timed, total, peak) in other.buckets.items():
+            self._add(key, count, timed, total, peak)
+
+    def to_charts(self) -> Dict[str, Any]:
+        """
+        timelineChartsData-shaped charts (common_timeline + aligned datasets)
+
+        Empty buckets between the first and last request are included as
+        zeros, unless that span exceeds MAX_DENSE_BUCKETS; then only the
+        non-empty buckets are charted.
+        """
+        if not self.buckets:
+            return {}
+
+        first, last = min(self.buckets), max(self.buckets)
+        if (last - first) // self.bucket_ms < MAX_DENSE_BUCKETS:
+            starts = list(range(first, last + self.bucket_ms, self.bucket_ms))
+        else:
+            starts = sorted(self.buckets)
+        counts, avg_ms, max_ms = [], [], []
+        for start in starts:
+            count, timed, total, peak = self.buckets.get(start, (0, 0, 0.0, -np.inf))
+            counts.append(count)
+            avg_ms.append(round(total / timed, 3) if timed else 0)
+            max_ms.append(round(peak, 3) if peak != -np.inf else 0)
+
+        return {
+            'common_timeline': {
+                'labels': [epoch_ms_to_iso(start) for start in starts],
+                'note': f'Server-side timeline, {self.bucket_ms // 1000}s buckets'
+            },
+            'request_count': {
+                'title': 'Request Count over Time',
+                'datasets': {'data': counts}
+            },
+            'elapsed_time': {
+                'title': 'Elapsed Time over Time (ms)',
+                'datasets': {'avg_ms': avg_ms, 'max_ms': max_ms}
+            }
+        }